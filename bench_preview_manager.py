@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+PreviewManager基准测试
+在临时目录中生成大量预览文件（默认10万个），对比旧的 glob + stat 串行实现
+与 os.scandir + 线程池实现在整理、统计、清理上的耗时
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import contextlib
+from pathlib import Path
+from datetime import datetime, timedelta
+
+sys.path.insert(0, str(Path(__file__).parent / "src"))
+
+from preview_manager import PreviewManager
+from storage_utils import link_or_copy
+
+
+STYLES = ["shake", "zoom", "blur", "transition", "glitch", "color"]
+
+
+def build_tree(root: Path, files: int, size: int, old_ratio: float):
+    """生成 previews/<style>/*_preview.mp4，其中一部分文件的修改时间设为30天前"""
+    if root.exists():
+        shutil.rmtree(root)
+    payload = os.urandom(size)
+    old = (datetime.now() - timedelta(days=30)).timestamp()
+    for style in STYLES:
+        (root / "previews" / style).mkdir(parents=True)
+    (root / "demos").mkdir()
+    for i in range(files):
+        path = root / "previews" / STYLES[i % len(STYLES)] / f"{i:06d}_preview.mp4"
+        path.write_bytes(payload)
+        if i < files * old_ratio:
+            os.utime(path, (old, old))
+
+
+# 旧实现：glob列出文件后逐个stat，串行复制/删除
+
+def legacy_organize(previews_dir: Path, demos_dir: Path):
+    for style_dir in previews_dir.iterdir():
+        if style_dir.is_dir():
+            target_dir = demos_dir / style_dir.name
+            target_dir.mkdir(exist_ok=True)
+            for preview_file in list(style_dir.glob("*.mp4")):
+                target_file = target_dir / preview_file.name
+                if not target_file.exists() or preview_file.stat().st_mtime > target_file.stat().st_mtime:
+                    link_or_copy(preview_file, target_file)
+
+
+def legacy_stats(previews_dir: Path, demos_dir: Path):
+    total = 0
+    for root in (previews_dir, demos_dir):
+        for style_dir in root.iterdir():
+            if style_dir.is_dir():
+                files = list(style_dir.glob("*.mp4"))
+                total += sum(f.stat().st_size for f in files)
+    return total
+
+
+def legacy_cleanup(previews_dir: Path, keep_days: int):
+    cutoff_time = datetime.now() - timedelta(days=keep_days)
+    for preview_file in previews_dir.rglob("*.mp4"):
+        if preview_file.is_file():
+            if datetime.fromtimestamp(preview_file.stat().st_mtime) < cutoff_time:
+                preview_file.unlink()
+
+
+def timed(func) -> float:
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        func()
+    return time.perf_counter() - start
+
+
+def run(args) -> dict:
+    base = Path(tempfile.mkdtemp(prefix="bench_preview_manager_", dir=args.dir))
+    root = base / "project"
+    results = {}
+    try:
+        for label, legacy, current in (
+            ("organize", lambda r: legacy_organize(r / "previews", r / "demos"),
+             lambda r: PreviewManager(str(r)).organize_previews()),
+            ("stats", lambda r: legacy_stats(r / "previews", r / "demos"),
+             lambda r: PreviewManager(str(r)).get_stats()),
+            ("cleanup", lambda r: legacy_cleanup(r / "previews", 7),
+             lambda r: PreviewManager(str(r)).cleanup_old_previews(7)),
+        ):
+            times = []
+            for func in (legacy, current):
+                build_tree(root, args.files, args.size, args.old_ratio)
+                times.append(timed(lambda: func(root)))
+                if label == "organize":
+                    # demos已是最新时再整理一次：最常见的情况，只有扫描和比较
+                    times.append(timed(lambda: func(root)))
+            if label == "organize":
+                results["organize"] = (times[0], times[2])
+                results["organize (up to date)"] = (times[1], times[3])
+            else:
+                results[label] = tuple(times)
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PreviewManager on a large preview tree")
+    parser.add_argument("--files", type=int, default=100000, help="Number of preview files")
+    parser.add_argument("--size", type=int, default=4096, help="Bytes per preview file")
+    parser.add_argument("--old-ratio", type=float, default=0.5, help="Fraction of files older than 7 days")
+    parser.add_argument("--dir", default=None, help="Where to create the temporary tree")
+    parser.add_argument("--link-mode", choices=["auto", "reflink", "hardlink", "copy"],
+                        help="DEMO_LINK_MODE for organize")
+
+    args = parser.parse_args()
+    if args.link_mode:
+        os.environ["DEMO_LINK_MODE"] = args.link_mode
+
+    print(f"🏁 {args.files} files x {args.size} bytes, {os.cpu_count()} CPUs, "
+          f"link mode {os.getenv('DEMO_LINK_MODE', 'auto')}")
+    results = run(args)
+    print(f"{'operation':<24}{'glob+stat':>12}{'scandir':>12}{'speedup':>10}")
+    for label, (legacy, current) in results.items():
+        print(f"{label:<24}{legacy:>11.2f}s{current:>11.2f}s{legacy / current:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -28,12 +28,19 @@ def main():
     preview_parser.add_argument('--style', help='Style to generate previews for')
     preview_parser.add_argument('--effect-file', help='Specific effect file')
     preview_parser.add_argument('--create-samples', action='store_true', help='Create sample assets')
+    preview_parser.add_argument('--thumbnails', action='store_true', help='Generate missing posters and sprite sheets')
+    preview_parser.add_argument('--progress', action='store_true', help='Show live render progress')
+    preview_parser.add_argument('--duration', type=float, help='Long preview length in seconds (segment-parallel render)')
+    preview_parser.add_argument('--segment-workers', type=int, help='Parallel segment renders for long previews')
+    preview_parser.add_argument('--retry-failed', action='store_true', help='Ignore the render failure cache')
     
     # Web服务器命令
     web_parser = subparsers.add_parser('web', help='Start web server')
     web_parser.add_argument('--host', default='localhost', help='Host to bind to')
     web_parser.add_argument('--port', type=int, default=5000, help='Port to bind to')
     web_parser.add_argument('--debug', action='store_true', help='Enable debug mode')
+    web_parser.add_argument('--asgi', action='store_true', help='Run the ASGI server under uvicorn (async file streaming and renders)')
+    web_parser.add_argument('--workers', type=int, default=4, help='Number of uvicorn worker processes (with --asgi)')
     
     # 批量处理命令
     batch_parser = subparsers.add_parser('batch', help='Batch operations')
@@ -41,12 +48,35 @@ def main():
     batch_parser.add_argument('--preview-all', action='store_true', help='Generate all previews')
     batch_parser.add_argument('--count', type=int, default=5, help='Effects per style')
     
+    # 渲染队列worker命令
+    worker_parser = subparsers.add_parser('worker', help='Run the render queue worker')
+    worker_parser.add_argument('--workers', type=int, default=1, help='Number of concurrent render threads')
+    worker_parser.add_argument('--drain', action='store_true', help='Exit when the queue is empty')
+    worker_parser.add_argument('--status', action='store_true', help='Show queue statistics')
+    worker_parser.add_argument('--progress', action='store_true', help='Show live render progress per job')
+    worker_parser.add_argument('--metrics-port', type=int, help='Serve Prometheus metrics on this port')
+    
+    # 导出命令
+    export_parser = subparsers.add_parser('export', help='Export effects as a ZIP archive')
+    export_parser.add_argument('--style', help='Export a whole style')
+    export_parser.add_argument('--ids', help='Comma-separated effect ids (style/id selects across styles)')
+    export_parser.add_argument('--previews', action='store_true', help='Include preview videos')
+    export_parser.add_argument('-o', '--output', help="Output file (default: effects-<style>.zip, '-' for stdout)")
+    
     # 预览管理命令
     manage_parser = subparsers.add_parser('manage', help='Manage preview files')
     manage_parser.add_argument('--organize', action='store_true', help='Organize previews to demos folder')
     manage_parser.add_argument('--index', action='store_true', help='Create demo index')
     manage_parser.add_argument('--cleanup', type=int, metavar='DAYS', help='Cleanup old previews')
     manage_parser.add_argument('--stats', action='store_true', help='Show statistics')
+    manage_parser.add_argument('--storage', action='store_true', help='Show bytes saved by linked demo copies')
+    manage_parser.add_argument('--evict', action='store_true', help='Evict least-recently-served files down to the storage budget')
+    manage_parser.add_argument('--budget-mb', type=float, help='Storage budget in MB (default: STORAGE_BUDGET_MB)')
+    manage_parser.add_argument('--dry-run', action='store_true', help='With --evict, only report what would be reclaimed')
+    manage_parser.add_argument('--pin', metavar='PATTERN', help='Never evict matching files (e.g. demos/*)')
+    manage_parser.add_argument('--compact', type=float, metavar='DAYS', help='Re-encode previews not served for N days into a smaller encoding')
+    manage_parser.add_argument('--compact-profile', choices=['h264-slow', 'h264-veryslow'], help='Encoding used by --compact')
+    manage_parser.add_argument('--reindex', action='store_true', help='Rescan previews/demos and rebuild the incremental index')
     
     args = parser.parse_args()
     
@@ -63,15 +93,29 @@ def main():
         
         elif args.command == 'preview':
             from preview_generator import PreviewGenerator
+            from render_progress import print_progress
             generator = PreviewGenerator(str(project_root))
             
+            if args.progress:
+                generator.progress_callback = print_progress
+            
+            if args.retry_failed:
+                generator.skip_known_failures = False
+            
             if args.create_samples:
                 generator.create_sample_assets()
+            elif args.thumbnails:
+                generator.generate_missing_thumbnails()
             elif args.effect_file:
                 effect_file = Path(args.effect_file)
                 output_file = project_root / "previews" / f"{effect_file.stem}_preview.mp4"
                 output_file.parent.mkdir(parents=True, exist_ok=True)
-                if generator.render_preview(effect_file, output_file):
+                if args.duration:
+                    success = generator.render_long_preview(effect_file, output_file, args.duration,
+                                                            workers=args.segment_workers)
+                else:
+                    success = generator.render_preview(effect_file, output_file)
+                if success:
                     print(f"Preview generated: {output_file}")
             elif args.style:
                 count = generator.generate_previews_for_style(args.style)
@@ -81,6 +125,10 @@ def main():
                 total = sum(results.values())
                 print(f"Generated {total} previews total")
         
+        elif args.command == 'web' and args.asgi:
+            from asgi_server import run
+            run(host=args.host, port=args.port, workers=args.workers, project_root=str(project_root))
+        
         elif args.command == 'web':
             from web_server import EffectPreviewServer
             server = EffectPreviewServer(str(project_root))
@@ -105,10 +153,34 @@ def main():
                 total = sum(results.values())
                 print(f"Batch preview generation complete: {total} total previews")
         
+        elif args.command == 'worker':
+            from render_queue import RenderQueue, RenderWorker, default_queue_path, serve_worker_metrics
+            queue = RenderQueue(str(default_queue_path(project_root)))
+            
+            if args.status:
+                for state, count in queue.stats().items():
+                    print(f"  {state}: {count}")
+            else:
+                worker = RenderWorker(str(project_root), queue)
+                if args.progress:
+                    from render_progress import print_progress
+                    worker.progress_listener = print_progress
+                if args.metrics_port:
+                    serve_worker_metrics(queue, args.metrics_port)
+                worker.run(workers=args.workers, drain=args.drain)
+        
+        elif args.command == 'export':
+            from zip_export import export
+            export(project_root, args.style, args.ids.split(',') if args.ids else None,
+                   args.previews, args.output)
+        
         elif args.command == 'manage':
             from preview_manager import PreviewManager
             manager = PreviewManager(str(project_root))
             
+            if args.reindex:
+                manager.rebuild_indexes()
+            
             if args.organize:
                 manager.organize_previews()
             
@@ -123,7 +195,25 @@ def main():
                 stats = manager.get_stats()
                 print(f"Total storage: {stats['total_size_mb']:.2f} MB")
             
-            if not any([args.organize, args.index, args.cleanup, args.stats]):
+            if args.storage:
+                from storage_utils import print_storage_report
+                print_storage_report(manager.get_storage_report())
+            
+            if args.compact is not None:
+                manager.compact_cold_previews(args.compact, profile=args.compact_profile)
+            
+            if args.pin or args.evict:
+                from storage_manager import StorageManager, print_eviction_report
+                storage = StorageManager(str(project_root))
+                if args.pin:
+                    storage.access_log.pin(args.pin)
+                    print(f"Pinned {args.pin}")
+                if args.evict:
+                    budget = int(args.budget_mb * 1024 * 1024) if args.budget_mb is not None else None
+                    print_eviction_report(storage.enforce(budget, dry_run=args.dry_run))
+            
+            if not any([args.organize, args.index, args.cleanup, args.stats, args.storage, args.reindex,
+                        args.evict, args.pin, args.compact is not None]):
                 # 默认执行整理和索引
                 manager.organize_previews()
                 manager.create_demo_index()
@@ -7,7 +7,6 @@ import os
 import sys
 from pathlib import Path
 import xml.etree.ElementTree as ET
-import tempfile
 import shutil
 
 # 添加src目录到Python路径
@@ -17,12 +16,34 @@ sys.path.insert(0, str(project_root / "src"))
 from flask import Flask, render_template, jsonify, send_file, send_from_directory, request
 import json
 
+from preview_thumbnails import THUMBNAIL_MAX_AGE, ThumbnailGenerator, thumbnail_paths
+from mlt_document import mlt_document
+from storage_utils import break_link
+from media_index import MediaIndex, watch_indexes
+from storage_manager import AccessLog, default_access_log_path
+from effect_catalog import EffectCatalog
+from effect_generator import SUBTYPE_KEYS
+from http_cache import conditional_response, json_response, send_cached_from_directory
+from compression import CompressedBodyCache, compress_response, precompress_static, send_static
+from listing import (DEMO_MATCH_FIELDS, DEMO_SORT_FIELDS, ListingError, SortedView, paginate,
+                     parse_query, wants_page)
+
 app = Flask(__name__, 
            template_folder='web/templates',
            static_folder='web/static')
 
 app.config['SECRET_KEY'] = 'kdenlive-effect-generator'
 
+# previews/ 和 demos/ 的增量索引（变更日志 + 快照），列表接口不再遍历目录
+preview_index = MediaIndex(Path("previews"))
+demo_index = MediaIndex(Path("demos"))
+
+# 预览/demo的最后访问时间，供容量预算按LRU淘汰
+access_log = AccessLog(str(default_access_log_path(".")))
+
+# 特效列表（元数据、时长、子类型、预览状态），按风格在首次请求时解析并缓存，目录变化后增量刷新
+catalog = EffectCatalog(Path("."))
+
 @app.route('/')
 def index():
     """主页"""
@@ -63,43 +84,25 @@ def get_styles():
             print(f"  ➕ Style: {style_dir.name} ({effect_count} effects, {preview_count} previews)")
     
     print(f"🎨 Returning {len(styles)} styles")
-    return jsonify(styles)
+    return conditional_response(jsonify(styles))
 
 @app.route('/api/effects/<style>')
 def get_effects_by_style(style):
-    """获取指定风格的特效列表"""
-    print(f"🔍 API called: /api/effects/{style}")
+    """获取指定风格的特效列表（内存目录中预先序列化的JSON，目录未变化时不重新扫描）
     
-    effects_dir = Path("effects") / style
-    previews_dir = Path("previews") / style
-    
-    print(f"📁 Effects dir: {effects_dir.absolute()}")
-    print(f"📁 Effects dir exists: {effects_dir.exists()}")
-    
-    effects = []
-    
-    if effects_dir.exists():
-        xml_files = list(effects_dir.glob("*.xml"))
-        print(f"📄 Found {len(xml_files)} XML files")
-        
-        for effect_file in xml_files:
-            preview_file = previews_dir / f"{effect_file.stem}_preview.mp4"
-            
-            effect_data = {
-                "id": effect_file.stem,
-                "name": effect_file.stem,
-                "description": f"{style.title()} effect",
-                "author": "AI Generator",
-                "effect_file": f"effects/{style}/{effect_file.name}",
-                "preview_file": f"previews/{style}/{preview_file.name}" if preview_file.exists() else None,
-                "has_preview": preview_file.exists()
-            }
-            
-            effects.append(effect_data)
-            print(f"  ➕ Added effect: {effect_file.stem}")
+    带 limit/cursor/sort/过滤参数时返回一页：{"items", "next_cursor", "total", "limit"}
+    """
+    print(f"🔍 API called: /api/effects/{style}")
     
-    print(f"🎬 Returning {len(effects)} effects")
-    return jsonify(effects)
+    if not wants_page(request.args, SUBTYPE_KEYS + ("author",)):
+        body = catalog.style_json(style)
+        return json_response(body, catalog.etag(style))
+    try:
+        page = catalog.page(style, request.args)
+    except ListingError as e:
+        return jsonify({"error": str(e)}), 400
+    print(f"🎬 Returning {len(page['items'])} of {page['total']} effects")
+    return conditional_response(jsonify(page))
 
 @app.route('/api/generate', methods=['POST'])
 def generate_effects():
@@ -167,6 +170,8 @@ def generate_preview():
         # 生成预览视频
         print(f"📹 Creating preview: {preview_file}")
         create_placeholder_video(preview_file, style, effect_id)
+        # 就地重写的预览不会改变目录修改时间，主动刷新以更新预览URL的版本号
+        catalog.refresh_style(style)
         
         return jsonify({
             "success": True,
@@ -182,6 +187,9 @@ def create_placeholder_video(output_file, style, effect_id):
     try:
         import subprocess
         
+        # 预览可能与demos中的副本共享inode，先断开再就地重写
+        break_link(Path(output_file))
+        
         # 读取特效XML文件
         effect_file = Path("effects") / style / f"{effect_id}.xml"
         if not effect_file.exists():
@@ -217,30 +225,22 @@ def create_placeholder_video(output_file, style, effect_id):
         # 替换模板中的特效
         modified_template = replace_effect_in_template(template_root, effect_root, style, effect_id)
         
-        # 创建临时文件
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.kdenlive', delete=False, encoding='utf-8') as temp_file:
-            temp_file.write(ET.tostring(modified_template, encoding='unicode'))
-            temp_kdenlive_path = temp_file.name
-        
-        try:
+        # 修改后的模板直接通过内存传给melt（过大时使用tmpfs暂存文件并自动清理）
+        with mlt_document(ET.tostring(modified_template, encoding='unicode'), suffix='.kdenlive') as (mlt_resource, doc_info):
             # 使用melt命令渲染视频
-            cmd = ['/Applications/kdenlive.app/Contents/MacOS/melt', temp_kdenlive_path, '-consumer', f'avformat:{output_file}', 'ab=160k', 'acodec=aac', 'channels=2', 'crf=23', 'f=mp4', 'g=15', 'movflags=+faststart', 'preset=veryfast', 'real_time=-1', 'threads=0', 'vcodec=libx264']
+            print(f"🎬 Rendering with template via {doc_info.describe()}")
+            cmd = ['/Applications/kdenlive.app/Contents/MacOS/melt', mlt_resource, '-consumer', f'avformat:{output_file}', 'ab=160k', 'acodec=aac', 'channels=2', 'crf=23', 'f=mp4', 'g=15', 'movflags=+faststart', 'preset=veryfast', 'real_time=-1', 'threads=0', 'vcodec=libx264']
             result = subprocess.run(cmd, capture_output=True, text=True)
             
             if result.returncode == 0:
                 print(f"✅ Preview video created with {style} effect: {output_file}")
+                ThumbnailGenerator().generate(Path(output_file))
+                preview_index.record(Path(output_file))
             else:
                 print(f"❌ Melt rendering failed: {result.stderr}")
                 print(f"❌ Melt stdout: {result.stdout}")
                 # 如果melt失败，创建一个空文件作为占位
                 output_file.touch()
-                
-        finally:
-            # 清理临时文件
-            try:
-                Path(temp_kdenlive_path).unlink()
-            except:
-                pass
             
     except Exception as e:
         print(f"⚠️  Could not create video: {e}")
@@ -365,7 +365,22 @@ def convert_effect_to_filter(effect_root, style, effect_id):
 def serve_preview(filename):
     """提供预览视频文件"""
     try:
-        return send_from_directory('previews', filename)
+        response = send_cached_from_directory('previews', filename, mimetype='video/mp4')
+        access_log.touch(f"previews/{filename}")
+        return response
+    except Exception as e:
+        return f"Error: {e}", 404
+
+@app.route('/thumbs/<path:filename>')
+def serve_thumbnail(filename):
+    """提供封面图和雪碧图（URL带版本号，可长期缓存）"""
+    if Path(filename).suffix.lower() not in {'.jpg', '.webp'}:
+        return "File not found", 404
+    try:
+        response = send_from_directory('previews', filename, max_age=THUMBNAIL_MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
     except Exception as e:
         return f"Error: {e}", 404
 
@@ -417,45 +432,58 @@ def generate_batch_preview():
 def serve_effect(filename):
     """提供特效XML文件"""
     try:
-        return send_from_directory('effects', filename, as_attachment=True)
+        return send_cached_from_directory('effects', filename, as_attachment=True,
+                                          mimetype='application/xml')
     except Exception as e:
         return f"Error: {e}", 404
 
 @app.route('/api/demos')
 def get_demos():
     """获取所有demo视频列表"""
-    demos_dir = Path("demos")
     demos = []
     
-    if demos_dir.exists():
-        for demo_file in demos_dir.glob("*.mp4"):
-            # 解析文件名格式: {style}_{effect_id}_demo.mp4
-            name_parts = demo_file.stem.replace("_demo", "").split("_", 1)
-            if len(name_parts) >= 2:
-                style = name_parts[0]
-                effect_id = name_parts[1]
-            else:
-                style = "unknown"
-                effect_id = demo_file.stem
-            
-            demos.append({
-                "filename": demo_file.name,
-                "style": style,
-                "effect_id": effect_id,
-                "path": f"demos/{demo_file.name}",
-                "size": demo_file.stat().st_size if demo_file.exists() else 0,
-                "created": demo_file.stat().st_mtime if demo_file.exists() else 0
-            })
+    for key, entry in demo_index.items():
+        # 只列出demos根目录下的文件
+        if "/" in key:
+            continue
+        stem = Path(key).stem
+        # 解析文件名格式: {style}_{effect_id}_demo.mp4
+        name_parts = stem.replace("_demo", "").split("_", 1)
+        if len(name_parts) >= 2:
+            style = name_parts[0]
+            effect_id = name_parts[1]
+        else:
+            style = "unknown"
+            effect_id = stem
+        
+        demos.append({
+            "filename": key,
+            "style": style,
+            "effect_id": effect_id,
+            "path": f"demos/{key}",
+            "size": entry["size"],
+            "created": entry["mtime"]
+        })
+    
+    if wants_page(request.args, DEMO_MATCH_FIELDS):
+        try:
+            query = parse_query(request.args, DEMO_SORT_FIELDS, "created", "desc", DEMO_MATCH_FIELDS)
+        except ListingError as e:
+            return jsonify({"error": str(e)}), 400
+        view = SortedView(demos, query["sort"], DEMO_SORT_FIELDS, "filename", query["order"])
+        return conditional_response(jsonify(paginate(view, query, search_fields=("filename", "style", "effect_id"))))
     
     # 按创建时间排序
     demos.sort(key=lambda x: x["created"], reverse=True)
-    return jsonify(demos)
+    return conditional_response(jsonify(demos))
 
 @app.route('/demos/<path:filename>')
 def serve_demo(filename):
     """提供demo视频文件"""
     try:
-        return send_from_directory('demos', filename)
+        response = send_cached_from_directory('demos', filename)
+        access_log.touch(f"demos/{filename}")
+        return response
     except Exception as e:
         return f"Error: {e}", 404
 
@@ -490,6 +518,11 @@ def get_effect_details(style, effect_id):
         print(f"❌ Error loading effect details: {e}")
         return jsonify({"error": str(e)}), 500
 
+# JSON/XML响应按Accept-Encoding压缩；静态文件优先发送预压缩的 .br/.gz
+compressed_cache = CompressedBodyCache()
+app.after_request(lambda response: compress_response(response, compressed_cache))
+app.view_functions["static"] = lambda filename: send_static(Path(app.static_folder), filename)
+
 # 添加CORS支持
 @app.after_request
 def after_request(response):
@@ -529,9 +562,16 @@ def regenerate_preview():
             except Exception as e:
                 print(f"⚠️  Could not delete existing preview: {e}")
         
+        # 旧的封面图和雪碧图也一并删除，避免与新预览不一致
+        for thumb_file in thumbnail_paths(preview_file).values():
+            if thumb_file.exists():
+                thumb_file.unlink()
+        
         # 重新生成预览视频
         print(f"📹 Regenerating preview: {preview_file}")
         create_placeholder_video(preview_file, style, effect_id)
+        # 就地重写的预览不会改变目录修改时间，主动刷新以更新预览URL的版本号
+        catalog.refresh_style(style)
         
         return jsonify({
             "success": True,
@@ -564,5 +604,12 @@ if __name__ == '__main__':
         else:
             print(f"❌ {path} - NOT FOUND")
     
+    precompressed = precompress_static(Path('web/static'))
+    if precompressed:
+        print(f"🗜️  Precompressed {precompressed} static file(s)")
+    
+    if os.getenv("MEDIA_INDEX_WATCH", "1") != "0" and watch_indexes([preview_index, demo_index]):
+        print("👀 Watching previews/ and demos/ for index updates")
+    
     print("\n🚀 Server starting at http://localhost:8080")
     app.run(host='0.0.0.0', port=8080, debug=True)
@@ -0,0 +1,609 @@
+#!/usr/bin/env python3
+"""
+ASGI Server - Web服务的ASGI版本，用uvicorn多进程部署
+预览/demo/静态文件下载、特效列表JSON和事件流（/api/events）在事件循环中异步处理，不占用线程；
+渲染用 asyncio.create_subprocess_exec 为每个任务启动子进程，并发数受限；
+其余接口复用 EffectPreviewServer 的Flask路由，在有界线程池中执行
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import socket
+import asyncio
+import mimetypes
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import Accept
+from werkzeug.http import http_date, is_resource_modified, parse_accept_header, parse_etags, parse_range_header
+from werkzeug.security import safe_join
+
+try:
+    from web_server import EffectPreviewServer
+    from render_queue import (EVENT_LINE_PREFIX, STATE_RUNNING, RenderQueue, default_executor_workers)
+    from http_cache import IMMUTABLE_MAX_AGE, file_etag
+    from range_serving import CHUNK_SIZE, if_range_matches, resolve_ranges
+    from compression import MIN_SIZE, STATIC_SUFFIXES, available_encodings, choose_encoding, compress, static_variant
+    from event_stream import HEARTBEAT_INTERVAL
+    from effect_generator import SUBTYPE_KEYS
+    from listing import wants_page
+    from metrics import HTTP_IN_FLIGHT, observe_request, record_render, record_render_started
+except ImportError:
+    from src.web_server import EffectPreviewServer
+    from src.render_queue import (EVENT_LINE_PREFIX, STATE_RUNNING, RenderQueue, default_executor_workers)
+    from src.http_cache import IMMUTABLE_MAX_AGE, file_etag
+    from src.range_serving import CHUNK_SIZE, if_range_matches, resolve_ranges
+    from src.compression import MIN_SIZE, STATIC_SUFFIXES, available_encodings, choose_encoding, compress, static_variant
+    from src.event_stream import HEARTBEAT_INTERVAL
+    from src.effect_generator import SUBTYPE_KEYS
+    from src.listing import wants_page
+    from src.metrics import HTTP_IN_FLIGHT, observe_request, record_render, record_render_started
+
+
+RENDER_QUEUE_SCRIPT = Path(__file__).resolve().parent / "render_queue.py"
+# 交给Flask路由的请求（生成、任务、分页列表等）使用的线程数
+WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "16"))
+# 读取文件分块的线程数（只做 os.pread，不会长时间占用）
+FILE_THREADS = int(os.getenv("ASGI_FILE_THREADS", "8"))
+# 交给Flask的请求体上限
+MAX_BODY_SIZE = 16 * 1024 * 1024
+# 子进程崩溃等原因遗留的运行中任务，心跳超时后重新排队
+STALE_TIMEOUT = 600.0
+
+CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-headers", b"Content-Type,Authorization"),
+    (b"access-control-allow-methods", b"GET,PUT,POST,DELETE,OPTIONS"),
+]
+
+EFFECTS_ROUTE = re.compile(r"^/api/effects/([^/]+)$")
+
+
+class AsyncRenderExecutor:
+    """从渲染队列认领任务，每个任务一个渲染子进程（render_queue.py --run-job），最多同时运行 concurrency 个
+
+    子进程以 "@event {json}" 行输出任务事件（渲染进度、状态），由 on_event 转发到事件流。
+    """
+
+    def __init__(self, project_root: Path, queue: RenderQueue,
+                 on_event: Callable[[str, Dict[str, Any]], Awaitable[None]],
+                 concurrency: Optional[int] = None, poll_interval: float = 2.0):
+        self.project_root = Path(project_root)
+        self.queue = queue
+        self.on_event = on_event
+        self.concurrency = default_executor_workers() if concurrency is None else concurrency
+        self.poll_interval = poll_interval
+        self.name = f"{socket.gethostname()}:{os.getpid()}/asgi"
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._processes: Dict[str, asyncio.subprocess.Process] = {}
+
+    def start(self):
+        """有新任务入队时调用（可在任意线程中调用）：唤醒认领循环"""
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def launch(self):
+        """在事件循环中启动认领循环（concurrency为0时只入队，由独立的worker进程渲染）"""
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        if self.concurrency > 0:
+            self._task = asyncio.create_task(self._serve())
+
+    async def _serve(self):
+        recovered = await asyncio.to_thread(self.queue.recover_stale, STALE_TIMEOUT)
+        if recovered:
+            print(f"♻️  Requeued {recovered} stale jobs")
+        print(f"👷 Async render executor: up to {self.concurrency} render process(es)")
+
+        slots = asyncio.Semaphore(self.concurrency)
+        running = set()
+        while True:
+            await slots.acquire()
+            job = await asyncio.to_thread(self.queue.claim, self.name)
+            if job is None:
+                slots.release()
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            task = asyncio.create_task(self._render(job, slots))
+            running.add(task)
+            task.add_done_callback(running.discard)
+
+    async def _render(self, job: Dict[str, Any], slots: asyncio.Semaphore):
+        try:
+            process = await asyncio.create_subprocess_exec(
+                sys.executable, str(RENDER_QUEUE_SCRIPT), "--project-root", str(self.project_root),
+                "--run-job", job["id"], "--event-lines",
+                stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT)
+            self._processes[job["id"]] = process
+            async for raw in process.stdout:
+                line = raw.decode("utf-8", "replace").rstrip()
+                if not line.startswith(EVENT_LINE_PREFIX):
+                    print(line)
+                    continue
+                try:
+                    message = json.loads(line[len(EVENT_LINE_PREFIX):])
+                except ValueError:
+                    continue
+                await self.on_event(message["event"], message["data"])
+
+            returncode = await process.wait()
+            if returncode != 0:
+                # 子进程异常退出，没有记录结果
+                current = await asyncio.to_thread(self.queue.get, job["id"])
+                if current and current["state"] == STATE_RUNNING:
+                    error = f"render process exited with {returncode}"
+                    state = await asyncio.to_thread(self.queue.fail, job["id"], error)
+                    await self.on_event("job-updated", {"job_id": job["id"], "batch_id": job["batch_id"],
+                                                        "batch_ids": job.get("batch_ids", []),
+                                                        "style": job["style"], "effect_id": job["effect_id"],
+                                                        "state": state, "error": error})
+        except Exception as e:
+            print(f"❌ Async render of job {job['id'][:8]} failed: {e}")
+        finally:
+            self._processes.pop(job["id"], None)
+            slots.release()
+
+    async def stop(self):
+        """停止认领；正在运行的渲染子进程被终止，任务由心跳超时回收后重新排队"""
+        if self._task is not None:
+            self._task.cancel()
+        for process in list(self._processes.values()):
+            if process.returncode is None:
+                process.terminate()
+
+
+class AsyncEffectPreviewApp:
+    """ASGI应用：热点路由异步处理，其余请求交给 EffectPreviewServer 的Flask应用"""
+
+    def __init__(self, project_root: str):
+        self.server = EffectPreviewServer(os.path.abspath(project_root))
+        self.server.setup_hooks()
+        self.project_root = self.server.project_root
+        self.static_dir = Path(self.server.app.static_folder)
+
+        # Flask路由入队后唤醒异步执行器，而不是启动线程内的RenderWorker
+        self.executor = AsyncRenderExecutor(self.project_root, self.server._get_render_queue(), self._on_job_event)
+        self.server.render_executor = self.executor
+
+        self.wsgi_pool = ThreadPoolExecutor(WSGI_THREADS, thread_name_prefix="asgi-wsgi")
+        self.file_pool = ThreadPoolExecutor(FILE_THREADS, thread_name_prefix="asgi-file")
+
+        # 事件流订阅者在事件循环中等待；发布可能来自任意线程
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._event_waiters: set = set()
+        self.server.events.add_listener(self._on_publish)
+
+        self.stats = {"native": 0, "wsgi": 0}
+
+    # ASGI入口
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+
+        routed = self._route(scope)
+        if routed is not None:
+            # 交给Flask的请求由 EffectPreviewServer 的钩子计入指标，这里只统计异步处理的路由
+            route, handler = routed
+            self.stats["native"] += 1
+            started = time.perf_counter()
+
+            async def send_observed(message):
+                if message["type"] == "http.response.start":
+                    observe_request(route, scope["method"], message["status"], time.perf_counter() - started)
+                await send(message)
+
+            HTTP_IN_FLIGHT.inc()
+            try:
+                await self._until_disconnect(receive, handler(scope, send_observed))
+            finally:
+                HTTP_IN_FLIGHT.dec()
+        else:
+            self.stats["wsgi"] += 1
+            await self._call_wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self._loop = asyncio.get_running_loop()
+                self.executor.launch()
+                await asyncio.to_thread(self.server.start_background)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.executor.stop()
+                self.server.access_log.flush()
+                self.wsgi_pool.shutdown(wait=False)
+                self.file_pool.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    def _route(self, scope) -> Optional[Tuple[str, Callable]]:
+        """异步处理的路由，返回 (与Flask一致的路由模板, 处理函数)；返回None时交给Flask"""
+        method = scope["method"]
+        path = scope["path"]
+        if method not in ("GET", "HEAD"):
+            return None
+
+        if path.startswith(("/preview/", "/previews/")):
+            prefix, filename = path.split("/", 2)[1:]
+            return f"/{prefix}/<path:filename>", lambda scope, send: self._serve_file(
+                scope, send, self.project_root / "previews", filename, "video/mp4", f"previews/{filename}")
+        if path.startswith("/demos/"):
+            filename = path[len("/demos/"):]
+            return "/demos/<path:filename>", lambda scope, send: self._serve_file(
+                scope, send, self.project_root / "demos", filename, None, f"demos/{filename}")
+        if path.startswith("/static/"):
+            filename = path[len("/static/"):]
+            return "/static/<path:filename>", lambda scope, send: self._serve_file(
+                scope, send, self.static_dir, filename, None, static=True)
+        if path == "/api/styles":
+            return path, lambda scope, send: self._serve_listing(scope, send, None)
+        if path == "/api/events":
+            return path, self._serve_events
+
+        match = EFFECTS_ROUTE.match(path)
+        if match:
+            args = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+            if not wants_page(args, SUBTYPE_KEYS + ("author",)):
+                style = match.group(1)
+                return "/api/effects/<style>", lambda scope, send: self._serve_listing(scope, send, style)
+        return None
+
+    async def _until_disconnect(self, receive, handler: Awaitable):
+        """客户端断开时取消处理（服务器在断开后会静默丢弃send，长下载和事件流需要主动停止）"""
+        task = asyncio.ensure_future(handler)
+
+        async def watch():
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+
+        watcher = asyncio.ensure_future(watch())
+        try:
+            await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for pending in (task, watcher):
+                if not pending.done():
+                    pending.cancel()
+            # 等处理协程的 finally 执行完（关闭文件、注销订阅者）
+            await asyncio.gather(task, watcher, return_exceptions=True)
+        if not task.cancelled() and task.exception() is not None:
+            raise task.exception()
+
+    # 文件
+
+    async def _serve_file(self, scope, send, directory: Path, filename: str, mimetype: Optional[str],
+                          access_key: Optional[str] = None, static: bool = False):
+        """条件请求（ETag/304）、单区间Range（206）和异步分块发送；多区间请求交给Flask"""
+        path = safe_join(os.path.abspath(directory), filename)
+        if path is None or not os.path.isfile(path):
+            await self._send_simple(send, 404, b"File not found", "text/plain")
+            return
+        path = Path(path)
+        environ = self._header_environ(scope)
+        mimetype = mimetype or mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+
+        headers = []
+        send_path = path
+        if static and path.suffix in STATIC_SUFFIXES:
+            send_path, encoding = static_variant(path, self._accept_encodings(environ))
+            if encoding is not None:
+                headers.append((b"content-encoding", encoding.encode()))
+            headers.append((b"vary", b"Accept-Encoding"))
+
+        st = os.stat(send_path)
+        etag = file_etag(st)
+        last_modified = datetime.fromtimestamp(st.st_mtime, timezone.utc)
+        query = dict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+        if query.get("v") == etag:
+            headers.append((b"cache-control", f"public, max-age={IMMUTABLE_MAX_AGE}, immutable".encode()))
+        else:
+            headers.append((b"cache-control", b"no-cache"))
+        headers += [(b"etag", f'"{etag}"'.encode()), (b"last-modified", http_date(st.st_mtime).encode()),
+                    (b"accept-ranges", b"bytes")] + CORS_HEADERS
+        if access_key:
+            # 最后访问时间（批量写入SQLite，不阻塞事件循环）
+            self.file_pool.submit(self.server.access_log.touch, access_key)
+
+        if not is_resource_modified(environ, etag=etag, last_modified=last_modified):
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        size = st.st_size
+        start, stop, status = 0, size, 200
+        if "HTTP_RANGE" in environ and if_range_matches(etag, st.st_mtime, environ.get("HTTP_IF_RANGE", "")):
+            ranges = resolve_ranges(parse_range_header(environ["HTTP_RANGE"]), size)
+            if ranges == []:
+                headers.append((b"content-range", f"bytes */{size}".encode()))
+                await send({"type": "http.response.start", "status": 416, "headers": headers})
+                await send({"type": "http.response.body", "body": b""})
+                return
+            if ranges and len(ranges) > 1:
+                await self._call_wsgi(scope, None, send)
+                return
+            if ranges:
+                (start, stop), status = ranges[0], 206
+                headers.append((b"content-range", f"bytes {start}-{stop - 1}/{size}".encode()))
+
+        headers += [(b"content-type", mimetype.encode()), (b"content-length", str(stop - start).encode())]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+        if status == 200 and "http.response.pathsend" in scope.get("extensions", {}):
+            # 服务器支持时整个文件交给它发送（sendfile）
+            await send({"type": "http.response.pathsend", "path": str(send_path)})
+            return
+
+        loop = asyncio.get_running_loop()
+        fd = os.open(send_path, os.O_RDONLY)
+        try:
+            pos = start
+            while pos < stop:
+                data = await loop.run_in_executor(self.file_pool, os.pread, fd, min(CHUNK_SIZE, stop - pos), pos)
+                if not data:
+                    break
+                pos += len(data)
+                await send({"type": "http.response.body", "body": data, "more_body": pos < stop})
+            if pos < stop:
+                await send({"type": "http.response.body", "body": b""})
+        finally:
+            os.close(fd)
+
+    # 列表JSON
+
+    async def _serve_listing(self, scope, send, style: Optional[str]):
+        """风格列表或整个风格的特效列表：内存目录中预先序列化的JSON，按ETag返回304或压缩后的缓存"""
+        catalog = self.server.catalog
+        body = catalog.styles_json() if style is None else catalog.style_json(style)
+        etag = catalog.etag(style)
+        environ = self._header_environ(scope)
+
+        headers = [(b"content-type", b"application/json"), (b"cache-control", b"no-cache"),
+                   (b"vary", b"Accept-Encoding")] + CORS_HEADERS
+        if_none_match = environ.get("HTTP_IF_NONE_MATCH")
+        if if_none_match and parse_etags(if_none_match).contains_weak(etag):
+            headers.append((b"etag", f'"{etag}"'.encode()))
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        encoding = choose_encoding(available_encodings(), self._accept_encodings(environ)) \
+            if len(body) >= MIN_SIZE else None
+        if encoding is not None:
+            cache = self.server.compressed_cache
+            compressed = cache.get(etag, encoding)
+            if compressed is None:
+                compressed = await asyncio.to_thread(compress, body, encoding)
+                cache.put(etag, encoding, compressed)
+            body = compressed
+            headers += [(b"content-encoding", encoding.encode()), (b"etag", f'W/"{etag}"'.encode())]
+        else:
+            headers.append((b"etag", f'"{etag}"'.encode()))
+
+        headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
+
+    # 事件流
+
+    def _on_publish(self):
+        loop = self._loop
+        if loop is not None and self._event_waiters:
+            loop.call_soon_threadsafe(self._wake_subscribers)
+
+    def _wake_subscribers(self):
+        for waiter in self._event_waiters:
+            waiter.set()
+
+    async def _serve_events(self, scope, send):
+        """/api/events：每个订阅者只是一个协程，不占用线程"""
+        events = self.server.events
+        environ = self._header_environ(scope)
+        last_event_id = environ.get("HTTP_LAST_EVENT_ID") or \
+            dict(parse_qsl(scope.get("query_string", b"").decode("latin-1"))).get("last_event_id")
+
+        headers = [(b"content-type", b"text/event-stream; charset=utf-8"), (b"cache-control", b"no-cache"),
+                   (b"x-accel-buffering", b"no")] + CORS_HEADERS
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+
+        messages, seq = events.resume(last_event_id)
+        waiter = asyncio.Event()
+        self._event_waiters.add(waiter)
+        events.stats["subscribers"] += 1
+        try:
+            await send({"type": "http.response.body", "body": "".join(messages).encode(), "more_body": True})
+            while True:
+                waiter.clear()
+                new_events, _ = events.since(seq)
+                if new_events:
+                    chunk = "".join(events.format(event) for event in new_events)
+                    seq = new_events[-1][0]
+                    await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+                    continue
+                try:
+                    await asyncio.wait_for(waiter.wait(), HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    await send({"type": "http.response.body", "body": b": keepalive\n\n", "more_body": True})
+        finally:
+            self._event_waiters.discard(waiter)
+            events.stats["subscribers"] -= 1
+
+    async def _on_job_event(self, event_type: str, data: Dict[str, Any]):
+        """渲染子进程的任务事件：成功时先刷新目录（发出preview-ready），再推送任务状态；
+        渲染在子进程中进行，渲染指标从 render-started 事件和结束事件附带的 render 计入本进程"""
+        if event_type == "render-started":
+            record_render_started(data["path"])
+        if event_type == "job-updated" and data.get("render"):
+            record_render(data["style"], data["render"])
+        if event_type == "job-updated" and data.get("state") == "succeeded":
+            await asyncio.to_thread(self.server.catalog.refresh_style, data["style"])
+        self.server.events.publish(event_type, data)
+
+    # 交给Flask
+
+    async def _call_wsgi(self, scope, receive, send):
+        """在线程池中运行Flask应用；响应体逐块在线程池中迭代（流式响应不阻塞事件循环）"""
+        body = b""
+        if receive is not None:
+            chunks = []
+            size = 0
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    return
+                chunks.append(message.get("body", b""))
+                size += len(chunks[-1])
+                if size > MAX_BODY_SIZE:
+                    await self._send_simple(send, 413, b"Request body too large", "text/plain")
+                    return
+                if not message.get("more_body"):
+                    break
+            body = b"".join(chunks)
+
+        environ = self._wsgi_environ(scope, body)
+        loop = asyncio.get_running_loop()
+
+        def start() -> Tuple[Dict[str, Any], Any, Any, bytes]:
+            result: Dict[str, Any] = {}
+
+            def start_response(status, response_headers, exc_info=None):
+                result["status"] = int(status.split(" ", 1)[0])
+                result["headers"] = response_headers
+                return lambda data: (_ for _ in ()).throw(RuntimeError("write() is not supported"))
+
+            iterable = self.server.app(environ, start_response)
+            iterator = iter(iterable)
+            first = next(iterator, b"")
+            return result, iterable, iterator, first
+
+        result, iterable, iterator, first = await loop.run_in_executor(self.wsgi_pool, start)
+        try:
+            headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in result["headers"]]
+            await send({"type": "http.response.start", "status": result["status"], "headers": headers})
+            chunk = first
+            while True:
+                following = await loop.run_in_executor(self.wsgi_pool, next, iterator, None)
+                await send({"type": "http.response.body", "body": chunk, "more_body": following is not None})
+                if following is None:
+                    break
+                chunk = following
+        finally:
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                await loop.run_in_executor(self.wsgi_pool, close)
+
+    # 工具
+
+    @staticmethod
+    def _header_environ(scope) -> Dict[str, str]:
+        """请求头转为WSGI风格的 HTTP_* 键（供werkzeug的条件请求函数使用）"""
+        environ: Dict[str, str] = {"REQUEST_METHOD": scope["method"]}
+        for name, value in scope.get("headers", []):
+            key = "HTTP_" + name.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    def _wsgi_environ(self, scope, body: bytes) -> Dict[str, Any]:
+        server = scope.get("server") or ("localhost", 80)
+        client = scope.get("client") or ("", 0)
+        environ = self._header_environ(scope)
+        environ.update({
+            "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": server[0],
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": client[0],
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": True,
+            "wsgi.run_once": False,
+        })
+        if "HTTP_CONTENT_TYPE" in environ:
+            environ["CONTENT_TYPE"] = environ.pop("HTTP_CONTENT_TYPE")
+        # 请求体已完整读取（包括分块传输的），长度以实际读到的为准
+        environ.pop("HTTP_CONTENT_LENGTH", None)
+        environ["CONTENT_LENGTH"] = str(len(body))
+        return environ
+
+    @staticmethod
+    def _accept_encodings(environ: Dict[str, str]) -> Accept:
+        return parse_accept_header(environ.get("HTTP_ACCEPT_ENCODING"), Accept)
+
+    @staticmethod
+    async def _send_simple(send, status: int, body: bytes, mimetype: str):
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", mimetype.encode()),
+                                (b"content-length", str(len(body)).encode())] + CORS_HEADERS})
+        await send({"type": "http.response.body", "body": body})
+
+
+def create_app(project_root: Optional[str] = None) -> AsyncEffectPreviewApp:
+    """uvicorn的应用工厂（每个worker进程各创建一次）：uvicorn --factory asgi_server:create_app"""
+    return AsyncEffectPreviewApp(project_root or os.getenv("PROJECT_ROOT", "."))
+
+
+def run(host: str = "127.0.0.1", port: int = 5000, workers: int = 4, project_root: str = ".",
+        limit_concurrency: Optional[int] = None):
+    """用uvicorn启动多个worker进程"""
+    try:
+        import uvicorn
+    except ImportError:
+        print("❌ uvicorn is not installed: pip install 'uvicorn[standard]'")
+        raise SystemExit(1)
+
+    # worker进程通过环境变量取得项目目录，并从src目录导入本模块
+    os.environ["PROJECT_ROOT"] = os.path.abspath(project_root)
+    src_dir = str(Path(__file__).resolve().parent)
+    if src_dir not in sys.path:
+        sys.path.insert(0, src_dir)
+    print(f"🚀 ASGI server at http://{host}:{port} with {workers} worker(s)")
+    print(f"Project root: {os.environ['PROJECT_ROOT']}")
+    uvicorn.run("asgi_server:create_app", factory=True, host=host, port=port, workers=workers,
+                limit_concurrency=limit_concurrency, lifespan="on", log_level="warning")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Effect Preview ASGI Server (uvicorn)")
+    parser.add_argument("--host", default="127.0.0.1", help="Host to bind to")
+    parser.add_argument("--port", type=int, default=5000, help="Port to bind to")
+    parser.add_argument("--workers", type=int, default=4, help="Number of worker processes")
+    parser.add_argument("--project-root", default=".", help="Project root directory")
+    parser.add_argument("--limit-concurrency", type=int, help="Maximum concurrent connections per worker (503 beyond)")
+    args = parser.parse_args()
+
+    run(args.host, args.port, args.workers, args.project_root, args.limit_concurrency)
+
+
+if __name__ == "__main__":
+    main()
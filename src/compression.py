@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Compression - JSON/XML响应的gzip/brotli协商压缩和静态资源预压缩
+超过阈值的JSON/XML按 Accept-Encoding 压缩，压缩结果按 (ETag, 编码) 缓存，未变化的列表不会重复压缩；
+app.js/style.css 等静态文件在启动或构建时预先压缩为 .br/.gz，请求时直接发送，不占用CPU
+"""
+
+import os
+import gzip
+import mimetypes
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+
+from flask import Response, request
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from http_cache import send_cached_file
+except ImportError:
+    from src.http_cache import send_cached_file
+
+
+# 动态压缩的响应类型
+COMPRESSIBLE_MIMETYPES = {"application/json", "application/xml", "text/xml"}
+# 预压缩的静态文件类型
+STATIC_SUFFIXES = (".js", ".css", ".html", ".svg", ".json", ".xml")
+# 小于该字节数的响应不压缩（压缩头和CPU开销大于收益）
+MIN_SIZE = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+# 直接发送文件（特效XML）时，超过该大小不读入内存压缩
+MAX_FILE_SIZE = 8 * 1024 * 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# 静态文件预压缩用最高压缩率（只做一次）
+STATIC_GZIP_LEVEL = 9
+STATIC_BROTLI_QUALITY = 11
+
+# 编码名 → 预压缩文件后缀
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def available_encodings() -> List[str]:
+    """服务端支持的编码，按优先顺序"""
+    return (["br"] if brotli is not None else []) + ["gzip"]
+
+
+def choose_encoding(encodings: Optional[Iterable[str]] = None, accept=None) -> Optional[str]:
+    """按 Accept-Encoding 选择编码（accept 默认取当前Flask请求）；客户端不接受压缩时返回None"""
+    if accept is None:
+        accept = request.accept_encodings
+    best, best_quality = None, 0.0
+    for encoding in encodings or available_encodings():
+        quality = accept[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data: bytes, encoding: str, static: bool = False) -> bytes:
+    if encoding == "br":
+        return brotli.compress(data, quality=STATIC_BROTLI_QUALITY if static else BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=STATIC_GZIP_LEVEL if static else GZIP_LEVEL, mtime=0)
+
+
+class CompressedBodyCache:
+    """压缩结果的LRU缓存，键为 (ETag, 编码)；ETag变化即内容变化，旧条目自然被淘汰"""
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, etag: str, encoding: str) -> Optional[bytes]:
+        with self._lock:
+            body = self._entries.get((etag, encoding))
+            if body is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end((etag, encoding))
+            self.stats["hits"] += 1
+            return body
+
+    def put(self, etag: str, encoding: str, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop((etag, encoding), None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[(etag, encoding)] = body
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+def _add_vary(response: Response):
+    if "accept-encoding" not in {v.lower() for v in response.vary}:
+        response.vary.add("Accept-Encoding")
+
+
+def compress_response(response: Response, cache: Optional[CompressedBodyCache] = None) -> Response:
+    """after_request 钩子：协商压缩JSON/XML响应
+
+    压缩后的ETag改为弱ETag（与nginx一致），If-None-Match 的弱比较仍然命中304。
+    """
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+        return response
+    _add_vary(response)
+    if (response.status_code != 200 or "Content-Encoding" in response.headers
+            or request.method == "HEAD" or response.is_streamed and not response.direct_passthrough):
+        return response
+    length = response.content_length
+    if length is not None and (length < MIN_SIZE or length > MAX_FILE_SIZE):
+        return response
+
+    encoding = choose_encoding()
+    if encoding is None:
+        return response
+
+    etag, weak = response.get_etag()
+    body = cache.get(etag, encoding) if cache is not None and etag and not weak else None
+    if body is None:
+        if response.direct_passthrough:
+            # send_file 的文件响应（特效XML）：读取文件内容后压缩
+            response.direct_passthrough = False
+        data = response.get_data()
+        if len(data) < MIN_SIZE:
+            return response
+        body = compress(data, encoding)
+        if cache is not None and etag and not weak:
+            cache.put(etag, encoding, body)
+    else:
+        response.close()
+
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    if etag:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def precompress_static(static_dir: Path, encodings: Optional[Iterable[str]] = None) -> int:
+    """为静态文件生成 .br/.gz（已是最新的跳过），返回生成的文件数"""
+    static_dir = Path(static_dir)
+    encodings = list(encodings or available_encodings())
+    written = 0
+    for path in sorted(static_dir.rglob("*")):
+        if not path.is_file() or path.suffix not in STATIC_SUFFIXES:
+            continue
+        source_mtime = path.stat().st_mtime
+        data = None
+        for encoding in encodings:
+            target = path.with_name(path.name + ENCODING_SUFFIXES[encoding])
+            if target.exists() and target.stat().st_mtime >= source_mtime:
+                continue
+            if data is None:
+                data = path.read_bytes()
+            body = compress(data, encoding, static=True)
+            if len(body) >= len(data):
+                continue
+            tmp = target.with_name(f".{target.name}.tmp")
+            tmp.write_bytes(body)
+            os.replace(tmp, target)
+            written += 1
+    return written
+
+
+def send_static(static_dir: Path, filename: str) -> Response:
+    """发送静态文件；存在不旧于原文件的预压缩版本且客户端接受时直接发送压缩文件"""
+    path = safe_join(os.path.abspath(static_dir), filename)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+    path = Path(path)
+
+    mimetype = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    if path.suffix not in STATIC_SUFFIXES:
+        return send_cached_file(path, mimetype=mimetype)
+    send_path, encoding = static_variant(path)
+    response = send_cached_file(send_path, mimetype=mimetype)
+    if encoding is not None:
+        response.headers["Content-Encoding"] = encoding
+    _add_vary(response)
+    return response
+
+
+def static_variant(path: Path, accept=None) -> Tuple[Path, Optional[str]]:
+    """客户端接受且不旧于原文件的预压缩版本 (路径, 编码)；没有时返回 (原文件, None)
+
+    预压缩文件可直接发送，不需要安装brotli。
+    """
+    source_mtime = path.stat().st_mtime
+    variants = [e for e in ENCODING_SUFFIXES if _fresh_variant(path, e, source_mtime)]
+    encoding = choose_encoding(variants, accept) if variants else None
+    if encoding is None:
+        return path, None
+    return path.with_name(path.name + ENCODING_SUFFIXES[encoding]), encoding
+
+
+def _fresh_variant(path: Path, encoding: str, source_mtime: float) -> bool:
+    try:
+        return os.stat(path.with_name(path.name + ENCODING_SUFFIXES[encoding])).st_mtime >= source_mtime
+    except FileNotFoundError:
+        return False
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Precompress static assets (.br/.gz)")
+    parser.add_argument("static_dir", nargs="?", default="web/static", help="Static directory")
+    args = parser.parse_args()
+
+    written = precompress_static(Path(args.static_dir))
+    print(f"🗜️  Precompressed {written} file(s) in {args.static_dir} ({', '.join(available_encodings())})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Effect Catalog - Web服务的内存特效目录
+启动时扫描一次 effects/ 和 previews/，之后由文件监听（watchdog）增量更新；
+风格列表和每个风格的特效列表预先序列化为JSON，列表请求直接返回缓存的字节
+"""
+
+import os
+import json
+import threading
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+try:
+    from preview_thumbnails import thumbnail_fields
+    from media_index import DebouncedEventHandler, Observer
+    from effect_timing import keyframe_range
+    from effect_generator import SUBTYPE_KEYS
+    from listing import EFFECT_SORT_FIELDS, SortedView, paginate, parse_query
+    from http_cache import body_etag, file_version, versioned_url
+except ImportError:
+    from src.preview_thumbnails import thumbnail_fields
+    from src.media_index import DebouncedEventHandler, Observer
+    from src.effect_timing import keyframe_range
+    from src.effect_generator import SUBTYPE_KEYS
+    from src.listing import EFFECT_SORT_FIELDS, SortedView, paginate, parse_query
+    from src.http_cache import body_etag, file_version, versioned_url
+
+
+THUMBNAIL_SUFFIXES = (".jpg", ".webp")
+
+
+def parse_effect_info(effect_file: Path) -> Dict[str, Any]:
+    """解析特效XML文件获取基本信息"""
+    try:
+        root = ET.parse(effect_file).getroot()
+
+        info = {
+            "id": root.get("id", ""),
+            "name": "",
+            "description": "",
+            "author": ""
+        }
+
+        # 名称、描述、作者
+        for key, tag in (("name", "n"), ("description", "description"), ("author", "author")):
+            elem = root.find(tag)
+            if elem is not None:
+                info[key] = elem.text or ""
+
+        return info
+
+    except Exception as e:
+        return {
+            "id": effect_file.stem,
+            "name": effect_file.stem,
+            "description": f"Error parsing XML: {e}",
+            "author": "Unknown"
+        }
+
+
+def parse_effect_attributes(xml_content: str) -> Dict[str, Any]:
+    """列表过滤用的属性：关键帧跨度（帧数）和子类型
+
+    新生成的特效把子类型写在根元素属性上；旧文件尽量从描述和缩放矩形推断。
+    """
+    try:
+        root = ET.fromstring(xml_content)
+        span = keyframe_range(xml_content)
+    except ET.ParseError:
+        return {"duration": None}
+
+    attributes: Dict[str, Any] = {"duration": span[1] - span[0] if span else None}
+    for key in SUBTYPE_KEYS:
+        if root.get(key):
+            attributes[key] = root.get(key)
+
+    description = root.findtext("description") or ""
+    if "color_style" not in attributes and " - " in description:
+        attributes["color_style"] = description.rsplit(" - ", 1)[1].strip()
+
+    if "zoom_type" not in attributes and root.get("id", "").startswith("zoom"):
+        rect = root.find(".//effect[@id='qtblend']/property[@name='rect']")
+        frames = [kf.split("=", 1)[1].split() for kf in (rect.text or "").split(";") if "=" in kf] \
+            if rect is not None else []
+        try:
+            start, end = float(frames[0][2]), float(frames[-1][2])
+        except (IndexError, ValueError):
+            start = end = None
+        if start != end:
+            attributes["zoom_type"] = "zoom_in" if end > start else "zoom_out"
+
+    return attributes
+
+
+def _list_dir(directory: Path) -> List[os.DirEntry]:
+    try:
+        with os.scandir(directory) as it:
+            return [e for e in it if not e.name.startswith(".")]
+    except (FileNotFoundError, NotADirectoryError):
+        return []
+
+
+class EffectCatalog:
+    """风格 → 特效 → 元数据/预览状态 的内存目录
+
+    XML只在文件修改时间变化时重新解析；每次变化后只重新序列化受影响的风格。
+    """
+
+    def __init__(self, project_root: Path):
+        self.project_root = Path(project_root)
+        self.effects_dir = self.project_root / "effects"
+        self.previews_dir = self.project_root / "previews"
+
+        self.effects: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.previews: Dict[str, Set[str]] = {}
+        self.version = 0
+        self.stats = {"builds": 0, "parses": 0, "reused": 0, "style_refreshes": 0}
+
+        self._styles_json = b"[]"
+        self._style_json: Dict[str, bytes] = {}
+        self._etags: Dict[Optional[str], str] = {}
+        self._style_items: Dict[str, List[Dict[str, Any]]] = {}
+        self._views: Dict[tuple, SortedView] = {}
+        self._dir_mtimes: Dict[str, tuple] = {}
+        self._lock = threading.RLock()
+        self._observer = None
+        # 变化通知 listener(event_type, data)：新特效 effect-created，新的或重新渲染的预览 preview-ready
+        self.listener: Optional[Callable[[str, Dict[str, Any]], None]] = None
+
+    # 构建与刷新
+
+    def build(self) -> "EffectCatalog":
+        """全量扫描（启动时调用一次；已解析且未修改的XML会复用）"""
+        with self._lock:
+            styles = {e.name for e in _list_dir(self.effects_dir) if e.is_dir()}
+            for style in set(self.effects) - styles:
+                self.effects.pop(style, None)
+                self.previews.pop(style, None)
+                self._dir_mtimes.pop(style, None)
+            for style in sorted(styles):
+                self._scan_style(style)
+            self._serialize(styles | set(self._style_json))
+            self._dir_mtimes[""] = self._root_mtime()
+            self.stats["builds"] += 1
+        return self
+
+    def _root_mtime(self) -> Optional[int]:
+        try:
+            return os.stat(self.effects_dir).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def refresh_style(self, style: str):
+        """重新扫描一个风格：只重新解析修改时间变化的XML"""
+        with self._lock:
+            self._scan_style(style)
+            self._serialize({style})
+            self.stats["style_refreshes"] += 1
+
+    def _style_dir_mtimes(self, style: str) -> tuple:
+        mtimes = []
+        for directory in (self.effects_dir / style, self.previews_dir / style):
+            try:
+                mtimes.append(os.stat(directory).st_mtime_ns)
+            except FileNotFoundError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def _scan_style(self, style: str):
+        old = self.effects.get(style, {})
+        effects = {}
+        for entry in _list_dir(self.effects_dir / style):
+            if not entry.name.endswith(".xml") or not entry.is_file():
+                continue
+            effect_id = entry.name[:-4]
+            mtime = entry.stat().st_mtime_ns
+            cached = old.get(effect_id)
+            if cached and cached["_mtime"] == mtime:
+                effects[effect_id] = cached
+                self.stats["reused"] += 1
+            else:
+                effects[effect_id] = self._load_effect(style, effect_id, mtime)
+
+        self.previews[style] = {e.name for e in _list_dir(self.previews_dir / style)
+                                if e.name.endswith(".mp4")}
+        if effects or (self.effects_dir / style).is_dir():
+            # 首次构建时不通知；之后比较新旧状态
+            notify = self.listener is not None and self.stats["builds"] > 0
+            self.effects[style] = effects
+            for effect_id, effect in effects.items():
+                before = old.get(effect_id)
+                before_url = before.get("preview_url") if before else None
+                effect.update(self._preview_fields(style, effect_id))
+                if not notify:
+                    continue
+                if before is None:
+                    self._notify("effect-created", style, effect)
+                if effect["preview_url"] and effect["preview_url"] != before_url:
+                    self._notify("preview-ready", style, effect, replaced=before_url is not None)
+        else:
+            self.effects.pop(style, None)
+            self.previews.pop(style, None)
+        self._dir_mtimes[style] = self._style_dir_mtimes(style)
+
+    def _notify(self, event_type: str, style: str, effect: Dict[str, Any], **extra):
+        data = {"style": style, "effect": {k: v for k, v in effect.items() if not k.startswith("_")}}
+        data.update(extra)
+        try:
+            self.listener(event_type, data)
+        except Exception as e:
+            print(f"⚠️  Catalog listener error: {e}")
+
+    def _load_effect(self, style: str, effect_id: str, mtime: int) -> Dict[str, Any]:
+        self.stats["parses"] += 1
+        effect_file = self.effects_dir / style / f"{effect_id}.xml"
+        info = parse_effect_info(effect_file)
+        try:
+            attributes = parse_effect_attributes(effect_file.read_text(encoding="utf-8"))
+        except (OSError, UnicodeDecodeError):
+            attributes = {"duration": None}
+        effect = {
+            "id": effect_id,
+            "name": info.get("name") or effect_id,
+            "description": info.get("description", ""),
+            "author": info.get("author", ""),
+            "effect_file": f"effects/{style}/{effect_id}.xml",
+            "created": mtime / 1e9,
+            "_mtime": mtime,
+            "_info": info,
+        }
+        effect.update(attributes)
+        return effect
+
+    def _preview_fields(self, style: str, effect_id: str) -> Dict[str, Any]:
+        has_preview = f"{effect_id}_preview.mp4" in self.previews.get(style, ())
+        preview_file = f"previews/{style}/{effect_id}_preview.mp4"
+        fields = {
+            "preview_file": preview_file if has_preview else None,
+            # 带版本号的URL内容不可变，浏览器可长期缓存
+            "preview_url": versioned_url(preview_file, file_version(self.project_root / preview_file))
+            if has_preview else None,
+            "has_preview": has_preview,
+        }
+        fields.update(thumbnail_fields(self.previews_dir, style, effect_id))
+        return fields
+
+    def apply_changes(self, paths: Iterable[str]):
+        """处理监听到的变化：按风格合并后各刷新一次"""
+        styles = set()
+        for path in paths:
+            style = self._style_of(path)
+            if style:
+                styles.add(style)
+        with self._lock:
+            for style in styles:
+                self._scan_style(style)
+            if styles:
+                self._serialize(styles)
+
+    def _style_of(self, path: str) -> Optional[str]:
+        """effects/<style>/... 或 previews/<style>/... 中的风格名"""
+        path = os.path.abspath(path)
+        for root in (self.effects_dir, self.previews_dir):
+            prefix = os.path.join(os.path.abspath(root), "")
+            if path.startswith(prefix):
+                style = path[len(prefix):].split(os.sep, 1)[0]
+                return None if style.startswith(".") else style
+        return None
+
+    def _serialize(self, styles: Iterable[str]):
+        """重新生成受影响风格的JSON和风格列表"""
+        for style in styles:
+            self._views = {k: v for k, v in self._views.items() if k[0] != style}
+            if style in self.effects:
+                items = [{k: v for k, v in effect.items() if not k.startswith("_")}
+                         for _, effect in sorted(self.effects[style].items())]
+                self._style_items[style] = items
+                self._style_json[style] = json.dumps(items, ensure_ascii=False).encode("utf-8")
+                self._etags[style] = body_etag(self._style_json[style])
+            else:
+                self._style_items.pop(style, None)
+                self._style_json.pop(style, None)
+                self._etags.pop(style, None)
+
+        self._styles_json = json.dumps([
+            {"name": style, "effect_count": len(effects), "preview_count": len(self.previews.get(style, ()))}
+            for style, effects in sorted(self.effects.items())
+        ], ensure_ascii=False).encode("utf-8")
+        self._etags[None] = body_etag(self._styles_json)
+        self.version += 1
+
+    # 读取
+
+    def _check_fresh(self, style: Optional[str] = None):
+        """没有文件监听时的后备：比较目录修改时间，只stat目录、不遍历特效文件"""
+        if self._observer is not None:
+            return
+        if style is not None:
+            if self._dir_mtimes.get(style) != self._style_dir_mtimes(style):
+                self.refresh_style(style)
+            return
+        if self._dir_mtimes.get("") != self._root_mtime():
+            self.build()
+            return
+        stale = [s for s in list(self.effects) if self._dir_mtimes.get(s) != self._style_dir_mtimes(s)]
+        if stale:
+            self.apply_changes(str(self.effects_dir / s) for s in stale)
+
+    def styles_json(self) -> bytes:
+        self._check_fresh()
+        return self._styles_json
+
+    def style_json(self, style: str) -> bytes:
+        self._check_fresh(style)
+        return self._style_json.get(style, b"[]")
+
+    def etag(self, style: Optional[str] = None) -> str:
+        """styles_json()（style为None）或 style_json(style) 当前内容的ETag，序列化时计算一次"""
+        return self._etags.get(style) or body_etag(b"[]")
+
+    def page(self, style: str, args) -> Dict[str, Any]:
+        """游标分页、排序和过滤（参数见 listing.parse_query）；每种排序的结果缓存到该风格下次变化"""
+        self._check_fresh(style)
+        query = parse_query(args, EFFECT_SORT_FIELDS, "id", match_fields=SUBTYPE_KEYS + ("author",))
+        with self._lock:
+            key = (style, query["sort"], query["order"])
+            view = self._views.get(key)
+            if view is None:
+                view = self._views[key] = SortedView(self._style_items.get(style, []), query["sort"],
+                                                     EFFECT_SORT_FIELDS, order=query["order"])
+        return paginate(view, query, search_fields=("id", "name", "description"))
+
+    def get_effect(self, style: str, effect_id: str) -> Optional[Dict[str, Any]]:
+        self._check_fresh(style)
+        return self.effects.get(style, {}).get(effect_id)
+
+    def details(self, refs: Iterable[Tuple[str, Optional[str]]], fields: Optional[Iterable[str]] = None,
+                include_xml: bool = False) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """批量详情：refs 为 (风格, 特效ID)，特效ID为None表示整个风格
+
+        元数据取自内存目录（不重新解析XML）；fields 限定返回的元数据字段，include_xml 时再读取XML原文。
+        返回 (详情列表, 找不到的 "风格/特效ID")。
+        """
+        refs = list(refs)
+        for style in {style for style, _ in refs}:
+            self._check_fresh(style)
+        wanted = set(fields) if fields is not None else None
+
+        selected, missing = [], []
+        with self._lock:
+            for style, effect_id in refs:
+                effects = self.effects.get(style, {})
+                if effect_id is None:
+                    if style not in self.effects:
+                        missing.append(style)
+                    selected.extend((style, effects[i]) for i in sorted(effects))
+                elif effect_id in effects:
+                    selected.append((style, effects[effect_id]))
+                else:
+                    missing.append(f"{style}/{effect_id}")
+
+        items = []
+        for style, effect in selected:
+            item = {"style": style}
+            item.update((k, v) for k, v in effect.items()
+                        if not k.startswith("_") and (wanted is None or k in wanted or k == "id"))
+            if include_xml:
+                try:
+                    item["xml_content"] = (self.project_root / effect["effect_file"]).read_text(encoding="utf-8")
+                except (OSError, UnicodeDecodeError):
+                    item["xml_content"] = None
+            items.append(item)
+        return items, missing
+
+    # 文件监听
+
+    def watch(self, debounce: float = 0.5):
+        """用watchdog监听 effects/ 和 previews/；未安装watchdog时返回None（退回目录修改时间检查）"""
+        if Observer is None:
+            return None
+        observer = Observer()
+        handler = CatalogEventHandler(self, debounce)
+        for directory in (self.effects_dir, self.previews_dir):
+            directory.mkdir(parents=True, exist_ok=True)
+            observer.schedule(handler, str(directory), recursive=True)
+        observer.daemon = True
+        observer.start()
+        self._observer = observer
+        return observer
+
+
+class CatalogEventHandler(DebouncedEventHandler):
+    """effects/*.xml、预览视频和缩略图的变化触发对应风格的增量刷新"""
+
+    def __init__(self, catalog: EffectCatalog, debounce: float = 0.5):
+        super().__init__(debounce)
+        self.catalog = catalog
+
+    def accepts(self, path: str, is_directory: bool) -> bool:
+        if is_directory:
+            return True
+        name = os.path.basename(path)
+        return not name.startswith(".") and name.endswith((".xml", ".mp4") + THUMBNAIL_SUFFIXES)
+
+    def handle_paths(self, paths: List[str]):
+        self.catalog.apply_changes(paths)
@@ -14,6 +14,10 @@ from jinja2 import Template
 import xml.etree.ElementTree as ET
 
 
+# 各风格的子类型参数，生成时写入XML根元素属性
+SUBTYPE_KEYS = ("zoom_type", "blur_type", "transition_type", "color_style")
+
+
 class EffectGenerator:
     def __init__(self, project_root: str):
         self.project_root = Path(project_root)
@@ -380,6 +384,12 @@ class EffectGenerator:
         t = Template(template)
         return t.render(**params)
     
+    def _stamp_subtype(self, xml_content: str, params: Dict[str, Any]) -> str:
+        """把子类型（zoom_type、color_style等）写成根元素属性，列表接口据此过滤"""
+        attrs = "".join(f' {key}="{params[key]}"' for key in SUBTYPE_KEYS if key in params)
+        end = xml_content.index(">")
+        return xml_content[:end] + attrs + xml_content[end:]
+    
     def generate_effects(self, style: str, count: int = 10) -> List[str]:
         """批量生成特效文件"""
         generated_files = []
@@ -388,7 +398,7 @@ class EffectGenerator:
         
         for i in range(count):
             params = self.generate_effect_params(style)
-            xml_content = self.generate_xml(style, params)
+            xml_content = self._stamp_subtype(self.generate_xml(style, params), params)
             
             filename = f"{params['id']}.xml"
             file_path = style_dir / filename
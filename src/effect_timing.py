@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Effect Timing - 根据特效自身的关键帧范围确定预览渲染窗口
+只做XML和字符串解析，不依赖NumPy，供所有渲染路径使用
+"""
+
+import re
+import argparse
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+
+# 关键帧键可带插值标记，例如 "10~=" (平滑) 或 "10|=" (离散)
+KEYFRAME_RE = re.compile(r"(?:^|;)\s*(-?\d+)\D?=")
+
+
+def keyframe_range(xml_content: str) -> Optional[Tuple[int, int]]:
+    """返回所有动画参数中 (最早关键帧, 最晚关键帧)，没有动画参数时返回None"""
+    root = ET.fromstring(xml_content)
+    first, last = None, None
+
+    for element in root.iter():
+        if element.tag == "parameter":
+            value = element.get("value") or element.get("default") or ""
+        elif element.tag == "property":
+            value = element.text or ""
+        else:
+            continue
+
+        frames = [int(m) for m in KEYFRAME_RE.findall(value)]
+        # 只有一个关键帧的参数是常量，不影响窗口
+        if len(frames) < 2:
+            continue
+        first = min(frames) if first is None else min(first, min(frames))
+        last = max(frames) if last is None else max(last, max(frames))
+
+    if first is None:
+        return None
+    return max(0, first), max(0, last)
+
+
+class RenderWindow:
+    """预览的渲染窗口（单位：帧）
+
+    时间线 = 静态前导(lead) + 特效动画区间(active) + 静态收尾(trail)。
+    前导和收尾里特效保持端点取值，只需克隆首尾帧，不必逐帧处理。
+    lead_frames 不超过 start_frame，melt路径才能从特效时间线上渲染出完整的前导。
+    """
+
+    def __init__(self, start_frame: int, active_frames: int, lead_frames: int,
+                 trail_frames: int, fps: int):
+        self.start_frame = start_frame
+        self.active_frames = active_frames
+        self.lead_frames = lead_frames
+        self.trail_frames = trail_frames
+        self.fps = fps
+
+    @property
+    def total_frames(self) -> int:
+        return self.lead_frames + self.active_frames + self.trail_frames
+
+    @property
+    def duration(self) -> float:
+        return self.total_frames / self.fps
+
+    def timeline_range(self) -> Tuple[int, int]:
+        """按特效时间完整处理整个窗口时的 (起始帧, 结束帧)，用于无法克隆帧的melt路径"""
+        if self.lead_frames > self.start_frame:
+            raise ValueError(f"lead of {self.lead_frames} frames starts before frame 0 "
+                             f"(effect starts at {self.start_frame})")
+        return self.start_frame - self.lead_frames, self.start_frame + self.active_frames + self.trail_frames - 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "start_frame": self.start_frame,
+            "active_frames": self.active_frames,
+            "lead_frames": self.lead_frames,
+            "trail_frames": self.trail_frames,
+            "total_frames": self.total_frames,
+            "duration": round(self.duration, 3),
+        }
+
+
+def compute_render_window(effect_file: Path, fps: int, pad_before: float = 0.5,
+                          pad_after: float = 0.5, min_duration: float = 1.0,
+                          max_duration: float = 30.0) -> RenderWindow:
+    """由特效关键帧范围加上前后留白得到渲染窗口
+
+    没有动画参数的特效只渲染一帧，其余时长全部由克隆帧填充。
+    """
+    try:
+        span = keyframe_range(Path(effect_file).read_text(encoding="utf-8"))
+    except (OSError, ET.ParseError):
+        span = None
+
+    first, last = span if span else (0, 0)
+    lead = int(round(pad_before * fps))
+    trail = int(round(pad_after * fps))
+    # 特效时间线从0开始：关键帧起点早于前导时把放不下的前导移到收尾，各渲染路径输出同样的总帧数
+    if lead > first:
+        trail += lead - first
+        lead = first
+    max_frames = max(1, int(round(max_duration * fps)))
+    active = max(1, min(last - first + 1, max_frames - lead - trail))
+
+    window = RenderWindow(first, active, lead, trail, fps)
+    min_frames = int(round(min_duration * fps))
+    if window.total_frames < min_frames:
+        window.trail_frames += min_frames - window.total_frames
+    return window
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the render window derived from effect keyframes")
+    parser.add_argument("effect_files", nargs="+", help="Effect XML files")
+    parser.add_argument("--fps", type=int, default=25, help="Preview frame rate")
+    parser.add_argument("--pad-before", type=float, default=0.5, help="Seconds before the first keyframe")
+    parser.add_argument("--pad-after", type=float, default=0.5, help="Seconds after the last keyframe")
+
+    args = parser.parse_args()
+
+    for effect_file in args.effect_files:
+        window = compute_render_window(Path(effect_file), args.fps, args.pad_before, args.pad_after)
+        print(f"{Path(effect_file).name}: {window.to_dict()}")
+
+
+if __name__ == "__main__":
+    main()
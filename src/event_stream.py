@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Event Stream - Web界面的服务端推送事件（SSE，/api/events）
+特效生成、渲染进度和预览完成时发布事件；浏览器只订阅一次，不再轮询列表和任务状态。
+最近的事件保存在内存环形缓冲区中，断线重连时按 Last-Event-ID 补发错过的事件
+"""
+
+import json
+import uuid
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+# 保留的历史事件数（重连时能补发的范围）
+HISTORY_SIZE = 1000
+# 没有事件时发送注释行保持连接（也用于及时发现已断开的客户端）
+HEARTBEAT_INTERVAL = 15.0
+# 浏览器断线后的重连间隔（毫秒）
+RETRY_MS = 3000
+
+
+def format_event(event_id: Optional[str], event_type: str, data: Dict[str, Any]) -> str:
+    """SSE消息格式：id / event / data 各一行，空行结束"""
+    lines = []
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+class EventBus:
+    """进程内的事件发布/订阅
+
+    事件ID为 "<epoch>:<序号>"；epoch每次启动不同，重连时带着上次进程的ID或已被挤出缓冲区的ID，
+    会先收到一个 reset 事件，客户端据此重新加载列表。
+    """
+
+    def __init__(self, history: int = HISTORY_SIZE):
+        self.epoch = uuid.uuid4().hex[:8]
+        self._events: deque = deque(maxlen=history)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._listeners: List[Callable[[], None]] = []
+        self.stats = {"published": 0, "subscribers": 0}
+
+    def add_listener(self, callback: Callable[[], None]):
+        """每次发布后调用（在发布者的线程中，不持有锁），用于唤醒其他线程或事件循环中的订阅者"""
+        self._listeners.append(callback)
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> str:
+        """发布事件，返回事件ID"""
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, event_type, data))
+            self.stats["published"] += 1
+            self._cond.notify_all()
+            event_id = f"{self.epoch}:{self._seq}"
+        for callback in self._listeners:
+            callback()
+        return event_id
+
+    def _parse_id(self, event_id: Optional[str]) -> Optional[int]:
+        """本进程发出的事件ID对应的序号；无法识别时返回None"""
+        if not event_id:
+            return None
+        epoch, _, seq = event_id.partition(":")
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self._seq:
+            return None
+        return int(seq)
+
+    def since(self, seq: int) -> Tuple[List[tuple], bool]:
+        """序号之后的事件，以及中间是否有已被挤出缓冲区的事件"""
+        with self._cond:
+            events = [e for e in self._events if e[0] > seq]
+            oldest = self._events[0][0] if self._events else self._seq + 1
+            return events, seq + 1 < oldest and seq < self._seq
+
+    def wait(self, seq: int, timeout: float) -> List[tuple]:
+        """等待序号之后的新事件（超时返回空列表）"""
+        with self._cond:
+            if self._seq <= seq:
+                self._cond.wait(timeout)
+            return [e for e in self._events if e[0] > seq]
+
+    def resume(self, last_event_id: Optional[str] = None) -> Tuple[List[str], int]:
+        """连接开始时要先发送的消息（补发错过的事件，或无法补发时的reset）以及之后等待的起始序号"""
+        with self._cond:
+            current = self._seq
+        seq = self._parse_id(last_event_id)
+
+        messages = [f"retry: {RETRY_MS}\n\n"]
+        if last_event_id and seq is None:
+            # 上次连接的是已重启的服务器（或无效的ID），错过的事件无法补发
+            messages.append(format_event(f"{self.epoch}:{current}", "reset", {"reason": "restarted"}))
+            return messages, current
+        if seq is None:
+            return messages, current
+
+        events, gap = self.since(seq)
+        if gap:
+            messages.append(format_event(f"{self.epoch}:{current}", "reset", {"reason": "history_exceeded"}))
+            return messages, current
+        for event_seq, event_type, data in events:
+            messages.append(format_event(f"{self.epoch}:{event_seq}", event_type, data))
+            seq = event_seq
+        return messages, seq
+
+    def format(self, event: tuple) -> str:
+        event_seq, event_type, data = event
+        return format_event(f"{self.epoch}:{event_seq}", event_type, data)
+
+    def stream(self, last_event_id: Optional[str] = None,
+               heartbeat: float = HEARTBEAT_INTERVAL) -> Iterator[str]:
+        """一个订阅者的SSE响应体；从 last_event_id 之后开始（没有时只接收新事件）"""
+        self.stats["subscribers"] += 1
+        try:
+            messages, seq = self.resume(last_event_id)
+            yield from messages
+            while True:
+                events = self.wait(seq, heartbeat)
+                if not events:
+                    yield ": keepalive\n\n"
+                    continue
+                for event in events:
+                    yield self.format(event)
+                    seq = event[0]
+        finally:
+            self.stats["subscribers"] -= 1
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+HTTP Cache - 预览、demo、特效XML和JSON列表的条件请求支持
+文件的强ETag由 inode + 大小 + 纳秒修改时间组成（重新渲染或压缩替换文件后必然变化），
+带匹配版本号（?v=<ETag>）的URL内容不可变，可长期缓存；其余请求每次用 If-None-Match /
+If-Modified-Since 重新验证，未变化时返回304
+"""
+
+import os
+import hashlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from flask import Response, request, send_file
+from werkzeug.exceptions import NotFound
+from werkzeug.http import is_resource_modified
+from werkzeug.security import safe_join
+
+try:
+    from range_serving import range_response
+except ImportError:
+    from src.range_serving import range_response
+
+
+# 带版本号的URL缓存一年
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def file_etag(st: os.stat_result) -> str:
+    """强ETag（不含引号）"""
+    return f"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"
+
+
+def file_version(path: Path) -> Optional[str]:
+    """用于URL的版本号（与ETag相同）；文件不存在时返回None"""
+    try:
+        return file_etag(os.stat(path))
+    except FileNotFoundError:
+        return None
+
+
+def versioned_url(rel_path: str, version: Optional[str]) -> str:
+    return f"{rel_path}?v={version}" if version else rel_path
+
+
+def send_cached_file(path: Path, **kwargs) -> Response:
+    """send_file 加上强ETag、Last-Modified和304处理
+
+    请求的 ?v= 与文件当前版本一致时按不可变内容长期缓存，否则要求浏览器每次重新验证。
+    """
+    st = os.stat(path)
+    etag = file_etag(st)
+    immutable = request.args.get("v") == etag
+
+    last_modified = datetime.fromtimestamp(st.st_mtime, timezone.utc)
+    response = None
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        # 先于Range判断：浏览器缓存仍有效时即使带Range也返回304
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+    elif "Range" in request.headers:
+        # 区间请求（拖动进度条）：只发送请求的字节
+        response = range_response(path, st, etag, kwargs.get("mimetype"))
+        if response is not None and kwargs.get("as_attachment"):
+            response.headers["Content-Disposition"] = f"attachment; filename={path.name}"
+    if response is None:
+        response = send_file(str(path), etag=etag, last_modified=st.st_mtime, conditional=True,
+                             max_age=IMMUTABLE_MAX_AGE if immutable else 0, **kwargs)
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+def send_cached_from_directory(directory, filename: str, **kwargs) -> Response:
+    """send_from_directory 的条件请求版本：拒绝目录穿越，文件不存在时抛出NotFound"""
+    path = safe_join(os.path.abspath(directory), filename)
+    if path is None or not os.path.isfile(path):
+        raise NotFound()
+    return send_cached_file(Path(path), **kwargs)
+
+
+def body_etag(body: bytes) -> str:
+    """JSON等响应体的强ETag（不含引号）"""
+    return hashlib.md5(body).hexdigest()
+
+
+def conditional_response(response: Response, etag: Optional[str] = None) -> Response:
+    """给JSON列表响应加ETag；If-None-Match命中时变为304（浏览器每次重新验证）"""
+    if etag:
+        response.set_etag(etag)
+    else:
+        response.add_etag()
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def json_response(body: bytes, etag: Optional[str] = None) -> Response:
+    """返回预先序列化的JSON（etag 为None时按内容计算）"""
+    return conditional_response(Response(body, mimetype="application/json"), etag or body_etag(body))
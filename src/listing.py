@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Listing - 列表接口的游标分页、稳定排序和服务端过滤
+/api/effects/<style> 和 /api/demos 共用：按 (排序字段, id) 的键集分页，
+游标是上一页最后一项的排序键，插入或删除其他项不会导致翻页时重复或遗漏
+"""
+
+import json
+import base64
+import bisect
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+# 排序字段及其缺省值
+EFFECT_SORT_FIELDS = {"id": "", "name": "", "created": 0.0, "duration": 0}
+DEMO_SORT_FIELDS = {"created": 0.0, "filename": "", "size": 0, "style": ""}
+
+# 按取值精确匹配的过滤字段（特效另有子类型字段，见 effect_generator.SUBTYPE_KEYS）
+DEMO_MATCH_FIELDS = ("style", "effect_id")
+
+
+class ListingError(ValueError):
+    """查询参数无效（接口返回400）"""
+
+
+def encode_cursor(key: Sequence[Any], sort: str, order: str) -> str:
+    """游标记录排序字段和方向，换了排序方式后重放旧游标会被拒绝"""
+    raw = json.dumps([sort, order] + list(key), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _same_type(value: Any, default: Any) -> bool:
+    if isinstance(value, bool):
+        return False
+    if isinstance(default, (int, float)):
+        return isinstance(value, (int, float))
+    return isinstance(value, type(default))
+
+
+def decode_cursor(cursor: str, sort: str, order: str, default: Any) -> Tuple[Any, ...]:
+    """解析游标并校验：排序字段和方向须与本次查询一致，排序键各元素类型须与 sort_key_func 的键一致
+
+    default 为该排序字段的缺省值（决定字段值的类型）；否则二分查找时比较不同类型会抛出TypeError。
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key = json.loads(raw)
+    except ValueError:
+        raise ListingError(f"Invalid cursor: {cursor}")
+    if not isinstance(key, list) or len(key) != 5:
+        raise ListingError(f"Invalid cursor: {cursor}")
+    if key[0] != sort or key[1] != order:
+        raise ListingError(f"Cursor was issued for sort={key[0]}&order={key[1]}, not sort={sort}&order={order}")
+    missing, value, item_id = key[2:]
+    if not isinstance(missing, bool) or not _same_type(value, default) or not isinstance(item_id, str):
+        raise ListingError(f"Invalid cursor: {cursor}")
+    return (missing, value, item_id)
+
+
+def _bool_arg(value: str) -> bool:
+    return value.lower() in ("1", "true", "yes")
+
+
+def _float_arg(args: Mapping[str, str], name: str) -> Optional[float]:
+    value = args.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ListingError(f"{name} must be a number")
+
+
+def parse_query(args: Mapping[str, str], sort_fields: Dict[str, Any], default_sort: str,
+                default_order: str = "asc", match_fields: Iterable[str] = ()) -> Dict[str, Any]:
+    """从请求参数（request.args）解析分页、排序和过滤条件"""
+    sort = args.get("sort") or default_sort
+    if sort not in sort_fields:
+        raise ListingError(f"sort must be one of: {', '.join(sort_fields)}")
+    order = args.get("order") or default_order
+    if order not in ("asc", "desc"):
+        raise ListingError("order must be asc or desc")
+    try:
+        limit = int(args.get("limit") or DEFAULT_LIMIT)
+    except ValueError:
+        raise ListingError("limit must be an integer")
+
+    cursor = args.get("cursor")
+    query = {
+        "sort": sort,
+        "order": order,
+        "limit": max(1, min(limit, MAX_LIMIT)),
+        "cursor": decode_cursor(cursor, sort, order, sort_fields[sort]) if cursor else None,
+        "has_preview": _bool_arg(args["has_preview"]) if args.get("has_preview") else None,
+        "min_duration": _float_arg(args, "min_duration"),
+        "max_duration": _float_arg(args, "max_duration"),
+        "q": (args.get("q") or "").lower(),
+        "match": {name: args[name] for name in match_fields if args.get(name)},
+    }
+    return query
+
+
+def wants_page(args: Mapping[str, str], match_fields: Iterable[str] = ()) -> bool:
+    """请求是否带有分页/过滤参数；不带时接口保持返回完整数组"""
+    return any(name in args for name in ("limit", "cursor", "sort", "order", "has_preview",
+                                         "min_duration", "max_duration", "q") + tuple(match_fields))
+
+
+def sort_key_func(sort: str, sort_fields: Dict[str, Any], id_field: str = "id",
+                  order: str = "asc") -> Callable:
+    """(是否缺少该字段, 字段值, id)：同值时按id排序保证顺序稳定；缺少字段的项无论升降序都排在最后"""
+    default = sort_fields[sort]
+    missing_last = order == "asc"
+
+    def key(item: Dict[str, Any]) -> Tuple[Any, ...]:
+        value = item.get(sort)
+        return ((value is None) == missing_last, default if value is None else value, item[id_field])
+
+    return key
+
+
+class SortedView:
+    """一组项按某个字段排序后的结果和排序键，供二分查找游标位置（可缓存复用）"""
+
+    def __init__(self, items: Iterable[Dict[str, Any]], sort: str, sort_fields: Dict[str, Any],
+                 id_field: str = "id", order: str = "asc"):
+        key = sort_key_func(sort, sort_fields, id_field, order)
+        pairs = sorted(((key(item), item) for item in items), key=lambda p: p[0])
+        self.keys = [k for k, _ in pairs]
+        self.items = [item for _, item in pairs]
+
+
+def _matches(item: Dict[str, Any], query: Dict[str, Any], search_fields: Sequence[str]) -> bool:
+    if query["has_preview"] is not None and bool(item.get("has_preview")) != query["has_preview"]:
+        return False
+    duration = item.get("duration")
+    if query["min_duration"] is not None and (duration is None or duration < query["min_duration"]):
+        return False
+    if query["max_duration"] is not None and (duration is None or duration > query["max_duration"]):
+        return False
+    for name, value in query["match"].items():
+        if str(item.get(name, "")) != value:
+            return False
+    if query["q"] and not any(query["q"] in str(item.get(f, "")).lower() for f in search_fields):
+        return False
+    return True
+
+
+def paginate(view: SortedView, query: Dict[str, Any], search_fields: Sequence[str] = ("id",)) -> Dict[str, Any]:
+    """从游标之后取一页：{"items", "next_cursor", "total", "limit"}
+
+    total 为满足过滤条件的总数；没有过滤条件时不需要遍历。
+    """
+    keys, items = view.keys, view.items
+    cursor = query["cursor"]
+    if query["order"] == "asc":
+        start = bisect.bisect_right(keys, cursor) if cursor else 0
+        indexes = range(start, len(items))
+    else:
+        start = bisect.bisect_left(keys, cursor) - 1 if cursor else len(items) - 1
+        indexes = range(start, -1, -1)
+
+    filtered = (query["has_preview"] is not None or query["min_duration"] is not None or
+                query["max_duration"] is not None or query["match"] or query["q"])
+
+    page: List[Dict[str, Any]] = []
+    last = None
+    more = False
+    for i in indexes:
+        if filtered and not _matches(items[i], query, search_fields):
+            continue
+        if len(page) == query["limit"]:
+            more = True
+            break
+        page.append(items[i])
+        last = keys[i]
+
+    total = sum(1 for item in items if _matches(item, query, search_fields)) if filtered else len(items)
+    return {
+        "items": page,
+        "next_cursor": encode_cursor(last, query["sort"], query["order"]) if more and last is not None else None,
+        "total": total,
+        "limit": query["limit"],
+    }
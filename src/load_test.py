@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Load Test - Web服务的并发压测（只用标准库，asyncio + keep-alive连接）
+模拟浏览器同时下载/拖动预览视频和请求列表接口，对比Flask版本与ASGI版本：
+python src/load_test.py --url http://127.0.0.1:5000 --concurrency 200 --duration 30
+"""
+
+import time
+import json
+import random
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+# 请求类型及默认权重：完整下载预览、Range拖动、风格列表、特效列表、静态文件
+DEFAULT_MIX = {"preview": 2, "seek": 3, "styles": 2, "effects": 2, "static": 1}
+SEEK_BYTES = 256 * 1024
+READ_CHUNK = 256 * 1024
+
+
+class HTTPClient:
+    """一个keep-alive连接上的最小HTTP/1.1客户端（只读取响应头和按Content-Length/分块的正文）"""
+
+    def __init__(self, host: str, port: int, timeout: float):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def request(self, path: str, headers: Optional[Dict[str, str]] = None) -> Tuple[int, int]:
+        """发送GET，返回 (状态码, 正文字节数)；正文读取后丢弃"""
+        for attempt in range(2):
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), self.timeout)
+                fresh = True
+            else:
+                fresh = False
+            try:
+                return await asyncio.wait_for(self._exchange(path, headers or {}), self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                # 服务器关闭了空闲连接：重连一次
+                await self.close()
+                if fresh or attempt:
+                    raise
+            except BaseException:
+                await self.close()
+                raise
+        raise ConnectionError("unreachable")
+
+    async def _exchange(self, path: str, headers: Dict[str, str]) -> Tuple[int, int]:
+        lines = [f"GET {path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Accept-Encoding: gzip"]
+        lines += [f"{k}: {v}" for k, v in headers.items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await self.writer.drain()
+
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        status_line, *header_lines = head.decode("latin-1").split("\r\n")
+        status = int(status_line.split(" ", 2)[1])
+        response_headers = {}
+        for line in header_lines:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                response_headers[name.strip().lower()] = value.strip()
+
+        received = 0
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                if size:
+                    received += len(await self.reader.readexactly(size))
+                await self.reader.readline()
+                if size == 0:
+                    break
+        elif "content-length" in response_headers:
+            remaining = int(response_headers["content-length"])
+            while remaining:
+                data = await self.reader.read(min(READ_CHUNK, remaining))
+                if not data:
+                    raise asyncio.IncompleteReadError(b"", remaining)
+                remaining -= len(data)
+                received += len(data)
+        elif status not in (204, 304):
+            # 没有长度的响应以关闭连接结束
+            while data := await self.reader.read(READ_CHUNK):
+                received += len(data)
+            await self.close()
+
+        if response_headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, received
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+        self.reader = self.writer = None
+
+
+async def _discover(client: HTTPClient) -> Dict[str, Any]:
+    """从 /api/styles 和 /api/effects/<style> 找出可请求的风格和预览"""
+    async def get_json(path: str):
+        lines = [f"GET {path} HTTP/1.1", f"Host: {client.host}:{client.port}", "Connection: close"]
+        reader, writer = await asyncio.open_connection(client.host, client.port)
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+        raw = await reader.read()
+        writer.close()
+        head, _, body = raw.partition(b"\r\n\r\n")
+        if b"chunked" in head.lower():
+            decoded = b""
+            while body:
+                size_line, _, rest = body.partition(b"\r\n")
+                size = int(size_line.split(b";")[0], 16)
+                if size == 0:
+                    break
+                decoded += rest[:size]
+                body = rest[size + 2:]
+            body = decoded
+        return json.loads(body)
+
+    styles = [s["name"] for s in await get_json("/api/styles")]
+    previews = []
+    for style in styles:
+        for effect in await get_json(f"/api/effects/{style}"):
+            if effect.get("preview_url"):
+                # 列表中的URL相对于站点根目录，请求行需要以 / 开头
+                previews.append("/" + effect["preview_url"].lstrip("/"))
+    return {"styles": styles, "previews": previews}
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+async def run_load_test(url: str, concurrency: int = 100, duration: float = 20.0,
+                        mix: Optional[Dict[str, int]] = None, timeout: float = 30.0) -> Dict[str, Any]:
+    """concurrency 个虚拟用户各自占一个keep-alive连接，在 duration 秒内按权重随机发请求"""
+    parts = urlsplit(url)
+    host, port = parts.hostname or "127.0.0.1", parts.port or 80
+    targets = await _discover(HTTPClient(host, port, timeout))
+    mix = dict(mix or DEFAULT_MIX)
+    if not targets["previews"]:
+        mix.pop("preview", None)
+        mix.pop("seek", None)
+    if not targets["styles"]:
+        mix.pop("effects", None)
+    kinds, weights = list(mix), list(mix.values())
+
+    results: Dict[str, Dict[str, Any]] = {kind: {"latencies": [], "errors": 0, "bytes": 0} for kind in kinds}
+    deadline = time.monotonic() + duration
+
+    def pick(kind: str) -> Tuple[str, Dict[str, str]]:
+        if kind == "preview":
+            return random.choice(targets["previews"]), {}
+        if kind == "seek":
+            start = random.randrange(0, 4 * 1024 * 1024, 4096)
+            return random.choice(targets["previews"]), {"Range": f"bytes={start}-{start + SEEK_BYTES - 1}"}
+        if kind == "styles":
+            return "/api/styles", {}
+        if kind == "effects":
+            return f"/api/effects/{random.choice(targets['styles'])}", {}
+        return "/static/app.js", {}
+
+    async def user():
+        client = HTTPClient(host, port, timeout)
+        try:
+            while time.monotonic() < deadline:
+                kind = random.choices(kinds, weights)[0]
+                path, headers = pick(kind)
+                started = time.perf_counter()
+                try:
+                    status, received = await client.request(path, headers)
+                    ok = status in (200, 206) or (kind == "seek" and status == 416)
+                except Exception:
+                    ok, received = False, 0
+                    await asyncio.sleep(0.05)
+                stats = results[kind]
+                if ok:
+                    stats["latencies"].append(time.perf_counter() - started)
+                    stats["bytes"] += received
+                else:
+                    stats["errors"] += 1
+        finally:
+            await client.close()
+
+    started = time.monotonic()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.monotonic() - started
+
+    report: Dict[str, Any] = {"url": url, "concurrency": concurrency, "duration": round(elapsed, 2), "kinds": {}}
+    total_ok = total_errors = total_bytes = 0
+    for kind, stats in results.items():
+        latencies = stats["latencies"]
+        total_ok += len(latencies)
+        total_errors += stats["errors"]
+        total_bytes += stats["bytes"]
+        report["kinds"][kind] = {
+            "requests": len(latencies), "errors": stats["errors"],
+            "rps": round(len(latencies) / elapsed, 1),
+            "p50_ms": round(_percentile(latencies, 0.50) * 1000, 1),
+            "p95_ms": round(_percentile(latencies, 0.95) * 1000, 1),
+            "p99_ms": round(_percentile(latencies, 0.99) * 1000, 1),
+            "mb_per_s": round(stats["bytes"] / elapsed / 1e6, 2),
+        }
+    report.update({"requests": total_ok, "errors": total_errors, "rps": round(total_ok / elapsed, 1),
+                   "mb_per_s": round(total_bytes / elapsed / 1e6, 2)})
+    return report
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n📈 {report['url']}  concurrency={report['concurrency']}  duration={report['duration']}s")
+    print(f"{'kind':<10}{'requests':>10}{'errors':>8}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'MB/s':>9}")
+    for kind, stats in report["kinds"].items():
+        print(f"{kind:<10}{stats['requests']:>10}{stats['errors']:>8}{stats['rps']:>9}"
+              f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}{stats['mb_per_s']:>9}")
+    print(f"{'total':<10}{report['requests']:>10}{report['errors']:>8}{report['rps']:>9}"
+          f"{'':>27}{report['mb_per_s']:>9}")
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Concurrent load test for the preview web server")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="Server base URL")
+    parser.add_argument("--concurrency", type=int, default=100, help="Concurrent connections")
+    parser.add_argument("--duration", type=float, default=20.0, help="Test duration in seconds")
+    parser.add_argument("--mix", help="Request mix, e.g. preview=2,seek=3,styles=2,effects=2,static=1")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    mix = None
+    if args.mix:
+        mix = {k: int(v) for k, v in (item.split("=") for item in args.mix.split(","))}
+    report = asyncio.run(run_load_test(args.url, args.concurrency, args.duration, mix, args.timeout))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Media Index - previews/ 和 demos/ 的增量索引
+每次变更（渲染完成、链接demo、删除文件）追加一行到变更日志，定期压缩为快照；
+读取方只需加载一次快照，之后每次刷新只读取日志新增的部分，耗时与变更数成正比而不是文件数
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from abc import ABCMeta, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+
+SNAPSHOT_NAME = ".index.json"
+JOURNAL_NAME = ".index.journal"
+LOCK_NAME = ".index.lock"
+
+# 日志超过这么多行时自动压缩为快照
+DEFAULT_COMPACT_EVERY = int(os.getenv("MEDIA_INDEX_COMPACT_EVERY", "500"))
+
+
+def watchdog_available() -> bool:
+    return Observer is not None
+
+
+class MediaIndex:
+    """单个目录（previews/ 或 demos/）下视频文件的增量索引
+
+    条目以相对路径（posix）为键，值为 {"size", "mtime", "ctime"}。
+    快照和日志都放在目录内的隐藏文件中，多个进程通过文件锁共享同一份索引。
+    """
+
+    def __init__(self, root: Path, suffix: str = ".mp4", compact_every: int = DEFAULT_COMPACT_EVERY):
+        self.root = Path(root)
+        self.suffix = suffix
+        self.compact_every = max(1, compact_every)
+        self.snapshot_file = self.root / SNAPSHOT_NAME
+        self.journal_file = self.root / JOURNAL_NAME
+        self.lock_file = self.root / LOCK_NAME
+        self._prefix = os.path.join(os.path.abspath(self.root), "")
+
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.seq = 0
+        self.stats = {"snapshot_loads": 0, "journal_lines": 0, "rebuilds": 0, "compactions": 0}
+
+        self._journal_ino: Optional[int] = None
+        self._journal_offset = 0
+        self._journal_count = 0
+        self._loaded = False
+        self._mutex = threading.RLock()
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        """进程内互斥 + 跨进程文件锁（追加/压缩用排他锁，读取用共享锁）"""
+        with self._mutex:
+            self.root.mkdir(parents=True, exist_ok=True)
+            with open(self.lock_file, "a") as lock:
+                if fcntl is not None:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+    def key_for(self, path) -> Optional[str]:
+        """文件在索引中的键；隐藏文件、临时文件和其它类型的文件返回None"""
+        path = os.path.abspath(path)
+        if not path.startswith(self._prefix) or not path.lower().endswith(self.suffix):
+            return None
+        parts = path[len(self._prefix):].split(os.sep)
+        if any(part.startswith(".") for part in parts):
+            return None
+        return "/".join(parts)
+
+    # 读取
+
+    def refresh(self) -> "MediaIndex":
+        """应用日志中新增的变更；首次使用且没有快照时全量扫描一次"""
+        if self._needs_bootstrap():
+            self.rebuild()
+            return self
+        with self._locked(exclusive=False):
+            self._refresh_locked()
+        return self
+
+    def items(self) -> List[Tuple[str, Dict[str, Any]]]:
+        """刷新后返回 (相对路径, 条目) 列表"""
+        self.refresh()
+        with self._mutex:
+            return list(self.entries.items())
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        self.refresh()
+        return self.entries.get(key)
+
+    def __len__(self) -> int:
+        self.refresh()
+        return len(self.entries)
+
+    def _needs_bootstrap(self) -> bool:
+        return not self._loaded and not self.snapshot_file.exists() and not self.journal_file.exists()
+
+    def _load_snapshot(self):
+        try:
+            with open(self.snapshot_file, "r", encoding="utf-8") as f:
+                snapshot = json.load(f)
+            self.entries = snapshot.get("entries", {})
+            self.seq = snapshot.get("seq", 0)
+        except (OSError, ValueError):
+            self.entries, self.seq = {}, 0
+        self.stats["snapshot_loads"] += 1
+        self._loaded = True
+
+    def _refresh_locked(self):
+        try:
+            journal = open(self.journal_file, "rb")
+        except FileNotFoundError:
+            if not self._loaded:
+                self._load_snapshot()
+            return
+
+        with journal:
+            st = os.fstat(journal.fileno())
+            # 日志被压缩替换（inode变化）后重新加载快照，再从新日志开头读取
+            if not self._loaded or st.st_ino != self._journal_ino:
+                self._load_snapshot()
+                self._journal_ino = st.st_ino
+                self._journal_offset = 0
+                self._journal_count = 0
+            if st.st_size <= self._journal_offset:
+                return
+
+            journal.seek(self._journal_offset)
+            data = journal.read(st.st_size - self._journal_offset)
+            # 只处理完整的行，写了一半的行留到下次
+            end = data.rfind(b"\n") + 1
+            for line in data[:end].splitlines():
+                if line.strip():
+                    self._apply(json.loads(line))
+                    self._journal_count += 1
+                    self.stats["journal_lines"] += 1
+            self._journal_offset += end
+
+    def _apply(self, change: Dict[str, Any]):
+        # 快照已包含的变更（压缩后、截断日志前崩溃时会出现）直接跳过
+        if change["seq"] <= self.seq:
+            return
+        if change["op"] == "put":
+            self.entries[change["path"]] = change["entry"]
+        else:
+            self.entries.pop(change["path"], None)
+        self.seq = change["seq"]
+
+    # 写入
+
+    def record(self, path: Path) -> bool:
+        """记录新增或更新的文件，返回索引是否变化"""
+        return self.record_many([path]) > 0
+
+    def remove(self, path: Path) -> bool:
+        """记录删除的文件，返回索引是否变化"""
+        return self.remove_many([path]) > 0
+
+    def record_many(self, paths: Iterable[Path]) -> int:
+        changes = []
+        for path in paths:
+            key = self.key_for(path)
+            if key is None:
+                continue
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                changes.append({"op": "del", "path": key})
+                continue
+            changes.append({"op": "put", "path": key, "entry": {
+                "size": st.st_size, "mtime": st.st_mtime, "ctime": st.st_ctime}})
+        return self._append(changes)
+
+    def remove_many(self, paths: Iterable[Path]) -> int:
+        keys = [self.key_for(path) for path in paths]
+        return self._append([{"op": "del", "path": key} for key in keys if key is not None])
+
+    def _append(self, changes: List[Dict[str, Any]]) -> int:
+        if not changes:
+            return 0
+        if self._needs_bootstrap():
+            self.rebuild()
+
+        with self._locked(exclusive=True):
+            self._refresh_locked()
+            pending = []
+            for change in changes:
+                # 与当前条目相同的变更不写日志（监听器会收到重复事件）
+                current = self.entries.get(change["path"])
+                if change["op"] == "put" and current == change["entry"]:
+                    continue
+                if change["op"] == "del" and current is None:
+                    continue
+                change["seq"] = self.seq + len(pending) + 1
+                pending.append(change)
+            if not pending:
+                return 0
+
+            # 大批量变更（整理、清理）直接并入快照，不再逐行写日志后立即压缩
+            if self._journal_count + len(pending) >= self.compact_every:
+                for change in pending:
+                    self._apply(change)
+                self._compact_locked()
+                return len(pending)
+
+            lines = "".join(json.dumps(change, ensure_ascii=False) + "\n" for change in pending)
+            fd = os.open(self.journal_file, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, lines.encode("utf-8"))
+            finally:
+                os.close(fd)
+            self._refresh_locked()
+            return len(pending)
+
+    # 压缩与重建
+
+    def compact(self):
+        """把当前状态写成快照并清空日志"""
+        if self._needs_bootstrap():
+            self.rebuild()
+            return
+        with self._locked(exclusive=True):
+            self._refresh_locked()
+            self._compact_locked()
+
+    def _compact_locked(self):
+        snapshot = {"seq": self.seq, "compacted_at": time.time(), "entries": self.entries}
+        tmp = self.snapshot_file.with_name(f"{SNAPSHOT_NAME}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp, self.snapshot_file)
+
+        # 先写快照再替换日志：读取方看到新日志时，快照一定已经是新的
+        tmp = self.journal_file.with_name(f"{JOURNAL_NAME}.{os.getpid()}.tmp")
+        open(tmp, "wb").close()
+        os.replace(tmp, self.journal_file)
+        self._journal_ino = os.stat(self.journal_file).st_ino
+        self._journal_offset = 0
+        self._journal_count = 0
+        self.stats["compactions"] += 1
+
+    def rebuild(self) -> int:
+        """全量扫描目录重建索引（首次使用，或文件在索引之外被改动后）"""
+        with self._locked(exclusive=True):
+            self._refresh_locked()
+            entries = {}
+            for dirpath, dirnames, filenames in os.walk(self.root):
+                dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    key = self.key_for(path)
+                    if key is None:
+                        continue
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    entries[key] = {"size": st.st_size, "mtime": st.st_mtime, "ctime": st.st_ctime}
+            self.entries = entries
+            self.seq += 1
+            self._loaded = True
+            self._compact_locked()
+            self.stats["rebuilds"] += 1
+            return len(entries)
+
+
+class DebouncedEventHandler(FileSystemEventHandler, metaclass=ABCMeta):
+    """watchdog事件处理基类：连续事件合并，静默 debounce 秒后把涉及的路径一次性交给 handle_paths()"""
+
+    def __init__(self, debounce: float = 1.0):
+        super().__init__()
+        self.debounce = debounce
+        self._pending: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def accepts(self, path: str, is_directory: bool) -> bool:
+        return not is_directory
+
+    @abstractmethod
+    def handle_paths(self, paths: List[str]):
+        """处理一批合并后的变化路径（子类实现）"""
+
+    def _touch(self, path: str, is_directory: bool = False):
+        if not self.accepts(path, is_directory):
+            return
+        with self._lock:
+            self._pending[path] = True
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.debounce, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self):
+        with self._lock:
+            paths, self._pending = list(self._pending), {}
+        if not paths:
+            return
+        try:
+            self.handle_paths(paths)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  {type(self).__name__} update failed: {e}")
+
+    def on_created(self, event):
+        self._touch(event.src_path, event.is_directory)
+
+    def on_modified(self, event):
+        self._touch(event.src_path, event.is_directory)
+
+    def on_closed(self, event):
+        self._touch(event.src_path)
+
+    def on_deleted(self, event):
+        self._touch(event.src_path, event.is_directory)
+
+    def on_moved(self, event):
+        self._touch(event.src_path, event.is_directory)
+        self._touch(event.dest_path, event.is_directory)
+
+
+class IndexEventHandler(DebouncedEventHandler):
+    """把监听到的文件变化写入索引"""
+
+    def __init__(self, index: MediaIndex, debounce: float = 1.0):
+        super().__init__(debounce)
+        self.index = index
+
+    def accepts(self, path: str, is_directory: bool) -> bool:
+        return not is_directory and self.index.key_for(path) is not None
+
+    def handle_paths(self, paths: List[str]):
+        # 记录时重新stat，文件已不存在的自动记为删除
+        self.index.record_many(paths)
+
+
+def watch_indexes(indexes: Iterable[MediaIndex], debounce: float = 1.0):
+    """用watchdog（Linux上为inotify）监听目录变化并写入索引；未安装watchdog时返回None"""
+    if Observer is None:
+        return None
+    observer = Observer()
+    for index in indexes:
+        index.root.mkdir(parents=True, exist_ok=True)
+        observer.schedule(IndexEventHandler(index, debounce), str(index.root), recursive=True)
+    observer.daemon = True
+    observer.start()
+    return observer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the incremental preview/demo index")
+    parser.add_argument("directories", nargs="*", help="Indexed directories (default: previews demos)")
+    parser.add_argument("--project-root", default=".", help="Project root directory")
+    parser.add_argument("--rebuild", action="store_true", help="Rescan the directory and rewrite the snapshot")
+    parser.add_argument("--compact", action="store_true", help="Fold the change journal into the snapshot")
+    parser.add_argument("--watch", action="store_true", help="Keep the index current with a filesystem watcher")
+
+    args = parser.parse_args()
+
+    root = Path(args.project_root)
+    dirs = args.directories or ["previews", "demos"]
+    indexes = [MediaIndex(root / d) for d in dirs]
+
+    for index in indexes:
+        if args.rebuild:
+            print(f"🔄 {index.root}: rebuilt with {index.rebuild()} files")
+        if args.compact:
+            index.compact()
+            print(f"🗜️  {index.root}: compacted at seq {index.seq}")
+        index.refresh()
+        print(f"📋 {index.root}: {len(index.entries)} files, seq {index.seq}, "
+              f"{index._journal_count} pending journal entries")
+
+    if args.watch:
+        observer = watch_indexes(indexes)
+        if observer is None:
+            print("❌ watchdog is not installed (pip install watchdog)")
+            sys.exit(1)
+        print("👀 Watching for changes, Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            observer.stop()
+        observer.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Metrics - Prometheus文本格式的运行指标（/metrics）
+请求延迟直方图、进行中的请求数、按渲染路径（melt/ffmpeg/numpy/pyav/fallback）统计的渲染次数、
+按风格的渲染耗时直方图、缓存命中和 effects/previews/demos 的磁盘占用。
+每次请求只做几次字典更新；队列深度、缓存和磁盘占用等在抓取时才读取
+"""
+
+import os
+import time
+import bisect
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# 请求延迟（秒）的直方图分桶
+REQUEST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 渲染耗时（秒）的直方图分桶
+RENDER_BUCKETS = (0.5, 1.0, 2.0, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+# 磁盘占用统计的缓存时间（遍历目录较慢，不在每次抓取时重复）
+DISK_USAGE_TTL = 60.0
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _labels(self, labels: Tuple, extra: Iterable[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.labelnames, labels)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """只增不减的计数；set() 供抓取时从已有的统计字典同步"""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def set(self, value: float, *labels: str):
+        with self._lock:
+            self._values[labels] = value
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{self._labels(k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    """可增可减的当前值"""
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1.0):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    """累积分桶直方图（_bucket / _sum / _count）"""
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = REQUEST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 标签 → [各桶计数（非累积，最后一个为+Inf）, 总和]
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, *labels: str) -> int:
+        entry = self._values.get(labels)
+        return sum(entry[0]) if entry else 0
+
+    def collect(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1])) for k, v in self._values.items())
+        lines = self.header()
+        for labels, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._labels(labels, [('le', _format_value(bound))])} "
+                             f"{cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """进程内的指标集合；collectors 在每次抓取前调用，用来同步队列深度、缓存统计等"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = REQUEST_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], None]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                print(f"⚠️  Metrics collector error: {e}")
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        return "\n".join(line for metric in metrics for line in metric.collect()) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "HTTP requests by route template, method and status", ("route", "method", "status"))
+HTTP_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "Time until the response headers are ready", ("route", "method"))
+HTTP_IN_FLIGHT = REGISTRY.gauge("http_requests_in_flight", "Requests currently being handled")
+
+RENDERS_STARTED = REGISTRY.counter(
+    "effect_renders_started_total", "Preview render attempts by render path", ("path",))
+RENDERS_SUCCEEDED = REGISTRY.counter(
+    "effect_renders_succeeded_total", "Render attempts that produced a preview, by render path", ("path",))
+RENDERS_FAILED = REGISTRY.counter(
+    "effect_renders_failed_total", "Render attempts that failed (and fell back or gave up), by render path",
+    ("path",))
+RENDERS_CANCELLED = REGISTRY.counter(
+    "effect_renders_cancelled_total", "Render attempts stopped because their job was cancelled, by render path",
+    ("path",))
+RENDERS_SKIPPED = REGISTRY.counter(
+    "effect_renders_skipped_total", "Renders skipped by the render failure cache")
+RENDER_DURATION = REGISTRY.histogram(
+    "effect_render_duration_seconds", "Wall time of a preview render (all attempts) by style", ("style",),
+    buckets=RENDER_BUCKETS)
+
+RENDER_QUEUE_JOBS = REGISTRY.gauge("render_queue_jobs", "Render queue jobs by state", ("state",))
+CACHE_HITS = REGISTRY.counter("cache_hits_total", "Cache hits by cache", ("cache",))
+CACHE_MISSES = REGISTRY.counter("cache_misses_total", "Cache misses by cache", ("cache",))
+EVENT_SUBSCRIBERS = REGISTRY.gauge("event_stream_subscribers", "Connected /api/events clients")
+STORAGE_BYTES = REGISTRY.gauge("storage_bytes", "Apparent size of files under a project directory", ("directory",))
+STORAGE_FILES = REGISTRY.gauge("storage_files", "Number of files under a project directory", ("directory",))
+
+
+def observe_request(route: str, method: str, status: int, seconds: float):
+    HTTP_REQUESTS.inc(route, method, str(status))
+    HTTP_LATENCY.observe(seconds, route, method)
+
+
+def record_render_started(path: str):
+    """进入一条渲染路径时计数：started 减去 succeeded/failed 即进行中、卡住或被超时杀掉的渲染"""
+    RENDERS_STARTED.inc(path)
+
+
+def record_render(style: str, render: Dict):
+    """记录一次预览渲染的结果：render 为 PreviewRender.render_info()
+    {"attempts": [[路径, 是否成功], ...], "seconds": 耗时, "skipped": 是否被负缓存跳过, "cancelled": 是否被取消}
+
+    开始计数由 record_render_started 在各路径开始时记录，这里只记录结果；被取消时最后一条路径计入cancelled。
+    """
+    if render.get("skipped"):
+        RENDERS_SKIPPED.inc()
+        return
+    attempts = render.get("attempts", ())
+    for index, (path, ok) in enumerate(attempts):
+        if render.get("cancelled") and index == len(attempts) - 1:
+            RENDERS_CANCELLED.inc(path)
+        else:
+            (RENDERS_SUCCEEDED if ok else RENDERS_FAILED).inc(path)
+    if render.get("attempts"):
+        RENDER_DURATION.observe(render.get("seconds", 0.0), style)
+
+
+def collect_queue(queue):
+    """渲染队列各状态的任务数（抓取时查询一次SQLite）"""
+    for state, count in queue.stats().items():
+        RENDER_QUEUE_JOBS.set(count, state)
+
+
+def collect_cache(name: str, stats: Dict[str, int], hits: str = "hits", misses: str = "misses"):
+    """从已有的统计字典同步缓存命中/未命中数"""
+    CACHE_HITS.set(stats.get(hits, 0), name)
+    CACHE_MISSES.set(stats.get(misses, 0), name)
+
+
+def collect_disk_usage(disk_usage: "DiskUsage"):
+    for directory, (files, size) in disk_usage.usage().items():
+        STORAGE_FILES.set(files, directory)
+        STORAGE_BYTES.set(size, directory)
+
+
+class DiskUsage:
+    """effects/、previews/、demos/ 的文件数和字节数（表观大小），按 DISK_USAGE_TTL 缓存"""
+
+    def __init__(self, project_root: Path, directories: Sequence[str] = ("effects", "previews", "demos"),
+                 ttl: float = DISK_USAGE_TTL):
+        self.project_root = Path(project_root)
+        self.directories = directories
+        self.ttl = ttl
+        self._cached: Dict[str, Tuple[int, int]] = {}
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+
+    def usage(self) -> Dict[str, Tuple[int, int]]:
+        with self._lock:
+            if not self._cached or time.monotonic() - self._scanned_at > self.ttl:
+                self._cached = {name: _scan(self.project_root / name) for name in self.directories}
+                self._scanned_at = time.monotonic()
+            return self._cached
+
+
+def _scan(directory: Path) -> Tuple[int, int]:
+    files = size = 0
+    stack = [str(directory)]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        files += 1
+                        size += entry.stat(follow_symlinks=False).st_size
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            continue
+    return files, size
+
+
+def start_metrics_server(port: int, host: str = "0.0.0.0", registry: Optional[Registry] = None):
+    """独立worker进程的指标端口（只提供 /metrics），在后台线程中运行"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    registry = registry or REGISTRY
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"📊 Metrics at http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+MLT Document - 不经过磁盘把MLT/kdenlive文档交给melt
+优先使用melt的 xml-string 生产者直接传递XML字符串；文档过大时写入tmpfs(/dev/shm)
+暂存区，并保证渲染结束后删除。每次渲染记录文档准备耗时，便于比较各方式的延迟。
+"""
+
+import os
+import time
+import uuid
+import tempfile
+import argparse
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Any
+
+
+# Linux单个命令行参数的上限是128KB（MAX_ARG_STRLEN），留出余量
+MAX_XML_STRING_ARG = 120 * 1024
+
+
+def scratch_dir() -> Path:
+    """优先使用tmpfs作为暂存目录，不可用时退回系统临时目录"""
+    shm = Path("/dev/shm")
+    if shm.is_dir() and os.access(shm, os.W_OK):
+        return shm
+    return Path(tempfile.gettempdir())
+
+
+class DocumentStats:
+    """按传递方式统计文档准备耗时"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def record(self, mode: str, seconds: float):
+        with self._lock:
+            entry = self._stats.setdefault(mode, {"count": 0, "total_ms": 0.0})
+            entry["count"] += 1
+            entry["total_ms"] += seconds * 1000
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                mode: {
+                    "count": entry["count"],
+                    "avg_ms": round(entry["total_ms"] / entry["count"], 3) if entry["count"] else 0.0
+                }
+                for mode, entry in self._stats.items()
+            }
+
+
+document_stats = DocumentStats()
+
+
+class MltDocumentInfo:
+    """一次文档传递的方式和耗时"""
+
+    def __init__(self, mode: str, size: int):
+        self.mode = mode
+        self.size = size
+        self.prep_seconds = 0.0
+        self.path: Optional[Path] = None
+
+    def describe(self) -> str:
+        return f"{self.mode} ({self.size / 1024:.1f} KB, prep {self.prep_seconds * 1000:.3f} ms)"
+
+
+@contextmanager
+def mlt_document(xml_content: str, suffix: str = ".mlt",
+                 max_arg_size: int = MAX_XML_STRING_ARG) -> Iterator[tuple]:
+    """产出 (melt资源参数, MltDocumentInfo)
+
+    小文档返回 "xml-string:<xml>"；大文档写入tmpfs暂存文件并返回其路径，
+    退出上下文时（包括异常）删除暂存文件。
+    """
+    started = time.perf_counter()
+    data = xml_content.encode("utf-8")
+
+    if len(data) <= max_arg_size and "\x00" not in xml_content:
+        info = MltDocumentInfo("xml-string", len(data))
+        resource = f"xml-string:{xml_content}"
+        info.prep_seconds = time.perf_counter() - started
+        document_stats.record(info.mode, info.prep_seconds)
+        yield resource, info
+        return
+
+    info = MltDocumentInfo("scratch", len(data))
+    path = scratch_dir() / f"kdenlive-effect-{os.getpid()}-{uuid.uuid4().hex}{suffix}"
+    fd = os.open(str(path), os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        info.path = path
+        info.prep_seconds = time.perf_counter() - started
+        document_stats.record(info.mode, info.prep_seconds)
+        yield str(path), info
+    finally:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def cleanup_stale_documents(directory: Path, pattern: str = "temp_*.mlt") -> int:
+    """删除旧版本在目录中遗留的临时MLT文件"""
+    removed = 0
+    directory = Path(directory)
+    if not directory.exists():
+        return removed
+    for stale in directory.glob(pattern):
+        try:
+            stale.unlink()
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def benchmark(xml_content: str, target_dir: Path, rounds: int = 200) -> Dict[str, Any]:
+    """比较磁盘临时文件、tmpfs暂存和内存传递三种方式的准备耗时"""
+    results = {}
+
+    def timed(label, fn):
+        started = time.perf_counter()
+        for _ in range(rounds):
+            fn()
+        results[label] = round((time.perf_counter() - started) * 1000 / rounds, 4)
+
+    def disk_file():
+        path = Path(target_dir) / f"bench_{uuid.uuid4().hex}.mlt"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(xml_content)
+            f.flush()
+            os.fsync(f.fileno())
+        path.unlink()
+
+    def scratch_file():
+        with mlt_document(xml_content, max_arg_size=0):
+            pass
+
+    def in_memory():
+        with mlt_document(xml_content):
+            pass
+
+    timed("disk_ms", disk_file)
+    timed("scratch_ms", scratch_file)
+    timed("xml_string_ms", in_memory)
+    results["size_kb"] = round(len(xml_content.encode("utf-8")) / 1024, 1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure MLT document hand-off latency")
+    parser.add_argument("document", help="MLT or kdenlive document to benchmark with")
+    parser.add_argument("--dir", default="previews", help="Directory for the on-disk baseline")
+    parser.add_argument("--rounds", type=int, default=200, help="Iterations per method")
+
+    args = parser.parse_args()
+
+    xml_content = Path(args.document).read_text(encoding="utf-8")
+    Path(args.dir).mkdir(parents=True, exist_ok=True)
+    results = benchmark(xml_content, Path(args.dir), args.rounds)
+
+    print(f"📄 Document size: {results['size_kb']} KB")
+    print(f"  disk temp file : {results['disk_ms']} ms")
+    print(f"  tmpfs scratch  : {results['scratch_ms']} ms ({scratch_dir()})")
+    print(f"  xml-string     : {results['xml_string_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
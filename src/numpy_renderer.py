@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+NumPy Reference Renderer
+用向量化NumPy在进程内实现生成特效的数学运算：
+矩形平移/缩放、旋转、方向模糊、曝光、饱和度和不透明度。
+既可作为不依赖melt的轻量预览后端，也可作为特效参数的正确性参照。
+"""
+
+import re
+import subprocess
+import argparse
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Any
+
+import numpy as np
+
+
+VIDEO_EXTS = {'.mp4', '.mov', '.avi', '.mkv', '.webm'}
+
+# 关键帧键中的插值类型标记，例如 "10~=" (平滑) 或 "10|=" (离散)
+KEYFRAME_KEY_RE = re.compile(r"^(-?\d+)\D*$")
+
+
+def parse_animation(value: str) -> Tuple[np.ndarray, np.ndarray]:
+    """解析MLT动画字符串
+
+    "0=0;60=120;120=0" 或 "0=-56 8 1080 1920 1.0;15=..." 或常量 "0.5"。
+    返回 (关键帧帧号[n], 关键帧数值[n, d])。
+    """
+    frames = []
+    values = []
+
+    for part in (value or "").split(";"):
+        part = part.strip()
+        if not part:
+            continue
+        if "=" in part:
+            key, _, raw = part.partition("=")
+            match = KEYFRAME_KEY_RE.match(key.strip())
+            if not match:
+                continue
+            frame = int(match.group(1))
+        else:
+            frame, raw = 0, part
+        try:
+            numbers = [float(x) for x in raw.split()]
+        except ValueError:
+            continue
+        if numbers:
+            frames.append(frame)
+            values.append(numbers)
+
+    if not frames:
+        return np.zeros(1, dtype=np.float64), np.zeros((1, 1), dtype=np.float64)
+
+    width = max(len(v) for v in values)
+    # 分量数不足的关键帧用最后一个分量补齐
+    values = [v + [v[-1]] * (width - len(v)) for v in values]
+    order = np.argsort(frames, kind="stable")
+    return np.asarray(frames, dtype=np.float64)[order], np.asarray(values, dtype=np.float64)[order]
+
+
+def interpolate(keyframes: Tuple[np.ndarray, np.ndarray], frames: np.ndarray) -> np.ndarray:
+    """对一组帧号做线性插值（首尾之外保持端点值），返回 [len(frames), d]"""
+    key_frames, key_values = keyframes
+    frames = np.asarray(frames, dtype=np.float64)
+    return np.stack([np.interp(frames, key_frames, key_values[:, i])
+                     for i in range(key_values.shape[1])], axis=1)
+
+
+class EffectOperation:
+    """单个滤镜（qtblend、dblur、exposure等）及其动画参数"""
+
+    def __init__(self, service: str, params: Dict[str, str]):
+        self.service = service
+        self.params = params
+        self.animations = {name: parse_animation(value) for name, value in params.items()}
+
+    def values(self, name: str, frames: np.ndarray, default: float) -> np.ndarray:
+        """获取参数在各帧上的取值（标量参数），返回 [len(frames)]"""
+        if name not in self.animations:
+            return np.full(len(frames), default, dtype=np.float64)
+        return interpolate(self.animations[name], frames)[:, 0]
+
+    def vectors(self, name: str, frames: np.ndarray) -> Optional[np.ndarray]:
+        """获取向量参数（如rect）在各帧上的取值，返回 [len(frames), d]"""
+        if name not in self.animations:
+            return None
+        return interpolate(self.animations[name], frames)
+
+    def key_span(self) -> int:
+        """该滤镜动画的最后一个关键帧"""
+        spans = [int(frames.max()) for frames, _ in self.animations.values() if len(frames)]
+        return max(spans) if spans else 0
+
+
+# 支持的MLT服务及其归一化名称
+SUPPORTED_SERVICES = {
+    "qtblend": "transform",
+    "avfilter.dblur": "dblur",
+    "avfilter.exposure": "exposure",
+    "frei0r.saturat0r": "saturation",
+    "frei0r.brightness": "brightness",
+}
+
+
+class EffectSpec:
+    """从特效XML解析出的有序滤镜列表"""
+
+    def __init__(self, effect_id: str, operations: List[EffectOperation], unsupported: List[str]):
+        self.effect_id = effect_id
+        self.operations = operations
+        self.unsupported = unsupported
+
+    @classmethod
+    def from_file(cls, effect_file: Path) -> "EffectSpec":
+        return cls.from_xml(Path(effect_file).read_text(encoding="utf-8"))
+
+    @classmethod
+    def from_xml(cls, xml_content: str) -> "EffectSpec":
+        root = ET.fromstring(xml_content)
+        operations = []
+        unsupported = []
+
+        if root.tag == "effect":
+            # 单个特效：<parameter name= value=>，服务名在tag属性
+            elements = [(root.get("tag", root.get("id", "")), root)]
+        else:
+            # 特效组：<effect id=服务名><property name=>值</property>
+            elements = [(effect.get("id", ""), effect) for effect in root.iter("effect")]
+
+        for service, element in elements:
+            params = {}
+            for param in element.findall("parameter"):
+                value = param.get("value", param.get("default", ""))
+                if param.get("name") and value:
+                    params[param.get("name")] = value
+            for prop in element.findall("property"):
+                if prop.get("name") and prop.text:
+                    params[prop.get("name")] = prop.text
+
+            if service in SUPPORTED_SERVICES:
+                operations.append(EffectOperation(SUPPORTED_SERVICES[service], params))
+            else:
+                unsupported.append(service)
+
+        return cls(root.get("id", ""), operations, unsupported)
+
+    def key_span(self) -> int:
+        """整个特效最后一个关键帧的帧号"""
+        return max([op.key_span() for op in self.operations] or [0])
+
+    def params_at(self, frame: int) -> List[Dict[str, Any]]:
+        """某一帧上各滤镜的参数取值，便于作为正确性参照"""
+        frames = np.asarray([frame], dtype=np.float64)
+        result = []
+        for op in self.operations:
+            result.append({
+                "service": op.service,
+                **{name: interpolate(anim, frames)[0].tolist() for name, anim in op.animations.items()}
+            })
+        return result
+
+
+class NumpyEffectRenderer:
+    def __init__(self, width: int = 1080, height: int = 1920, fps: int = 25,
+                 batch_size: int = 8, max_blur_taps: int = 16):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.batch_size = batch_size
+        self.max_blur_taps = max_blur_taps
+
+        # 预分配缓冲区：批量输出帧、浮点工作区、采样坐标
+        self._out = np.empty((batch_size, height, width, 3), dtype=np.uint8)
+        self._work = np.empty((batch_size, height, width, 3), dtype=np.float32)
+        self._tmp = np.empty((height, width, 3), dtype=np.float32)
+        self._acc = np.empty((height, width, 3), dtype=np.float32)
+        self._grid_x, self._grid_y = np.meshgrid(np.arange(width, dtype=np.float32) + 0.5,
+                                                 np.arange(height, dtype=np.float32) + 0.5)
+        self._src_x = np.empty((height, width), dtype=np.float32)
+        self._src_y = np.empty((height, width), dtype=np.float32)
+        self._idx_x = np.empty((height, width), dtype=np.intp)
+        self._idx_y = np.empty((height, width), dtype=np.intp)
+        self._valid = np.empty((height, width), dtype=bool)
+
+    def render_batches(self, spec: EffectSpec, source: Iterator[np.ndarray],
+                       total_frames: int, start_frame: int = 0) -> Iterator[np.ndarray]:
+        """按批渲染，yield的数组是预分配缓冲区的视图，下一批会覆盖它"""
+        position = 0
+        source_iter = iter(source)
+        last_frame = None
+
+        while position < total_frames:
+            count = min(self.batch_size, total_frames - position)
+            frames = np.arange(start_frame + position, start_frame + position + count, dtype=np.float64)
+
+            for i in range(count):
+                try:
+                    last_frame = next(source_iter)
+                except StopIteration:
+                    # 素材比预览短时保持最后一帧
+                    if last_frame is None:
+                        raise ValueError("Source produced no frames")
+                np.multiply(last_frame, 1.0 / 255.0, out=self._work[i], casting="unsafe")
+
+            self._apply(spec, self._work[:count], frames)
+
+            np.clip(self._work[:count], 0.0, 1.0, out=self._work[:count])
+            np.multiply(self._work[:count], 255.0, out=self._work[:count])
+            np.rint(self._work[:count], out=self._work[:count])
+            self._out[:count] = self._work[:count]
+
+            yield self._out[:count]
+            position += count
+
+    def render_frame(self, spec: EffectSpec, frame: np.ndarray, frame_index: int) -> np.ndarray:
+        """渲染单帧（返回新数组），用于核对特效参数"""
+        batch = next(self.render_batches(spec, iter([frame]), 1, start_frame=frame_index))
+        return batch[0].copy()
+
+    def _apply(self, spec: EffectSpec, batch: np.ndarray, frames: np.ndarray):
+        for op in spec.operations:
+            if op.service == "transform":
+                self._apply_transform(op, batch, frames)
+            elif op.service == "dblur":
+                self._apply_dblur(op, batch, frames)
+            elif op.service == "exposure":
+                exposure = op.values("av.exposure", frames, 0.0)
+                black = op.values("av.black", frames, 0.0)
+                gain = np.power(2.0, exposure) / np.maximum(1.0 - black, 1e-3)
+                batch -= black[:, None, None, None].astype(np.float32)
+                batch *= gain[:, None, None, None].astype(np.float32)
+            elif op.service == "saturation":
+                saturation = op.values("saturation", frames, 1.0).astype(np.float32)
+                luma = (batch[..., 0] * 0.299 + batch[..., 1] * 0.587 + batch[..., 2] * 0.114)[..., None]
+                batch -= luma
+                batch *= saturation[:, None, None, None]
+                batch += luma
+            elif op.service == "brightness":
+                batch += op.values("brightness", frames, 0.0)[:, None, None, None].astype(np.float32)
+
+    def _apply_transform(self, op: EffectOperation, batch: np.ndarray, frames: np.ndarray):
+        """qtblend：矩形平移/缩放、绕中心旋转、不透明度"""
+        rects = op.vectors("rect", frames)
+        rotations = op.values("rotation", frames, 0.0)
+        opacity = op.values("opacity", frames, 1.0)
+        rotate_center = op.params.get("rotate_center", "1") != "0"
+
+        for i in range(len(frames)):
+            if rects is not None:
+                x, y, w, h = rects[i, :4]
+                rect_opacity = rects[i, 4] if rects.shape[1] > 4 else 1.0
+            else:
+                x, y, w, h, rect_opacity = 0.0, 0.0, self.width, self.height, 1.0
+
+            angle = rotations[i]
+            if (x, y, w, h) != (0.0, 0.0, self.width, self.height) or angle != 0.0:
+                self._resample(batch[i], x, y, w, h, angle, rotate_center)
+
+            alpha = rect_opacity * opacity[i]
+            if alpha != 1.0:
+                batch[i] *= np.float32(alpha)
+
+    def _resample(self, frame: np.ndarray, x: float, y: float, w: float, h: float,
+                  angle: float, rotate_center: bool):
+        """逆向映射+最近邻采样，矩形外区域为黑色"""
+        if w <= 0 or h <= 0:
+            frame.fill(0.0)
+            return
+
+        if rotate_center:
+            cx, cy = x + w / 2.0, y + h / 2.0
+        else:
+            cx, cy = x, y
+
+        # 输出像素绕旋转中心逆旋转，再映射回素材坐标
+        theta = np.deg2rad(-angle)
+        cos_t, sin_t = np.float32(np.cos(theta)), np.float32(np.sin(theta))
+        dx = self._grid_x - np.float32(cx)
+        dy = self._grid_y - np.float32(cy)
+        np.multiply(dx, cos_t, out=self._src_x)
+        self._src_x -= dy * sin_t
+        np.multiply(dx, sin_t, out=self._src_y)
+        self._src_y += dy * cos_t
+        self._src_x += np.float32(cx - x)
+        self._src_y += np.float32(cy - y)
+        self._src_x *= np.float32(self.width / w)
+        self._src_y *= np.float32(self.height / h)
+
+        np.floor(self._src_x, out=self._src_x)
+        np.floor(self._src_y, out=self._src_y)
+        self._valid[:] = ((self._src_x >= 0) & (self._src_x < self.width) &
+                          (self._src_y >= 0) & (self._src_y < self.height))
+        np.clip(self._src_x, 0, self.width - 1, out=self._src_x)
+        np.clip(self._src_y, 0, self.height - 1, out=self._src_y)
+        self._idx_x[:] = self._src_x
+        self._idx_y[:] = self._src_y
+
+        np.copyto(self._tmp, frame)
+        frame[:] = self._tmp[self._idx_y, self._idx_x]
+        frame[~self._valid] = 0.0
+
+    def _apply_dblur(self, op: EffectOperation, batch: np.ndarray, frames: np.ndarray):
+        """avfilter.dblur：沿角度方向对radius长度内的像素取平均"""
+        radii = op.values("av.radius", frames, 5.0)
+        angles = op.values("av.angle", frames, 45.0)
+
+        for i in range(len(frames)):
+            radius = radii[i]
+            if radius < 0.5:
+                continue
+
+            taps = int(min(self.max_blur_taps, max(2, np.ceil(radius))))
+            theta = np.deg2rad(angles[i])
+            step_x = np.cos(theta) * radius / (taps - 1)
+            step_y = np.sin(theta) * radius / (taps - 1)
+
+            np.copyto(self._tmp, batch[i])
+            self._acc.fill(0.0)
+            for t in range(taps):
+                self._accumulate_shifted(self._tmp, int(round(step_x * t)), int(round(step_y * t)))
+            np.multiply(self._acc, np.float32(1.0 / taps), out=batch[i])
+
+    def _accumulate_shifted(self, frame: np.ndarray, dx: int, dy: int):
+        """将平移(dx, dy)后的帧累加到_acc，边缘像素延伸"""
+        h, w = self.height, self.width
+        dx = max(-w + 1, min(w - 1, dx))
+        dy = max(-h + 1, min(h - 1, dy))
+        ys = slice(max(dy, 0), h + min(dy, 0))
+        xs = slice(max(dx, 0), w + min(dx, 0))
+        src_ys = slice(max(-dy, 0), h - max(dy, 0))
+        src_xs = slice(max(-dx, 0), w - max(dx, 0))
+
+        self._acc[ys, xs] += frame[src_ys, src_xs]
+        # 平移后露出的边缘用最近的边缘像素填充
+        if dy > 0:
+            self._acc[:dy, xs] += frame[:1, src_xs]
+        elif dy < 0:
+            self._acc[h + dy:, xs] += frame[-1:, src_xs]
+        if dx > 0:
+            self._acc[:, :dx] += self._edge_column(frame, 0, dy)
+        elif dx < 0:
+            self._acc[:, w + dx:] += self._edge_column(frame, w - 1, dy)
+
+    def _edge_column(self, frame: np.ndarray, column: int, dy: int) -> np.ndarray:
+        rows = np.clip(np.arange(self.height) - dy, 0, self.height - 1)
+        return frame[rows, column:column + 1]
+
+
+class RawFrameSource:
+    """通过ffmpeg把素材解码为rgb24原始帧（已缩放并填充到预览尺寸）"""
+
+    def __init__(self, ffmpeg_path: str, asset_file: Path, width: int, height: int, fps: int):
+        self.ffmpeg_path = ffmpeg_path
+        self.asset_file = Path(asset_file)
+        self.width = width
+        self.height = height
+        self.fps = fps
+
+    def frames(self, max_frames: int, start_frame: int = 0) -> Iterator[np.ndarray]:
+        is_video = self.asset_file.suffix.lower() in VIDEO_EXTS
+        scale = (f'scale={self.width}:{self.height}:force_original_aspect_ratio=decrease:flags=lanczos,'
+                 f'pad={self.width}:{self.height}:(ow-iw)/2:(oh-ih)/2,fps={self.fps}')
+
+        if not is_video:
+            # 静态图片只解码一次，后续帧复用同一缓冲区
+            cmd = [self.ffmpeg_path, '-v', 'error', '-i', str(self.asset_file),
+                   '-vf', scale, '-frames:v', '1', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-']
+            data = subprocess.run(cmd, capture_output=True, check=True).stdout
+            frame = np.frombuffer(data, dtype=np.uint8).reshape(self.height, self.width, 3)
+            for _ in range(max_frames):
+                yield frame
+            return
+
+        cmd = [self.ffmpeg_path, '-v', 'error']
+        if start_frame:
+            cmd += ['-ss', f'{start_frame / self.fps:.3f}']
+        cmd += ['-i', str(self.asset_file), '-vf', scale, '-frames:v', str(max_frames),
+                '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-']
+
+        frame_size = self.width * self.height * 3
+        buffer = np.empty((self.height, self.width, 3), dtype=np.uint8)
+        view = memoryview(buffer).cast("B")
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            while True:
+                filled = 0
+                while filled < frame_size:
+                    n = proc.stdout.readinto(view[filled:])
+                    if not n:
+                        break
+                    filled += n
+                if filled < frame_size:
+                    break
+                yield buffer
+        finally:
+            proc.stdout.close()
+            proc.wait()
+
+
+class RawVideoEncoder:
+    """把rgb24原始帧通过stdin送给ffmpeg编码为H.264"""
+
+    def __init__(self, ffmpeg_path: str, output_file: Path, width: int, height: int, fps: int,
+                 gop_size: Optional[int] = None, lead_frames: int = 0, trail_frames: int = 0):
+        cmd = [
+            ffmpeg_path, '-v', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+            '-s', f'{width}x{height}', '-r', str(fps),
+            '-i', '-',
+            '-c:v', 'libx264', '-preset', 'fast', '-crf', '23',
+            '-pix_fmt', 'yuv420p', '-movflags', '+faststart',
+        ]
+        if lead_frames or trail_frames:
+            # 静态的前导/收尾直接克隆首尾帧，不经过特效渲染
+            cmd += ['-vf', f'tpad=start={lead_frames}:stop={trail_frames}:start_mode=clone:stop_mode=clone']
+        if gop_size:
+            # 固定关键帧间隔，分段渲染的各段可直接流复制拼接
+            cmd += ['-g', str(gop_size), '-keyint_min', str(gop_size), '-sc_threshold', '0']
+        cmd += ['-y', str(output_file)]
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def write(self, batch: np.ndarray):
+        self.proc.stdin.write(memoryview(np.ascontiguousarray(batch)).cast("B"))
+
+    def close(self) -> Tuple[int, str]:
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            # ffmpeg已退出，缓冲区中剩余的数据无法写入
+            pass
+        stderr = self.proc.stderr.read().decode("utf-8", "replace")
+        return self.proc.wait(), stderr
+
+
+def render_effect_preview(effect_file: Path, asset_file: Path, output_file: Path,
+                          ffmpeg_path: str = "ffmpeg", width: int = 1080, height: int = 1920,
+                          fps: int = 25, total_frames: int = 125, start_frame: int = 0,
+                          renderer: Optional[NumpyEffectRenderer] = None,
+                          progress_callback=None, gop_size: Optional[int] = None,
+                          lead_frames: int = 0, trail_frames: int = 0) -> Tuple[bool, str]:
+    """用NumPy渲染特效预览并编码为MP4，返回 (是否成功, 错误信息)
+
+    只渲染 start_frame 起的 total_frames 帧；lead_frames/trail_frames 由编码器克隆首尾帧补齐。
+    """
+    spec = EffectSpec.from_file(effect_file)
+    if spec.unsupported:
+        print(f"⚠️  NumPy renderer ignores unsupported services: {', '.join(spec.unsupported)}")
+
+    renderer = renderer or NumpyEffectRenderer(width, height, fps)
+    source = RawFrameSource(ffmpeg_path, asset_file, width, height, fps)
+    encoder = RawVideoEncoder(ffmpeg_path, output_file, width, height, fps, gop_size,
+                              lead_frames, trail_frames)
+
+    rendered = 0
+    error = None
+    try:
+        for batch in renderer.render_batches(spec, source.frames(total_frames, start_frame),
+                                             total_frames, start_frame):
+            encoder.write(batch)
+            rendered += len(batch)
+            if progress_callback:
+                progress_callback(rendered, total_frames)
+    except (BrokenPipeError, ValueError) as e:
+        error = str(e)
+    finally:
+        # 任何异常（包括MemoryError、KeyboardInterrupt）都要关闭管道并回收ffmpeg子进程
+        returncode, stderr = encoder.close()
+
+    if error is not None:
+        return False, error
+    return returncode == 0, stderr
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NumPy reference renderer for generated effects")
+    parser.add_argument("effect_file", help="Effect XML file")
+    parser.add_argument("--params-at", type=int, metavar="FRAME",
+                        help="Print interpolated parameters at a frame instead of rendering")
+    parser.add_argument("--asset", help="Source image or video")
+    parser.add_argument("--output", help="Output MP4 file")
+    parser.add_argument("--frames", type=int, default=125, help="Number of frames to render")
+
+    args = parser.parse_args()
+
+    if args.params_at is not None:
+        spec = EffectSpec.from_file(Path(args.effect_file))
+        for op in spec.params_at(args.params_at):
+            print(op)
+        return
+
+    if not args.asset or not args.output:
+        parser.error("--asset and --output are required for rendering")
+
+    ok, error = render_effect_preview(Path(args.effect_file), Path(args.asset), Path(args.output),
+                                      total_frames=args.frames)
+    print(f"✓ Rendered {args.output}" if ok else f"✗ Render failed: {error}")
+
+
+if __name__ == "__main__":
+    main()
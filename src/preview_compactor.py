@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+Preview Compactor - 冷预览的后台重新编码
+长时间没有被访问的预览用更慢的x264 preset重新编码，原子替换原文件并记录节省的字节数；
+编码进程以 nice/ionice 最低优先级运行，受CPU预算限制，渲染队列中有任务时暂停让路
+"""
+
+import os
+import sys
+import time
+import shutil
+import sqlite3
+import argparse
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+try:
+    from media_index import MediaIndex
+    from storage_manager import AccessLog, default_access_log_path
+    from storage_utils import link_or_copy, rewrite_lock
+    from render_queue import RenderQueue, STATE_PENDING, STATE_RUNNING, default_queue_path
+except ImportError:
+    from src.media_index import MediaIndex
+    from src.storage_manager import AccessLog, default_access_log_path
+    from src.storage_utils import link_or_copy, rewrite_lock
+    from src.render_queue import RenderQueue, STATE_PENDING, STATE_RUNNING, default_queue_path
+
+
+# 每种配置按顺序尝试可用的编码器
+# 预览以 video/mp4 提供，只使用所有浏览器（包括Safari和旧客户端）都能播放的H.264
+COMPACTION_PROFILES: Dict[str, List[List[str]]] = {
+    "h264-slow": [["-c:v", "libx264", "-preset", "slower", "-crf", "26", "-profile:v", "high"]],
+    "h264-veryslow": [["-c:v", "libx264", "-preset", "veryslow", "-crf", "28", "-profile:v", "high"]],
+}
+
+STATUS_COMPACTED = "compacted"
+STATUS_NO_GAIN = "no_gain"
+STATUS_FAILED = "failed"
+
+
+def _lower_priority():
+    """子进程启动前降到最低CPU优先级（POSIX）"""
+    try:
+        os.nice(19)
+    except (AttributeError, OSError):
+        pass
+
+
+def _children_cpu_seconds() -> float:
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _unchanged(path: Path, st: os.stat_result) -> bool:
+    """inode、大小和修改时间都与压缩开始时一致"""
+    try:
+        current = path.stat()
+    except FileNotFoundError:
+        return False
+    return ((current.st_dev, current.st_ino, current.st_size, current.st_mtime_ns)
+            == (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns))
+
+
+class PreviewCompactor:
+    def __init__(self, project_root: str, ffmpeg_path: str = "ffmpeg", profile: str = "h264-slow",
+                 cpu_budget: float = 0.25, access_log: Optional[AccessLog] = None):
+        self.project_root = Path(project_root)
+        self.previews_dir = self.project_root / "previews"
+        self.demos_dir = self.project_root / "demos"
+        self.ffmpeg_path = ffmpeg_path
+        self.profile = profile if profile in COMPACTION_PROFILES else "h264-slow"
+        # CPU预算：占整机CPU的比例，决定编码线程数和任务之间的休眠时间
+        self.cpu_budget = min(1.0, max(0.01, cpu_budget))
+        self.cpu_count = os.cpu_count() or 1
+        self.threads = max(1, int(self.cpu_count * self.cpu_budget))
+
+        self.access_log = access_log or AccessLog(str(default_access_log_path(self.project_root)))
+        self.db_path = default_access_log_path(self.project_root)
+        self.preview_index = MediaIndex(self.previews_dir)
+        self.demo_index = MediaIndex(self.demos_dir)
+        self._encoder_args: Optional[List[str]] = None
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self):
+        """压缩记录与访问记录放在同一个数据库中"""
+        conn = self._connect()
+        try:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS compactions (
+                    path TEXT PRIMARY KEY,
+                    profile TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    original_bytes INTEGER NOT NULL,
+                    compacted_bytes INTEGER NOT NULL,
+                    file_mtime REAL NOT NULL,
+                    compacted_at REAL NOT NULL,
+                    error TEXT
+                );
+            """)
+        finally:
+            conn.close()
+
+    def encoder_args(self) -> Optional[List[str]]:
+        """当前配置下ffmpeg支持的第一个编码器参数"""
+        if self._encoder_args is None:
+            try:
+                result = subprocess.run([self.ffmpeg_path, "-hide_banner", "-encoders"],
+                                        capture_output=True, text=True)
+                available = result.stdout
+            except OSError:
+                available = ""
+            for args in COMPACTION_PROFILES[self.profile]:
+                if f" {args[1]} " in available:
+                    self._encoder_args = args
+                    break
+        return self._encoder_args
+
+    def _records(self) -> Dict[str, Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            return {row["path"]: dict(row) for row in conn.execute("SELECT * FROM compactions")}
+        finally:
+            conn.close()
+
+    def _record(self, path: str, status: str, original: int, compacted: int, mtime: float,
+                error: Optional[str] = None):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO compactions (path, profile, status, original_bytes, compacted_bytes, "
+                "file_mtime, compacted_at, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (path, self.profile, status, original, compacted, mtime, time.time(), error)
+            )
+        finally:
+            conn.close()
+
+    def cold_previews(self, cold_days: float = 7.0) -> List[str]:
+        """最后访问（没有访问记录时取修改时间）早于 cold_days 天、且尚未压缩过的预览"""
+        cutoff = time.time() - cold_days * 24 * 3600
+        accessed = self.access_log.last_access()
+        records = self._records()
+
+        cold = []
+        for key, entry in self.preview_index.items():
+            rel = f"previews/{key}"
+            record = records.get(rel)
+            # 压缩后（或确认无收益后）文件未再变化的不再处理；重新渲染会改变修改时间
+            if record and record["file_mtime"] == entry["mtime"]:
+                continue
+            if max(accessed.get(rel, 0), entry["mtime"]) < cutoff:
+                cold.append((max(accessed.get(rel, 0), entry["mtime"]), rel))
+        return [rel for _, rel in sorted(cold)]
+
+    def _renders_active(self) -> bool:
+        """渲染队列中有等待或进行中的任务时返回True"""
+        queue_path = default_queue_path(self.project_root)
+        if not queue_path.exists():
+            return False
+        stats = RenderQueue(str(queue_path)).stats()
+        return stats[STATE_PENDING] + stats[STATE_RUNNING] > 0
+
+    def _command(self, source: Path, target: Path, encoder_args: List[str]) -> List[str]:
+        cmd = [self.ffmpeg_path, "-v", "error", "-i", str(source)] + encoder_args + [
+            "-threads", str(self.threads), "-pix_fmt", "yuv420p", "-an",
+            "-movflags", "+faststart", "-y", str(target)
+        ]
+        # 磁盘IO使用idle级别，只在磁盘空闲时读写
+        ionice = shutil.which("ionice") if sys.platform.startswith("linux") else None
+        return ([ionice, "-c", "3"] + cmd) if ionice else cmd
+
+    def compact_file(self, rel: str, demo_inodes: Optional[Dict[tuple, List[Path]]] = None) -> Dict[str, Any]:
+        """重新编码一个预览，更小时原子替换并重新链接共享inode的demo"""
+        source = self.project_root / rel
+        st = source.stat()
+        encoder_args = self.encoder_args()
+        if encoder_args is None:
+            return {"path": rel, "status": STATUS_FAILED, "error": f"no encoder for profile {self.profile}"}
+
+        tmp = source.with_name(f".{source.stem}.compact.{os.getpid()}.mp4")
+        try:
+            result = subprocess.run(self._command(source, tmp, encoder_args), capture_output=True,
+                                    text=True, preexec_fn=_lower_priority if os.name == "posix" else None)
+            if result.returncode != 0 or not tmp.exists():
+                error = result.stderr.strip()[-500:]
+                self._record(rel, STATUS_FAILED, st.st_size, st.st_size, st.st_mtime, error)
+                return {"path": rel, "status": STATUS_FAILED, "error": error}
+
+            compacted = tmp.stat().st_size
+            if compacted >= st.st_size:
+                self._record(rel, STATUS_NO_GAIN, st.st_size, st.st_size, st.st_mtime)
+                return {"path": rel, "status": STATUS_NO_GAIN, "saved_bytes": 0}
+
+            # 与渲染的 break_link 使用同一把锁：替换前核对文件没有被重新渲染、断链或标记为重写
+            with rewrite_lock(source):
+                if not _unchanged(source, st):
+                    return {"path": rel, "status": STATUS_FAILED, "error": "preview changed during compaction"}
+                shutil.copystat(source, tmp)
+                os.replace(tmp, source)
+        finally:
+            try:
+                tmp.unlink()
+            except FileNotFoundError:
+                pass
+
+        # 原来与预览共享inode的demo仍指向旧数据，重新链接到新文件
+        for demo in (demo_inodes or {}).get((st.st_dev, st.st_ino), []):
+            link_or_copy(source, demo)
+            self.demo_index.record(demo)
+        self.preview_index.record(source)
+
+        new_mtime = source.stat().st_mtime
+        self._record(rel, STATUS_COMPACTED, st.st_size, compacted, new_mtime)
+        return {"path": rel, "status": STATUS_COMPACTED, "original_bytes": st.st_size,
+                "compacted_bytes": compacted, "saved_bytes": st.st_size - compacted}
+
+    def _demo_inodes(self) -> Dict[tuple, List[Path]]:
+        inodes: Dict[tuple, List[Path]] = {}
+        for key, _ in self.demo_index.items():
+            path = self.demos_dir / key
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            if st.st_nlink > 1:
+                inodes.setdefault((st.st_dev, st.st_ino), []).append(path)
+        return inodes
+
+    def run(self, cold_days: float = 7.0, max_files: Optional[int] = None,
+            max_seconds: Optional[float] = None, wait_for_renders: float = 600.0) -> Dict[str, Any]:
+        """处理冷预览，直到处理完、达到文件数或时间上限"""
+        started = time.time()
+        summary = {"processed": 0, "compacted": 0, "no_gain": 0, "failed": 0, "saved_bytes": 0,
+                   "profile": self.profile, "threads": self.threads}
+        candidates = self.cold_previews(cold_days)
+        if max_files is not None:
+            candidates = candidates[:max_files]
+        if not candidates:
+            return summary
+        demo_inodes = self._demo_inodes()
+
+        for rel in candidates:
+            if max_seconds is not None and time.time() - started > max_seconds:
+                break
+            # 交互渲染优先：队列中有任务时暂停
+            waited = 0.0
+            while self._renders_active() and waited < wait_for_renders:
+                time.sleep(5)
+                waited += 5
+            if waited >= wait_for_renders:
+                print("⏸️  Render queue busy, stopping compaction")
+                break
+
+            cpu_before, wall_before = _children_cpu_seconds(), time.time()
+            try:
+                result = self.compact_file(rel, demo_inodes)
+            except OSError as e:
+                result = {"path": rel, "status": STATUS_FAILED, "error": str(e)}
+            summary["processed"] += 1
+            summary[result["status"]] += 1
+            summary["saved_bytes"] += result.get("saved_bytes", 0)
+            if result["status"] == STATUS_COMPACTED:
+                print(f"🗜️  {rel}: {result['original_bytes'] / 1024:.0f} KB -> "
+                      f"{result['compacted_bytes'] / 1024:.0f} KB")
+            elif result["status"] == STATUS_FAILED:
+                print(f"⚠️  {rel}: {result.get('error', '')}")
+
+            # 超出CPU预算时休眠，使编码进程的平均CPU占用不超过预算
+            cpu_used = _children_cpu_seconds() - cpu_before
+            allowed = self.cpu_budget * self.cpu_count
+            pause = cpu_used / allowed - (time.time() - wall_before)
+            if pause > 0:
+                time.sleep(pause)
+
+        summary["elapsed"] = round(time.time() - started, 2)
+        return summary
+
+    def totals(self) -> Dict[str, Any]:
+        """累计节省的字节数"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT COUNT(*) AS files, COALESCE(SUM(original_bytes), 0) AS original, "
+                "COALESCE(SUM(compacted_bytes), 0) AS compacted FROM compactions WHERE status = ?",
+                (STATUS_COMPACTED,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return {"files": row["files"], "original_bytes": row["original"],
+                "compacted_bytes": row["compacted"], "saved_bytes": row["original"] - row["compacted"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-encode cold previews into a smaller encoding")
+    parser.add_argument("--project-root", default=".", help="Project root directory")
+    parser.add_argument("--profile", choices=sorted(COMPACTION_PROFILES), default="h264-slow")
+    parser.add_argument("--cold-days", type=float, default=7.0, help="Only previews not served for N days")
+    parser.add_argument("--cpu-budget", type=float, default=0.25, help="Fraction of total CPU to use")
+    parser.add_argument("--max-files", type=int, help="Stop after N previews")
+    parser.add_argument("--max-seconds", type=float, help="Stop after N seconds")
+    parser.add_argument("--ffmpeg", default="ffmpeg", help="ffmpeg executable")
+    parser.add_argument("--totals", action="store_true", help="Only show bytes saved so far")
+
+    args = parser.parse_args()
+
+    compactor = PreviewCompactor(args.project_root, args.ffmpeg, args.profile, args.cpu_budget)
+    if not args.totals:
+        summary = compactor.run(args.cold_days, args.max_files, args.max_seconds)
+        print(f"✅ Processed {summary['processed']} previews: {summary['compacted']} compacted, "
+              f"{summary['no_gain']} no gain, {summary['failed']} failed, "
+              f"saved {summary['saved_bytes'] / 1024 / 1024:.2f} MB")
+    totals = compactor.totals()
+    print(f"📊 Total saved by compaction: {totals['saved_bytes'] / 1024 / 1024:.2f} MB over {totals['files']} previews")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,13 +6,95 @@ Preview Generator
 
 import os
 import sys
+import time
+import threading
 import subprocess
 import argparse
 from pathlib import Path
-from typing import List, Optional, Dict
+from typing import Any, Callable, List, Optional, Dict
 import json
 from datetime import datetime
 
+try:
+    from preview_thumbnails import ThumbnailGenerator, thumbnail_paths
+    from render_progress import RenderCancelled, RenderProgress, RenderResult, print_progress, run_with_progress
+    from mlt_document import cleanup_stale_documents, mlt_document
+    from segment_renderer import SegmentRenderer
+    from effect_timing import RenderWindow, compute_render_window
+    from storage_utils import break_link, link_or_copy
+    from media_index import MediaIndex
+    from metrics import record_render, record_render_started
+    from render_failures import (FAILURE_ENCODER, FAILURE_MISSING_ASSET, FAILURE_TIMEOUT, NegativeCache,
+                                 classify_failure, default_failure_cache_path, preflight_check, render_key)
+except ImportError:
+    from src.preview_thumbnails import ThumbnailGenerator, thumbnail_paths
+    from src.render_progress import (RenderCancelled, RenderProgress, RenderResult, print_progress,
+                                     run_with_progress)
+    from src.mlt_document import cleanup_stale_documents, mlt_document
+    from src.segment_renderer import SegmentRenderer
+    from src.effect_timing import RenderWindow, compute_render_window
+    from src.storage_utils import break_link, link_or_copy
+    from src.media_index import MediaIndex
+    from src.metrics import record_render, record_render_started
+    from src.render_failures import (FAILURE_ENCODER, FAILURE_MISSING_ASSET, FAILURE_TIMEOUT, NegativeCache,
+                                     classify_failure, default_failure_cache_path, preflight_check, render_key)
+
+
+class PreviewRender:
+    """一次 render_preview 调用的状态和结果
+
+    渲染队列的多个worker线程共享同一个生成器，渲染窗口、失败分类等逐次渲染的状态放在这里逐层传递，
+    不放在生成器的实例属性上；布尔值即是否成功，兼容原来按bool使用返回值的调用方
+    """
+
+    def __init__(self, effect_file: Path, window: RenderWindow, failure_key: Optional[str] = None,
+                 on_path: Optional[Callable[[str], None]] = None,
+                 cancel_event: Optional[threading.Event] = None):
+        self.effect_file = effect_file
+        self.window = window
+        self.failure_key = failure_key
+        self.success = False
+        self.failure: Optional[Dict[str, Any]] = None
+        self.skipped = False
+        # 被设置后正在运行的ffmpeg/melt被终止，进程内后端在下一帧停止，不再尝试后备路径
+        self.cancel_event = cancel_event
+        self.cancelled = False
+        # 经过的渲染路径（melt/ffmpeg/numpy/pyav/fallback）及各自是否成功，和整次渲染的耗时，写入指标
+        self.attempts: List[list] = []
+        self.seconds = 0.0
+        # 进入渲染路径时的回调（渲染子进程用它把开始事件转给父进程计数）
+        self.on_path = on_path
+
+    def __bool__(self) -> bool:
+        return self.success
+
+    def check_cancelled(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise RenderCancelled()
+
+    def begin_path(self, path: str):
+        """进入一条渲染路径；切换到后备路径说明上一条路径失败"""
+        self.check_cancelled()
+        if self.attempts and self.attempts[-1][0] == path:
+            return
+        if self.attempts and self.attempts[-1][1] is None:
+            self.attempts[-1][1] = False
+        self.attempts.append([path, None])
+        record_render_started(path)
+        if self.on_path is not None:
+            self.on_path(path)
+
+    def finish(self, success: bool, seconds: float):
+        self.success = success
+        self.seconds = seconds
+        if self.attempts and self.attempts[-1][1] is None:
+            self.attempts[-1][1] = success
+
+    def render_info(self) -> Dict[str, Any]:
+        """指标和任务事件使用的渲染记录 {"attempts", "seconds", "skipped", "cancelled"}"""
+        return {"attempts": self.attempts, "seconds": self.seconds, "skipped": self.skipped,
+                "cancelled": self.cancelled}
+
 
 class PreviewGenerator:
     def __init__(self, project_root: str):
@@ -40,6 +122,41 @@ class PreviewGenerator:
         else:
             print("⚠️  MLT found but using FFmpeg for better compatibility.")
             self.use_placeholder = True  # 强制使用FFmpeg预览
+        
+        # 封面图和雪碧图生成器
+        self.thumbnails = ThumbnailGenerator(self.ffmpeg_path, duration=self.duration)
+        
+        # 渲染后端：ffmpeg（默认，子进程，优先melt）、numpy（进程内参考渲染器）
+        # 或 pyav（进程内解码/编码，适合常驻worker）
+        self.backend = os.getenv("PREVIEW_BACKEND", "ffmpeg").lower()
+        # NumPy渲染器预分配约300MB全分辨率缓冲区，只保留一个，与PyAV后端一样用锁串行使用
+        self._numpy_renderer = None
+        self._numpy_lock = threading.Lock()
+        self._pyav_backend = None
+        
+        # 渲染进度回调：接收RenderProgress（帧号、fps、速度、ETA）
+        self.progress_callback: Optional[Callable[[RenderProgress], None]] = None
+        self.stall_timeout = 30.0
+        self.render_timeout = float(os.getenv("RENDER_TIMEOUT", "300"))
+        
+        # 渲染失败负缓存：已知失败的特效/素材组合在TTL内直接跳过
+        self.failure_cache = NegativeCache(str(default_failure_cache_path(self.project_root)))
+        self.skip_known_failures = True
+        
+        # MLT文档直接通过内存传给melt，清理旧版本遗留的临时文件
+        cleanup_stale_documents(self.previews_dir)
+        
+        # 渲染窗口：effect（默认，按特效关键帧范围加前后留白）或 fixed（固定duration秒）
+        self.window_mode = os.getenv("PREVIEW_WINDOW", "effect").lower()
+        self.pad_before = float(os.getenv("PREVIEW_PAD_BEFORE", "0.5"))
+        self.pad_after = float(os.getenv("PREVIEW_PAD_AFTER", "0.5"))
+        
+        # 长预览（30-60秒）分段并行渲染的worker数
+        self.segment_workers = int(os.getenv("PREVIEW_SEGMENT_WORKERS", "0")) or os.cpu_count() or 1
+        
+        # previews/ 和 demos/ 的增量索引：渲染管线自己写入变更，读取时不再遍历目录
+        self.preview_index = MediaIndex(self.previews_dir)
+        self.demo_index = MediaIndex(self.demos_dir)
     
     def _find_ffmpeg(self) -> str:
         """查找ffmpeg命令路径"""
@@ -75,6 +192,30 @@ class PreviewGenerator:
         
         return None
     
+    def compute_window(self, effect_file: Path) -> RenderWindow:
+        """根据特效关键帧范围和前后留白确定渲染窗口"""
+        if self.window_mode == "fixed":
+            return RenderWindow(0, self.fps * self.duration, 0, 0, self.fps)
+        return compute_render_window(effect_file, self.fps, self.pad_before, self.pad_after)
+    
+    def _run_render(self, cmd: List[str], label: str, window: RenderWindow, kind: str = "ffmpeg",
+                    cancel_event: Optional[threading.Event] = None) -> RenderResult:
+        """运行渲染命令（输出为整个渲染窗口），增量解析进度并回调 progress_callback；被取消时抛出 RenderCancelled"""
+        result = run_with_progress(
+            cmd,
+            total_frames=window.total_frames,
+            target_fps=self.fps,
+            callback=self.progress_callback,
+            kind=kind,
+            label=label,
+            stall_timeout=self.stall_timeout,
+            timeout=self.render_timeout,
+            cancel_event=cancel_event
+        )
+        if result.cancelled:
+            raise RenderCancelled()
+        return result
+    
     def get_asset_files(self) -> List[Path]:
         """获取素材文件列表"""
         asset_files = []
@@ -129,8 +270,10 @@ class PreviewGenerator:
             except ImportError:
                 print("PIL not available, skipping sample image creation")
     
-    def generate_preview_mlt(self, effect_file: Path, asset_file: Path) -> str:
+    def generate_preview_mlt(self, effect_file: Path, asset_file: Path, total_frames: Optional[int] = None) -> str:
         """生成MLT XML用于预览"""
+        last_frame = (total_frames or self.fps * self.duration) - 1
+        
         # 读取特效XML
         with open(effect_file, 'r', encoding='utf-8') as f:
             effect_content = f.read()
@@ -143,19 +286,19 @@ class PreviewGenerator:
            display_aspect_num="9" display_aspect_den="16" frame_rate_num="{self.fps}" 
            frame_rate_den="1" colorspace="709"/>
   
-  <producer id="producer0" in="0" out="{self.fps * self.duration - 1}">
+  <producer id="producer0" in="0" out="{last_frame}">
     <property name="resource">{asset_file.absolute()}</property>
     <property name="mlt_service">{"avformat" if asset_file.suffix.lower() in {'.mp4', '.mov', '.avi', '.mkv', '.webm'} else "pixbuf"}</property>
     <property name="seekable">1</property>
   </producer>
   
   <playlist id="playlist0">
-    <entry producer="producer0" in="0" out="{self.fps * self.duration - 1}">
+    <entry producer="producer0" in="0" out="{last_frame}">
       {effect_content}
     </entry>
   </playlist>
   
-  <tractor id="tractor0" in="0" out="{self.fps * self.duration - 1}">
+  <tractor id="tractor0" in="0" out="{last_frame}">
     <track producer="playlist0"/>
   </tractor>
   
@@ -163,15 +306,151 @@ class PreviewGenerator:
         
         return mlt_xml
     
-    def render_preview(self, effect_file: Path, output_file: Path, asset_file: Optional[Path] = None, save_demo: bool = True) -> bool:
-        """渲染预览视频"""
+    def render_preview(self, effect_file: Path, output_file: Path, asset_file: Optional[Path] = None,
+                       save_demo: bool = True, on_path: Optional[Callable[[str], None]] = None,
+                       cancel_event: Optional[threading.Event] = None) -> PreviewRender:
+        """渲染预览视频，成功后生成封面图和雪碧图；返回本次渲染的结果（成功与否、失败分类、渲染路径）
+
+        on_path(路径) 在每条渲染路径开始时调用；cancel_event 被设置时终止渲染，结果的 cancelled 为True
+        """
+        key_asset = asset_file or next(iter(self.get_asset_files()), None)
+        key = render_key(effect_file, key_asset, self.backend)
+        call = PreviewRender(effect_file, self.compute_window(effect_file), on_path=on_path,
+                             cancel_event=cancel_event)
+        
+        # 已知失败的组合直接跳过，不再启动渲染和占位视频进程
+        if self.skip_known_failures:
+            known = self.failure_cache.lookup(key)
+            if known:
+                print(f"⏭️  Skipping {effect_file.name}: known {known['failure_class']} failure "
+                      f"(x{known['count']}, use --retry-failed to force)")
+                call.failure = dict(known, skipped=True)
+                call.skipped = True
+                record_render(effect_file.parent.name, call.render_info())
+                return call
+        
+        problem = preflight_check(effect_file, asset_file)
+        if problem:
+            print(f"✗ {effect_file.name}: {problem['error']}")
+            call.failure = self.failure_cache.record(
+                key, problem["failure_class"], problem["error"], str(effect_file),
+                str(asset_file) if asset_file else None)
+            # XML错误、缺少素材也计入渲染失败指标
+            call.begin_path("preflight")
+            call.finish(False, 0.0)
+            record_render(effect_file.parent.name, call.render_info())
+            return call
+        
+        # 预览可能与demos中的副本共享inode，先断开再就地重写
+        break_link(output_file)
+        call.failure_key = key
+        started = time.monotonic()
+        success = False
+        try:
+            success = self._render_preview_file(call, effect_file, output_file, asset_file, save_demo)
+            
+            if success:
+                self.thumbnails.generate(output_file, duration=call.window.duration)
+                self._index_preview(output_file)
+        except RenderCancelled:
+            call.cancelled = True
+            print(f"🛑 Render cancelled: {effect_file.name}")
+            self._discard_partial(output_file)
+        finally:
+            call.finish(success, time.monotonic() - started)
+            record_render(effect_file.parent.name, call.render_info())
+        
+        return call
+    
+    def _record_failure(self, call: PreviewRender, effect_file: Path, asset_file: Optional[Path],
+                        failure_class: str, error: str):
+        """记录主渲染路径的失败（占位视频等后备路径的结果不影响分类）"""
+        if call.failure is not None:
+            return
+        print(f"📝 Render failure classified as {failure_class}: {effect_file.name}")
+        if call.failure_key is None:
+            call.failure = {"failure_class": failure_class, "error": error}
+            return
+        call.failure = self.failure_cache.record(
+            call.failure_key, failure_class, error, str(effect_file),
+            str(asset_file) if asset_file else None)
+    
+    def _record_result_failure(self, call: PreviewRender, effect_file: Path, asset_file: Optional[Path],
+                               result: RenderResult):
+        self._record_failure(call, effect_file, asset_file,
+                             classify_failure(result.stderr, result.timed_out, result.progress.stalled),
+                             result.stderr)
+    
+    def _record_exception(self, call: PreviewRender, effect_file: Path, asset_file: Optional[Path],
+                          error: Exception):
+        # 无法启动ffmpeg/melt本身（OSError）属于编码器问题，而不是素材缺失
+        failure_class = FAILURE_ENCODER if isinstance(error, OSError) else classify_failure(str(error))
+        self._record_failure(call, effect_file, asset_file, failure_class, str(error))
+    
+    def _mark_success(self, call: PreviewRender):
+        """主渲染路径成功时清除该组合的失败记录"""
+        if call.failure_key is not None and call.failure is None:
+            self.failure_cache.clear(call.failure_key)
+    
+    def render_long_preview(self, effect_file: Path, output_file: Path, duration: float,
+                            asset_file: Optional[Path] = None, save_demo: bool = True,
+                            workers: Optional[int] = None) -> bool:
+        """渲染长预览：按GOP分段并行渲染后流复制拼接，耗时随CPU核数缩短"""
+        output_file.parent.mkdir(parents=True, exist_ok=True)
+        break_link(output_file)
+        
+        if asset_file is None:
+            asset_files = self.get_asset_files()
+            if not asset_files:
+                self.create_sample_assets()
+                asset_files = self.get_asset_files()
+            if not asset_files:
+                print("No asset files found")
+                return False
+            asset_file = asset_files[0]
+        
+        total_frames = int(round(duration * self.fps))
+        renderer = SegmentRenderer(self, workers or self.segment_workers)
+        if not renderer.render(effect_file, output_file, total_frames, asset_file):
+            return False
+        
+        if save_demo:
+            self._save_to_demos(effect_file, output_file)
+        ThumbnailGenerator(self.ffmpeg_path, duration=duration).generate(output_file)
+        self._index_preview(output_file)
+        return True
+    
+    def _discard_partial(self, output_file: Path):
+        """删除被取消的渲染写了一半的预览"""
+        try:
+            output_file.unlink()
+            self.preview_index.remove(output_file)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Failed to remove partial preview: {e}")
+    
+    def _index_preview(self, output_file: Path):
+        """把新渲染的预览写入增量索引；索引出错不影响渲染结果"""
+        try:
+            self.preview_index.record(output_file)
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Failed to update preview index: {e}")
+    
+    def _render_preview_file(self, call: PreviewRender, effect_file: Path, output_file: Path, asset_file: Optional[Path] = None, save_demo: bool = True) -> bool:
+        """渲染预览视频文件"""
         
         # 确保输出目录存在
         output_file.parent.mkdir(parents=True, exist_ok=True)
         
+        if self.backend == "numpy":
+            return self._render_numpy_preview(call, effect_file, output_file, asset_file, save_demo)
+        if self.backend == "pyav":
+            return self._render_pyav_preview(call, effect_file, output_file, asset_file, save_demo)
+        
         # 如果MLT不可用，创建占位视频
         if self.use_placeholder:
-            return self._create_placeholder_preview(effect_file, output_file, save_demo)
+            return self._create_placeholder_preview(call, effect_file, output_file, save_demo)
         
         # 如果没有指定素材文件，使用第一个可用的
         if asset_file is None:
@@ -186,32 +465,33 @@ class PreviewGenerator:
             
             asset_file = asset_files[0]
         
-        # 生成MLT XML
-        mlt_content = self.generate_preview_mlt(effect_file, asset_file)
-        
-        # 创建临时MLT文件
-        temp_mlt = self.previews_dir / f"temp_{effect_file.stem}.mlt"
-        with open(temp_mlt, 'w', encoding='utf-8') as f:
-            f.write(mlt_content)
+        # 生成MLT XML；melt无法克隆首尾帧，按特效时间完整处理整个窗口
+        window = call.window
+        range_start, range_end = window.timeline_range()
+        mlt_content = self.generate_preview_mlt(effect_file, asset_file, range_end + 1)
         
+        call.begin_path("melt")
         try:
-            # 渲染命令
-            cmd = [
-                self.melt_path,
-                str(temp_mlt),
-                "-consumer", f"avformat:{output_file}",
-                "vcodec=libx264", "acodec=aac",
-                "preset=fast", "crf=23",
-                f"s={self.width}x{self.height}",
-                "r=25"
-            ]
-            
-            print(f"Rendering preview for {effect_file.name}...")
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            # MLT文档通过 xml-string 直接传给melt，过大时使用tmpfs暂存文件并自动清理
+            with mlt_document(mlt_content) as (mlt_resource, doc_info):
+                # 渲染命令
+                cmd = [
+                    self.melt_path,
+                    mlt_resource, f"in={range_start}", f"out={range_end}",
+                    "-consumer", f"avformat:{output_file}",
+                    "vcodec=libx264", "acodec=aac",
+                    "preset=fast", "crf=23",
+                    f"s={self.width}x{self.height}",
+                    "r=25"
+                ]
+                
+                print(f"Rendering preview for {effect_file.name}... (MLT via {doc_info.describe()})")
+                result = self._run_render(cmd, effect_file.stem, window, kind="melt",
+                                          cancel_event=call.cancel_event)
             
             if result.returncode == 0:
                 print(f"✓ Preview created: {output_file.name}")
-                temp_mlt.unlink()  # 删除临时文件
+                self._mark_success(call)
                 
                 # 如果需要，同时保存到demos目录
                 if save_demo:
@@ -220,9 +500,10 @@ class PreviewGenerator:
                 return True
             else:
                 print(f"✗ Failed to render {effect_file.name}: {result.stderr}")
+                self._record_result_failure(call, effect_file, asset_file, result)
                 # MLT渲染失败时，尝试创建占位视频
                 print(f"Attempting to create placeholder video...")
-                if self._create_placeholder_video(output_file, effect_file):
+                if self._create_placeholder_video(call, output_file, effect_file):
                     if save_demo:
                         self._save_to_demos(effect_file, output_file)
                     return True
@@ -230,16 +511,109 @@ class PreviewGenerator:
                 
         except Exception as e:
             print(f"✗ Error rendering {effect_file.name}: {e}")
+            self._record_exception(call, effect_file, asset_file, e)
             # 出现异常时，尝试创建占位视频
             print(f"Attempting to create placeholder video...")
-            if self._create_placeholder_video(output_file, effect_file):
+            if self._create_placeholder_video(call, output_file, effect_file):
                 if save_demo:
                     self._save_to_demos(effect_file, output_file)
                 return True
             return False
     
-    def _create_placeholder_preview(self, effect_file: Path, output_file: Path, save_demo: bool = True) -> bool:
+    def _render_numpy_preview(self, call: PreviewRender, effect_file: Path, output_file: Path, asset_file: Optional[Path] = None, save_demo: bool = True) -> bool:
+        """使用NumPy参考渲染器在进程内渲染特效，不依赖melt"""
+        try:
+            import numpy_renderer
+        except ImportError:
+            try:
+                from src import numpy_renderer
+            except ImportError as e:
+                print(f"⚠️  NumPy renderer unavailable ({e}), falling back to FFmpeg")
+                return self._create_placeholder_preview(call, effect_file, output_file, save_demo)
+        
+        def render(asset, window, on_frames):
+            # 复用渲染器的帧缓冲区；缓冲区是共享的，同一时刻只允许一个渲染
+            with self._numpy_lock:
+                if self._numpy_renderer is None:
+                    self._numpy_renderer = numpy_renderer.NumpyEffectRenderer(self.width, self.height, self.fps)
+                return numpy_renderer.render_effect_preview(
+                    effect_file, asset, output_file,
+                    ffmpeg_path=self.ffmpeg_path,
+                    width=self.width, height=self.height, fps=self.fps,
+                    total_frames=window.active_frames,
+                    start_frame=window.start_frame,
+                    renderer=self._numpy_renderer,
+                    progress_callback=on_frames,
+                    lead_frames=window.lead_frames,
+                    trail_frames=window.trail_frames
+                )
+        
+        return self._render_in_process(call, "NumPy renderer", render, effect_file, output_file, asset_file, save_demo)
+    
+    def _render_pyav_preview(self, call: PreviewRender, effect_file: Path, output_file: Path, asset_file: Optional[Path] = None, save_demo: bool = True) -> bool:
+        """使用PyAV在进程内解码、渲染和编码，解码帧和编码参数在多次渲染间保持常驻"""
+        if self._pyav_backend is None:
+            try:
+                try:
+                    from pyav_backend import PyAVRenderBackend
+                except ImportError:
+                    from src.pyav_backend import PyAVRenderBackend
+                cache_mb = int(os.getenv("PYAV_FRAME_CACHE_MB", "1024"))
+                self._pyav_backend = PyAVRenderBackend(self.width, self.height, self.fps,
+                                                       cache_bytes=cache_mb * 1024 * 1024)
+            except ImportError as e:
+                print(f"⚠️  PyAV backend unavailable ({e}), falling back to FFmpeg")
+                return self._create_placeholder_preview(call, effect_file, output_file, save_demo)
+        
+        def render(asset, window, on_frames):
+            return self._pyav_backend.render(effect_file, asset, output_file, window.active_frames,
+                                             window.start_frame, progress_callback=on_frames,
+                                             lead_frames=window.lead_frames,
+                                             trail_frames=window.trail_frames)
+        
+        return self._render_in_process(call, "PyAV backend", render, effect_file, output_file, asset_file, save_demo)
+    
+    def _render_in_process(self, call: PreviewRender, label: str, render: Callable, effect_file: Path, output_file: Path,
+                           asset_file: Optional[Path] = None, save_demo: bool = True) -> bool:
+        """进程内后端的公共流程：选择素材、汇报进度、失败时退回FFmpeg占位视频"""
+        if asset_file is None:
+            asset_files = self.get_asset_files()
+            if not asset_files:
+                print("No asset files found")
+                return self._create_placeholder_preview(call, effect_file, output_file, save_demo)
+            asset_file = asset_files[0]
+        
+        # 只有特效动画区间逐帧处理，静态的前导和收尾由编码器克隆首尾帧
+        call.begin_path(self.backend)
+        window = call.window
+        progress = RenderProgress(effect_file.stem, window.active_frames, self.fps)
+        
+        def on_frames(rendered, total):
+            call.check_cancelled()
+            if self.progress_callback:
+                progress.update(rendered)
+                self.progress_callback(progress)
+        
+        print(f"Rendering {effect_file.name} with {label}...")
+        try:
+            success, error = render(asset_file, window, on_frames)
+        except Exception as e:
+            success, error = False, str(e)
+        
+        if success:
+            print(f"✓ Preview created with {label}: {output_file.name}")
+            self._mark_success(call)
+            if save_demo:
+                self._save_to_demos(effect_file, output_file)
+            return True
+        
+        print(f"✗ {label} failed for {effect_file.name}: {error}")
+        self._record_failure(call, effect_file, asset_file, classify_failure(error), error)
+        return self._create_placeholder_preview(call, effect_file, output_file, save_demo)
+    
+    def _create_placeholder_preview(self, call: PreviewRender, effect_file: Path, output_file: Path, save_demo: bool = True) -> bool:
         """创建真实的预览视频（使用FFmpeg和assets）"""
+        call.begin_path("ffmpeg")
         try:
             style = effect_file.parent.name
             effect_id = effect_file.stem
@@ -263,8 +637,9 @@ class PreviewGenerator:
                         # 使用视频asset创建预览
                         cmd = [
                             self.ffmpeg_path, 
+                            '-stream_loop', '-1',  # 素材比渲染窗口短时循环
                             '-i', str(asset_file),
-                            '-t', str(self.duration),
+                            '-t', f'{call.window.duration:.3f}',
                             '-vf', f'scale={self.width}:{self.height}:force_original_aspect_ratio=decrease:flags=lanczos,pad={self.width}:{self.height}:(ow-iw)/2:(oh-ih)/2,fps={self.fps}',
                             '-c:v', 'libx264',
                             '-preset', 'fast',
@@ -279,7 +654,7 @@ class PreviewGenerator:
                             self.ffmpeg_path, 
                             '-loop', '1',
                             '-i', str(asset_file),
-                            '-t', str(self.duration),
+                            '-t', f'{call.window.duration:.3f}',
                             '-vf', f'scale={self.width}:{self.height}:force_original_aspect_ratio=decrease:flags=lanczos,pad={self.width}:{self.height}:(ow-iw)/2:(oh-ih)/2,fps={self.fps}',
                             '-c:v', 'libx264',
                             '-preset', 'fast',
@@ -289,9 +664,10 @@ class PreviewGenerator:
                         ]
                     
                     print(f"Creating preview from asset: {asset_file.name}")
-                    result = subprocess.run(cmd, capture_output=True, text=True)
+                    result = self._run_render(cmd, effect_id, call.window, cancel_event=call.cancel_event)
                     if result.returncode == 0:
                         print(f"✓ Preview created from asset: {output_file.name}")
+                        self._mark_success(call)
                         
                         # 如果需要，同时保存到demos目录
                         if save_demo:
@@ -300,28 +676,36 @@ class PreviewGenerator:
                         return True
                     else:
                         print(f"⚠️  FFmpeg failed: {result.stderr}")
+                        self._record_result_failure(call, effect_file, asset_file, result)
                         # 如果ffmpeg失败，创建简单的占位视频
-                        return self._create_simple_placeholder(output_file, style, effect_id, save_demo, effect_file)
+                        return self._create_simple_placeholder(call, output_file, style, effect_id, save_demo, effect_file)
                 except Exception as e:
                     print(f"⚠️  Error running FFmpeg: {e}")
-                    return self._create_simple_placeholder(output_file, style, effect_id, save_demo, effect_file)
+                    self._record_exception(call, effect_file, asset_file, e)
+                    return self._create_simple_placeholder(call, output_file, style, effect_id, save_demo, effect_file)
             else:
                 # 没有有效的asset文件，创建简单的占位视频
-                return self._create_simple_placeholder(output_file, style, effect_id, save_demo, effect_file)
+                self._record_failure(call, effect_file, asset_file, FAILURE_MISSING_ASSET, "No asset files found")
+                return self._create_simple_placeholder(call, output_file, style, effect_id, save_demo, effect_file)
                 
         except Exception as e:
             print(f"⚠️  Could not create preview video: {e}")
             # 创建简单的占位视频
-            return self._create_simple_placeholder(output_file, style, effect_id, save_demo, effect_file)
+            return self._create_simple_placeholder(call, output_file, style, effect_id, save_demo, effect_file)
     
-    def _create_simple_placeholder(self, output_file: Path, style: str, effect_id: str, save_demo: bool, effect_file: Path) -> bool:
+    def _create_simple_placeholder(self, call: PreviewRender, output_file: Path, style: str, effect_id: str, save_demo: bool, effect_file: Path) -> bool:
         """创建简单的占位视频"""
+        call.begin_path("fallback")
+        # 编码器错误或超时时同样的ffmpeg几乎必然再次失败，直接写最小文件
+        if call.failure and call.failure.get("failure_class") in (FAILURE_ENCODER, FAILURE_TIMEOUT):
+            return self._create_minimal_video_file(call, output_file, style, effect_id, save_demo)
+        
         try:
             # 尝试使用ffmpeg创建一个简单的彩色视频
             cmd = [
                 self.ffmpeg_path, 
                 '-f', 'lavfi', '-i', 
-                f'color=c=orange:size={self.width}x{self.height}:duration={self.duration}',
+                f'color=c=orange:size={self.width}x{self.height}:duration={call.window.duration:.3f}',
                 '-c:v', 'libx264',
                 '-preset', 'fast',
                 '-crf', '23',
@@ -331,7 +715,7 @@ class PreviewGenerator:
             ]
             
             print(f"Creating simple placeholder video: {output_file}")
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = self._run_render(cmd, effect_id, call.window, cancel_event=call.cancel_event)
             if result.returncode == 0:
                 print(f"✓ Simple placeholder created: {output_file.name}")
                 
@@ -343,15 +727,16 @@ class PreviewGenerator:
             else:
                 print(f"⚠️  FFmpeg failed: {result.stderr}")
                 # 如果ffmpeg不可用，创建一个实际的小视频文件
-                return self._create_minimal_video_file(output_file, style, effect_id, save_demo)
+                return self._create_minimal_video_file(call, output_file, style, effect_id, save_demo)
                 
         except Exception as e:
             print(f"⚠️  Could not create simple placeholder: {e}")
             # 创建最小的视频文件
-            return self._create_minimal_video_file(output_file, style, effect_id, save_demo)
+            return self._create_minimal_video_file(call, output_file, style, effect_id, save_demo)
     
-    def _create_minimal_video_file(self, output_file: Path, style: str, effect_id: str, save_demo: bool) -> bool:
+    def _create_minimal_video_file(self, call: PreviewRender, output_file: Path, style: str, effect_id: str, save_demo: bool) -> bool:
         """创建最小的视频文件（当FFmpeg不可用时）"""
+        call.begin_path("fallback")
         try:
             # 创建一个包含基本MP4头的最小文件
             minimal_mp4_data = bytes([
@@ -372,6 +757,7 @@ class PreviewGenerator:
             if save_demo:
                 demo_file = self.demos_dir / f"{style}_{effect_id}_demo.mp4"
                 self.demos_dir.mkdir(parents=True, exist_ok=True)
+                break_link(demo_file)
                 with open(demo_file, 'wb') as f:
                     f.write(minimal_mp4_data)
                     f.write(b'0' * 1024)
@@ -383,8 +769,9 @@ class PreviewGenerator:
             print(f"⚠️  Could not create minimal video file: {e}")
             return False
     
-    def _create_placeholder_video(self, output_file: Path, effect_file: Path) -> bool:
+    def _create_placeholder_video(self, call: PreviewRender, output_file: Path, effect_file: Path) -> bool:
         """创建占位预览视频（当MLT渲染失败时使用）"""
+        call.begin_path("fallback")
         try:
             # 获取风格名和特效ID
             style = effect_file.parent.name
@@ -394,7 +781,7 @@ class PreviewGenerator:
             cmd = [
                 self.ffmpeg_path, 
                 '-f', 'lavfi', '-i', 
-                f'color=c=red:size={self.width}x{self.height}:duration={self.duration}',
+                f'color=c=red:size={self.width}x{self.height}:duration={call.window.duration:.3f}',
                 '-vf', f'drawtext=text="FALLBACK {effect_id}":fontcolor=white:fontsize=60:x=(w-text_w)/2:y=(h-text_h)/2',
                 '-c:v', 'libx264',
                 '-preset', 'fast',
@@ -403,7 +790,7 @@ class PreviewGenerator:
             ]
             
             print(f"Creating fallback video: {output_file}")
-            result = subprocess.run(cmd, capture_output=True, text=True)
+            result = self._run_render(cmd, effect_id, call.window, cancel_event=call.cancel_event)
             if result.returncode == 0:
                 print(f"✅ Fallback video created: {output_file}")
                 return True
@@ -422,7 +809,7 @@ class PreviewGenerator:
             return True
 
     def _save_to_demos(self, effect_file: Path, preview_file: Path):
-        """将预览视频复制到demos目录"""
+        """将预览视频保存到demos目录（优先reflink/硬链接，不支持时复制）"""
         try:
             # 确保demos目录存在
             self.demos_dir.mkdir(parents=True, exist_ok=True)
@@ -436,10 +823,9 @@ class PreviewGenerator:
             
             # 检查源文件是否存在
             if preview_file.exists():
-                # 复制文件
-                import shutil
-                shutil.copy2(preview_file, demo_file)
-                print(f"✓ Demo saved to: {demo_file}")
+                method = link_or_copy(preview_file, demo_file)
+                self.demo_index.record(demo_file)
+                print(f"✓ Demo saved to: {demo_file} ({method})")
             else:
                 print(f"⚠️  Preview file not found: {preview_file}")
             
@@ -489,29 +875,27 @@ class PreviewGenerator:
         return results
     
     def create_preview_index(self):
-        """创建预览索引JSON文件"""
+        """创建预览索引JSON文件（由增量索引生成，不遍历目录）"""
         index = {
             "generated_at": str(datetime.now()),
             "styles": {}
         }
         
-        for style_dir in self.previews_dir.iterdir():
-            if style_dir.is_dir():
-                style = style_dir.name
-                previews = []
-                
-                for preview_file in style_dir.glob("*.mp4"):
-                    effect_name = preview_file.stem.replace("_preview", "")
-                    previews.append({
-                        "effect_name": effect_name,
-                        "preview_file": str(preview_file.relative_to(self.project_root)),
-                        "effect_file": f"effects/{style}/{effect_name}.xml"
-                    })
-                
-                index["styles"][style] = {
-                    "count": len(previews),
-                    "previews": previews
-                }
+        for key, _ in sorted(self.preview_index.items()):
+            parts = key.split("/")
+            if len(parts) != 2:
+                continue
+            style, filename = parts
+            effect_name = Path(filename).stem.replace("_preview", "")
+            previews = index["styles"].setdefault(style, {"count": 0, "previews": []})["previews"]
+            previews.append({
+                "effect_name": effect_name,
+                "preview_file": str((self.previews_dir / key).relative_to(self.project_root)),
+                "effect_file": f"effects/{style}/{effect_name}.xml"
+            })
+        
+        for data in index["styles"].values():
+            data["count"] = len(data["previews"])
         
         # 保存索引文件
         index_file = self.previews_dir / "index.json"
@@ -519,6 +903,25 @@ class PreviewGenerator:
             json.dump(index, f, indent=2, ensure_ascii=False)
         
         print(f"Preview index created: {index_file}")
+    
+    def generate_missing_thumbnails(self) -> int:
+        """为已有但缺少封面图/雪碧图的预览视频补齐缩略图"""
+        count = 0
+        
+        if not self.previews_dir.exists():
+            return count
+        
+        for preview_file in self.previews_dir.rglob("*_preview.mp4"):
+            paths = thumbnail_paths(preview_file)
+            if paths["poster"].exists() and paths["sprite"].exists():
+                continue
+
+            results = self.thumbnails.generate(preview_file)
+            if results["poster"] or results["sprite"]:
+                count += 1
+
+        print(f"Generated thumbnails for {count} previews")
+        return count
 
 
 def main():
@@ -528,23 +931,56 @@ def main():
     parser.add_argument("--project-root", default=".", help="Project root directory")
     parser.add_argument("--create-samples", action="store_true", 
                       help="Create sample asset files")
+    parser.add_argument("--progress", action="store_true",
+                      help="Show live frame/fps/speed/ETA while rendering")
+    parser.add_argument("--thumbnails", action="store_true",
+                      help="Generate missing posters and sprite sheets for existing previews")
+    parser.add_argument("--duration", type=float,
+                      help="Render a long preview of this many seconds with segment-parallel rendering")
+    parser.add_argument("--segment-workers", type=int,
+                      help="Parallel segment renders for long previews (default: CPU count)")
+    parser.add_argument("--retry-failed", action="store_true",
+                      help="Render effects even if they are in the failure cache")
+    parser.add_argument("--failures", action="store_true",
+                      help="Show render failure counters by class")
     
     args = parser.parse_args()
     
     try:
         generator = PreviewGenerator(args.project_root)
         
+        if args.progress:
+            generator.progress_callback = print_progress
+        
+        if args.retry_failed:
+            generator.skip_known_failures = False
+        
+        if args.failures:
+            for kind, classes in generator.failure_cache.counters().items():
+                print(f"{kind}: " + ", ".join(f"{name}={count}" for name, count in classes.items()))
+            return
+        
         if args.create_samples:
             generator.create_sample_assets()
             return
         
+        if args.thumbnails:
+            generator.generate_missing_thumbnails()
+            return
+        
         if args.effect_file:
             # 单个文件预览
             effect_file = Path(args.effect_file)
             output_file = generator.previews_dir / f"{effect_file.stem}_preview.mp4"
             generator.previews_dir.mkdir(parents=True, exist_ok=True)
             
-            if generator.render_preview(effect_file, output_file):
+            if args.duration:
+                success = generator.render_long_preview(effect_file, output_file, args.duration,
+                                                        workers=args.segment_workers)
+            else:
+                success = generator.render_preview(effect_file, output_file)
+            
+            if success:
                 print(f"Preview generated: {output_file}")
             else:
                 print("Failed to generate preview")
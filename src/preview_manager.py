@@ -4,11 +4,65 @@ Preview Manager - 管理预览视频文件
 """
 
 import os
-import shutil
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 import json
 
+try:
+    from storage_utils import link_or_copy, print_storage_report, storage_report
+    from media_index import MediaIndex
+    from preview_compactor import PreviewCompactor
+    from preview_thumbnails import thumbnail_paths
+except ImportError:
+    from src.storage_utils import link_or_copy, print_storage_report, storage_report
+    from src.media_index import MediaIndex
+    from src.preview_compactor import PreviewCompactor
+    from src.preview_thumbnails import thumbnail_paths
+
+
+# 每个线程池任务处理的文件数：单个链接/删除只是一次系统调用，逐个提交的调度开销反而更大
+LINK_BATCH = 256
+
+
+def _io_workers() -> int:
+    """复制/删除线程池大小：这类操作主要在等待IO，线程数可以多于CPU核数"""
+    return int(os.getenv("PREVIEW_IO_WORKERS", "0")) or min(32, (os.cpu_count() or 1) + 4)
+
+
+def _chunks(items: list, size: int) -> Iterator[list]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _scan_dirs(directory: Path) -> List[os.DirEntry]:
+    """列出非隐藏子目录（is_dir使用目录项自带的类型，不额外stat）"""
+    try:
+        with os.scandir(directory) as it:
+            return [e for e in it if not e.name.startswith(".") and e.is_dir(follow_symlinks=False)]
+    except FileNotFoundError:
+        return []
+
+
+def _scan_videos(directory, suffix: str = ".mp4", recursive: bool = False) -> Iterator[os.DirEntry]:
+    """用os.scandir列出视频文件；DirEntry.stat() 的结果会被缓存，每个文件最多stat一次"""
+    try:
+        with os.scandir(directory) as it:
+            entries = list(it)
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        if entry.name.startswith("."):
+            continue
+        if entry.is_dir(follow_symlinks=False):
+            if recursive:
+                yield from _scan_videos(entry.path, suffix, recursive)
+        elif entry.name.lower().endswith(suffix) and entry.is_file():
+            yield entry
+
 
 class PreviewManager:
     def __init__(self, project_root: str):
@@ -19,36 +73,61 @@ class PreviewManager:
         # 创建必要的目录
         self.previews_dir.mkdir(exist_ok=True)
         self.demos_dir.mkdir(exist_ok=True)
+        
+        # 复制/删除使用有界线程池并行执行
+        self.io_workers = _io_workers()
+        
+        # 增量索引（变更日志 + 快照），与PreviewGenerator共用同一份
+        self.preview_index = MediaIndex(self.previews_dir)
+        self.demo_index = MediaIndex(self.demos_dir)
     
     def organize_previews(self):
         """整理预览文件到demos文件夹"""
         print("📁 开始整理预览文件...")
         
-        # 按风格整理
-        for style_dir in self.previews_dir.iterdir():
-            if style_dir.is_dir():
-                style_name = style_dir.name
+        # 先加载demos索引（首次使用时扫描已有文件），之后只追加本次链接的文件
+        self.demo_index.refresh()
+        
+        # 先按风格收集需要链接的文件，再分批提交到线程池并行处理
+        jobs = []
+        linked = []
+        with ThreadPoolExecutor(max_workers=self.io_workers) as pool:
+            for style_entry in sorted(_scan_dirs(self.previews_dir), key=lambda e: e.name):
+                style_name = style_entry.name
                 target_dir = self.demos_dir / style_name
                 target_dir.mkdir(exist_ok=True)
                 
-                # 复制所有预览视频
-                preview_files = list(style_dir.glob("*.mp4"))
-                copied_count = 0
+                # 目标目录只扫描一次，已有文件的修改时间来自缓存的stat结果
+                existing = {e.name: e.stat().st_mtime for e in _scan_videos(target_dir)}
+                preview_files = list(_scan_videos(style_entry.path))
                 
-                for preview_file in preview_files:
-                    target_file = target_dir / preview_file.name
-                    
-                    # 如果目标文件不存在或源文件更新，则复制
-                    if not target_file.exists() or preview_file.stat().st_mtime > target_file.stat().st_mtime:
-                        shutil.copy2(preview_file, target_file)
-                        copied_count += 1
+                # 如果目标文件不存在或源文件更新，则重新链接（reflink/硬链接，不支持时内核复制）
+                pending = [
+                    (e.path, os.path.join(target_dir, e.name)) for e in preview_files
+                    if e.name not in existing or e.stat().st_mtime > existing[e.name]
+                ]
+                futures = [pool.submit(self._link_batch, batch) for batch in _chunks(pending, LINK_BATCH)]
+                jobs.append((style_name, len(preview_files), pending, futures))
+            
+            for style_name, total, pending, futures in jobs:
+                methods = {}
+                for future in futures:
+                    for method in future.result():
+                        methods[method] = methods.get(method, 0) + 1
+                linked.extend(dst for _, dst in pending)
                 
-                print(f"  {style_name}: 复制了 {copied_count}/{len(preview_files)} 个预览文件")
+                detail = ", ".join(f"{m} {n}" for m, n in methods.items())
+                print(f"  {style_name}: 整理了 {len(pending)}/{total} 个预览文件" + (f" ({detail})" if detail else ""))
         
+        self.demo_index.record_many(linked)
         print("✅ 预览文件整理完成")
     
+    @staticmethod
+    def _link_batch(batch: List[Tuple[str, str]]) -> List[str]:
+        return [link_or_copy(src, dst) for src, dst in batch]
+    
     def create_demo_index(self):
-        """创建demo视频索引"""
+        """创建demo视频索引（由增量索引生成，只读取上次之后的变更）"""
         index = {
             "created_at": datetime.now().isoformat(),
             "total_demos": 0,
@@ -57,30 +136,26 @@ class PreviewManager:
         
         total_count = 0
         
-        for style_dir in self.demos_dir.iterdir():
-            if style_dir.is_dir():
-                style_name = style_dir.name
-                demo_files = list(style_dir.glob("*.mp4"))
-                
-                demos = []
-                for demo_file in demo_files:
-                    effect_id = demo_file.stem.replace("_preview", "")
-                    stat = demo_file.stat()
-                    
-                    demos.append({
-                        "effect_id": effect_id,
-                        "filename": demo_file.name,
-                        "size_mb": round(stat.st_size / (1024 * 1024), 2),
-                        "created_at": datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                        "path": str(demo_file.relative_to(self.demos_dir))
-                    })
-                
-                index["styles"][style_name] = {
-                    "count": len(demos),
-                    "demos": sorted(demos, key=lambda x: x["created_at"], reverse=True)
-                }
-                
-                total_count += len(demos)
+        for key, entry in self.demo_index.items():
+            parts = key.split("/")
+            if len(parts) != 2:
+                continue
+            style_name, filename = parts
+            effect_id = Path(filename).stem.replace("_preview", "")
+            
+            style = index["styles"].setdefault(style_name, {"count": 0, "demos": []})
+            style["demos"].append({
+                "effect_id": effect_id,
+                "filename": filename,
+                "size_mb": round(entry["size"] / (1024 * 1024), 2),
+                "created_at": datetime.fromtimestamp(entry["ctime"]).isoformat(),
+                "path": key
+            })
+        
+        for style in index["styles"].values():
+            style["count"] = len(style["demos"])
+            style["demos"].sort(key=lambda x: x["created_at"], reverse=True)
+            total_count += style["count"]
         
         index["total_demos"] = total_count
         
@@ -92,24 +167,92 @@ class PreviewManager:
         print(f"📋 创建了demo索引: {total_count} 个视频")
         return index
     
+    def rebuild_indexes(self):
+        """全量扫描重建 previews/ 和 demos/ 的增量索引（文件在管线之外被改动后使用）"""
+        previews = self.preview_index.rebuild()
+        demos = self.demo_index.rebuild()
+        print(f"🔄 重建索引: {previews} 个预览, {demos} 个demo")
+        return {"previews": previews, "demos": demos}
+    
     def cleanup_old_previews(self, keep_days=7):
         """清理旧的预览文件"""
         print(f"🧹 清理 {keep_days} 天前的预览文件...")
         
         from datetime import timedelta
-        cutoff_time = datetime.now() - timedelta(days=keep_days)
+        cutoff = (datetime.now() - timedelta(days=keep_days)).timestamp()
         
-        removed_count = 0
+        old_files = [e.path for e in _scan_videos(self.previews_dir, recursive=True)
+                     if e.stat().st_mtime < cutoff]
         
-        for preview_file in self.previews_dir.rglob("*.mp4"):
-            if preview_file.is_file():
-                file_time = datetime.fromtimestamp(preview_file.stat().st_mtime)
-                if file_time < cutoff_time:
-                    preview_file.unlink()
-                    removed_count += 1
-                    print(f"  删除: {preview_file.relative_to(self.previews_dir)}")
+        removed = []
+        prefix = len(os.path.join(str(self.previews_dir), ""))
+        with ThreadPoolExecutor(max_workers=self.io_workers) as pool:
+            batches = list(_chunks(old_files, LINK_BATCH))
+            for batch, errors in zip(batches, pool.map(self._unlink_batch, batches)):
+                for path, error in zip(batch, errors):
+                    if error:
+                        print(f"  ⚠️  删除失败: {path[prefix:]}: {error}")
+                        continue
+                    removed.append(path)
+                    print(f"  删除: {path[prefix:]}")
+        
+        self.preview_index.remove_many(removed)
+        print(f"✅ 清理完成，删除了 {len(removed)} 个旧文件")
+    
+    @staticmethod
+    def _unlink_batch(batch: List[str]) -> List[Optional[OSError]]:
+        errors = []
+        for path in batch:
+            try:
+                os.unlink(path)
+                errors.append(None)
+            except FileNotFoundError:
+                errors.append(None)
+            except OSError as e:
+                errors.append(e)
+                continue
+            # 封面图和雪碧图随预览一起删除，与存储淘汰一致
+            for thumb in thumbnail_paths(Path(path)).values():
+                try:
+                    thumb.unlink()
+                except OSError:
+                    pass
+        return errors
+    
+    def compact_cold_previews(self, cold_days: float = 7.0, profile: Optional[str] = None,
+                              cpu_budget: Optional[float] = None, max_files: Optional[int] = None,
+                              max_seconds: Optional[float] = None, ffmpeg_path: str = "ffmpeg") -> Dict[str, Any]:
+        """用更高效的编码重新压缩长时间未被访问的预览（低优先级，受CPU预算限制）"""
+        compactor = PreviewCompactor(
+            str(self.project_root), ffmpeg_path,
+            profile or os.getenv("PREVIEW_COMPACTION_PROFILE", "h264-slow"),
+            cpu_budget if cpu_budget is not None else float(os.getenv("PREVIEW_COMPACTION_CPU_BUDGET", "0.25"))
+        )
+        print(f"🗜️  压缩 {cold_days:g} 天未访问的预览（{compactor.profile}，{compactor.threads} 线程）...")
+        summary = compactor.run(cold_days, max_files, max_seconds)
+        summary["total_saved_bytes"] = compactor.totals()["saved_bytes"]
+        print(f"✅ 压缩完成: {summary['compacted']}/{summary['processed']} 个预览，"
+              f"节省 {summary['saved_bytes'] / (1024 * 1024):.2f} MB（累计 {summary['total_saved_bytes'] / (1024 * 1024):.2f} MB）")
+        return summary
+    
+    def start_background_compaction(self, interval: float, cold_days: float = 7.0,
+                                    max_seconds: Optional[float] = None, **kwargs) -> threading.Thread:
+        """后台线程每隔 interval 秒压缩一次冷预览"""
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.compact_cold_previews(cold_days, max_seconds=max_seconds, **kwargs)
+                except Exception as e:
+                    print(f"⚠️  后台压缩失败: {e}")
         
-        print(f"✅ 清理完成，删除了 {removed_count} 个旧文件")
+        thread = threading.Thread(target=loop, name="preview-compaction", daemon=True)
+        thread.start()
+        return thread
+    
+    def get_storage_report(self):
+        """previews/ 和 demos/ 的表观大小、实际占用以及链接节省的字节数"""
+        return storage_report([self.previews_dir, self.demos_dir])
     
     def get_stats(self):
         """获取统计信息"""
@@ -119,24 +262,14 @@ class PreviewManager:
             "total_size_mb": 0
         }
         
-        # 统计预览文件
-        for style_dir in self.previews_dir.iterdir():
-            if style_dir.is_dir():
-                files = list(style_dir.glob("*.mp4"))
-                size = sum(f.stat().st_size for f in files)
-                stats["previews"][style_dir.name] = {
-                    "count": len(files),
-                    "size_mb": round(size / (1024 * 1024), 2)
-                }
-                stats["total_size_mb"] += size / (1024 * 1024)
-        
-        # 统计demo文件
-        for style_dir in self.demos_dir.iterdir():
-            if style_dir.is_dir():
-                files = list(style_dir.glob("*.mp4"))
-                size = sum(f.stat().st_size for f in files)
-                stats["demos"][style_dir.name] = {
-                    "count": len(files),
+        for key, root in (("previews", self.previews_dir), ("demos", self.demos_dir)):
+            for style_entry in _scan_dirs(root):
+                count, size = 0, 0
+                for entry in _scan_videos(style_entry.path):
+                    count += 1
+                    size += entry.stat().st_size
+                stats[key][style_entry.name] = {
+                    "count": count,
                     "size_mb": round(size / (1024 * 1024), 2)
                 }
                 stats["total_size_mb"] += size / (1024 * 1024)
@@ -153,12 +286,18 @@ def main():
     parser.add_argument("--index", action="store_true", help="创建demo索引")
     parser.add_argument("--cleanup", type=int, metavar="DAYS", help="清理N天前的预览文件")
     parser.add_argument("--stats", action="store_true", help="显示统计信息")
+    parser.add_argument("--storage", action="store_true", help="显示链接副本节省的存储空间")
+    parser.add_argument("--reindex", action="store_true", help="全量扫描重建增量索引")
+    parser.add_argument("--compact", type=float, metavar="DAYS", help="重新编码N天未访问的预览以节省空间")
     parser.add_argument("--project-root", default=".", help="项目根目录")
     
     args = parser.parse_args()
     
     manager = PreviewManager(args.project_root)
     
+    if args.reindex:
+        manager.rebuild_indexes()
+    
     if args.organize:
         manager.organize_previews()
     
@@ -186,7 +325,14 @@ def main():
             for style, data in stats["demos"].items():
                 print(f"  {style}: {data['count']} 个文件, {data['size_mb']:.2f} MB")
     
-    if not any([args.organize, args.index, args.cleanup, args.stats]):
+    if args.storage:
+        print_storage_report(manager.get_storage_report())
+    
+    if args.compact is not None:
+        manager.compact_cold_previews(args.compact)
+    
+    if not any([args.organize, args.index, args.cleanup, args.stats, args.storage, args.reindex,
+                args.compact is not None]):
         # 默认执行所有操作
         manager.organize_previews()
         manager.create_demo_index()
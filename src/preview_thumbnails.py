@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Preview Thumbnails
+为预览视频生成封面图(poster)和雪碧图(sprite sheet)
+"""
+
+import subprocess
+from pathlib import Path
+from typing import Dict, Optional, Any
+
+
+# 封面/雪碧图的长缓存时间（URL带版本号，内容变化时URL随之变化）
+THUMBNAIL_MAX_AGE = 365 * 24 * 3600
+
+
+def thumbnail_paths(preview_file: Path) -> Dict[str, Path]:
+    """根据预览视频路径推导封面图和雪碧图路径"""
+    base = preview_file.stem.replace("_preview", "")
+    return {
+        "poster": preview_file.with_name(f"{base}_poster.jpg"),
+        "poster_webp": preview_file.with_name(f"{base}_poster.webp"),
+        "sprite": preview_file.with_name(f"{base}_sprite.jpg"),
+    }
+
+
+def thumbnail_fields(previews_dir: Path, style: str, effect_id: str,
+                     sprite_frames: int = 10) -> Dict[str, Any]:
+    """生成API返回用的缩略图字段（带mtime版本号的URL）"""
+    preview_file = Path(previews_dir) / style / f"{effect_id}_preview.mp4"
+    fields = {
+        "poster_file": None,
+        "poster_webp_file": None,
+        "sprite_file": None,
+        "sprite_frames": 0,
+    }
+
+    for key, path in thumbnail_paths(preview_file).items():
+        try:
+            version = int(path.stat().st_mtime)
+        except OSError:
+            continue
+        fields[f"{key}_file"] = f"thumbs/{style}/{path.name}?v={version}"
+
+    if fields["sprite_file"]:
+        fields["sprite_frames"] = sprite_frames
+
+    return fields
+
+
+class ThumbnailGenerator:
+    def __init__(self, ffmpeg_path: str = "ffmpeg", duration: float = 5,
+                 poster_width: int = 360, sprite_width: int = 120, sprite_frames: int = 10):
+        self.ffmpeg_path = ffmpeg_path
+        self.duration = duration
+        self.poster_width = poster_width
+        self.sprite_width = sprite_width
+        self.sprite_frames = sprite_frames
+
+    def generate(self, preview_file: Path, webp: bool = True,
+                 duration: Optional[float] = None) -> Dict[str, Optional[Path]]:
+        """为预览视频生成封面图(JPEG/WebP)和横向雪碧图；duration 为该视频的时长（默认使用构造时的值）"""
+        duration = duration or self.duration
+        paths = thumbnail_paths(preview_file)
+        results = {key: None for key in paths}
+
+        if not preview_file.exists():
+            print(f"⚠️  Preview file not found: {preview_file}")
+            return results
+
+        # 封面取视频中段的一帧，失败时退回第一帧
+        poster_time = duration * 0.4
+        for seek in (poster_time, 0):
+            if self._create_poster(preview_file, paths["poster"], seek):
+                results["poster"] = paths["poster"]
+                break
+
+        if webp and results["poster"]:
+            # WebP依赖ffmpeg编译时带libwebp，不可用时只保留JPEG
+            if self._create_poster(preview_file, paths["poster_webp"], poster_time,
+                                   codec_args=['-c:v', 'libwebp', '-quality', '75']):
+                results["poster_webp"] = paths["poster_webp"]
+
+        if self._create_sprite(preview_file, paths["sprite"], duration):
+            results["sprite"] = paths["sprite"]
+
+        created = [p.name for p in results.values() if p]
+        if created:
+            print(f"✓ Thumbnails created: {', '.join(created)}")
+
+        return results
+
+    def _create_poster(self, preview_file: Path, output_file: Path, seek: float,
+                       codec_args: Optional[list] = None) -> bool:
+        """截取单帧作为封面"""
+        cmd = [
+            self.ffmpeg_path,
+            '-ss', f'{seek:.2f}',
+            '-i', str(preview_file),
+            '-frames:v', '1',
+            '-vf', f'scale={self.poster_width}:-2',
+        ] + (codec_args or ['-q:v', '4']) + ['-y', str(output_file)]
+
+        return self._run(cmd, output_file)
+
+    def _create_sprite(self, preview_file: Path, output_file: Path, duration: float) -> bool:
+        """将整段视频均匀采样为一行拼接的雪碧图"""
+        sample_fps = self.sprite_frames / max(duration, 0.1)
+        cmd = [
+            self.ffmpeg_path,
+            '-i', str(preview_file),
+            '-vf', f'fps={sample_fps:.4f},scale={self.sprite_width}:-2,tile={self.sprite_frames}x1',
+            '-frames:v', '1',
+            '-q:v', '5',
+            '-y', str(output_file)
+        ]
+
+        return self._run(cmd, output_file)
+
+    def _run(self, cmd: list, output_file: Path) -> bool:
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True)
+        except FileNotFoundError:
+            return False
+
+        if result.returncode == 0 and output_file.exists() and output_file.stat().st_size > 0:
+            return True
+
+        # 清理失败时可能残留的空文件
+        if output_file.exists() and output_file.stat().st_size == 0:
+            output_file.unlink()
+        return False
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+PyAV Backend - 进程内的预览渲染后端（可选依赖 PyAV）
+在长期运行的worker中复用已解码的素材帧、编码参数和NumPy渲染器缓冲区，
+省去每次渲染启动ffmpeg/melt进程和重复解码素材的开销
+"""
+
+import time
+import threading
+import argparse
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import av
+except ImportError:  # 可选依赖，未安装时后端不可用
+    av = None
+
+try:
+    from numpy_renderer import VIDEO_EXTS, EffectSpec, NumpyEffectRenderer
+except ImportError:
+    from src.numpy_renderer import VIDEO_EXTS, EffectSpec, NumpyEffectRenderer
+
+
+def pyav_available() -> bool:
+    return av is not None
+
+
+class _AssetFrames:
+    """一个素材已解码的帧（按素材帧号）；length 在解码到文件末尾后才知道"""
+
+    def __init__(self):
+        self.frames: Dict[int, np.ndarray] = {}
+        self.length: Optional[int] = None
+        self.nbytes = 0
+
+
+class DecodedFrameCache:
+    """按素材（路径、修改时间、大小、预览尺寸、帧率）缓存已缩放的rgb24帧，按字节数LRU淘汰
+
+    缓存与渲染窗口无关：帧按素材帧号逐帧存放，不同特效的窗口从同一素材的缓存中取各自需要的帧。
+    超出预算时先淘汰最久未用的其他素材，单个素材放不下的帧不缓存。
+    """
+
+    def __init__(self, max_bytes: int = 1024 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[tuple, _AssetFrames]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(asset_file: Path, width: int, height: int, fps: int) -> tuple:
+        stat = asset_file.stat()
+        return (str(asset_file.resolve()), stat.st_mtime_ns, stat.st_size, width, height, fps)
+
+    def window(self, key: tuple, start_frame: int, total_frames: int) -> Optional[List[np.ndarray]]:
+        """取出从 start_frame 起的 total_frames 帧（素材较短时从窗口起点循环）；缺任何一帧返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            frames = self._slice(entry, start_frame, total_frames) if entry else None
+            if frames is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return frames
+
+    @staticmethod
+    def _slice(entry: _AssetFrames, start_frame: int, total_frames: int) -> Optional[List[np.ndarray]]:
+        available = total_frames
+        if entry.length is not None:
+            available = min(total_frames, entry.length - start_frame)
+            if available <= 0:
+                return None
+        frames = []
+        for i in range(available):
+            frame = entry.frames.get(start_frame + i)
+            if frame is None:
+                return None
+            frames.append(frame)
+        return [frames[i % available] for i in range(total_frames)]
+
+    def put(self, key: tuple, index: int, frame: np.ndarray):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _AssetFrames()
+            self._entries.move_to_end(key)
+            if index in entry.frames:
+                return
+            while self._bytes + frame.nbytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+            if self._bytes + frame.nbytes > self.max_bytes:
+                return
+            entry.frames[index] = frame
+            entry.nbytes += frame.nbytes
+            self._bytes += frame.nbytes
+
+    def set_length(self, key: tuple, length: int):
+        """解码到文件末尾时记录素材的帧数，之后超出末尾的窗口也能从缓存循环取帧"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.length = length
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+class PyAVRenderBackend:
+    """常驻进程内的渲染后端：PyAV解码/编码 + NumPy特效渲染"""
+
+    def __init__(self, width: int = 1080, height: int = 1920, fps: int = 25,
+                 cache_bytes: int = 1024 * 1024 * 1024, codec: str = "libx264",
+                 codec_options: Optional[Dict[str, str]] = None):
+        if av is None:
+            raise ImportError("PyAV is not installed (pip install av)")
+
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.codec = codec
+        # 编码参数只准备一次，每次渲染直接复用
+        self.codec_options = codec_options or {"preset": "fast", "crf": "23"}
+        self.container_options = {"movflags": "+faststart"}
+        self.renderer = NumpyEffectRenderer(width, height, fps)
+        self.frame_cache = DecodedFrameCache(cache_bytes)
+        self._lock = threading.Lock()
+
+    def iter_asset_frames(self, asset_file: Path, total_frames: int, start_frame: int = 0) -> Iterator[np.ndarray]:
+        """逐帧产生缩放到预览尺寸的rgb24素材画面，不把整个窗口放进一个数组
+
+        视频从 start_frame 开始，比窗口短时从窗口起点循环；静态图片只解码一次。
+        命中缓存时直接取帧，否则边解码边产生，并把解码的帧放入缓存。
+        """
+        asset_file = Path(asset_file)
+        key = DecodedFrameCache.key(asset_file, self.width, self.height, self.fps)
+        if asset_file.suffix.lower() not in VIDEO_EXTS:
+            cached = self.frame_cache.window(key, 0, 1)
+            frame = cached[0] if cached else self._decode_image(asset_file)
+            self.frame_cache.put(key, 0, frame)
+            for _ in range(total_frames):
+                yield frame
+            return
+
+        cached = self.frame_cache.window(key, start_frame, total_frames)
+        if cached is not None:
+            yield from cached
+            return
+
+        produced = 0
+        while produced < total_frames:
+            count = 0
+            for index, frame in self._decode_video(asset_file, total_frames - produced, start_frame):
+                self.frame_cache.put(key, index, frame)
+                yield frame
+                count += 1
+            produced += count
+            if produced < total_frames:
+                # 解码到了文件末尾
+                self.frame_cache.set_length(key, start_frame + count)
+                if count == 0:
+                    # 窗口起点已在素材之后：其余帧为黑场
+                    black = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+                    for _ in range(total_frames - produced):
+                        yield black
+                    return
+
+    def _fit(self, frame) -> np.ndarray:
+        """等比缩放并居中填充到预览尺寸（与ffmpeg的scale+pad一致）"""
+        scale = min(self.width / frame.width, self.height / frame.height)
+        w = max(2, int(frame.width * scale) // 2 * 2)
+        h = max(2, int(frame.height * scale) // 2 * 2)
+        scaled = frame.reformat(width=w, height=h, format="rgb24",
+                                interpolation="LANCZOS").to_ndarray()
+        canvas = np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        y, x = (self.height - h) // 2, (self.width - w) // 2
+        canvas[y:y + h, x:x + w] = scaled
+        return canvas
+
+    def _decode_image(self, asset_file: Path) -> np.ndarray:
+        with av.open(str(asset_file)) as container:
+            frame = next(container.decode(video=0))
+            return self._fit(frame)[np.newaxis]
+
+    def _decode_video(self, asset_file: Path, max_frames: int, start_frame: int) -> Iterator[Tuple[int, np.ndarray]]:
+        """从 start_frame 起按目标帧率解码最多 max_frames 帧，产生 (素材帧号, 帧)；到文件末尾时提前结束"""
+        start_time = start_frame / self.fps
+        filled = 0
+
+        with av.open(str(asset_file)) as container:
+            stream = container.streams.video[0]
+            stream.thread_type = "AUTO"
+            if start_time > 0 and stream.time_base:
+                container.seek(int(start_time / stream.time_base), stream=stream)
+
+            # 按目标帧率取样：每个输出时刻使用该时刻之前最近的解码帧，只转换用到的帧
+            pending = None
+            current = None
+            for frame in container.decode(stream):
+                frame_time = frame.time if frame.time is not None else 0.0
+                while pending is not None and filled < max_frames \
+                        and (start_frame + filled) / self.fps < frame_time:
+                    if current is None:
+                        current = self._fit(pending)
+                    yield start_frame + filled, current
+                    filled += 1
+                if filled >= max_frames:
+                    return
+                pending, current = frame, None
+
+            if pending is not None and filled < max_frames:
+                yield start_frame + filled, self._fit(pending)
+
+    def render(self, effect_file: Path, asset_file: Path, output_file: Path,
+               total_frames: int = 125, start_frame: int = 0,
+               progress_callback: Optional[Callable[[int, int], None]] = None,
+               gop_size: Optional[int] = None, lead_frames: int = 0,
+               trail_frames: int = 0) -> Tuple[bool, str]:
+        """渲染特效预览并编码为MP4，返回 (是否成功, 错误信息)
+
+        只对 start_frame 起的 total_frames 帧做特效处理；lead_frames/trail_frames
+        重复编码首尾帧，静态画面在编码器里几乎没有开销。
+        """
+        spec = EffectSpec.from_file(Path(effect_file))
+        if spec.unsupported:
+            print(f"⚠️  PyAV backend ignores unsupported services: {', '.join(spec.unsupported)}")
+
+        # 渲染器的帧缓冲区是共享的，同一时刻只允许一个渲染
+        with self._lock:
+            frames = self.iter_asset_frames(Path(asset_file), total_frames, start_frame)
+            rendered = 0
+            try:
+                with av.open(str(output_file), "w", format="mp4",
+                             options=self.container_options) as container:
+                    options = dict(self.codec_options)
+                    if gop_size:
+                        options.update({"g": str(gop_size), "keyint_min": str(gop_size), "sc_threshold": "0"})
+                    stream = container.add_stream(self.codec, rate=self.fps, options=options)
+                    stream.width = self.width
+                    stream.height = self.height
+                    stream.pix_fmt = "yuv420p"
+
+                    last_image = None
+                    for batch in self.renderer.render_batches(spec, frames, total_frames, start_frame):
+                        for image in batch:
+                            repeats = lead_frames + 1 if rendered == 0 else 1
+                            for _ in range(repeats):
+                                video_frame = av.VideoFrame.from_ndarray(image, format="rgb24")
+                                container.mux(stream.encode(video_frame))
+                            rendered += 1
+                        last_image = batch[-1]
+                        if progress_callback:
+                            progress_callback(rendered, total_frames)
+                    for _ in range(trail_frames if last_image is not None else 0):
+                        video_frame = av.VideoFrame.from_ndarray(last_image, format="rgb24")
+                        container.mux(stream.encode(video_frame))
+                    container.mux(stream.encode(None))
+            except (av.FFmpegError, ValueError, OSError) as e:
+                return False, str(e)
+
+        return True, ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process PyAV preview backend")
+    parser.add_argument("effect_files", nargs="+", help="Effect XML files")
+    parser.add_argument("--asset", required=True, help="Source image or video")
+    parser.add_argument("--output-dir", default="previews", help="Output directory")
+    parser.add_argument("--frames", type=int, default=125, help="Number of frames to render")
+
+    args = parser.parse_args()
+
+    if not pyav_available():
+        parser.error("PyAV is not installed (pip install av)")
+
+    backend = PyAVRenderBackend()
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    timings: List[float] = []
+    for effect_file in args.effect_files:
+        effect_file = Path(effect_file)
+        started = time.perf_counter()
+        ok, error = backend.render(effect_file, Path(args.asset),
+                                   output_dir / f"{effect_file.stem}.mp4", args.frames)
+        timings.append(time.perf_counter() - started)
+        print(f"{'✓' if ok else '✗'} {effect_file.name}: {timings[-1]:.2f}s {error}")
+
+    print(f"📊 Frame cache: {backend.frame_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Range Serving - 预览视频的 Range / 206 Partial Content 支持
+处理单区间、多区间（multipart/byteranges）和 If-Range；只读取并发送请求的字节。
+只有在gunicorn下（其 wsgi.file_wrapper 用 os.sendfile 发送）单区间才在内核中零拷贝发送；
+Flask开发服务器、waitress等其他WSGI服务器由Python线程按 CHUNK_SIZE 分块 pread 后发送
+"""
+
+import os
+import uuid
+import mimetypes
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from flask import Response, request
+from werkzeug.datastructures import Range
+from werkzeug.http import http_date, parse_date
+
+
+CHUNK_SIZE = 256 * 1024
+# 区间过多时（常见于扫描或滥用）直接返回完整文件
+MAX_RANGES = 16
+# 这些服务器的 file_wrapper 会按Content-Length用 os.sendfile 发送当前位置之后的字节
+SENDFILE_WRAPPER_MODULES = ("gunicorn.",)
+
+
+class FileRangeIterator:
+    """按字节区间读取文件的响应体（os.pread，不移动文件位置）；多区间时在各段前后加multipart分隔"""
+
+    def __init__(self, path: Path, segments: List[Tuple[bytes, int, int]], trailer: bytes = b""):
+        self.path = path
+        self.segments = segments
+        self.trailer = trailer
+        self.bytes_read = 0
+
+    def __iter__(self) -> Iterator[bytes]:
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            for prefix, start, stop in self.segments:
+                if prefix:
+                    yield prefix
+                pos = start
+                while pos < stop:
+                    data = os.pread(fd, min(CHUNK_SIZE, stop - pos), pos)
+                    if not data:
+                        break
+                    pos += len(data)
+                    self.bytes_read += len(data)
+                    yield data
+            if self.trailer:
+                yield self.trailer
+        finally:
+            os.close(fd)
+
+
+def _sendfile_wrapper():
+    wrapper = request.environ.get("wsgi.file_wrapper")
+    if wrapper is not None and (getattr(wrapper, "__module__", None) or "").startswith(SENDFILE_WRAPPER_MODULES):
+        return wrapper
+    return None
+
+
+def requested_ranges(size: int) -> Optional[List[Tuple[int, int]]]:
+    """解析当前请求的Range头，见 resolve_ranges"""
+    return resolve_ranges(request.range, size)
+
+
+def resolve_ranges(header: Optional[Range], size: int) -> Optional[List[Tuple[int, int]]]:
+    """返回合并后的 [(start, stop)]（stop不含）；没有Range头或无法使用时返回None，
+    全部区间都超出文件时返回空列表（416）"""
+    if header is None or header.units != "bytes":
+        return None
+    if len(header.ranges) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for start, stop in header.ranges:
+        if start < 0:
+            # 后缀区间 bytes=-N
+            start, stop = max(0, size + start), size
+        else:
+            stop = size if stop is None else min(stop, size)
+        if start < stop:
+            ranges.append((start, stop))
+
+    # 重叠或相邻的区间合并
+    ranges.sort()
+    merged: List[Tuple[int, int]] = []
+    for start, stop in ranges:
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
+
+
+def if_range_matches(etag: str, last_modified: float, if_range: Optional[str] = None) -> bool:
+    """If-Range 与当前文件一致时区间才有效；不一致时应返回完整的新文件
+
+    if_range 默认取当前Flask请求的If-Range头（没有该头时传空字符串）。
+    """
+    if if_range is None:
+        if_range = request.headers.get("If-Range")
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        # 只接受强ETag比较
+        return if_range == f'"{etag}"'
+    date = parse_date(if_range)
+    return date is not None and int(date.timestamp()) == int(last_modified)
+
+
+def range_response(path: Path, st: os.stat_result, etag: str,
+                   mimetype: Optional[str] = None) -> Optional[Response]:
+    """对带Range头的请求返回206/416；应返回完整文件时返回None"""
+    if request.method not in ("GET", "HEAD") or not if_range_matches(etag, st.st_mtime):
+        return None
+    size = st.st_size
+    ranges = requested_ranges(size)
+    if ranges is None:
+        return None
+
+    mimetype = mimetype or mimetypes.guess_type(str(path))[0] or "application/octet-stream"
+    if not ranges:
+        # RFC 9110 §15.5.17：416同样给出文件长度和支持的区间单位
+        response = Response(status=416)
+        response.headers["Content-Range"] = f"bytes */{size}"
+        response.headers["Accept-Ranges"] = "bytes"
+        return response
+
+    if len(ranges) == 1:
+        start, stop = ranges[0]
+        wrapper = _sendfile_wrapper()
+        if wrapper is not None and request.method == "GET":
+            # 由服务器按Content-Length从当前位置起用 os.sendfile 发送
+            f = open(path, "rb")
+            f.seek(start)
+            body = wrapper(f, CHUNK_SIZE)
+        else:
+            body = FileRangeIterator(path, [(b"", start, stop)])
+        response = Response(body, status=206, mimetype=mimetype, direct_passthrough=True)
+        response.headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+        response.content_length = stop - start
+    else:
+        boundary = uuid.uuid4().hex
+        segments = []
+        length = 0
+        for start, stop in ranges:
+            prefix = (f"\r\n--{boundary}\r\nContent-Type: {mimetype}\r\n"
+                      f"Content-Range: bytes {start}-{stop - 1}/{size}\r\n\r\n").encode("ascii")
+            segments.append((prefix, start, stop))
+            length += len(prefix) + stop - start
+        trailer = f"\r\n--{boundary}--\r\n".encode("ascii")
+        body = FileRangeIterator(path, segments, trailer)
+        response = Response(body, status=206, direct_passthrough=True,
+                            content_type=f"multipart/byteranges; boundary={boundary}")
+        response.content_length = length + len(trailer)
+
+    response.headers["Accept-Ranges"] = "bytes"
+    response.headers["Last-Modified"] = http_date(st.st_mtime)
+    response.set_etag(etag)
+    return response
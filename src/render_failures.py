@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Render Failures - 渲染失败分类与负缓存
+失败按类别（XML错误、素材缺失、编码器错误、超时）记录到SQLite，
+以特效内容哈希和素材指纹为键、按类别设置TTL；已知失败的组合直接跳过，不再重复启动渲染进程
+"""
+
+import re
+import time
+import hashlib
+import sqlite3
+import argparse
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+
+# 失败类别
+FAILURE_BAD_XML = "bad_xml"
+FAILURE_MISSING_ASSET = "missing_asset"
+FAILURE_ENCODER = "encoder_error"
+FAILURE_TIMEOUT = "timeout"
+FAILURE_UNKNOWN = "unknown"
+
+FAILURE_CLASSES = (FAILURE_BAD_XML, FAILURE_MISSING_ASSET, FAILURE_ENCODER,
+                   FAILURE_TIMEOUT, FAILURE_UNKNOWN)
+
+# 不会因重试而改变的失败：特效或素材内容变化后键也会变化
+PERMANENT_FAILURES = (FAILURE_BAD_XML, FAILURE_MISSING_ASSET)
+
+# 各类别的默认TTL（秒）；超时多为偶发，保留时间最短
+DEFAULT_TTLS = {
+    FAILURE_BAD_XML: 7 * 24 * 3600,
+    FAILURE_MISSING_ASSET: 3600,
+    FAILURE_ENCODER: 24 * 3600,
+    FAILURE_TIMEOUT: 600,
+    FAILURE_UNKNOWN: 3600,
+}
+
+# stderr特征，按顺序匹配
+FAILURE_PATTERNS = [
+    (FAILURE_MISSING_ASSET, re.compile(
+        r"No such file or directory|does not exist|Could not open|Unable to open", re.I)),
+    (FAILURE_BAD_XML, re.compile(
+        r"not well-formed|mismatched tag|xml parse|parse error|unclosed token|ParseError", re.I)),
+    (FAILURE_MISSING_ASSET, re.compile(
+        r"Failed to load|Invalid data found when processing input", re.I)),
+    (FAILURE_ENCODER, re.compile(
+        r"encoder|Conversion failed|Error initializing|Invalid argument|codec|"
+        r"Error while|Broken pipe", re.I)),
+]
+
+
+def classify_failure(error: str = "", timed_out: bool = False, stalled: bool = False) -> str:
+    """根据stderr尾部和超时状态判断失败类别"""
+    if timed_out or stalled:
+        return FAILURE_TIMEOUT
+    for failure_class, pattern in FAILURE_PATTERNS:
+        if pattern.search(error or ""):
+            return failure_class
+    return FAILURE_UNKNOWN
+
+
+def preflight_check(effect_file: Path, asset_file: Optional[Path]) -> Optional[Dict[str, str]]:
+    """渲染前的廉价检查：特效XML能否解析、素材是否存在；有问题时返回失败信息"""
+    try:
+        ET.parse(str(effect_file))
+    except ET.ParseError as e:
+        return {"failure_class": FAILURE_BAD_XML, "error": f"Invalid effect XML: {e}"}
+    except OSError as e:
+        return {"failure_class": FAILURE_MISSING_ASSET, "error": f"Effect file unreadable: {e}"}
+
+    if asset_file is not None and not Path(asset_file).exists():
+        return {"failure_class": FAILURE_MISSING_ASSET, "error": f"Asset not found: {asset_file}"}
+    return None
+
+
+def render_key(effect_file: Path, asset_file: Optional[Path], backend: str = "") -> str:
+    """特效内容哈希 + 素材指纹（路径、大小、修改时间）+ 渲染后端"""
+    digest = hashlib.sha1()
+    try:
+        digest.update(Path(effect_file).read_bytes())
+    except OSError:
+        digest.update(str(effect_file).encode("utf-8"))
+
+    if asset_file is not None:
+        try:
+            st = Path(asset_file).stat()
+            digest.update(f"|{Path(asset_file).resolve()}|{st.st_size}|{st.st_mtime_ns}".encode("utf-8"))
+        except OSError:
+            digest.update(f"|{asset_file}|missing".encode("utf-8"))
+    digest.update(f"|{backend}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class NegativeCache:
+    def __init__(self, db_path: str, ttls: Optional[Dict[str, float]] = None):
+        self.db_path = Path(db_path)
+        self.ttls = dict(DEFAULT_TTLS)
+        if ttls:
+            self.ttls.update(ttls)
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self):
+        """创建失败记录表和计数表"""
+        conn = self._connect()
+        try:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS failures (
+                    key TEXT PRIMARY KEY,
+                    effect TEXT NOT NULL,
+                    asset TEXT,
+                    failure_class TEXT NOT NULL,
+                    error TEXT,
+                    count INTEGER NOT NULL DEFAULT 1,
+                    failed_at REAL NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS failures_expiry ON failures (expires_at);
+                CREATE TABLE IF NOT EXISTS counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL DEFAULT 0
+                );
+            """)
+        finally:
+            conn.close()
+
+    def lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        """返回未过期的失败记录；命中时计入跳过次数"""
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT * FROM failures WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+            if row is None:
+                return None
+            self._bump(conn, f"skipped:{row['failure_class']}")
+            return dict(row)
+        finally:
+            conn.close()
+
+    def record(self, key: str, failure_class: str, error: str, effect: str,
+               asset: Optional[str] = None) -> Dict[str, Any]:
+        """记录一次失败（同一键累加次数并刷新TTL）"""
+        if failure_class not in FAILURE_CLASSES:
+            failure_class = FAILURE_UNKNOWN
+        now = time.time()
+        expires_at = now + self.ttls.get(failure_class, DEFAULT_TTLS[FAILURE_UNKNOWN])
+        error = (error or "")[-2000:]
+
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO failures (key, effect, asset, failure_class, error, failed_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET failure_class = excluded.failure_class, "
+                "error = excluded.error, count = count + 1, failed_at = excluded.failed_at, "
+                "expires_at = excluded.expires_at",
+                (key, effect, asset, failure_class, error, now, expires_at)
+            )
+            self._bump(conn, f"failed:{failure_class}")
+        finally:
+            conn.close()
+
+        return {"failure_class": failure_class, "error": error, "expires_at": expires_at}
+
+    def clear(self, key: str) -> bool:
+        """渲染成功后删除记录"""
+        conn = self._connect()
+        try:
+            return conn.execute("DELETE FROM failures WHERE key = ?", (key,)).rowcount > 0
+        finally:
+            conn.close()
+
+    def counters(self) -> Dict[str, Dict[str, int]]:
+        """各类别的失败次数和因负缓存跳过的次数"""
+        result = {
+            "failed": {name: 0 for name in FAILURE_CLASSES},
+            "skipped": {name: 0 for name in FAILURE_CLASSES},
+            "active": {name: 0 for name in FAILURE_CLASSES},
+        }
+        conn = self._connect()
+        try:
+            for row in conn.execute("SELECT name, value FROM counters"):
+                kind, _, failure_class = row["name"].partition(":")
+                if kind in result:
+                    result[kind][failure_class] = row["value"]
+            for row in conn.execute(
+                "SELECT failure_class, COUNT(*) AS n FROM failures WHERE expires_at > ? "
+                "GROUP BY failure_class", (time.time(),)
+            ):
+                result["active"][row["failure_class"]] = row["n"]
+        finally:
+            conn.close()
+        return result
+
+    def list_entries(self, include_expired: bool = False) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            if include_expired:
+                rows = conn.execute("SELECT * FROM failures ORDER BY failed_at DESC").fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT * FROM failures WHERE expires_at > ? ORDER BY failed_at DESC", (time.time(),)
+                ).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            conn.close()
+
+    def purge_expired(self) -> int:
+        conn = self._connect()
+        try:
+            return conn.execute("DELETE FROM failures WHERE expires_at <= ?", (time.time(),)).rowcount
+        finally:
+            conn.close()
+
+    def reset(self) -> int:
+        """清空所有失败记录（计数保留）"""
+        conn = self._connect()
+        try:
+            return conn.execute("DELETE FROM failures").rowcount
+        finally:
+            conn.close()
+
+    def _bump(self, conn: sqlite3.Connection, name: str):
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1", (name,)
+        )
+
+
+def default_failure_cache_path(project_root) -> Path:
+    """负缓存数据库的默认位置"""
+    return Path(project_root) / "render_failures.db"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the render negative cache")
+    parser.add_argument("--project-root", default=".", help="Project root directory")
+    parser.add_argument("--list", action="store_true", help="List known-bad effect/asset combinations")
+    parser.add_argument("--purge", action="store_true", help="Remove expired entries")
+    parser.add_argument("--reset", action="store_true", help="Forget all recorded failures")
+
+    args = parser.parse_args()
+
+    cache = NegativeCache(str(default_failure_cache_path(args.project_root)))
+
+    if args.purge:
+        print(f"🧹 Purged {cache.purge_expired()} expired entries")
+    if args.reset:
+        print(f"🧹 Removed {cache.reset()} entries")
+    if args.list:
+        for entry in cache.list_entries():
+            remaining = max(0, entry["expires_at"] - time.time())
+            print(f"  [{entry['failure_class']}] {entry['effect']} x{entry['count']} "
+                  f"(expires in {remaining / 60:.0f} min): {entry['error'][-120:]}")
+
+    counters = cache.counters()
+    print("📊 Render failures:")
+    for failure_class in FAILURE_CLASSES:
+        print(f"  {failure_class}: failed {counters['failed'][failure_class]}, "
+              f"skipped {counters['skipped'][failure_class]}, active {counters['active'][failure_class]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Render Progress - 增量解析ffmpeg/melt的进度输出
+ffmpeg使用 -progress pipe:1 的键值输出，melt使用 -progress 的 "Current Frame" 输出；
+stderr只保留最后若干行用于错误信息，不在内存中完整缓存
+"""
+
+import re
+import time
+import subprocess
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional, Any
+
+
+# melt -progress 输出格式: "Current Frame:        123, percentage:         45"
+MELT_PROGRESS_RE = re.compile(r"Current Frame:\s*(\d+),\s*percentage:\s*(\d+)")
+
+
+class RenderCancelled(BaseException):
+    """渲染被取消（任务被DELETE）
+
+    与 asyncio.CancelledError 一样继承 BaseException：各渲染路径的 except Exception 后备分支不会把取消
+    当作失败去尝试占位视频，直到 render_preview 才被捕获。
+    """
+
+
+class RenderProgress:
+    """单个渲染任务的进度快照"""
+
+    def __init__(self, label: str, total_frames: int, target_fps: float):
+        self.label = label
+        self.total_frames = total_frames
+        self.target_fps = target_fps
+        self.frame = 0
+        self.fps = 0.0
+        self.speed = 0.0
+        self.started_at = time.time()
+        self.updated_at = self.started_at
+        self.stalled = False
+        self.done = False
+
+    @property
+    def elapsed(self) -> float:
+        return time.time() - self.started_at
+
+    @property
+    def percent(self) -> float:
+        if self.total_frames <= 0:
+            return 0.0
+        return min(100.0, self.frame * 100.0 / self.total_frames)
+
+    @property
+    def eta(self) -> Optional[float]:
+        """剩余时间（秒），速度未知时为None"""
+        if self.fps <= 0 or self.total_frames <= 0:
+            return None
+        return max(0.0, (self.total_frames - self.frame) / self.fps)
+
+    def update(self, frame: int, fps: Optional[float] = None, speed: Optional[float] = None):
+        now = time.time()
+        if fps is None:
+            # melt不输出fps，按已渲染帧数和耗时估算
+            elapsed = now - self.started_at
+            fps = frame / elapsed if elapsed > 0 else 0.0
+        if speed is None:
+            speed = fps / self.target_fps if self.target_fps else 0.0
+
+        if frame > self.frame:
+            self.updated_at = now
+            self.stalled = False
+        self.frame = frame
+        self.fps = fps
+        self.speed = speed
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "label": self.label,
+            "frame": self.frame,
+            "total_frames": self.total_frames,
+            "percent": round(self.percent, 1),
+            "fps": round(self.fps, 2),
+            "speed": round(self.speed, 3),
+            "eta": round(self.eta, 1) if self.eta is not None else None,
+            "elapsed": round(self.elapsed, 1),
+            "stalled": self.stalled,
+            "done": self.done,
+        }
+
+    def format_line(self) -> str:
+        """CLI单行进度显示"""
+        eta = f"{self.eta:.1f}s" if self.eta is not None else "?"
+        status = " STALLED" if self.stalled else ""
+        return (f"[{self.label}] frame {self.frame}/{self.total_frames} "
+                f"{self.percent:5.1f}% {self.fps:6.1f}fps {self.speed:5.2f}x ETA {eta}{status}")
+
+
+class RenderResult:
+    """与subprocess.CompletedProcess兼容的渲染结果（stderr只含末尾若干行）"""
+
+    def __init__(self, args: List[str], returncode: int, stderr: str,
+                 progress: RenderProgress, timed_out: bool = False, cancelled: bool = False):
+        self.args = args
+        self.returncode = returncode
+        self.stderr = stderr
+        self.stdout = ""
+        self.progress = progress
+        self.timed_out = timed_out
+        self.cancelled = cancelled
+
+
+def print_progress(progress: RenderProgress):
+    """默认的CLI进度回调：在同一行刷新进度"""
+    end = "\n" if progress.done or progress.stalled else ""
+    print(f"\r{progress.format_line()}", end=end, flush=True)
+
+
+def run_with_progress(cmd: List[str], total_frames: int, target_fps: float,
+                      callback: Optional[Callable[[RenderProgress], None]] = None,
+                      kind: str = "ffmpeg", label: str = "render",
+                      stall_timeout: float = 30.0, timeout: Optional[float] = None,
+                      stderr_lines: int = 40, cancel_event: Optional[threading.Event] = None) -> RenderResult:
+    """运行ffmpeg/melt并增量解析进度
+
+    kind="ffmpeg" 时在可执行文件后插入 -progress pipe:1 -nostats；
+    kind="melt" 时插入 -progress，从stderr解析帧号。
+    超过 stall_timeout 秒没有新帧时以 stalled=True 回调一次；超过 timeout 秒或 cancel_event 被设置时强制结束。
+    """
+    if kind == "ffmpeg":
+        args = [cmd[0], "-progress", "pipe:1", "-nostats"] + list(cmd[1:])
+    elif kind == "melt":
+        args = [cmd[0], "-progress"] + list(cmd[1:])
+    else:
+        args = list(cmd)
+
+    progress = RenderProgress(label, total_frames, target_fps)
+    tail = deque(maxlen=stderr_lines)
+    lock = threading.Lock()
+
+    def notify():
+        if callback is None:
+            return
+        try:
+            callback(progress)
+        except Exception as e:
+            print(f"⚠️  Progress callback error: {e}")
+
+    proc = subprocess.Popen(args, stdin=subprocess.DEVNULL,
+                            stdout=subprocess.PIPE if kind == "ffmpeg" else subprocess.DEVNULL,
+                            stderr=subprocess.PIPE)
+
+    def read_ffmpeg_progress():
+        block = {}
+        for raw in iter(proc.stdout.readline, b""):
+            line = raw.decode("utf-8", "replace").strip()
+            if "=" not in line:
+                continue
+            key, _, value = line.partition("=")
+            block[key] = value
+            if key == "progress":
+                # 一个进度块结束；结束块可能不含帧信息
+                if "frame" not in block:
+                    block = {}
+                    continue
+                with lock:
+                    progress.update(_to_int(block.get("frame")),
+                                    _to_float(block.get("fps")),
+                                    _to_float(block.get("speed", "").rstrip("x")))
+                    notify()
+                block = {}
+
+    def read_stderr():
+        buffer = b""
+        while True:
+            chunk = proc.stderr.read1(4096) if hasattr(proc.stderr, "read1") else proc.stderr.read(4096)
+            if not chunk:
+                break
+            buffer += chunk
+            # melt用\r刷新同一行，统一按\r和\n切分
+            parts = re.split(rb"[\r\n]", buffer)
+            buffer = parts.pop()
+            for part in parts:
+                line = part.decode("utf-8", "replace").strip()
+                if not line:
+                    continue
+                match = MELT_PROGRESS_RE.search(line) if kind == "melt" else None
+                if match:
+                    with lock:
+                        progress.update(int(match.group(1)))
+                        notify()
+                else:
+                    tail.append(line)
+        if buffer.strip():
+            tail.append(buffer.decode("utf-8", "replace").strip())
+
+    readers = [threading.Thread(target=read_stderr, daemon=True)]
+    if kind == "ffmpeg":
+        readers.append(threading.Thread(target=read_ffmpeg_progress, daemon=True))
+    for reader in readers:
+        reader.start()
+
+    timed_out = False
+    cancelled = False
+    while True:
+        try:
+            proc.wait(timeout=1.0)
+            break
+        except subprocess.TimeoutExpired:
+            pass
+
+        if cancel_event is not None and cancel_event.is_set():
+            cancelled = True
+            proc.kill()
+            proc.wait()
+            break
+
+        with lock:
+            idle = time.time() - progress.updated_at
+            if idle > stall_timeout and not progress.stalled:
+                progress.stalled = True
+                notify()
+
+        if timeout is not None and progress.elapsed > timeout:
+            timed_out = True
+            proc.kill()
+            proc.wait()
+            break
+
+    for reader in readers:
+        reader.join(timeout=5)
+
+    with lock:
+        progress.done = True
+        if proc.returncode == 0 and progress.total_frames > 0:
+            progress.frame = max(progress.frame, progress.total_frames)
+        notify()
+
+    return RenderResult(args, proc.returncode, "\n".join(tail), progress, timed_out, cancelled)
+
+
+def _to_int(value: Optional[str]) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _to_float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,629 @@
+#!/usr/bin/env python3
+"""
+Render Queue - 持久化的预览渲染任务队列
+基于SQLite，支持任务状态、优先级、有限次数重试（指数退避）和重复任务去重
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import socket
+import threading
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional, Any
+
+try:
+    from render_failures import PERMANENT_FAILURES
+except ImportError:
+    from src.render_failures import PERMANENT_FAILURES
+
+
+# 任务状态
+STATE_PENDING = "pending"
+STATE_RUNNING = "running"
+STATE_SUCCEEDED = "succeeded"
+STATE_FAILED = "failed"
+STATE_CANCELLED = "cancelled"
+
+# --run-job --event-lines 输出的任务事件行前缀
+EVENT_LINE_PREFIX = "@event "
+
+# worker检查运行中的任务是否被取消的间隔（秒）
+CANCEL_POLL_INTERVAL = 1.0
+
+# 任务属于某个批次：成员表中的记录，或旧数据库中只写在 jobs.batch_id 上的批次
+BATCH_MEMBER_SQL = "(id IN (SELECT job_id FROM batch_jobs WHERE batch_id = ?) OR batch_id = ?)"
+
+# 优先级：交互式请求（单个预览）优先于批量任务
+PRIORITY_INTERACTIVE = 100
+PRIORITY_BATCH = 10
+
+
+class RenderQueue:
+    def __init__(self, db_path: str, max_attempts: int = 3,
+                 backoff_base: float = 5.0, backoff_max: float = 300.0):
+        self.db_path = Path(db_path)
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self):
+        """创建任务表和索引"""
+        conn = self._connect()
+        try:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    style TEXT NOT NULL,
+                    effect_id TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    priority INTEGER NOT NULL,
+                    batch_id TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    max_attempts INTEGER NOT NULL,
+                    next_run_at REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    heartbeat_at REAL,
+                    worker TEXT,
+                    error TEXT,
+                    preview_file TEXT
+                );
+                -- 同一特效最多只有一个待处理任务
+                CREATE UNIQUE INDEX IF NOT EXISTS jobs_pending_dedup
+                    ON jobs (style, effect_id) WHERE state = 'pending';
+                CREATE INDEX IF NOT EXISTS jobs_claim
+                    ON jobs (state, priority DESC, next_run_at, created_at);
+                CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch_id);
+                -- 批次成员：去重后复用的任务可同时属于多个批次（jobs.batch_id 为最先加入的批次）
+                CREATE TABLE IF NOT EXISTS batch_jobs (
+                    batch_id TEXT NOT NULL,
+                    job_id TEXT NOT NULL,
+                    PRIMARY KEY (batch_id, job_id)
+                );
+                CREATE INDEX IF NOT EXISTS batch_jobs_job ON batch_jobs (job_id);
+            """)
+        finally:
+            conn.close()
+
+    def enqueue(self, style: str, effect_id: str, priority: int = PRIORITY_BATCH,
+                batch_id: Optional[str] = None) -> Dict[str, Any]:
+        """添加渲染任务；若已有相同的待处理任务则复用（必要时提升其优先级），并把它加入本批次"""
+        now = time.time()
+        job_id = uuid.uuid4().hex
+
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT INTO jobs (id, style, effect_id, state, priority, batch_id, "
+                    "max_attempts, next_run_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, style, effect_id, STATE_PENDING, priority, batch_id,
+                     self.max_attempts, now, now)
+                )
+            except sqlite3.IntegrityError:
+                # 去重：返回已存在的待处理任务
+                row = conn.execute(
+                    "SELECT id, priority, batch_id FROM jobs WHERE style = ? AND effect_id = ? AND state = ?",
+                    (style, effect_id, STATE_PENDING)
+                ).fetchone()
+                job_id = row["id"]
+                if priority > row["priority"]:
+                    conn.execute("UPDATE jobs SET priority = ? WHERE id = ?", (priority, job_id))
+                if batch_id and row["batch_id"] is None:
+                    conn.execute("UPDATE jobs SET batch_id = ? WHERE id = ?", (batch_id, job_id))
+            # 复用的任务也加入本批次，批次结果中才能看到这个特效
+            if batch_id:
+                conn.execute("INSERT OR IGNORE INTO batch_jobs (batch_id, job_id) VALUES (?, ?)",
+                             (batch_id, job_id))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        return self.get(job_id)
+
+    def claim(self, worker: str) -> Optional[Dict[str, Any]]:
+        """领取一个可执行的任务（按优先级、创建时间排序）"""
+        now = time.time()
+
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE state = ? AND next_run_at <= ? "
+                "ORDER BY priority DESC, created_at LIMIT 1",
+                (STATE_PENDING, now)
+            ).fetchone()
+
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+
+            conn.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, started_at = ?, "
+                "heartbeat_at = ?, worker = ? WHERE id = ?",
+                (STATE_RUNNING, now, now, worker, row["id"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        return self.get(row["id"])
+
+    def heartbeat(self, job_id: str):
+        """更新运行中任务的心跳时间"""
+        self._execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND state = ?",
+                      (time.time(), job_id, STATE_RUNNING))
+
+    def complete(self, job_id: str, preview_file: Optional[str] = None):
+        """标记任务成功"""
+        self._execute(
+            "UPDATE jobs SET state = ?, finished_at = ?, error = NULL, preview_file = ? "
+            "WHERE id = ? AND state = ?",
+            (STATE_SUCCEEDED, time.time(), preview_file, job_id, STATE_RUNNING)
+        )
+
+    def fail(self, job_id: str, error: str, retry: bool = True) -> str:
+        """标记任务失败；未超过重试次数时按指数退避重新排队，返回任务的新状态"""
+        job = self.get(job_id)
+        if job is None or job["state"] != STATE_RUNNING:
+            return job["state"] if job else STATE_FAILED
+
+        now = time.time()
+        if retry and job["attempts"] < job["max_attempts"]:
+            delay = min(self.backoff_base * (2 ** (job["attempts"] - 1)), self.backoff_max)
+            try:
+                self._execute(
+                    "UPDATE jobs SET state = ?, next_run_at = ?, error = ?, worker = NULL "
+                    "WHERE id = ?",
+                    (STATE_PENDING, now + delay, error, job_id)
+                )
+                return STATE_PENDING
+            except sqlite3.IntegrityError:
+                # 重试期间已有新的相同任务入队，本任务直接结束
+                pass
+
+        self._execute(
+            "UPDATE jobs SET state = ?, finished_at = ?, error = ? WHERE id = ?",
+            (STATE_FAILED, now, error, job_id)
+        )
+        return STATE_FAILED
+
+    def cancel(self, job_id: str) -> bool:
+        """取消待处理或运行中的任务；渲染运行中任务的worker轮询到状态变化后终止渲染进程"""
+        return self._execute(
+            "UPDATE jobs SET state = ?, finished_at = ? WHERE id = ? AND state IN (?, ?)",
+            (STATE_CANCELLED, time.time(), job_id, STATE_PENDING, STATE_RUNNING)
+        ) > 0
+
+    def cancel_batch(self, batch_id: str) -> int:
+        """取消批次中所有待处理和运行中的任务，返回取消的数量
+
+        同时属于其他批次的任务保留，其他批次仍在等待它的结果。
+        """
+        return self._execute(
+            f"UPDATE jobs SET state = ?, finished_at = ? WHERE state IN (?, ?) AND {BATCH_MEMBER_SQL} "
+            "AND NOT EXISTS (SELECT 1 FROM batch_jobs b WHERE b.job_id = jobs.id AND b.batch_id != ?)",
+            (STATE_CANCELLED, time.time(), STATE_PENDING, STATE_RUNNING, batch_id, batch_id, batch_id)
+        )
+
+    def is_cancelled(self, job_id: str) -> bool:
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT state FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        finally:
+            conn.close()
+        return row is not None and row["state"] == STATE_CANCELLED
+
+    def recover_stale(self, timeout: float = 600.0) -> int:
+        """将心跳超时的运行中任务（如进程崩溃、重启）重新放回队列"""
+        cutoff = time.time() - timeout
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE state = ? AND heartbeat_at < ?",
+                (STATE_RUNNING, cutoff)
+            ).fetchall()
+        finally:
+            conn.close()
+
+        for row in rows:
+            self.fail(row["id"], "worker lost (stale heartbeat)")
+
+        return len(rows)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务详情（batch_ids 为任务所属的全部批次）"""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = dict(row)
+            batch_ids = [r["batch_id"] for r in conn.execute(
+                "SELECT batch_id FROM batch_jobs WHERE job_id = ? ORDER BY rowid", (job_id,))]
+        finally:
+            conn.close()
+        if job["batch_id"] and job["batch_id"] not in batch_ids:
+            batch_ids.insert(0, job["batch_id"])
+        job["batch_ids"] = batch_ids
+        return job
+
+    def list_batch(self, batch_id: str) -> List[Dict[str, Any]]:
+        """获取一个批次中的所有任务（包括去重后从其他批次复用的任务）"""
+        conn = self._connect()
+        try:
+            rows = conn.execute(
+                f"SELECT * FROM jobs WHERE {BATCH_MEMBER_SQL} ORDER BY created_at", (batch_id, batch_id)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [dict(row) for row in rows]
+
+    def describe(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """单个任务或整个批次的状态和逐个特效的结果（/api/jobs/<id>）"""
+        job = self.get(job_id)
+        jobs = [job] if job else self.list_batch(job_id)
+        if not jobs:
+            return None
+
+        counts = {state: 0 for state in (STATE_PENDING, STATE_RUNNING, STATE_SUCCEEDED,
+                                         STATE_FAILED, STATE_CANCELLED)}
+        for item in jobs:
+            counts[item["state"]] += 1
+
+        if counts[STATE_RUNNING] or (counts[STATE_PENDING] and len(jobs) > counts[STATE_PENDING]):
+            status = STATE_RUNNING
+        elif counts[STATE_PENDING]:
+            status = STATE_PENDING
+        elif counts[STATE_SUCCEEDED] == len(jobs):
+            status = STATE_SUCCEEDED
+        elif counts[STATE_FAILED]:
+            status = STATE_FAILED
+        else:
+            status = STATE_CANCELLED
+
+        finished = [item["finished_at"] for item in jobs if item["finished_at"]]
+        return {
+            "id": job_id,
+            "kind": "preview" if job else "batch",
+            "status": status,
+            "total": len(jobs),
+            "done": len(jobs) - counts[STATE_PENDING] - counts[STATE_RUNNING],
+            "counts": counts,
+            "created_at": min(item["created_at"] for item in jobs),
+            "finished_at": max(finished) if status not in (STATE_PENDING, STATE_RUNNING) and finished else None,
+            "results": [{
+                "job_id": item["id"],
+                "style": item["style"],
+                "effect_id": item["effect_id"],
+                "state": item["state"],
+                "attempts": item["attempts"],
+                "error": item["error"],
+                "preview_file": item["preview_file"],
+            } for item in jobs],
+        }
+
+    def stats(self) -> Dict[str, int]:
+        """按状态统计任务数量"""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state").fetchall()
+        finally:
+            conn.close()
+
+        stats = {state: 0 for state in (STATE_PENDING, STATE_RUNNING, STATE_SUCCEEDED,
+                                        STATE_FAILED, STATE_CANCELLED)}
+        for row in rows:
+            stats[row["state"]] = row["n"]
+        return stats
+
+    def purge_finished(self, older_than: float = 7 * 24 * 3600) -> int:
+        """删除早已结束的任务记录（连同批次成员记录）"""
+        purged = self._execute(
+            "DELETE FROM jobs WHERE state IN (?, ?, ?) AND finished_at < ?",
+            (STATE_SUCCEEDED, STATE_FAILED, STATE_CANCELLED, time.time() - older_than)
+        )
+        if purged:
+            self._execute("DELETE FROM batch_jobs WHERE job_id NOT IN (SELECT id FROM jobs)", ())
+        return purged
+
+    def _execute(self, sql: str, params: tuple) -> int:
+        conn = self._connect()
+        try:
+            cursor = conn.execute(sql, params)
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+
+def default_queue_path(project_root) -> Path:
+    """队列数据库的默认位置"""
+    return Path(project_root) / "render_queue.db"
+
+
+class RenderWorker:
+    def __init__(self, project_root: str, queue: Optional[RenderQueue] = None,
+                 poll_interval: float = 1.0, stale_timeout: float = 600.0):
+        self.project_root = Path(project_root)
+        self.queue = queue or RenderQueue(str(default_queue_path(self.project_root)))
+        self.poll_interval = poll_interval
+        self.stale_timeout = stale_timeout
+        self.name = f"{socket.gethostname()}:{os.getpid()}"
+
+        # 长期复用同一个预览生成器，避免每个任务重复探测ffmpeg/melt
+        try:
+            from preview_generator import PreviewGenerator
+        except ImportError:
+            from src.preview_generator import PreviewGenerator
+        self.generator = PreviewGenerator(str(self.project_root))
+
+        # 进度监听：卡住的任务总会记录日志，其他进度转发给可选的监听函数
+        self.progress_listener = None
+        self.generator.progress_callback = self._on_progress
+
+        # 任务事件监听 job_listener(event_type, data)：状态变化 job-updated，渲染进度 render-progress
+        self.job_listener = None
+        self._active_jobs: Dict[str, Dict[str, Any]] = {}
+
+    def _on_progress(self, progress):
+        if progress.stalled:
+            print(f"\n⚠️  Render stalled: {progress.format_line()}")
+        if self.progress_listener is not None:
+            self.progress_listener(progress)
+        if self.job_listener is not None:
+            # 进度标签为特效ID（分段渲染为 "<ID>#<段号>"，合并为 "<ID>_preview#concat"）
+            effect_id = progress.label.split("#", 1)[0]
+            if effect_id.endswith("_preview"):
+                effect_id = effect_id[:-len("_preview")]
+            job = self._active_jobs.get(effect_id)
+            if job is not None:
+                self._emit("render-progress", job, progress=progress.to_dict())
+
+    def _emit(self, event_type: str, job: Dict[str, Any], **data):
+        if self.job_listener is None:
+            return
+        data.update({"job_id": job["id"], "batch_id": job["batch_id"], "batch_ids": job.get("batch_ids", []),
+                     "style": job["style"], "effect_id": job["effect_id"]})
+        try:
+            self.job_listener(event_type, data)
+        except Exception as e:
+            print(f"⚠️  Job listener error: {e}")
+
+    def run_once(self, worker_name: Optional[str] = None) -> bool:
+        """处理一个任务，队列为空时返回False"""
+        job = self.queue.claim(worker_name or self.name)
+        if job is None:
+            return False
+        self.process(job)
+        return True
+
+    def process(self, job: Dict[str, Any]):
+        """渲染一个已认领（running）的任务，并记录成功/失败"""
+        style = job["style"]
+        effect_id = job["effect_id"]
+        effect_file = self.project_root / "effects" / style / f"{effect_id}.xml"
+        output_file = self.project_root / "previews" / style / f"{effect_id}_preview.mp4"
+
+        print(f"🎬 Job {job['id'][:8]}: {style}/{effect_id} (attempt {job['attempts']}/{job['max_attempts']})")
+
+        if not effect_file.exists():
+            self.queue.fail(job["id"], f"Effect file not found: {effect_file}", retry=False)
+            print(f"❌ Effect file not found: {effect_file}")
+            self._emit("job-updated", job, state=STATE_FAILED, error="effect file not found")
+            return
+
+        self._active_jobs[effect_id] = job
+        self._emit("job-updated", job, state=STATE_RUNNING)
+
+        # 渲染期间定期更新心跳，避免被其他worker当作失联任务回收；同时轮询任务是否被取消
+        done = threading.Event()
+        cancel_event = threading.Event()
+
+        def beat():
+            beat_interval = min(30.0, self.stale_timeout / 4)
+            last_beat = time.monotonic()
+            while not done.wait(CANCEL_POLL_INTERVAL):
+                try:
+                    if self.queue.is_cancelled(job["id"]):
+                        cancel_event.set()
+                        return
+                    if time.monotonic() - last_beat >= beat_interval:
+                        self.queue.heartbeat(job["id"])
+                        last_beat = time.monotonic()
+                except sqlite3.Error as e:
+                    print(f"⚠️  Job {job['id'][:8]} heartbeat failed: {e}")
+
+        threading.Thread(target=beat, daemon=True).start()
+
+        try:
+            result = self.generator.render_preview(
+                effect_file, output_file, save_demo=True,
+                on_path=lambda path: self._emit("render-started", job, path=path),
+                cancel_event=cancel_event)
+        except Exception as e:
+            state = self.queue.fail(job["id"], str(e))
+            print(f"❌ Job {job['id'][:8]} error: {e} -> {state}")
+            self._emit("job-updated", job, state=state, error=str(e))
+            return
+        finally:
+            done.set()
+            if self._active_jobs.get(effect_id) is job:
+                del self._active_jobs[effect_id]
+
+        if result.cancelled:
+            # 任务状态已由取消请求改为cancelled
+            print(f"🛑 Job {job['id'][:8]} cancelled")
+            self._emit("job-updated", job, state=STATE_CANCELLED, render=result.render_info())
+        elif result.success:
+            preview_file = f"previews/{style}/{output_file.name}"
+            self.queue.complete(job["id"], preview_file)
+            print(f"✅ Job {job['id'][:8]} done")
+            self._emit("job-updated", job, state=STATE_SUCCEEDED, preview_file=preview_file,
+                       render=result.render_info())
+        else:
+            # 已知失败（负缓存命中）或重试也无法恢复的失败不再重试
+            failure = result.failure or {}
+            failure_class = failure.get("failure_class", "unknown")
+            retry = not failure.get("skipped") and failure_class not in PERMANENT_FAILURES
+            state = self.queue.fail(job["id"], f"render failed ({failure_class})", retry=retry)
+            print(f"⚠️  Job {job['id'][:8]} failed ({failure_class}) -> {state}")
+            self._emit("job-updated", job, state=state, error=f"render failed ({failure_class})",
+                       render=result.render_info())
+
+    def run(self, workers: int = 1, drain: bool = False, stop_event: Optional[threading.Event] = None):
+        """持续处理队列；drain=True时队列清空后退出"""
+        stop_event = stop_event or threading.Event()
+
+        recovered = self.queue.recover_stale(self.stale_timeout)
+        if recovered:
+            print(f"♻️  Requeued {recovered} stale jobs")
+
+        def loop(index: int):
+            worker_name = f"{self.name}/{index}"
+            while not stop_event.is_set():
+                if not self.run_once(worker_name):
+                    if drain:
+                        return
+                    stop_event.wait(self.poll_interval)
+
+        print(f"👷 Render worker started with {workers} thread(s): {self.queue.db_path}")
+        threads = [threading.Thread(target=loop, args=(i,), daemon=True) for i in range(workers)]
+        for thread in threads:
+            thread.start()
+
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            print("\n🛑 Stopping worker, waiting for running jobs...")
+            stop_event.set()
+            for thread in threads:
+                thread.join()
+
+
+def default_executor_workers() -> int:
+    """Web服务进程内渲染线程数（RENDER_EXECUTOR_WORKERS，0表示只由独立的worker进程渲染）"""
+    return int(os.getenv("RENDER_EXECUTOR_WORKERS", "1"))
+
+
+class RenderExecutor:
+    """在Web服务进程内的后台线程中消费渲染队列
+
+    渲染线程数与Web请求线程分开限制；请求只负责入队并立即返回任务ID。
+    """
+
+    def __init__(self, project_root: str, queue: Optional[RenderQueue] = None,
+                 workers: Optional[int] = None, poll_interval: float = 1.0):
+        self.worker = RenderWorker(project_root, queue, poll_interval=poll_interval)
+        self.queue = self.worker.queue
+        self.workers = default_executor_workers() if workers is None else workers
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> bool:
+        """启动后台渲染（重复调用无副作用）；workers为0时不启动"""
+        with self._lock:
+            if self.workers <= 0 or self.running:
+                return self.running
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self.worker.run, kwargs={"workers": self.workers, "stop_event": self._stop},
+                name="render-executor", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def serve_worker_metrics(queue: RenderQueue, port: int):
+    """独立worker的 /metrics 端口：渲染次数/耗时在本进程记录，队列深度在抓取时查询"""
+    try:
+        from metrics import REGISTRY, collect_queue, start_metrics_server
+    except ImportError:
+        from src.metrics import REGISTRY, collect_queue, start_metrics_server
+    REGISTRY.add_collector(lambda: collect_queue(queue))
+    return start_metrics_server(port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render queue worker")
+    parser.add_argument("--project-root", default=".", help="Project root directory")
+    parser.add_argument("--workers", type=int, default=1, help="Number of concurrent render threads")
+    parser.add_argument("--drain", action="store_true", help="Exit when the queue is empty")
+    parser.add_argument("--status", action="store_true", help="Show queue statistics")
+    parser.add_argument("--enqueue-style", help="Enqueue batch jobs for every effect of a style")
+    parser.add_argument("--run-job", metavar="JOB_ID", help="Render one already-claimed job and exit")
+    parser.add_argument("--event-lines", action="store_true",
+                        help="With --run-job, print job events as '@event {json}' lines")
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this port")
+
+    args = parser.parse_args()
+
+    queue = RenderQueue(str(default_queue_path(args.project_root)))
+
+    if args.run_job:
+        # 由异步服务（asgi_server）为每个任务启动的子进程
+        job = queue.get(args.run_job)
+        if job is None or job["state"] != STATE_RUNNING:
+            print(f"❌ Job is not running: {args.run_job}")
+            raise SystemExit(2)
+        worker = RenderWorker(args.project_root, queue)
+        if args.event_lines:
+            worker.job_listener = lambda event_type, data: print(
+                f"{EVENT_LINE_PREFIX}{json.dumps({'event': event_type, 'data': data})}", flush=True)
+        worker.process(job)
+        return
+
+    if args.enqueue_style:
+        batch_id = uuid.uuid4().hex
+        effects_dir = Path(args.project_root) / "effects" / args.enqueue_style
+        count = 0
+        for effect_file in sorted(effects_dir.glob("*.xml")):
+            queue.enqueue(args.enqueue_style, effect_file.stem, PRIORITY_BATCH, batch_id)
+            count += 1
+        print(f"Enqueued {count} jobs for {args.enqueue_style} (batch {batch_id})")
+
+    if args.status:
+        for state, count in queue.stats().items():
+            print(f"  {state}: {count}")
+        return
+
+    if not args.enqueue_style:
+        if args.metrics_port:
+            serve_worker_metrics(queue, args.metrics_port)
+        RenderWorker(args.project_root, queue).run(workers=args.workers, drain=args.drain)
+
+
+if __name__ == "__main__":
+    main()
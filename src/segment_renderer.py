@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Segment Renderer - 长预览（30-60秒）的分段并行渲染
+把时间线按GOP对齐切分为若干段，各段带上特效的时间偏移并行渲染，
+最后用ffmpeg concat demuxer以流复制（-c copy）无损拼接
+"""
+
+import os
+import math
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, TYPE_CHECKING
+
+try:
+    from render_progress import RenderProgress, run_with_progress
+    from mlt_document import mlt_document
+except ImportError:
+    from src.render_progress import RenderProgress, run_with_progress
+    from src.mlt_document import mlt_document
+
+if TYPE_CHECKING:
+    from preview_generator import PreviewGenerator
+
+
+VIDEO_EXTS = {'.mp4', '.mov', '.avi', '.mkv', '.webm'}
+
+
+def plan_segments(total_frames: int, workers: int, gop_size: int,
+                  min_segment_gops: int = 2) -> List[Tuple[int, int]]:
+    """把 total_frames 切分为 (起始帧, 帧数) 列表
+
+    每段长度是GOP的整数倍（最后一段除外），段数不超过worker数，
+    每段至少 min_segment_gops 个GOP，避免进程启动开销盖过并行收益。
+    """
+    if total_frames <= 0:
+        return []
+    gops = math.ceil(total_frames / gop_size)
+    count = max(1, min(workers, gops // max(1, min_segment_gops)))
+    gops_per_segment = math.ceil(gops / count)
+
+    segments = []
+    start = 0
+    while start < total_frames:
+        frames = min(gops_per_segment * gop_size, total_frames - start)
+        segments.append((start, frames))
+        start += frames
+    return segments
+
+
+def _render_numpy_segment(effect_file: Path, asset_file: Path, output_file: Path, ffmpeg_path: str,
+                          width: int, height: int, fps: int, total_frames: int, start_frame: int,
+                          gop_size: int) -> Tuple[bool, str]:
+    """在子进程中用NumPy渲染一段（特效按 start_frame 偏移取关键帧）"""
+    try:
+        from numpy_renderer import render_effect_preview
+    except ImportError:
+        from src.numpy_renderer import render_effect_preview
+    return render_effect_preview(effect_file, asset_file, output_file, ffmpeg_path=ffmpeg_path,
+                                 width=width, height=height, fps=fps,
+                                 total_frames=total_frames, start_frame=start_frame, gop_size=gop_size)
+
+
+def _render_pyav_segment(effect_file: Path, asset_file: Path, output_file: Path, ffmpeg_path: str,
+                         width: int, height: int, fps: int, total_frames: int, start_frame: int,
+                         gop_size: int) -> Tuple[bool, str]:
+    """在子进程中用PyAV渲染一段"""
+    try:
+        from pyav_backend import PyAVRenderBackend
+    except ImportError:
+        from src.pyav_backend import PyAVRenderBackend
+    # 每个子进程只渲染一段，解码帧缓存不会被复用，不预留缓存预算
+    backend = PyAVRenderBackend(width, height, fps, cache_bytes=0)
+    return backend.render(effect_file, asset_file, output_file, total_frames, start_frame, gop_size=gop_size)
+
+
+class SegmentRenderer:
+    """按GOP切分时间线、并行渲染各段并流复制拼接"""
+
+    def __init__(self, generator: "PreviewGenerator", workers: Optional[int] = None,
+                 gop_size: Optional[int] = None):
+        self.generator = generator
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        # 默认每秒一个关键帧；各段都以关键帧开头，拼接后关键帧间隔保持一致
+        self.gop_size = gop_size or generator.fps
+
+    def render_mode(self) -> str:
+        """与单段渲染相同的后端选择：melt / numpy / pyav / ffmpeg"""
+        gen = self.generator
+        if gen.backend in ("numpy", "pyav"):
+            return gen.backend
+        if not gen.use_placeholder and gen.melt_path:
+            return "melt"
+        return "ffmpeg"
+
+    def render(self, effect_file: Path, output_file: Path, total_frames: int,
+               asset_file: Path) -> bool:
+        """渲染 total_frames 帧的预览到 output_file，成功返回True"""
+        segments = plan_segments(total_frames, self.workers, self.gop_size)
+        mode = self.render_mode()
+        work_dir = output_file.parent / f".{output_file.stem}.segments"
+        if work_dir.exists():
+            shutil.rmtree(work_dir)
+        work_dir.mkdir(parents=True)
+
+        print(f"🧩 Rendering {effect_file.name}: {total_frames} frames in "
+              f"{len(segments)} segments ({mode}, {self.workers} workers)")
+
+        progress = RenderProgress(effect_file.stem, total_frames, self.generator.fps)
+        segment_frames: Dict[int, int] = {}
+        lock = threading.Lock()
+
+        def on_segment_progress(index: int, frames: int):
+            with lock:
+                segment_frames[index] = frames
+                progress.update(sum(segment_frames.values()))
+                if self.generator.progress_callback:
+                    self.generator.progress_callback(progress)
+
+        segment_files = [work_dir / f"segment_{i:03d}.mp4" for i in range(len(segments))]
+        try:
+            if mode in ("numpy", "pyav"):
+                ok, error = self._render_in_processes(mode, effect_file, asset_file, segments,
+                                                      segment_files, on_segment_progress)
+            else:
+                ok, error = self._render_with_commands(mode, effect_file, asset_file, segments,
+                                                       segment_files, on_segment_progress)
+            if not ok:
+                print(f"✗ Segment render failed for {effect_file.name}: {error}")
+                return False
+
+            result = self._concat(segment_files, work_dir, output_file)
+            if result.returncode != 0:
+                print(f"✗ Segment concat failed for {effect_file.name}: {result.stderr}")
+                return False
+
+            progress.done = True
+            if self.generator.progress_callback:
+                self.generator.progress_callback(progress)
+            print(f"✓ Long preview created: {output_file.name}")
+            return True
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _render_with_commands(self, mode: str, effect_file: Path, asset_file: Path,
+                              segments: List[Tuple[int, int]], segment_files: List[Path],
+                              on_progress) -> Tuple[bool, str]:
+        """melt/ffmpeg：每段一个子进程，线程池只负责等待"""
+        gen = self.generator
+        total_frames = segments[-1][0] + segments[-1][1]
+
+        def run(index: int, resource: Optional[str]) -> Tuple[bool, str]:
+            start, frames = segments[index]
+            if mode == "melt":
+                cmd = self._melt_command(resource, start, frames, segment_files[index])
+            else:
+                cmd = self._ffmpeg_command(asset_file, start, frames, segment_files[index])
+            result = run_with_progress(
+                cmd, total_frames=frames, target_fps=gen.fps,
+                callback=lambda p: on_progress(index, p.frame),
+                kind="melt" if mode == "melt" else "ffmpeg",
+                label=f"{effect_file.stem}#{index}", stall_timeout=gen.stall_timeout
+            )
+            return result.returncode == 0, result.stderr
+
+        def run_all(resource: Optional[str]) -> Tuple[bool, str]:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                results = list(pool.map(lambda i: run(i, resource), range(len(segments))))
+            for ok, error in results:
+                if not ok:
+                    return False, error
+            return True, ""
+
+        if mode == "melt":
+            # 所有段共用同一份MLT文档，通过 in/out 选取各段，特效关键帧随之偏移
+            mlt_content = gen.generate_preview_mlt(effect_file, asset_file, total_frames)
+            with mlt_document(mlt_content) as (resource, _):
+                return run_all(resource)
+        return run_all(None)
+
+    def _render_in_processes(self, mode: str, effect_file: Path, asset_file: Path,
+                             segments: List[Tuple[int, int]], segment_files: List[Path],
+                             on_progress) -> Tuple[bool, str]:
+        """numpy/pyav：计算密集，用进程池绕开GIL"""
+        gen = self.generator
+        target = _render_numpy_segment if mode == "numpy" else _render_pyav_segment
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = [
+                pool.submit(target, effect_file, asset_file, segment_files[i], gen.ffmpeg_path,
+                            gen.width, gen.height, gen.fps, frames, start, self.gop_size)
+                for i, (start, frames) in enumerate(segments)
+            ]
+            for i, future in enumerate(futures):
+                ok, error = future.result()
+                if not ok:
+                    return False, error
+                on_progress(i, segments[i][1])
+        return True, ""
+
+    def _encoder_args(self) -> List[str]:
+        """固定GOP、关闭场景切换关键帧，保证各段编码参数一致可直接拼接"""
+        return [
+            '-c:v', 'libx264', '-preset', 'fast', '-crf', '23',
+            '-g', str(self.gop_size), '-keyint_min', str(self.gop_size), '-sc_threshold', '0',
+            '-pix_fmt', 'yuv420p', '-an',
+        ]
+
+    def _melt_command(self, resource: str, start: int, frames: int, output_file: Path) -> List[str]:
+        gen = self.generator
+        return [
+            gen.melt_path, resource, f"in={start}", f"out={start + frames - 1}",
+            "-consumer", f"avformat:{output_file}",
+            "vcodec=libx264", "an=1",
+            "preset=fast", "crf=23",
+            f"g={self.gop_size}", f"keyint_min={self.gop_size}", "sc_threshold=0",
+            f"s={gen.width}x{gen.height}",
+            f"r={gen.fps}"
+        ]
+
+    def _ffmpeg_command(self, asset_file: Path, start: int, frames: int, output_file: Path) -> List[str]:
+        gen = self.generator
+        vf = (f'scale={gen.width}:{gen.height}:force_original_aspect_ratio=decrease:flags=lanczos,'
+              f'pad={gen.width}:{gen.height}:(ow-iw)/2:(oh-ih)/2,fps={gen.fps}')
+        if asset_file.suffix.lower() in VIDEO_EXTS:
+            # 素材比预览短时循环播放；-ss 在输入前快速定位到段起点
+            source = ['-stream_loop', '-1', '-ss', f'{start / gen.fps:.3f}', '-i', str(asset_file)]
+        else:
+            source = ['-loop', '1', '-i', str(asset_file)]
+        return ([gen.ffmpeg_path] + source +
+                ['-vf', vf, '-frames:v', str(frames)] + self._encoder_args() +
+                ['-y', str(output_file)])
+
+    def _concat(self, segment_files: List[Path], work_dir: Path, output_file: Path):
+        """concat demuxer流复制拼接，不重新编码"""
+        gen = self.generator
+        list_file = work_dir / "segments.txt"
+        list_file.write_text("".join(f"file '{f.name}'\n" for f in segment_files), encoding="utf-8")
+        cmd = [
+            gen.ffmpeg_path, '-v', 'error',
+            '-f', 'concat', '-safe', '0', '-i', str(list_file),
+            '-c', 'copy', '-movflags', '+faststart',
+            '-y', str(output_file)
+        ]
+        return run_with_progress(cmd, total_frames=0, target_fps=gen.fps, kind="plain",
+                                 label=f"{output_file.stem}#concat", stall_timeout=gen.stall_timeout)
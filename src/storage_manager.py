@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Storage Manager - previews/ 和 demos/ 的容量预算与LRU淘汰
+Web服务的预览路由记录每个视频最后一次被访问的时间；超出字节预算时，
+优先删除最久没有被访问的文件（硬链接副本按inode合并计算），固定的文件永不淘汰
+"""
+
+import os
+import time
+import atexit
+import sqlite3
+import fnmatch
+import argparse
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from media_index import MediaIndex
+    from preview_thumbnails import thumbnail_paths
+except ImportError:
+    from src.media_index import MediaIndex
+    from src.preview_thumbnails import thumbnail_paths
+
+
+MANAGED_DIRS = ("previews", "demos")
+
+
+def default_budget_bytes() -> int:
+    """STORAGE_BUDGET_MB，0表示不限制"""
+    return int(float(os.getenv("STORAGE_BUDGET_MB", "0")) * 1024 * 1024)
+
+
+def default_access_log_path(project_root) -> Path:
+    return Path(project_root) / "storage_access.db"
+
+
+class AccessLog:
+    """记录视频文件的最后访问时间和固定列表（SQLite）
+
+    路由中的 touch() 只写内存缓冲，按时间或数量批量落盘，不给每个请求增加一次写事务。
+    """
+
+    def __init__(self, db_path: str, flush_interval: float = 5.0, flush_size: int = 256):
+        self.db_path = Path(db_path)
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._pending: Dict[str, float] = {}
+        self._hits: Dict[str, int] = {}
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._init_db()
+        atexit.register(self.flush)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _init_db(self):
+        """创建访问记录表和固定列表"""
+        conn = self._connect()
+        try:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS access (
+                    path TEXT PRIMARY KEY,
+                    last_access REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS pins (
+                    pattern TEXT PRIMARY KEY,
+                    reason TEXT,
+                    pinned_at REAL NOT NULL
+                );
+            """)
+        finally:
+            conn.close()
+
+    def touch(self, path: str):
+        """记录一次访问（path为相对项目根目录的路径，例如 previews/glitch/x_preview.mp4）"""
+        now = time.time()
+        with self._lock:
+            self._pending[path] = now
+            self._hits[path] = self._hits.get(path, 0) + 1
+            due = len(self._pending) >= self.flush_size or now - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, hits = self._pending, self._hits
+            self._pending, self._hits = {}, {}
+            self._last_flush = time.time()
+        if not pending:
+            return
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT INTO access (path, last_access, hits) VALUES (?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET last_access = MAX(last_access, excluded.last_access), "
+                "hits = hits + excluded.hits",
+                [(path, ts, hits.get(path, 1)) for path, ts in pending.items()]
+            )
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def last_access(self) -> Dict[str, float]:
+        self.flush()
+        conn = self._connect()
+        try:
+            return {row["path"]: row["last_access"] for row in conn.execute("SELECT path, last_access FROM access")}
+        finally:
+            conn.close()
+
+    def forget(self, paths: List[str]):
+        conn = self._connect()
+        try:
+            conn.executemany("DELETE FROM access WHERE path = ?", [(p,) for p in paths])
+        finally:
+            conn.close()
+
+    def pin(self, pattern: str, reason: str = "") -> bool:
+        """固定匹配的文件（支持通配符，例如 demos/* 或 previews/glitch/*）"""
+        conn = self._connect()
+        try:
+            return conn.execute(
+                "INSERT OR REPLACE INTO pins (pattern, reason, pinned_at) VALUES (?, ?, ?)",
+                (pattern, reason, time.time())
+            ).rowcount > 0
+        finally:
+            conn.close()
+
+    def unpin(self, pattern: str) -> bool:
+        conn = self._connect()
+        try:
+            return conn.execute("DELETE FROM pins WHERE pattern = ?", (pattern,)).rowcount > 0
+        finally:
+            conn.close()
+
+    def pins(self) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        try:
+            return [dict(row) for row in conn.execute("SELECT * FROM pins ORDER BY pattern")]
+        finally:
+            conn.close()
+
+
+class StorageManager:
+    """在 previews/ 和 demos/ 上执行字节预算"""
+
+    def __init__(self, project_root: str, access_log: Optional[AccessLog] = None,
+                 budget_bytes: Optional[int] = None):
+        self.project_root = Path(project_root)
+        self.access_log = access_log or AccessLog(str(default_access_log_path(self.project_root)))
+        self.budget_bytes = default_budget_bytes() if budget_bytes is None else budget_bytes
+        self.indexes = {name: MediaIndex(self.project_root / name) for name in MANAGED_DIRS}
+
+    def _objects(self) -> List[Dict[str, Any]]:
+        """按inode合并同一份数据的所有路径（预览和它的硬链接demo）"""
+        objects: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        for name, index in self.indexes.items():
+            for key, entry in index.items():
+                rel = f"{name}/{key}"
+                path = self.project_root / rel
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                obj = objects.setdefault((st.st_dev, st.st_ino), {
+                    "paths": [], "size": st.st_size, "mtime": st.st_mtime, "extra_bytes": 0})
+                obj["paths"].append(rel)
+                # 预览的封面图和雪碧图随预览一起淘汰
+                if name == "previews":
+                    for thumb in thumbnail_paths(path).values():
+                        try:
+                            obj["extra_bytes"] += thumb.stat().st_size
+                        except FileNotFoundError:
+                            pass
+        return list(objects.values())
+
+    def plan(self, budget_bytes: Optional[int] = None) -> Dict[str, Any]:
+        """计算需要淘汰的文件（不删除任何东西）"""
+        budget = self.budget_bytes if budget_bytes is None else budget_bytes
+        accessed = self.access_log.last_access()
+        pins = [p["pattern"] for p in self.access_log.pins()]
+
+        objects = self._objects()
+        total = 0
+        pinned_bytes = 0
+        candidates = []
+        for obj in objects:
+            obj["bytes"] = obj["size"] + obj["extra_bytes"]
+            # 从未被访问过的文件以修改时间作为最后访问时间
+            obj["last_access"] = max([accessed.get(p, 0) for p in obj["paths"]] + [obj["mtime"]])
+            obj["pinned"] = any(fnmatch.fnmatch(p, pattern) for p in obj["paths"] for pattern in pins)
+            total += obj["bytes"]
+            if obj["pinned"]:
+                pinned_bytes += obj["bytes"]
+            else:
+                candidates.append(obj)
+
+        evict = []
+        remaining = total
+        if budget > 0:
+            for obj in sorted(candidates, key=lambda o: o["last_access"]):
+                if remaining <= budget:
+                    break
+                evict.append(obj)
+                remaining -= obj["bytes"]
+
+        return {
+            "budget_bytes": budget,
+            "total_bytes": total,
+            "pinned_bytes": pinned_bytes,
+            "reclaim_bytes": total - remaining,
+            "after_bytes": remaining,
+            "over_budget": budget > 0 and remaining > budget,
+            "files": len(objects),
+            "evict": [{"paths": o["paths"], "bytes": o["bytes"], "last_access": o["last_access"]}
+                      for o in evict],
+        }
+
+    def enforce(self, budget_bytes: Optional[int] = None, dry_run: bool = False) -> Dict[str, Any]:
+        """淘汰到预算以内；dry_run 时只返回报告"""
+        report = self.plan(budget_bytes)
+        report["dry_run"] = dry_run
+        if dry_run:
+            return report
+
+        removed = {name: [] for name in MANAGED_DIRS}
+        for obj in report["evict"]:
+            for rel in obj["paths"]:
+                path = self.project_root / rel
+                targets = [path]
+                if rel.startswith("previews/"):
+                    targets += list(thumbnail_paths(path).values())
+                for target in targets:
+                    try:
+                        target.unlink()
+                    except FileNotFoundError:
+                        pass
+                removed[rel.split("/", 1)[0]].append(path)
+
+        for name, paths in removed.items():
+            self.indexes[name].remove_many(paths)
+        self.access_log.forget([p for obj in report["evict"] for p in obj["paths"]])
+        return report
+
+
+def print_eviction_report(report: Dict[str, Any]):
+    mb = 1024 * 1024
+    budget = report["budget_bytes"]
+    title = "🔍 淘汰预演（未删除任何文件）" if report.get("dry_run") else "🧹 淘汰结果"
+    print(f"{title}:")
+    print(f"  预算: {budget / mb:.2f} MB" if budget > 0 else "  预算: 不限制")
+    print(f"  当前占用: {report['total_bytes'] / mb:.2f} MB（{report['files']} 个文件，固定 {report['pinned_bytes'] / mb:.2f} MB）")
+    print(f"  可回收: {report['reclaim_bytes'] / mb:.2f} MB（{len(report['evict'])} 个文件）")
+    for obj in report["evict"][:50]:
+        served = datetime.fromtimestamp(obj["last_access"]).strftime("%Y-%m-%d %H:%M")
+        print(f"    - {', '.join(obj['paths'])} ({obj['bytes'] / mb:.2f} MB, 最后访问 {served})")
+    if len(report["evict"]) > 50:
+        print(f"    ... 另外 {len(report['evict']) - 50} 个文件")
+    if report["over_budget"]:
+        print("  ⚠️  固定的文件已超出预算")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enforce a byte budget over previews/ and demos/")
+    parser.add_argument("--project-root", default=".", help="Project root directory")
+    parser.add_argument("--budget-mb", type=float, help="Byte budget in MB (default: STORAGE_BUDGET_MB)")
+    parser.add_argument("--dry-run", action="store_true", help="Only report what would be reclaimed")
+    parser.add_argument("--pin", metavar="PATTERN", help="Never evict matching files (e.g. demos/*)")
+    parser.add_argument("--unpin", metavar="PATTERN", help="Remove a pin")
+    parser.add_argument("--pins", action="store_true", help="List pins")
+
+    args = parser.parse_args()
+
+    manager = StorageManager(args.project_root)
+    if args.pin:
+        manager.access_log.pin(args.pin)
+        print(f"📌 Pinned {args.pin}")
+    if args.unpin:
+        print(f"📌 Unpinned {args.unpin}" if manager.access_log.unpin(args.unpin) else f"Not pinned: {args.unpin}")
+    if args.pins:
+        for pin in manager.access_log.pins():
+            print(f"  📌 {pin['pattern']}")
+    if args.pin or args.unpin or args.pins:
+        return
+
+    budget = int(args.budget_mb * 1024 * 1024) if args.budget_mb is not None else None
+    print_eviction_report(manager.enforce(budget, dry_run=args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
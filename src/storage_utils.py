@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Storage Utils - 预览/Demo文件的去重存储
+demos/ 中的副本优先使用写时复制的reflink，其次硬链接，文件系统都不支持时才复制字节；
+存储报告按inode和物理extent去重，统计实际节省的字节数
+"""
+
+import os
+import sys
+import errno
+import shutil
+import struct
+import argparse
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+# linux/fs.h
+FICLONE = 0x40049409
+FS_IOC_FIEMAP = 0xC020660B
+FIEMAP_EXTENT_LAST = 0x1
+FIEMAP_EXTENT_SHARED = 0x2000
+FIEMAP_HEADER = struct.Struct("=QQLLLL")
+FIEMAP_EXTENT = struct.Struct("=QQQQQLLLL")
+
+LINK_MODES = ("auto", "reflink", "hardlink", "copy")
+
+# 表示文件系统不支持reflink的错误码（跨设备的EXDEV与具体目标有关，不计入）
+REFLINK_UNSUPPORTED = {errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.ENOSYS}
+_no_reflink_devices: Set[int] = set()
+
+# 同一目录内重写/替换文件的跨进程锁（隐藏文件，不会被索引）
+REWRITE_LOCK_NAME = ".rewrite.lock"
+_rewrite_mutex = threading.Lock()
+
+# 各方式的使用次数，便于确认文件系统实际支持哪种方式
+link_stats: Dict[str, int] = {"reflink": 0, "hardlink": 0, "copy": 0}
+
+
+def default_link_mode() -> str:
+    mode = os.getenv("DEMO_LINK_MODE", "auto").lower()
+    return mode if mode in LINK_MODES else "auto"
+
+
+def reflink(src: Path, dst: Path):
+    """写时复制克隆（btrfs、XFS、bcachefs等），不支持时抛出OSError"""
+    if fcntl is None or not sys.platform.startswith("linux"):
+        raise OSError(errno.EOPNOTSUPP, "reflink is not supported on this platform")
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    shutil.copystat(src, dst)
+
+
+def kernel_copy(src: Path, dst: Path):
+    """在内核中复制文件内容（copy_file_range，不经过用户态缓冲；NFS等可在服务端完成）
+
+    系统或文件系统不支持时退回普通的分块复制。
+    """
+    if not hasattr(os, "copy_file_range"):
+        shutil.copy2(src, dst)
+        return
+
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        try:
+            while remaining > 0:
+                copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                if copied == 0:
+                    break
+                remaining -= copied
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.EINVAL):
+                raise
+            fsrc.seek(0)
+            fdst.seek(0)
+            fdst.truncate()
+            shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+    shutil.copystat(src, dst)
+
+
+def link_or_copy(src: Path, dst: Path, mode: Optional[str] = None) -> str:
+    """把 src 放到 dst（已存在则原子替换），返回实际使用的方式
+
+    auto 依次尝试 reflink → 硬链接 → 复制。硬链接与源文件共享inode，
+    重新渲染前要先用 break_link() 断开，避免改写demos中的副本。
+    """
+    src, dst = Path(src), Path(dst)
+    mode = mode or default_link_mode()
+
+    # 已经是同一个文件时无需任何操作
+    try:
+        src_stat = os.stat(src)
+    except OSError:
+        src_stat = None
+    try:
+        dst_stat = os.stat(dst)
+        if src_stat and (src_stat.st_dev, src_stat.st_ino) == (dst_stat.st_dev, dst_stat.st_ino):
+            return "hardlink"
+    except OSError:
+        pass
+
+    tmp = dst.with_name(f".{dst.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    attempts = {"auto": ("reflink", "hardlink", "copy"), "reflink": ("reflink", "copy"),
+                "hardlink": ("hardlink", "copy"), "copy": ("copy",)}[mode]
+    try:
+        tmp.unlink()
+    except FileNotFoundError:
+        pass
+
+    for method in attempts:
+        # 已知不支持reflink的文件系统不再逐个文件尝试（每次尝试都要创建并删除一个临时文件）
+        if method == "reflink" and src_stat and src_stat.st_dev in _no_reflink_devices:
+            continue
+        try:
+            if method == "reflink":
+                reflink(src, tmp)
+            elif method == "hardlink":
+                os.link(src, tmp)
+            else:
+                kernel_copy(src, tmp)
+            os.replace(tmp, dst)
+            link_stats[method] += 1
+            return method
+        except OSError as e:
+            if method == "reflink" and src_stat and e.errno in REFLINK_UNSUPPORTED:
+                _no_reflink_devices.add(src_stat.st_dev)
+            try:
+                tmp.unlink()
+            except OSError:
+                pass
+            if method == "copy":
+                raise
+    return "copy"
+
+
+@contextmanager
+def rewrite_lock(path: Path):
+    """重写或替换 path 期间持有的锁：进程内互斥 + 所在目录的跨进程文件锁"""
+    directory = Path(path).parent
+    with _rewrite_mutex:
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / REWRITE_LOCK_NAME, "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def break_link(path: Path) -> bool:
+    """如果文件与其它路径共享inode（硬链接），先删除这个名字，返回是否断开
+
+    ffmpeg -y 会截断并就地重写输出文件；不断开的话会同时改写demos中的副本。
+    未共享的文件更新修改时间，标记即将重写：后台压缩在同一把锁下核对inode/大小/修改时间，
+    发现变化就放弃替换，不会用旧内容覆盖新的渲染结果。
+    """
+    with rewrite_lock(path):
+        try:
+            if Path(path).stat().st_nlink > 1:
+                Path(path).unlink()
+                return True
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+    return False
+
+
+def _shared_extents(path: Path) -> Set[Tuple[int, int]]:
+    """通过FIEMAP取出文件中标记为共享的物理extent (物理地址, 长度)"""
+    extents: Set[Tuple[int, int]] = set()
+    if fcntl is None or not sys.platform.startswith("linux"):
+        return extents
+
+    batch = 64
+    start = 0
+    with open(path, "rb") as f:
+        while True:
+            buf = bytearray(FIEMAP_HEADER.size + FIEMAP_EXTENT.size * batch)
+            FIEMAP_HEADER.pack_into(buf, 0, start, 0xFFFFFFFFFFFFFFFF, 0, 0, batch, 0)
+            try:
+                fcntl.ioctl(f.fileno(), FS_IOC_FIEMAP, buf)
+            except OSError:
+                return extents
+            mapped = FIEMAP_HEADER.unpack_from(buf, 0)[3]
+            if mapped == 0:
+                return extents
+            last = False
+            for i in range(mapped):
+                logical, physical, length, _, _, flags, _, _, _ = FIEMAP_EXTENT.unpack_from(
+                    buf, FIEMAP_HEADER.size + i * FIEMAP_EXTENT.size)
+                if flags & FIEMAP_EXTENT_SHARED:
+                    extents.add((physical, length))
+                start = logical + length
+                last = last or bool(flags & FIEMAP_EXTENT_LAST)
+            if last:
+                return extents
+
+
+def storage_report(directories: Iterable[Path], pattern: str = "*.mp4") -> Dict[str, int]:
+    """统计目录下视频文件的表观大小和去重后的实际占用
+
+    硬链接按 (设备, inode) 去重；reflink按共享物理extent去重（仅Linux）。
+    """
+    seen_inodes: Set[Tuple[int, int]] = set()
+    shared: Set[Tuple[int, int, int]] = set()
+    report = {"files": 0, "apparent_bytes": 0, "stored_bytes": 0,
+              "hardlink_saved_bytes": 0, "reflink_saved_bytes": 0}
+
+    for directory in directories:
+        directory = Path(directory)
+        if not directory.exists():
+            continue
+        for path in directory.rglob(pattern):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            report["files"] += 1
+            report["apparent_bytes"] += st.st_size
+
+            key = (st.st_dev, st.st_ino)
+            if key in seen_inodes:
+                report["hardlink_saved_bytes"] += st.st_size
+                continue
+            seen_inodes.add(key)
+
+            # 已被其它文件引用过的共享extent不再计入实际占用
+            duplicated = 0
+            for physical, length in _shared_extents(path):
+                extent = (st.st_dev, physical, length)
+                if extent in shared:
+                    duplicated += length
+                else:
+                    shared.add(extent)
+            duplicated = min(duplicated, st.st_size)
+            report["reflink_saved_bytes"] += duplicated
+            report["stored_bytes"] += st.st_size - duplicated
+
+    report["saved_bytes"] = report["hardlink_saved_bytes"] + report["reflink_saved_bytes"]
+    return report
+
+
+def print_storage_report(report: Dict[str, int]):
+    mb = 1024 * 1024
+    print("💾 存储报告:")
+    print(f"  文件数: {report['files']}")
+    print(f"  表观大小: {report['apparent_bytes'] / mb:.2f} MB")
+    print(f"  实际占用: {report['stored_bytes'] / mb:.2f} MB")
+    print(f"  节省: {report['saved_bytes'] / mb:.2f} MB "
+          f"(硬链接 {report['hardlink_saved_bytes'] / mb:.2f} MB, reflink {report['reflink_saved_bytes'] / mb:.2f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report bytes saved by linked preview/demo copies")
+    parser.add_argument("--project-root", default=".", help="Project root directory")
+
+    args = parser.parse_args()
+
+    root = Path(args.project_root)
+    print_storage_report(storage_report([root / "previews", root / "demos"]))
+
+
+if __name__ == "__main__":
+    main()
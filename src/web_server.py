@@ -6,10 +6,49 @@ Web界面预览生成的特效
 
 import os
 import json
+import time
+import uuid
 from pathlib import Path
-from flask import Flask, render_template, jsonify, send_file, request
+from flask import Flask, Response, g, render_template, jsonify, send_file, request
 from typing import Dict, List, Any
 
+try:
+    from preview_thumbnails import THUMBNAIL_MAX_AGE
+    from render_queue import RenderExecutor, RenderQueue, PRIORITY_BATCH, PRIORITY_INTERACTIVE, default_queue_path
+    from render_failures import NegativeCache, default_failure_cache_path
+    from media_index import MediaIndex, watch_indexes
+    from storage_manager import AccessLog, StorageManager, default_access_log_path
+    from effect_catalog import EffectCatalog, parse_effect_info
+    from effect_generator import SUBTYPE_KEYS
+    from http_cache import conditional_response, file_version, json_response, send_cached_file, versioned_url
+    from event_stream import EventBus
+    from compression import CompressedBodyCache, compress_response, precompress_static, send_static
+    from metrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE, EVENT_SUBSCRIBERS, HTTP_IN_FLIGHT, REGISTRY,
+                         DiskUsage, collect_cache, collect_disk_usage, collect_queue, observe_request)
+    from listing import DEMO_MATCH_FIELDS, DEMO_SORT_FIELDS, ListingError, SortedView, paginate, parse_query, wants_page
+    from zip_export import export_filename, export_files, stream_zip
+    from preview_manager import PreviewManager
+except ImportError:
+    from src.preview_thumbnails import THUMBNAIL_MAX_AGE
+    from src.render_queue import RenderExecutor, RenderQueue, PRIORITY_BATCH, PRIORITY_INTERACTIVE, default_queue_path
+    from src.render_failures import NegativeCache, default_failure_cache_path
+    from src.media_index import MediaIndex, watch_indexes
+    from src.storage_manager import AccessLog, StorageManager, default_access_log_path
+    from src.effect_catalog import EffectCatalog, parse_effect_info
+    from src.effect_generator import SUBTYPE_KEYS
+    from src.http_cache import conditional_response, file_version, json_response, send_cached_file, versioned_url
+    from src.event_stream import EventBus
+    from src.compression import CompressedBodyCache, compress_response, precompress_static, send_static
+    from src.metrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE, EVENT_SUBSCRIBERS, HTTP_IN_FLIGHT, REGISTRY,
+                             DiskUsage, collect_cache, collect_disk_usage, collect_queue, observe_request)
+    from src.listing import DEMO_MATCH_FIELDS, DEMO_SORT_FIELDS, ListingError, SortedView, paginate, parse_query, wants_page
+    from src.zip_export import export_filename, export_files, stream_zip
+    from src.preview_manager import PreviewManager
+
+
+# 批量详情一次最多请求的特效ID数（整个风格不受限制）
+MAX_DETAIL_IDS = 1000
+
 
 class EffectPreviewServer:
     def __init__(self, project_root: str):
@@ -20,7 +59,38 @@ class EffectPreviewServer:
         
         # 设置Flask配置
         self.app.config['SECRET_KEY'] = 'kdenlive-effect-generator-secret'
-        self.app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0  # 禁用缓存
+        self.app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0  # 静态文件每次重新验证；预览/demo/XML见 http_cache
+        
+        self._render_queue = None
+        # 后台渲染执行器（有 start() 即可；ASGI服务替换为基于子进程的异步执行器）
+        self.render_executor = None
+        
+        # demos/ 增量索引：列表接口只读取上次请求之后的变更
+        self.preview_index = MediaIndex(self.project_root / "previews")
+        self.demo_index = MediaIndex(self.project_root / "demos")
+        self._index_observer = None
+        
+        # 预览/demo的最后访问时间，容量预算按最久未访问优先淘汰
+        self.access_log = AccessLog(str(default_access_log_path(self.project_root)))
+        
+        # 风格/特效/预览状态的内存目录：启动时构建一次，列表接口直接返回缓存的JSON
+        self.catalog = EffectCatalog(self.project_root).build()
+        self._catalog_observer = None
+        
+        # 服务端推送事件（/api/events）：特效生成、渲染进度和预览完成
+        self.events = EventBus()
+        self.catalog.listener = self.events.publish
+        
+        # JSON/XML响应按Accept-Encoding压缩（压缩结果按ETag缓存）；静态文件优先发送预压缩的 .br/.gz
+        self.compressed_cache = CompressedBodyCache()
+        self.app.after_request(lambda response: compress_response(response, self.compressed_cache))
+        self.app.view_functions["static"] = lambda filename: send_static(self.app.static_folder, filename)
+        
+        # 运行指标（/metrics）：每个请求记录路由模板、状态码和到响应头的耗时
+        self.disk_usage = DiskUsage(self.project_root)
+        self.app.before_request(self._metrics_before_request)
+        self.app.after_request(self._metrics_after_request)
+        self.app.teardown_request(self._metrics_teardown_request)
         
         self.setup_routes()
     
@@ -34,89 +104,133 @@ class EffectPreviewServer:
         
         @self.app.route('/api/styles')
         def get_styles():
-            """获取所有风格"""
-            effects_dir = self.project_root / "effects"
-            styles = []
-            
-            if effects_dir.exists():
-                for style_dir in effects_dir.iterdir():
-                    if style_dir.is_dir():
-                        effect_count = len(list(style_dir.glob("*.xml")))
-                        preview_dir = self.project_root / "previews" / style_dir.name
-                        preview_count = len(list(preview_dir.glob("*.mp4"))) if preview_dir.exists() else 0
-                        
-                        styles.append({
-                            "name": style_dir.name,
-                            "effect_count": effect_count,
-                            "preview_count": preview_count
-                        })
-            
-            return jsonify(styles)
+            """获取所有风格（内存目录中预先序列化的JSON，未变化时返回304）"""
+            body = self.catalog.styles_json()
+            return json_response(body, self.catalog.etag())
         
         @self.app.route('/api/effects/<style>')
         def get_effects_by_style(style):
-            """获取指定风格的特效列表"""
-            effects_dir = self.project_root / "effects" / style
-            previews_dir = self.project_root / "previews" / style
-            
-            effects = []
+            """获取指定风格的特效列表（内存目录中预先序列化的JSON）
             
-            if effects_dir.exists():
-                for effect_file in effects_dir.glob("*.xml"):
-                    preview_file = previews_dir / f"{effect_file.stem}_preview.mp4"
-                    
-                    # 读取特效信息
-                    effect_info = self._parse_effect_info(effect_file)
-                    
-                    effects.append({
-                        "id": effect_file.stem,
-                        "name": effect_info.get("name", effect_file.stem),
-                        "description": effect_info.get("description", ""),
-                        "author": effect_info.get("author", ""),
-                        "effect_file": f"effects/{style}/{effect_file.name}",
-                        "preview_file": f"previews/{style}/{preview_file.name}" if preview_file.exists() else None,
-                        "has_preview": preview_file.exists()
-                    })
-            
-            return jsonify(effects)
+            带 limit/cursor/sort/过滤参数时返回一页：{"items", "next_cursor", "total", "limit"}
+            """
+            if not wants_page(request.args, SUBTYPE_KEYS + ("author",)):
+                body = self.catalog.style_json(style)
+                return json_response(body, self.catalog.etag(style))
+            try:
+                return conditional_response(jsonify(self.catalog.page(style, request.args)))
+            except ListingError as e:
+                return jsonify({"error": str(e)}), 400
         
         @self.app.route('/api/effect/<style>/<effect_id>')
         def get_effect_details(style, effect_id):
-            """获取特效详细信息"""
+            """获取特效详细信息（元数据取自内存目录，只读取XML原文）"""
+            effect = self.catalog.get_effect(style, effect_id)
             effect_file = self.project_root / "effects" / style / f"{effect_id}.xml"
             
-            if not effect_file.exists():
+            if effect is None or not effect_file.exists():
                 return jsonify({"error": "Effect not found"}), 404
             
             # 读取XML内容
             with open(effect_file, 'r', encoding='utf-8') as f:
                 xml_content = f.read()
             
-            effect_info = self._parse_effect_info(effect_file)
+            effect_info = dict(effect["_info"])
             effect_info["xml_content"] = xml_content
             
             return jsonify(effect_info)
         
+        @self.app.route('/api/effect_details', methods=['GET', 'POST'])
+        def get_effect_details_batch():
+            """批量获取特效详情，一次请求代替逐个请求 /api/effect/<style>/<effect_id>
+            
+            参数（POST JSON或GET查询参数）：
+            - style: 风格；不带 ids 时返回整个风格
+            - ids: 特效ID列表（GET时逗号分隔），可写成 "风格/特效ID" 跨风格选取
+            - fields: "metadata"（默认）、"all"（再加 xml_content）或字段名列表（可包含 xml_content）
+            """
+            if request.method == 'POST':
+                data = request.get_json(silent=True) or {}
+            else:
+                data = {k: request.args[k] for k in ('style', 'ids', 'fields') if k in request.args}
+            try:
+                refs, fields, include_xml = self._parse_detail_request(data)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            
+            effects, missing = self.catalog.details(refs, fields, include_xml)
+            response = jsonify({"effects": effects, "missing": missing, "count": len(effects)})
+            return conditional_response(response) if request.method == 'GET' else response
+        
+        @self.app.route('/api/export', methods=['GET', 'POST'])
+        def export_effects():
+            """把风格或选中的特效（previews=1时带预览视频）打包为ZIP，边打包边发送
+            
+            参数与 /api/effect_details 相同（style、ids），不落临时文件，内存占用不随导出大小增长
+            """
+            if request.method == 'POST':
+                data = request.get_json(silent=True) or {}
+            else:
+                data = {k: request.args[k] for k in ('style', 'ids', 'previews') if k in request.args}
+            try:
+                refs, _, _ = self._parse_detail_request(data)
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            
+            effects, missing = self.catalog.details(refs, fields=())
+            if not effects:
+                return jsonify({"error": "No effects selected", "missing": missing}), 404
+            
+            selected = [(e["style"], e["id"]) for e in effects]
+            include_previews = str(data.get("previews", "")).lower() in ("1", "true", "yes")
+            files = export_files(self.project_root, selected, include_previews)
+            response = Response(stream_zip(files), mimetype='application/zip', direct_passthrough=True)
+            response.headers['Content-Disposition'] = f'attachment; filename="{export_filename(selected)}"'
+            response.headers['Cache-Control'] = 'no-store'
+            return response
+        
+        @self.app.route('/metrics')
+        def metrics():
+            """Prometheus文本格式的运行指标（本进程）"""
+            self.collect_metrics()
+            return Response(REGISTRY.render(), content_type=METRICS_CONTENT_TYPE)
+        
         @self.app.route('/preview/<path:filename>')
+        @self.app.route('/previews/<path:filename>')
         def serve_preview(filename):
-            """提供预览视频文件"""
+            """提供预览视频文件（ETag/304，带版本号的URL长期缓存）"""
             file_path = self.project_root / "previews" / filename
             if file_path.exists() and file_path.is_file():
+                self.access_log.touch(f"previews/{filename}")
                 try:
-                    return send_file(str(file_path), mimetype='video/mp4')
+                    return send_cached_file(file_path, mimetype='video/mp4')
                 except Exception as e:
                     return f"Error serving file: {e}", 500
             else:
                 return "File not found", 404
         
+        @self.app.route('/thumbs/<path:filename>')
+        def serve_thumbnail(filename):
+            """提供封面图和雪碧图（URL带版本号，可长期缓存）"""
+            file_path = self.project_root / "previews" / filename
+            if file_path.suffix.lower() not in {'.jpg', '.webp'}:
+                return "File not found", 404
+            if file_path.exists() and file_path.is_file():
+                response = send_file(str(file_path), max_age=THUMBNAIL_MAX_AGE)
+                response.cache_control.public = True
+                response.cache_control.immutable = True
+                return response
+            else:
+                return "File not found", 404
+        
         @self.app.route('/effect/<path:filename>')
         def serve_effect(filename):
             """提供特效XML文件"""
             file_path = self.project_root / "effects" / filename
             if file_path.exists() and file_path.is_file():
                 try:
-                    return send_file(str(file_path), as_attachment=True, 
-                                   mimetype='application/xml')
+                    return send_cached_file(file_path, as_attachment=True, 
+                                            mimetype='application/xml')
                 except Exception as e:
                     return f"Error serving file: {e}", 500
             else:
@@ -137,6 +251,7 @@ class EffectPreviewServer:
                 from src.effect_generator import EffectGenerator
                 generator = EffectGenerator(str(self.project_root))
                 generated_files = generator.generate_effects(style, count)
+                self.catalog.refresh_style(style)
                 
                 return jsonify({
                     "success": True,
@@ -157,6 +272,18 @@ class EffectPreviewServer:
             if not style or not effect_id:
                 return jsonify({"error": "Style and effect_id are required"}), 400
             
+            if not data.get('sync'):
+                # 入队后立即返回202，由后台渲染线程（或独立的worker进程）渲染
+                job = self._get_render_queue().enqueue(style, effect_id, PRIORITY_INTERACTIVE)
+                self._start_render_executor()
+                return jsonify({
+                    "success": True,
+                    "queued": True,
+                    "job_id": job["id"],
+                    "status_url": f"/api/jobs/{job['id']}",
+                    "job": job
+                }), 202
+            
             try:
                 from src.preview_generator import PreviewGenerator
                 generator = PreviewGenerator(str(self.project_root))
@@ -168,12 +295,17 @@ class EffectPreviewServer:
                 output_file.parent.mkdir(parents=True, exist_ok=True)
                 
                 # 渲染预览视频，同时保存到demos目录
-                success = generator.render_preview(effect_file, output_file, save_demo=True)
+                result = generator.render_preview(effect_file, output_file, save_demo=True)
+                success = result.success
+                self.catalog.refresh_style(style)
                 
                 return jsonify({
                     "success": success,
                     "preview_file": f"previews/{style}/{effect_id}_preview.mp4" if success else None,
-                    "demo_file": f"demos/{style}_{effect_id}_demo.mp4" if success else None
+                    "preview_url": versioned_url(f"previews/{style}/{effect_id}_preview.mp4",
+                                                 file_version(output_file)) if success else None,
+                    "demo_file": f"demos/{style}_{effect_id}_demo.mp4" if success else None,
+                    "failure": result.failure
                 })
             
             except Exception as e:
@@ -188,12 +320,36 @@ class EffectPreviewServer:
             if not style:
                 return jsonify({"error": "Style is required"}), 400
             
+            if not data.get('sync'):
+                effects_dir = self.project_root / "effects" / style
+                if not effects_dir.exists():
+                    return jsonify({"error": f"Style directory not found: {style}"}), 404
+                
+                # 每个特效一个任务，共享同一个batch_id
+                render_queue = self._get_render_queue()
+                batch_id = uuid.uuid4().hex
+                jobs = [render_queue.enqueue(style, effect_file.stem, PRIORITY_BATCH, batch_id)
+                        for effect_file in sorted(effects_dir.glob("*.xml"))]
+                
+                self._start_render_executor()
+                
+                return jsonify({
+                    "success": True,
+                    "queued": True,
+                    "job_id": batch_id,
+                    "batch_id": batch_id,
+                    "status_url": f"/api/jobs/{batch_id}",
+                    "job_ids": [job["id"] for job in jobs],
+                    "total_effects": len(jobs)
+                }), 202
+            
             try:
                 from src.preview_generator import PreviewGenerator
                 generator = PreviewGenerator(str(self.project_root))
                 
                 # 生成该风格的所有预览
                 generated_count = generator.generate_previews_for_style(style)
+                self.catalog.refresh_style(style)
                 
                 # 统计总特效数
                 effects_dir = self.project_root / "effects" / style
@@ -209,93 +365,127 @@ class EffectPreviewServer:
             except Exception as e:
                 return jsonify({"error": str(e)}), 500
         
+        @self.app.route('/api/jobs/<job_id>', methods=['GET', 'DELETE'])
+        def job_status(job_id):
+            """任务（单个预览）或批次的状态和逐个特效的结果
+
+            DELETE取消待处理和正在渲染的任务（渲染进程在约1秒内被终止）；已经结束的任务返回409
+            """
+            render_queue = self._get_render_queue()
+            cancelled = 0
+            if request.method == 'DELETE':
+                job = render_queue.get(job_id)
+                cancelled = render_queue.cancel(job_id) if job else render_queue.cancel_batch(job_id)
+                if cancelled and job:
+                    self.events.publish("job-updated", {"job_id": job_id, "batch_id": job["batch_id"],
+                                                        "batch_ids": job["batch_ids"],
+                                                        "style": job["style"], "effect_id": job["effect_id"],
+                                                        "state": "cancelled"})
+                elif cancelled:
+                    self.events.publish("job-updated", {"job_id": None, "batch_id": job_id, "state": "cancelled"})
+            
+            status = render_queue.describe(job_id)
+            if status is None:
+                return jsonify({"error": f"Job not found: {job_id}"}), 404
+            if request.method == 'DELETE' and not cancelled:
+                return jsonify(dict(status, error=f"Job already {status['status']}, nothing to cancel")), 409
+            return jsonify(status)
+        
+        @self.app.route('/api/events')
+        def event_stream():
+            """服务端推送事件（SSE）；断线重连时浏览器带 Last-Event-ID，补发错过的事件"""
+            last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+            return Response(self.events.stream(last_event_id), mimetype='text/event-stream',
+                            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        
+        @self.app.route('/api/queue')
+        def get_queue_stats():
+            """获取渲染队列统计"""
+            return jsonify(self._get_render_queue().stats())
+        
+        @self.app.route('/api/failures')
+        def get_render_failures():
+            """获取渲染失败分类计数和当前的负缓存记录"""
+            cache = NegativeCache(str(default_failure_cache_path(self.project_root)))
+            return jsonify({
+                "counters": cache.counters(),
+                "entries": cache.list_entries()
+            })
+        
         @self.app.route('/api/demos')
         def get_demos():
             """获取所有demo视频列表"""
-            demos_dir = self.project_root / "demos"
             demos = []
             
-            if demos_dir.exists():
-                for demo_file in demos_dir.glob("*.mp4"):
-                    # 解析文件名格式: {style}_{effect_id}_demo.mp4
-                    name_parts = demo_file.stem.replace("_demo", "").split("_", 1)
-                    if len(name_parts) >= 2:
-                        style = name_parts[0]
-                        effect_id = name_parts[1]
-                    else:
-                        style = "unknown"
-                        effect_id = demo_file.stem
-                    
-                    demos.append({
-                        "filename": demo_file.name,
-                        "style": style,
-                        "effect_id": effect_id,
-                        "path": f"demos/{demo_file.name}",
-                        "size": demo_file.stat().st_size if demo_file.exists() else 0,
-                        "created": demo_file.stat().st_mtime if demo_file.exists() else 0
-                    })
+            for key, entry in self.demo_index.items():
+                # 只列出demos根目录下的文件
+                if "/" in key:
+                    continue
+                stem = Path(key).stem
+                # 解析文件名格式: {style}_{effect_id}_demo.mp4
+                name_parts = stem.replace("_demo", "").split("_", 1)
+                if len(name_parts) >= 2:
+                    style = name_parts[0]
+                    effect_id = name_parts[1]
+                else:
+                    style = "unknown"
+                    effect_id = stem
+                
+                demos.append({
+                    "filename": key,
+                    "style": style,
+                    "effect_id": effect_id,
+                    "path": f"demos/{key}",
+                    "size": entry["size"],
+                    "created": entry["mtime"]
+                })
+            
+            if wants_page(request.args, DEMO_MATCH_FIELDS):
+                try:
+                    query = parse_query(request.args, DEMO_SORT_FIELDS, "created", "desc", DEMO_MATCH_FIELDS)
+                except ListingError as e:
+                    return jsonify({"error": str(e)}), 400
+                view = SortedView(demos, query["sort"], DEMO_SORT_FIELDS, "filename", query["order"])
+                return conditional_response(
+                    jsonify(paginate(view, query, search_fields=("filename", "style", "effect_id"))))
             
             # 按创建时间排序
             demos.sort(key=lambda x: x["created"], reverse=True)
-            return jsonify(demos)
+            return conditional_response(jsonify(demos))
 
         @self.app.route('/demos/<path:filename>')
         def serve_demo(filename):
             """提供demo视频文件"""
             demos_dir = self.project_root / "demos"
-            return send_file(demos_dir / filename)
+            if not (demos_dir / filename).is_file():
+                return "File not found", 404
+            self.access_log.touch(f"demos/{filename}")
+            return send_cached_file(demos_dir / filename)
+        
+        @self.app.route('/api/storage')
+        def get_storage_budget():
+            """容量预算的预演报告：当前占用以及按最久未访问顺序将被淘汰的文件"""
+            manager = StorageManager(str(self.project_root), access_log=self.access_log)
+            budget_mb = request.args.get('budget_mb', type=float)
+            budget = int(budget_mb * 1024 * 1024) if budget_mb is not None else None
+            report = manager.enforce(budget, dry_run=True)
+            report["pins"] = self.access_log.pins()
+            return jsonify(report)
+        
+        @self.app.route('/api/storage/pin', methods=['POST', 'DELETE'])
+        def pin_storage():
+            """固定（POST）或取消固定（DELETE）匹配的预览/demo文件"""
+            pattern = (request.get_json(silent=True) or {}).get('pattern')
+            if not pattern:
+                return jsonify({"error": "pattern is required"}), 400
+            if request.method == 'DELETE':
+                return jsonify({"success": self.access_log.unpin(pattern), "pattern": pattern})
+            return jsonify({"success": self.access_log.pin(pattern), "pattern": pattern})
 
         # ...existing code...
     
-    def _parse_effect_info(self, effect_file: Path) -> Dict[str, Any]:
-        """解析特效XML文件获取基本信息"""
-        try:
-            import xml.etree.ElementTree as ET
-            tree = ET.parse(effect_file)
-            root = tree.getroot()
-            
-            info = {
-                "id": root.get("id", ""),
-                "name": "",
-                "description": "",
-                "author": ""
-            }
-            
-            # 提取名称
-            name_elem = root.find("n")
-            if name_elem is not None:
-                info["name"] = name_elem.text or ""
-            
-            # 提取描述
-            desc_elem = root.find("description")
-            if desc_elem is not None:
-                info["description"] = desc_elem.text or ""
-            
-            # 提取作者
-            author_elem = root.find("author")
-            if author_elem is not None:
-                info["author"] = author_elem.text or ""
-            
-            return info
-        
-        except Exception as e:
-            return {
-                "id": effect_file.stem,
-                "name": effect_file.stem,
-                "description": f"Error parsing XML: {e}",
-                "author": "Unknown"
-            }
-    
-    def run(self, host='localhost', port=5000, debug=True):
-        """启动服务器"""
-        print(f"Starting Effect Preview Server at http://{host}:{port}")
-        print(f"Project root: {self.project_root}")
-        
-        # 确保目录存在
-        (self.project_root / "previews").mkdir(exist_ok=True)
-        (self.project_root / "effects").mkdir(exist_ok=True)
-        
-        # 添加CORS支持和错误处理
+    def setup_hooks(self):
+        """CORS响应头和JSON错误页（开发服务器和ASGI服务共用）"""
         @self.app.after_request
         def after_request(response):
             response.headers.add('Access-Control-Allow-Origin', '*')
@@ -314,8 +504,130 @@ class EffectPreviewServer:
         @self.app.errorhandler(500)
         def internal_error(error):
             return jsonify({"error": "Internal Server Error", "message": str(error)}), 500
+    
+    def _metrics_before_request(self):
+        g.metrics_started = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+    
+    def _metrics_after_request(self, response):
+        started = g.get("metrics_started")
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            observe_request(route, request.method, response.status_code, time.perf_counter() - started)
+        return response
+    
+    def _metrics_teardown_request(self, error=None):
+        if g.pop("metrics_started", None) is not None:
+            HTTP_IN_FLIGHT.dec()
+    
+    def collect_metrics(self):
+        """抓取时才读取的指标：渲染队列深度、缓存命中、事件流订阅者和磁盘占用"""
+        collect_queue(self._get_render_queue())
+        collect_cache("compressed_body", self.compressed_cache.stats)
+        collect_cache("effect_metadata", self.catalog.stats, hits="reused", misses="parses")
+        EVENT_SUBSCRIBERS.set(self.events.stats["subscribers"])
+        collect_disk_usage(self.disk_usage)
+    
+    def _get_render_queue(self) -> RenderQueue:
+        """延迟创建渲染队列（SQLite）"""
+        if self._render_queue is None:
+            self._render_queue = RenderQueue(str(default_queue_path(self.project_root)))
+        return self._render_queue
+    
+    def _start_render_executor(self):
+        """首次提交渲染任务时启动后台渲染线程（RENDER_EXECUTOR_WORKERS=0时只入队）"""
+        if self.render_executor is None:
+            self.render_executor = RenderExecutor(str(self.project_root), self._get_render_queue())
+            self.render_executor.worker.job_listener = self._on_job_event
+        self.render_executor.start()
+    
+    def _on_job_event(self, event_type: str, data: Dict[str, Any]):
+        """后台渲染的任务事件：成功时先刷新目录（发出preview-ready），再推送任务状态"""
+        if event_type == "job-updated" and data["state"] == "succeeded":
+            self.catalog.refresh_style(data["style"])
+        self.events.publish(event_type, data)
+    
+    def _parse_detail_request(self, data: Dict[str, Any]):
+        """批量详情请求 → ([(风格, 特效ID或None)], 元数据字段或None, 是否包含XML)"""
+        style = data.get("style")
+        ids = data.get("ids")
+        if isinstance(ids, str):
+            ids = [i for i in ids.split(",") if i]
+        if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, str) for i in ids)):
+            raise ValueError("ids must be a list of effect ids")
+        if ids is None and not style:
+            raise ValueError("style or ids is required")
+        if ids is not None and len(ids) > MAX_DETAIL_IDS:
+            raise ValueError(f"at most {MAX_DETAIL_IDS} ids per request")
+        
+        refs = []
+        for effect_id in ids if ids is not None else [None]:
+            if effect_id is not None and "/" in effect_id:
+                refs.append(tuple(effect_id.split("/", 1)))
+            elif style:
+                refs.append((style, effect_id))
+            else:
+                raise ValueError(f"style is required for id '{effect_id}'")
+        
+        fields = data.get("fields", "metadata")
+        if isinstance(fields, str) and "," in fields:
+            fields = fields.split(",")
+        if fields == "metadata":
+            return refs, None, False
+        if fields == "all":
+            return refs, None, True
+        if isinstance(fields, str):
+            fields = [fields]
+        if not isinstance(fields, list):
+            raise ValueError("fields must be 'metadata', 'all' or a list of field names")
+        return refs, [f for f in fields if f != "xml_content"], "xml_content" in fields
+    
+    def _parse_effect_info(self, effect_file: Path) -> Dict[str, Any]:
+        """解析特效XML文件获取基本信息"""
+        return parse_effect_info(effect_file)
+    
+    def run(self, host='localhost', port=5000, debug=True):
+        """启动服务器"""
+        print(f"Starting Effect Preview Server at http://{host}:{port}")
+        print(f"Project root: {self.project_root}")
+        
+        self.start_background()
+        self.setup_hooks()
         
         self.app.run(host=host, port=port, debug=debug, threaded=True)
+    
+    def start_background(self):
+        """启动时的准备工作和后台任务：预压缩、目录监听、恢复未完成的渲染、冷预览压缩"""
+        # 确保目录存在
+        (self.project_root / "previews").mkdir(exist_ok=True)
+        (self.project_root / "effects").mkdir(exist_ok=True)
+        
+        # 静态文件预压缩（只处理修改过的文件）
+        precompressed = precompress_static(Path(self.app.static_folder))
+        if precompressed:
+            print(f"🗜️  Precompressed {precompressed} static file(s)")
+        
+        # 有watchdog时监听目录，手动拷入/删除的文件也能进入索引
+        if os.getenv("MEDIA_INDEX_WATCH", "1") != "0":
+            self._index_observer = watch_indexes([self.preview_index, self.demo_index])
+            if self._index_observer:
+                print("👀 Watching previews/ and demos/ for index updates")
+            self._catalog_observer = self.catalog.watch()
+            if self._catalog_observer:
+                print("👀 Watching effects/ and previews/ for catalog updates")
+        
+        # 继续渲染上次退出时队列中未完成的任务
+        queue_stats = self._get_render_queue().stats()
+        if queue_stats["pending"] or queue_stats["running"]:
+            self._start_render_executor()
+        
+        # 冷预览后台压缩（间隔小时数，0表示关闭）
+        compaction_hours = float(os.getenv("PREVIEW_COMPACTION_INTERVAL_HOURS", "0"))
+        if compaction_hours > 0:
+            PreviewManager(str(self.project_root)).start_background_compaction(
+                compaction_hours * 3600, float(os.getenv("PREVIEW_COMPACTION_COLD_DAYS", "7")),
+                max_seconds=compaction_hours * 3600 / 2)
+            print(f"🗜️  Background preview compaction every {compaction_hours:g}h")
 
 
 def main():
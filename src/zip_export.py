@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Zip Export - 把一个风格或选中的特效（可选带预览视频）打包为ZIP，边生成边发送
+不写临时文件、不在内存中拼接整个压缩包：每读一块源文件就把压缩结果交给响应，内存占用与导出大小无关。
+XML用deflate压缩；MP4/缩略图本身已压缩，按 stored 原样写入，不浪费CPU
+"""
+
+import os
+import sys
+import json
+import time
+import zipfile
+import argparse
+from pathlib import Path
+from typing import IO, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+# 每次读取源文件的字节数（也是每次交给响应的数据量上限）
+CHUNK_SIZE = 256 * 1024
+# 已压缩的格式直接存储
+STORED_SUFFIXES = (".mp4", ".webm", ".jpg", ".jpeg", ".webp", ".png", ".zip")
+
+
+class _ZipSink:
+    """ZipFile写入的目标：只暂存上一次取走之后写入的字节（不可seek，ZipFile改用数据描述符）"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        if data:
+            self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> Iterator[bytes]:
+        if self._chunks:
+            data = b"".join(self._chunks)
+            self._chunks = []
+            yield data
+
+
+def _zip_info(arcname: str, st: os.stat_result) -> zipfile.ZipInfo:
+    """按已打开文件的fstat结果生成ZipInfo（与 ZipInfo.from_file 相同的字段，但不再按路径stat）"""
+    # ZIP的时间戳从1980年开始；文件大小用于判断是否需要ZIP64
+    date_time = max(time.localtime(st.st_mtime)[:6], (1980, 1, 1, 0, 0, 0))
+    info = zipfile.ZipInfo(arcname, date_time)
+    info.external_attr = (st.st_mode & 0xFFFF) << 16
+    info.file_size = st.st_size
+    return info
+
+
+def select_effects(project_root: Path, style: Optional[str] = None,
+                   ids: Optional[Sequence[str]] = None) -> List[Tuple[str, str]]:
+    """命令行的选择：整个风格或特效ID列表（"风格/特效ID" 可跨风格），返回存在的 (风格, 特效ID)"""
+    effects_dir = Path(project_root) / "effects"
+    if not ids:
+        if not style:
+            raise ValueError("style or ids is required")
+        return [(style, p.stem) for p in sorted((effects_dir / style).glob("*.xml"))]
+
+    refs = []
+    for effect_id in ids:
+        ref_style, _, ref_id = effect_id.rpartition("/")
+        ref_style = ref_style or style
+        if not ref_style:
+            raise ValueError(f"style is required for id '{effect_id}'")
+        if (effects_dir / ref_style / f"{ref_id}.xml").is_file():
+            refs.append((ref_style, ref_id))
+        else:
+            # 输出到stderr，导出到标准输出时不混入ZIP数据
+            print(f"⚠️  Effect not found: {ref_style}/{ref_id}", file=sys.stderr)
+    return refs
+
+
+def export_files(project_root: Path, refs: Iterable[Tuple[str, str]],
+                 include_previews: bool = False) -> List[Tuple[str, Path]]:
+    """要打包的文件 (包内路径, 源文件)：<风格>/<特效ID>.xml，带预览时再加 <风格>/previews/<特效ID>_preview.mp4"""
+    project_root = Path(project_root)
+    files = []
+    for style, effect_id in refs:
+        files.append((f"{style}/{effect_id}.xml", project_root / "effects" / style / f"{effect_id}.xml"))
+        if include_previews:
+            preview = project_root / "previews" / style / f"{effect_id}_preview.mp4"
+            if preview.is_file():
+                files.append((f"{style}/previews/{preview.name}", preview))
+    return files
+
+
+def stream_zip(files: Iterable[Tuple[str, Path]], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """逐块生成ZIP字节；最后写入 manifest.json（实际打包的文件列表）
+
+    导出过程中被删除的文件跳过；大于4 GB的条目自动使用ZIP64。
+    """
+    sink = _ZipSink()
+    manifest = []
+    with zipfile.ZipFile(sink, "w", allowZip64=True) as zf:
+        for arcname, path in files:
+            try:
+                source = open(path, "rb")
+            except FileNotFoundError:
+                continue
+            with source:
+                # 打开后文件可能被删除或替换，元数据取自已打开的文件
+                info = _zip_info(arcname, os.fstat(source.fileno()))
+                if path.suffix.lower() in STORED_SUFFIXES:
+                    info.compress_type = zipfile.ZIP_STORED
+                else:
+                    info.compress_type = zipfile.ZIP_DEFLATED
+                with zf.open(info, "w") as target:
+                    while True:
+                        data = source.read(chunk_size)
+                        if not data:
+                            break
+                        target.write(data)
+                        yield from sink.drain()
+            yield from sink.drain()
+            manifest.append({"path": arcname, "size": info.file_size})
+
+        body = json.dumps({"exported_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "files": manifest},
+                          ensure_ascii=False, indent=2)
+        zf.writestr("manifest.json", body, compress_type=zipfile.ZIP_DEFLATED)
+    yield from sink.drain()
+
+
+def export_filename(refs: Sequence[Tuple[str, str]]) -> str:
+    """下载文件名：单一风格时为 effects-<风格>.zip"""
+    styles = sorted({style for style, _ in refs})
+    return f"effects-{styles[0]}.zip" if len(styles) == 1 else "effects.zip"
+
+
+def write_zip(files: Iterable[Tuple[str, Path]], output: IO[bytes]) -> int:
+    """把导出写入文件或标准输出，返回写入的字节数"""
+    written = 0
+    for chunk in stream_zip(files):
+        output.write(chunk)
+        written += len(chunk)
+    output.flush()
+    return written
+
+
+def export(project_root: Path, style: Optional[str], ids: Optional[Sequence[str]],
+           include_previews: bool = False, output: Optional[str] = None):
+    """命令行导出（main.py export 也调用这里）"""
+    refs = select_effects(project_root, style, ids)
+    if not refs:
+        print("❌ No effects selected", file=sys.stderr)
+        return
+    files = export_files(project_root, refs, include_previews)
+    if output == "-":
+        write_zip(files, sys.stdout.buffer)
+        return
+
+    output_path = Path(output or export_filename(refs))
+    started = time.time()
+    with open(output_path, "wb") as f:
+        written = write_zip(files, f)
+    print(f"📦 Exported {len(refs)} effects ({len(files)} files) to {output_path} "
+          f"({written / 1024 / 1024:.1f} MB, {time.time() - started:.1f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export effects (and previews) as a ZIP archive")
+    parser.add_argument("--project-root", default=".", help="Project root directory")
+    parser.add_argument("--style", help="Export a whole style")
+    parser.add_argument("--ids", help="Comma-separated effect ids (style/id selects across styles)")
+    parser.add_argument("--previews", action="store_true", help="Include preview videos")
+    parser.add_argument("-o", "--output", help="Output file (default: effects-<style>.zip, '-' for stdout)")
+    args = parser.parse_args()
+
+    try:
+        export(Path(args.project_root), args.style, args.ids.split(",") if args.ids else None,
+               args.previews, args.output)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
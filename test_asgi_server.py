@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+测试ASGI版本的Web服务：不需要uvicorn，直接用 scope/receive/send 调用应用
+"""
+
+import sys
+import json
+import asyncio
+import tempfile
+from pathlib import Path
+
+# 添加src目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from src.asgi_server import AsyncEffectPreviewApp
+from src.effect_generator import EffectGenerator
+
+
+PREVIEW_SIZE = 2 * 1024 * 1024 + 17
+PREVIEW = "previews/zoom/zoom_001_preview.mp4"
+
+
+def _make_project(root: Path):
+    (root / "effects").mkdir()
+    EffectGenerator(str(root)).generate_effects("zoom", 3)
+    preview = root / PREVIEW
+    preview.parent.mkdir(parents=True)
+    preview.write_bytes(bytes(range(256)) * (PREVIEW_SIZE // 256) + b"x" * (PREVIEW_SIZE % 256))
+    static = root / "web" / "static"
+    static.mkdir(parents=True)
+    (static / "app.js").write_text("console.log('effects');\n" * 200)
+
+
+async def _request(app, path: str, method: str = "GET", headers=None, body: bytes = b"", query: bytes = b""):
+    """发送一个请求，返回 (状态码, 响应头dict, 正文)"""
+    scope = {"type": "http", "method": method, "path": path, "query_string": query, "http_version": "1.1",
+             "scheme": "http", "server": ("127.0.0.1", 5000), "client": ("127.0.0.1", 40000),
+             "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]}
+    request_sent = asyncio.Event()
+    response = {"status": None, "headers": {}, "body": b""}
+
+    async def receive():
+        if not request_sent.is_set():
+            request_sent.set()
+            return {"type": "http.request", "body": body, "more_body": False}
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {k.decode(): v.decode() for k, v in message["headers"]}
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"], response["body"]
+
+
+def _lifespan(app):
+    """启动/关闭lifespan，返回 (startup, shutdown) 两个协程函数"""
+    inbox: asyncio.Queue = asyncio.Queue()
+    outbox: asyncio.Queue = asyncio.Queue()
+    task = None
+
+    async def startup():
+        nonlocal task
+        task = asyncio.ensure_future(app({"type": "lifespan"}, inbox.get, outbox.put))
+        await inbox.put({"type": "lifespan.startup"})
+        assert (await outbox.get())["type"] == "lifespan.startup.complete"
+
+    async def shutdown():
+        await inbox.put({"type": "lifespan.shutdown"})
+        assert (await outbox.get())["type"] == "lifespan.shutdown.complete"
+        await task
+
+    return startup, shutdown
+
+
+def test_native_routes():
+    """列表JSON（304、压缩）、预览的完整下载和Range、静态文件、交给Flask的路由"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _make_project(root)
+        app = AsyncEffectPreviewApp(str(root))
+
+        async def scenario():
+            startup, shutdown = _lifespan(app)
+            await startup()
+            try:
+                status, headers, body = await _request(app, "/api/styles")
+                assert status == 200 and json.loads(body)[0]["name"] == "zoom"
+                status, _, _ = await _request(app, "/api/styles", headers={"If-None-Match": headers["etag"]})
+                assert status == 304
+
+                status, headers, body = await _request(app, "/api/effects/zoom")
+                assert status == 200 and len(json.loads(body)) == 3
+                effect_id = json.loads(body)[0]["id"]
+
+                status, headers, body = await _request(app, f"/{PREVIEW}")
+                assert status == 200 and len(body) == PREVIEW_SIZE
+                assert headers["content-type"] == "video/mp4" and headers["accept-ranges"] == "bytes"
+                etag = headers["etag"]
+
+                status, headers, body = await _request(app, f"/{PREVIEW}", headers={"Range": "bytes=1000-1999"})
+                assert status == 206 and body == (bytes(range(256)) * 12)[1000 % 256:1000 % 256 + 1000]
+                assert headers["content-range"] == f"bytes 1000-1999/{PREVIEW_SIZE}"
+
+                status, _, body = await _request(app, f"/{PREVIEW}", "HEAD")
+                assert status == 200 and body == b""
+                status, _, _ = await _request(app, f"/{PREVIEW}", headers={"If-None-Match": etag})
+                assert status == 304
+                status, headers, _ = await _request(app, f"/{PREVIEW}", headers={"Range": f"bytes={PREVIEW_SIZE}-"})
+                assert status == 416
+                assert headers["content-range"] == f"bytes */{PREVIEW_SIZE}" and headers["accept-ranges"] == "bytes"
+                status, headers, body = await _request(app, f"/{PREVIEW}", headers={"Range": "bytes=0-9,20-29"})
+                assert status == 206 and headers["content-type"].startswith("multipart/byteranges")
+                status, _, _ = await _request(app, "/previews/../../etc/passwd")
+                assert status == 404
+
+                status, headers, body = await _request(app, "/static/app.js", headers={"Accept-Encoding": "gzip"})
+                assert status == 200 and headers.get("content-encoding") == "gzip"
+                assert headers["vary"] == "Accept-Encoding"
+
+                status, _, body = await _request(app, f"/api/effect/zoom/{effect_id}")
+                assert status == 200 and json.loads(body)["id"] == effect_id
+                status, _, _ = await _request(app, "/api/effect/zoom/missing")
+                assert status == 404
+                assert app.stats["native"] >= 10 and app.stats["wsgi"] == 2
+            finally:
+                await shutdown()
+
+        asyncio.run(scenario())
+
+    print("✅ Listings, previews (full/Range/304/416), static and delegated Flask routes")
+
+
+def test_event_stream():
+    """/api/events 的订阅者是协程；其他线程发布的事件送达，客户端断开后订阅结束"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _make_project(root)
+        app = AsyncEffectPreviewApp(str(root))
+        events = app.server.events
+
+        async def scenario():
+            app._loop = asyncio.get_running_loop()
+            received = []
+            disconnect = asyncio.Event()
+            got_event = asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if message["type"] == "http.response.body":
+                    received.append(message["body"].decode())
+                    if "event: job-updated" in message["body"].decode():
+                        got_event.set()
+
+            scope = {"type": "http", "method": "GET", "path": "/api/events", "query_string": b"", "headers": []}
+            task = asyncio.ensure_future(app(scope, receive, send))
+            await asyncio.sleep(0.05)
+            assert events.stats["subscribers"] == 1
+
+            await asyncio.to_thread(events.publish, "job-updated", {"job_id": "abc", "state": "succeeded"})
+            await asyncio.wait_for(got_event.wait(), 5)
+            disconnect.set()
+            await asyncio.wait_for(task, 5)
+            assert events.stats["subscribers"] == 0
+            return "".join(received)
+
+        stream = asyncio.run(scenario())
+        assert stream.startswith("retry: ")
+        assert f"id: {events.epoch}:1" in stream and '"job_id":"abc"' in stream
+        app.server.access_log.flush()
+
+    print("✅ Event stream delivered across threads and closed on disconnect")
+
+
+if __name__ == "__main__":
+    test_native_routes()
+    test_event_stream()
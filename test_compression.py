@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+测试 Accept-Encoding 协商：JSON响应按客户端接受的编码压缩，静态文件发送预压缩版本
+"""
+
+import os
+import sys
+import gzip
+import json
+import tempfile
+from pathlib import Path
+
+# 添加src目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from flask import Flask
+from werkzeug.http import parse_accept_header
+
+from src.compression import available_encodings, choose_encoding, send_static, static_variant
+from src.web_server import EffectPreviewServer
+from src.effect_generator import EffectGenerator
+
+
+def _choose(header: str, encodings=("br", "gzip")):
+    return choose_encoding(list(encodings), parse_accept_header(header))
+
+
+def test_choose_encoding():
+    assert _choose("gzip, deflate, br") == "br"
+    assert _choose("gzip, deflate") == "gzip"
+    assert _choose("gzip;q=1.0, br;q=0.5") == "gzip"
+    assert _choose("br;q=0, gzip") == "gzip"
+    assert _choose("*") == "br"
+    assert _choose("*;q=0.5, br;q=0") == "gzip"
+    assert _choose("identity") is None
+    assert _choose("") is None
+    assert _choose("gzip, br", encodings=["gzip"]) == "gzip"
+    # 没有安装brotli时不会选择br
+    assert choose_encoding(accept=parse_accept_header("br, gzip")) == available_encodings()[0]
+    print("✅ 按Accept-Encoding的q值选择编码")
+
+
+def test_json_response_negotiation():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / "effects").mkdir()
+        EffectGenerator(str(root)).generate_effects("zoom", 20)
+        server = EffectPreviewServer(str(root))
+        client = server.app.test_client()
+
+        plain = client.get("/api/effects/zoom")
+        assert plain.status_code == 200
+        assert "Content-Encoding" not in plain.headers
+        assert "Accept-Encoding" in plain.headers["Vary"]
+        data = plain.get_data()
+        assert len(data) > 1024
+
+        response = client.get("/api/effects/zoom", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert json.loads(gzip.decompress(response.get_data())) == json.loads(data)
+        etag = response.headers["ETag"]
+        assert etag.startswith('W/')
+
+        # 同一ETag的压缩结果从缓存取，弱ETag的条件请求仍然返回304
+        hits = server.compressed_cache.stats["hits"]
+        again = client.get("/api/effects/zoom", headers={"Accept-Encoding": "gzip"})
+        assert again.get_data() == response.get_data()
+        assert server.compressed_cache.stats["hits"] == hits + 1
+        cached = client.get("/api/effects/zoom", headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+        assert cached.status_code == 304
+
+        # 客户端拒绝所有编码时原样返回
+        refused = client.get("/api/effects/zoom", headers={"Accept-Encoding": "gzip;q=0"})
+        assert "Content-Encoding" not in refused.headers
+        assert refused.get_data() == data
+        server.access_log.flush()
+    print("✅ JSON响应按Accept-Encoding压缩并缓存")
+
+
+def test_static_variants():
+    with tempfile.TemporaryDirectory() as tmp:
+        static = Path(tmp)
+        source = static / "app.js"
+        source.write_text("console.log('effects');\n" * 200, encoding="utf-8")
+        # 预压缩文件直接发送，不需要安装brotli
+        (static / "app.js.br").write_bytes(b"BROTLI")
+        (static / "app.js.gz").write_bytes(gzip.compress(source.read_bytes()))
+
+        assert static_variant(source, parse_accept_header("gzip, br")) == (static / "app.js.br", "br")
+        assert static_variant(source, parse_accept_header("gzip")) == (static / "app.js.gz", "gzip")
+        assert static_variant(source, parse_accept_header("identity")) == (source, None)
+
+        # 原文件比预压缩版本新时不发送旧的压缩文件
+        newer = os.stat(static / "app.js.br").st_mtime + 10
+        os.utime(source, (newer, newer))
+        assert static_variant(source, parse_accept_header("gzip, br")) == (source, None)
+
+        app = Flask(__name__)
+        os.utime(static / "app.js.gz", (newer, newer))
+        with app.test_request_context("/static/app.js", headers={"Accept-Encoding": "gzip, br"}):
+            response = send_static(static, "app.js")
+            response.direct_passthrough = False
+            assert response.headers["Content-Encoding"] == "gzip"
+            assert response.mimetype in ("application/javascript", "text/javascript")
+            assert "Accept-Encoding" in response.headers["Vary"]
+            assert gzip.decompress(response.get_data()) == source.read_bytes()
+            response.close()
+    print("✅ 静态文件发送客户端接受的预压缩版本")
+
+
+if __name__ == "__main__":
+    test_choose_encoding()
+    test_json_response_negotiation()
+    test_static_variants()
+    print("🎉 压缩协商测试通过")
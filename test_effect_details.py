@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+测试批量详情接口：ID数量上限、找不到的ID单独列出、字段选择和跨风格选取
+"""
+
+import sys
+import tempfile
+from pathlib import Path
+
+# 添加src目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from src.web_server import EffectPreviewServer, MAX_DETAIL_IDS
+from src.effect_generator import EffectGenerator
+
+
+def _make_server(root: Path):
+    (root / "effects").mkdir()
+    generator = EffectGenerator(str(root))
+    generator.generate_effects("zoom", 3)
+    generator.generate_effects("blur", 2)
+    server = EffectPreviewServer(str(root))
+    ids = {style: sorted(p.stem for p in (root / "effects" / style).glob("*.xml")) for style in ("zoom", "blur")}
+    return server, ids
+
+
+def test_max_detail_ids():
+    with tempfile.TemporaryDirectory() as tmp:
+        server, ids = _make_server(Path(tmp))
+        client = server.app.test_client()
+
+        at_limit = [f"zoom/missing_{i}" for i in range(MAX_DETAIL_IDS - 1)] + [f"zoom/{ids['zoom'][0]}"]
+        response = client.post("/api/effect_details", json={"ids": at_limit})
+        assert response.status_code == 200
+        assert response.get_json()["count"] == 1
+        assert len(response.get_json()["missing"]) == MAX_DETAIL_IDS - 1
+
+        over = client.post("/api/effect_details", json={"ids": at_limit + ["zoom/one_more"]})
+        assert over.status_code == 400
+        assert str(MAX_DETAIL_IDS) in over.get_json()["error"]
+
+        # GET的逗号分隔列表使用同一上限，导出接口也是
+        query = ",".join(["zoom/x"] * (MAX_DETAIL_IDS + 1))
+        assert client.get(f"/api/effect_details?ids={query}").status_code == 400
+        assert client.get(f"/api/export?ids={query}").status_code == 400
+        server.access_log.flush()
+    print("✅ 超过MAX_DETAIL_IDS返回400")
+
+
+def test_missing_ids_and_fields():
+    with tempfile.TemporaryDirectory() as tmp:
+        server, ids = _make_server(Path(tmp))
+        client = server.app.test_client()
+
+        wanted = [f"zoom/{ids['zoom'][1]}", "zoom/nope", f"blur/{ids['blur'][0]}", "nostyle/x"]
+        data = client.post("/api/effect_details", json={"ids": wanted, "fields": ["name", "xml_content"]}).get_json()
+        assert [(e["style"], e["id"]) for e in data["effects"]] == \
+            [("zoom", ids["zoom"][1]), ("blur", ids["blur"][0])]
+        assert data["missing"] == ["zoom/nope", "nostyle/x"]
+        assert data["count"] == 2
+        assert set(data["effects"][0]) == {"style", "id", "name", "xml_content"}
+        assert data["effects"][0]["xml_content"].lstrip().startswith("<")
+
+        # 整个风格（默认只返回元数据）；不存在的风格列入missing
+        data = client.get("/api/effect_details?style=blur").get_json()
+        assert [e["id"] for e in data["effects"]] == ids["blur"]
+        assert "xml_content" not in data["effects"][0]
+        data = client.get(f"/api/effect_details?style=zoom&ids={ids['zoom'][2]},ghost").get_json()
+        assert [e["id"] for e in data["effects"]] == [ids["zoom"][2]]
+        assert data["missing"] == ["zoom/ghost"]
+        assert client.get("/api/effect_details?style=nostyle").get_json()["missing"] == ["nostyle"]
+
+        # 参数错误
+        assert client.get("/api/effect_details").status_code == 400
+        assert client.post("/api/effect_details", json={"ids": "x"}).status_code == 400
+        assert client.post("/api/effect_details", json={"ids": [1, 2]}).status_code == 400
+        assert client.get("/api/effect_details?ids=no_style_id").status_code == 400
+        assert client.get("/api/export?style=zoom&ids=ghost").status_code == 404
+        server.access_log.flush()
+    print("✅ 找不到的ID列入missing，其余照常返回")
+
+
+if __name__ == "__main__":
+    test_max_detail_ids()
+    test_missing_ids_and_fields()
+    print("🎉 批量详情测试通过")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+测试SSE断线重连：带 Last-Event-ID 补发错过的事件，无法补发时先发送 reset
+"""
+
+import sys
+import json
+import tempfile
+from pathlib import Path
+
+# 添加src目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from src.event_stream import EventBus, RETRY_MS
+from src.web_server import EffectPreviewServer
+
+
+def _parse(messages):
+    """SSE消息 -> [(id, event, data)]，跳过 retry 和注释行"""
+    events = []
+    for message in messages:
+        fields = dict(line.split(": ", 1) for line in message.strip().splitlines() if not line.startswith(":"))
+        if "event" in fields:
+            events.append((fields.get("id"), fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def _read(response, count: int):
+    """读取流式响应的前几条消息后断开（响应体不会自己结束）"""
+    body = response.iter_encoded()
+    messages = [next(body).decode("utf-8") for _ in range(count)]
+    response.close()
+    return messages
+
+
+def test_resume_after_last_event_id():
+    bus = EventBus()
+    first = bus.publish("job-updated", {"job_id": "j1", "status": "running"})
+    bus.publish("job-updated", {"job_id": "j1", "status": "done"})
+    third = bus.publish("preview-ready", {"style": "zoom", "id": "zoom_1"})
+
+    messages, seq = bus.resume(first)
+    assert messages[0] == f"retry: {RETRY_MS}\n\n"
+    events = _parse(messages)
+    assert [e[1] for e in events] == ["job-updated", "preview-ready"]
+    assert events[0][2]["status"] == "done" and events[-1][0] == third
+    assert seq == 3
+
+    # 已经是最新的ID：没有补发，从当前序号开始等待
+    messages, seq = bus.resume(third)
+    assert not _parse(messages) and seq == 3
+
+    # 第一次连接只接收之后的新事件
+    messages, seq = bus.resume(None)
+    assert not _parse(messages) and seq == 3
+    print("✅ 按Last-Event-ID补发之后的事件")
+
+
+def test_reset_when_events_cannot_be_replayed():
+    bus = EventBus(history=2)
+    first = bus.publish("effect-created", {"id": "a"})
+    for i in range(4):
+        bus.publish("effect-created", {"id": f"b{i}"})
+
+    # 缓冲区已挤出中间的事件
+    events = _parse(bus.resume(first)[0])
+    assert [(e[1], e[2]["reason"]) for e in events] == [("reset", "history_exceeded")]
+    assert events[0][0] == f"{bus.epoch}:5"
+
+    # 另一个进程（重启前）的ID
+    restarted = EventBus()
+    events = _parse(restarted.resume(first)[0])
+    assert [(e[1], e[2]["reason"]) for e in events] == [("reset", "restarted")]
+    assert _parse(restarted.resume("garbage")[0])[0][1] == "reset"
+
+    # 缓冲区中仍有的事件照常补发
+    events = _parse(bus.resume(f"{bus.epoch}:3")[0])
+    assert [e[2]["id"] for e in events] == ["b2", "b3"]
+    print("✅ 无法补发时发送reset")
+
+
+def test_events_endpoint_resumes():
+    with tempfile.TemporaryDirectory() as tmp:
+        server = EffectPreviewServer(tmp)
+        client = server.app.test_client()
+        first = server.events.publish("job-updated", {"job_id": "j1", "status": "running"})
+        server.events.publish("job-updated", {"job_id": "j1", "status": "done"})
+
+        response = client.get("/api/events", headers={"Last-Event-ID": first}, buffered=False)
+        assert response.mimetype == "text/event-stream"
+        assert response.headers["Cache-Control"] == "no-cache"
+        messages = _read(response, 2)
+        events = _parse(messages)
+        assert [(e[1], e[2]["status"]) for e in events] == [("job-updated", "done")]
+
+        # EventSource不能带自定义头时也可以用查询参数
+        response = client.get(f"/api/events?last_event_id={first}", buffered=False)
+        assert _parse(_read(response, 2))[0][2]["status"] == "done"
+        server.access_log.flush()
+    print("✅ /api/events 按Last-Event-ID补发")
+
+
+if __name__ == "__main__":
+    test_resume_after_last_event_id()
+    test_reset_when_events_cannot_be_replayed()
+    test_events_endpoint_resumes()
+    print("🎉 SSE重连测试通过")
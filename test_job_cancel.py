@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+测试取消渲染任务：正在运行的ffmpeg被终止、不写负缓存也不尝试占位视频，已结束的任务返回409
+"""
+
+import os
+import sys
+import time
+import threading
+import tempfile
+from pathlib import Path
+
+# 添加src目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from src.render_progress import run_with_progress
+from src.render_queue import STATE_CANCELLED, RenderQueue, RenderWorker, default_queue_path
+from src.effect_generator import EffectGenerator
+
+
+def _slow_ffmpeg(root: Path) -> Path:
+    """代替ffmpeg的脚本：不输出进度，一直运行到被终止"""
+    script = root / "slow_ffmpeg"
+    script.write_text("#!/bin/sh\nexec sleep 60\n")
+    script.chmod(0o755)
+    return script
+
+
+def test_run_with_progress_cancel():
+    with tempfile.TemporaryDirectory() as tmp:
+        cancel_event = threading.Event()
+        threading.Timer(0.5, cancel_event.set).start()
+        started = time.monotonic()
+        result = run_with_progress([str(_slow_ffmpeg(Path(tmp)))], 100, 25, kind="plain",
+                                   cancel_event=cancel_event)
+        assert result.cancelled and not result.timed_out
+        assert result.returncode != 0
+        assert time.monotonic() - started < 5
+    print("✅ 取消时终止正在运行的渲染进程")
+
+
+def test_cancel_running_job():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / "effects").mkdir()
+        (root / "assets").mkdir()
+        (root / "assets" / "sample_image.jpg").write_bytes(b"not decoded: ffmpeg is replaced")
+        EffectGenerator(str(root)).generate_effects("zoom", 1)
+        effect_id = next((root / "effects" / "zoom").glob("*.xml")).stem
+
+        queue = RenderQueue(str(default_queue_path(root)))
+        worker = RenderWorker(str(root), queue)
+        worker.generator.ffmpeg_path = str(_slow_ffmpeg(root))
+        events = []
+        started = threading.Event()
+
+        def listener(event_type, data):
+            events.append((event_type, data))
+            if event_type == "render-started":
+                started.set()
+
+        worker.job_listener = listener
+        queue.enqueue("zoom", effect_id)
+        job = queue.claim("test")
+        thread = threading.Thread(target=worker.process, args=(job,))
+        thread.start()
+
+        assert started.wait(10), events
+        time.sleep(0.5)
+        assert queue.cancel(job["id"])
+        thread.join(10)
+        assert not thread.is_alive(), "render was not stopped"
+
+        assert queue.get(job["id"])["state"] == STATE_CANCELLED
+        final = [data for event_type, data in events if event_type == "job-updated"][-1]
+        assert final["state"] == STATE_CANCELLED and final["render"]["cancelled"]
+        # 只启动过FFmpeg路径，没有退到占位视频
+        assert [path for path, _ in final["render"]["attempts"]] == ["ffmpeg"]
+        assert not (root / "previews" / "zoom" / f"{effect_id}_preview.mp4").exists()
+        assert worker.generator.failure_cache.list_entries() == []
+    print("✅ 取消正在渲染的任务：进程被终止，不写负缓存、不生成占位视频")
+
+
+def test_delete_endpoint():
+    from src.web_server import EffectPreviewServer
+
+    # 只入队，不在服务进程内渲染
+    previous = os.environ.get("RENDER_EXECUTOR_WORKERS")
+    os.environ["RENDER_EXECUTOR_WORKERS"] = "0"
+    try:
+        _check_delete_endpoint(EffectPreviewServer)
+    finally:
+        if previous is None:
+            os.environ.pop("RENDER_EXECUTOR_WORKERS", None)
+        else:
+            os.environ["RENDER_EXECUTOR_WORKERS"] = previous
+    print("✅ DELETE取消待处理和运行中的任务，已结束的任务返回409")
+
+
+def _check_delete_endpoint(server_class):
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / "effects").mkdir()
+        EffectGenerator(str(root)).generate_effects("zoom", 2)
+        server = server_class(str(root))
+        client = server.app.test_client()
+        queue = server._get_render_queue()
+        ids = sorted(p.stem for p in (root / "effects" / "zoom").glob("*.xml"))
+
+        pending = queue.enqueue("zoom", ids[0])
+        response = client.delete(f"/api/jobs/{pending['id']}")
+        assert response.status_code == 200 and response.get_json()["status"] == STATE_CANCELLED
+
+        # 正在运行的任务同样可以取消（由渲染它的worker终止进程）
+        queue.enqueue("zoom", ids[1])
+        running = queue.claim("elsewhere")
+        assert client.delete(f"/api/jobs/{running['id']}").status_code == 200
+        assert queue.is_cancelled(running["id"])
+
+        again = client.delete(f"/api/jobs/{pending['id']}")
+        assert again.status_code == 409 and again.get_json()["status"] == STATE_CANCELLED
+        assert client.delete("/api/jobs/no-such-job").status_code == 404
+        server.access_log.flush()
+
+
+if __name__ == "__main__":
+    test_run_with_progress_cancel()
+    test_cancel_running_job()
+    test_delete_endpoint()
+    print("🎉 任务取消测试通过")
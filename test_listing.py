@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+测试列表接口的游标分页：翻页结果完整且不重复，跨排序方式重放游标和伪造的游标返回400而不是500
+"""
+
+import sys
+import json
+import base64
+import tempfile
+from pathlib import Path
+
+# 添加src目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from src.listing import EFFECT_SORT_FIELDS, ListingError, SortedView, paginate, parse_query
+from src.web_server import EffectPreviewServer
+from src.effect_generator import EffectGenerator
+
+
+def _forge(key) -> str:
+    raw = json.dumps(key).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def test_paginate_all_pages():
+    items = [{"id": f"e{i:02d}", "duration": i % 4} for i in range(23)]
+    for order in ("asc", "desc"):
+        view = SortedView(items, "duration", EFFECT_SORT_FIELDS, order=order)
+        seen, cursor = [], None
+        while True:
+            args = {"sort": "duration", "order": order, "limit": "5"}
+            if cursor:
+                args["cursor"] = cursor
+            page = paginate(view, parse_query(args, EFFECT_SORT_FIELDS, "id"))
+            seen += [item["id"] for item in page["items"]]
+            cursor = page["next_cursor"]
+            if not cursor:
+                break
+        assert sorted(seen) == sorted(item["id"] for item in items), order
+        assert len(seen) == len(set(seen))
+    print("✅ 升序/降序翻页覆盖全部项且不重复")
+
+
+def test_cursor_validation():
+    items = [{"id": f"e{i}", "created": float(i)} for i in range(5)]
+    view = SortedView(items, "created", EFFECT_SORT_FIELDS)
+    cursor = paginate(view, parse_query({"sort": "created", "limit": "2"}, EFFECT_SORT_FIELDS, "id"))["next_cursor"]
+    assert cursor
+
+    bad = [
+        {"sort": "id", "cursor": cursor},                       # 换排序字段
+        {"sort": "created", "order": "desc", "cursor": cursor},  # 换排序方向
+        {"sort": "id", "cursor": _forge(["id", "asc", False, 1.5, "e1"])},          # 值类型不符
+        {"sort": "id", "cursor": _forge(["id", "asc", False, {"a": 1}, "b"])},
+        {"sort": "created", "cursor": _forge(["created", "asc", False, True, "e1"])},
+        {"sort": "created", "cursor": _forge(["created", "asc", 0, 1.0, 7])},
+        {"sort": "id", "cursor": _forge([0, {"a": 1}, "b"])},                        # 旧格式
+        {"sort": "id", "cursor": "not-base64!"},
+    ]
+    for args in bad:
+        try:
+            parse_query(args, EFFECT_SORT_FIELDS, "id")
+        except ListingError:
+            continue
+        raise AssertionError(f"cursor accepted: {args}")
+
+    # 整数和浮点数的数值字段可以互换
+    query = parse_query({"sort": "created", "cursor": _forge(["created", "asc", False, 2, "e2"])},
+                        EFFECT_SORT_FIELDS, "id")
+    assert [item["id"] for item in paginate(view, query)["items"]] == ["e3", "e4"]
+    print("✅ 游标绑定排序方式并校验键类型")
+
+
+def test_replayed_cursor_returns_400():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / "effects").mkdir()
+        EffectGenerator(str(root)).generate_effects("zoom", 4)
+        server = EffectPreviewServer(str(root))
+        client = server.app.test_client()
+
+        first = client.get("/api/effects/zoom?sort=created&limit=2")
+        assert first.status_code == 200, first.get_data(as_text=True)
+        cursor = first.get_json()["next_cursor"]
+        assert cursor
+
+        assert client.get(f"/api/effects/zoom?sort=created&limit=2&cursor={cursor}").status_code == 200
+        replayed = client.get(f"/api/effects/zoom?sort=id&limit=2&cursor={cursor}")
+        assert replayed.status_code == 400, replayed.status_code
+        assert "sort=created" in replayed.get_json()["error"]
+
+        forged = _forge(["created", "desc", False, "x", "b"])
+        assert client.get(f"/api/demos?limit=2&cursor={forged}").status_code == 400
+        assert client.get(f"/api/demos?limit=2&cursor={cursor}").status_code == 400
+        server.access_log.flush()
+    print("✅ 跨排序方式重放游标返回400")
+
+
+if __name__ == "__main__":
+    test_paginate_all_pages()
+    test_cursor_validation()
+    test_replayed_cursor_returns_400()
+    print("🎉 列表分页测试通过")
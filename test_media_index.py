@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+测试增量索引：另一个进程的变更通过日志增量可见，压缩后重新加载快照，快照已包含的日志行不重复应用
+"""
+
+import sys
+import json
+import tempfile
+from pathlib import Path
+
+# 添加src目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from src.media_index import MediaIndex
+
+
+def _write(root: Path, rel: str, size: int = 16) -> Path:
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"\x00" * size)
+    return path
+
+
+def test_replay_after_compaction():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _write(root, "zoom/a_preview.mp4")
+        writer = MediaIndex(root, compact_every=4)
+        reader = MediaIndex(root, compact_every=4)
+        assert [key for key, _ in reader.items()] == ["zoom/a_preview.mp4"]
+        loads = reader.stats["snapshot_loads"]
+
+        # 日志中的变更增量可见，不重新加载快照
+        writer.record(_write(root, "zoom/b_preview.mp4"))
+        writer.record(_write(root, "zoom/c_preview.mp4"))
+        assert sorted(key for key, _ in reader.items()) == \
+            ["zoom/a_preview.mp4", "zoom/b_preview.mp4", "zoom/c_preview.mp4"]
+        assert reader.stats["snapshot_loads"] == loads
+        assert reader.stats["journal_lines"] == 2
+
+        # 第4行触发压缩：日志被替换后读取方重新加载快照，再继续读新日志
+        (root / "zoom" / "a_preview.mp4").unlink()
+        writer.remove(root / "zoom" / "a_preview.mp4")
+        writer.record(_write(root, "blur/d_preview.mp4"))
+        assert writer.stats["compactions"] == 1
+        writer.record(_write(root, "blur/e_preview.mp4", size=32))
+        assert sorted(key for key, _ in reader.items()) == \
+            ["blur/d_preview.mp4", "blur/e_preview.mp4", "zoom/b_preview.mp4", "zoom/c_preview.mp4"]
+        assert reader.stats["snapshot_loads"] == loads + 1
+        assert reader.get("blur/e_preview.mp4")["size"] == 32
+        assert reader.seq == writer.seq
+    print("✅ 压缩后重新加载快照并继续读取新日志")
+
+
+def test_snapshot_skips_replayed_lines():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        index = MediaIndex(root)
+        index.rebuild()
+        a = _write(root, "zoom/a_preview.mp4")
+        index.record(a)
+        old_journal = index.journal_file.read_bytes()
+        a.unlink()
+        index.remove(a)
+        index.record(_write(root, "zoom/b_preview.mp4"))
+        index.compact()
+
+        # 压缩写完快照、截断日志前崩溃：旧日志仍在，其中的变更已包含在快照里
+        index.journal_file.write_bytes(old_journal)
+        fresh = MediaIndex(root)
+        assert [key for key, _ in fresh.items()] == ["zoom/b_preview.mp4"]
+        assert fresh.seq == index.seq
+
+        # 写了一半的行留到下次刷新，补全后才应用
+        line = json.dumps({"op": "put", "path": "zoom/c_preview.mp4", "seq": fresh.seq + 1,
+                           "entry": {"size": 1, "mtime": 0.0, "ctime": 0.0}}).encode()
+        with open(index.journal_file, "ab") as f:
+            f.write(line[:10])
+        assert fresh.get("zoom/c_preview.mp4") is None
+        with open(index.journal_file, "ab") as f:
+            f.write(line[10:] + b"\n")
+        assert fresh.get("zoom/c_preview.mp4")["size"] == 1
+    print("✅ 快照已包含的日志行不重复应用，半行等待补全")
+
+
+if __name__ == "__main__":
+    test_replay_after_compaction()
+    test_snapshot_skips_replayed_lines()
+    print("🎉 增量索引测试通过")
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+测试 /metrics：请求延迟按路由模板统计，同步渲染计入渲染路径和风格耗时，ASGI异步路由同样计入
+"""
+
+import sys
+import json
+import asyncio
+import tempfile
+from pathlib import Path
+
+# 添加src目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from src.metrics import Histogram
+from src.web_server import EffectPreviewServer
+from src.effect_generator import EffectGenerator
+
+
+def _sample(text: str, name: str) -> float:
+    """取一条样本的值（name 含标签）"""
+    for line in text.splitlines():
+        if line.startswith(name + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_histogram_format():
+    histogram = Histogram("demo_seconds", "Demo", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        histogram.observe(value, "/a")
+    lines = histogram.collect()
+    assert 'demo_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{route="/a",le="1"} 2' in lines
+    assert 'demo_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{route="/a"} 3' in lines
+    print("✅ 直方图输出为累积分桶")
+
+
+def test_server_metrics():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / "effects").mkdir()
+        EffectGenerator(str(root)).generate_effects("zoom", 2)
+        effect_id = sorted(p.stem for p in (root / "effects" / "zoom").glob("*.xml"))[0]
+
+        server = EffectPreviewServer(str(root))
+        server.disk_usage.ttl = 0
+        client = server.app.test_client()
+        route = 'http_requests_total{route="/api/effects/<style>",method="GET",status="200"}'
+        # 指标是进程级的（其他测试可能已计入），只比较前后差值
+        before_text = client.get("/metrics").get_data(as_text=True)
+        before = _sample(before_text, route)
+        fallback_before = _sample(before_text, 'effect_renders_succeeded_total{path="fallback"}')
+        durations_before = _sample(before_text, 'effect_render_duration_seconds_count{style="zoom"}')
+        client.get("/api/effects/zoom")
+        client.get("/api/effects/zoom")
+        client.get("/api/no_such_route")
+
+        response = client.post("/api/generate_preview", data=json.dumps(
+            {"style": "zoom", "effect_id": effect_id, "sync": True}), content_type="application/json")
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+        response = client.get("/metrics")
+        text = response.get_data(as_text=True)
+        assert response.content_type.startswith("text/plain; version=0.0.4")
+        assert _sample(text, route) == before + 2
+        assert _sample(text, 'http_requests_total{route="unmatched",method="GET",status="404"}') >= 1
+        assert 'http_request_duration_seconds_bucket{route="/api/effects/<style>",method="GET",le="+Inf"}' in text
+        assert _sample(text, "http_requests_in_flight") == 1  # 只有本次 /metrics 请求
+        # 没有melt和素材时：ffmpeg失败后回退到占位视频
+        assert _sample(text, 'effect_renders_succeeded_total{path="fallback"}') == fallback_before + 1
+        assert _sample(text, 'effect_render_duration_seconds_count{style="zoom"}') == durations_before + 1
+        assert _sample(text, 'storage_files{directory="effects"}') == 2
+        assert _sample(text, 'storage_files{directory="previews"}') >= 1
+        assert 'cache_misses_total{cache="effect_metadata"}' in text
+        assert 'render_queue_jobs{state="pending"}' in text
+        server.access_log.flush()
+    print("✅ /metrics 包含请求、渲染、缓存和磁盘占用指标")
+
+
+def test_render_started_counted_at_begin():
+    """进入渲染路径时立即计入started，结束后才计入succeeded/failed；回调把路径转给调用方"""
+    # 用渲染器所导入的指标模块（与服务器的 /metrics 是同一个注册表）
+    from src.preview_generator import PreviewRender, record_render
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = EffectPreviewServer(tmp)
+        client = server.app.test_client()
+        started = 'effect_renders_started_total{path="melt"}'
+        failed = 'effect_renders_failed_total{path="melt"}'
+        before = client.get("/metrics").get_data(as_text=True)
+
+        paths = []
+        call = PreviewRender(Path(tmp) / "zoom_001.xml", None, on_path=paths.append)
+        call.begin_path("melt")
+        text = client.get("/metrics").get_data(as_text=True)
+        assert _sample(text, started) == _sample(before, started) + 1
+        assert _sample(text, failed) == _sample(before, failed)  # 进行中：只有started
+        assert paths == ["melt"]
+
+        call.begin_path("ffmpeg")
+        call.finish(True, 1.0)
+        record_render("zoom", call.render_info())
+        text = client.get("/metrics").get_data(as_text=True)
+        assert _sample(text, started) == _sample(before, started) + 1
+        assert _sample(text, failed) == _sample(before, failed) + 1
+        assert paths == ["melt", "ffmpeg"]
+        server.access_log.flush()
+    print("✅ 渲染开始时计入started，结束时只记录结果")
+
+
+def test_asgi_native_routes():
+    try:
+        from src.asgi_server import AsyncEffectPreviewApp
+    except ImportError as e:
+        print(f"⚠️  跳过ASGI测试: {e}")
+        return
+    from test_asgi_server import _make_project, _request
+
+    async def run(app):
+        await _request(app, "/api/styles")
+        await _request(app, "/preview/zoom/zoom_001_preview.mp4", headers={"Range": "bytes=0-99"})
+        _, _, body = await _request(app, "/metrics")
+        return body.decode()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _make_project(root)
+        app = AsyncEffectPreviewApp(str(root))
+        text = asyncio.run(run(app))
+        assert _sample(text, 'http_requests_total{route="/api/styles",method="GET",status="200"}') >= 1
+        assert _sample(text, 'http_requests_total{route="/preview/<path:filename>",method="GET",status="206"}') >= 1
+        app.server.access_log.flush()
+    print("✅ ASGI异步路由计入请求指标")
+
+
+if __name__ == "__main__":
+    test_histogram_format()
+    test_server_metrics()
+    test_render_started_counted_at_begin()
+    test_asgi_native_routes()
+    print("🎉 指标测试通过")
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+测试NumPy参考渲染器
+"""
+
+import sys
+import itertools
+from pathlib import Path
+
+import numpy as np
+
+# 添加src目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root / "src"))
+
+from numpy_renderer import EffectSpec, NumpyEffectRenderer, parse_animation, interpolate
+
+
+WIDTH, HEIGHT = 108, 192
+
+
+def _qtblend(rect: str = "0=0 0 108 192 1", rotation: str = "0=0") -> EffectSpec:
+    return EffectSpec.from_xml(
+        f'<effect id="t" tag="qtblend">'
+        f'<parameter name="rect" value="{rect}"/>'
+        f'<parameter name="rotation" value="{rotation}"/>'
+        f'</effect>'
+    )
+
+
+def test_keyframe_interpolation():
+    """关键帧插值：区间内线性，区间外保持端点值"""
+    keyframes = parse_animation("0=0;10=100;20~=50")
+    values = interpolate(keyframes, np.array([-5, 0, 5, 10, 15, 30]))[:, 0]
+    assert values.tolist() == [0, 0, 50, 100, 75, 50]
+
+    constant = parse_animation("0.5")
+    assert interpolate(constant, np.array([0, 99]))[:, 0].tolist() == [0.5, 0.5]
+    print("✅ Keyframe interpolation")
+
+
+def test_identity_and_translation():
+    """满屏矩形不改变画面；平移后露出的区域为黑色"""
+    renderer = NumpyEffectRenderer(WIDTH, HEIGHT, batch_size=2)
+    frame = (np.random.rand(HEIGHT, WIDTH, 3) * 255).astype(np.uint8)
+
+    assert np.array_equal(renderer.render_frame(_qtblend(), frame, 0), frame)
+
+    shifted = renderer.render_frame(_qtblend("0=10 0 108 192 1"), frame, 0)
+    assert np.array_equal(shifted[:, 10:], frame[:, :-10])
+    assert (shifted[:, :10] == 0).all()
+    print("✅ Rect identity and translation")
+
+
+def test_color_operations():
+    """曝光、饱和度和不透明度的数值"""
+    renderer = NumpyEffectRenderer(WIDTH, HEIGHT)
+    gray = np.full((HEIGHT, WIDTH, 3), 64, dtype=np.uint8)
+
+    exposure = EffectSpec.from_xml(
+        '<effectgroup id="g"><effect id="avfilter.exposure">'
+        '<property name="av.exposure">1</property><property name="av.black">0</property>'
+        '</effect></effectgroup>'
+    )
+    assert (renderer.render_frame(exposure, gray, 0) == 128).all()
+
+    # 灰色像素不受饱和度影响
+    saturation = EffectSpec.from_xml(
+        '<effectgroup id="g"><effect id="frei0r.saturat0r">'
+        '<property name="saturation">1.8</property></effect></effectgroup>'
+    )
+    assert (renderer.render_frame(saturation, gray, 0) == 64).all()
+
+    opacity = EffectSpec.from_xml(
+        '<effect id="t" tag="qtblend"><parameter name="opacity" value="0=0;10=1"/></effect>'
+    )
+    assert (renderer.render_frame(opacity, gray, 5) == 32).all()
+    print("✅ Exposure, saturation and opacity")
+
+
+def test_directional_blur_preserves_flat_frames():
+    """方向模糊不改变纯色画面"""
+    renderer = NumpyEffectRenderer(WIDTH, HEIGHT)
+    flat = np.full((HEIGHT, WIDTH, 3), 100, dtype=np.uint8)
+    blur = EffectSpec.from_xml(
+        '<effectgroup id="g"><effect id="avfilter.dblur">'
+        '<property name="av.radius">0=0;10=20</property><property name="av.angle">30</property>'
+        '</effect></effectgroup>'
+    )
+    assert (renderer.render_frame(blur, flat, 10) == 100).all()
+    print("✅ Directional blur")
+
+
+def test_generated_effects_render():
+    """仓库中所有生成的特效都能批量渲染"""
+    renderer = NumpyEffectRenderer(WIDTH, HEIGHT, batch_size=4)
+    frame = (np.random.rand(HEIGHT, WIDTH, 3) * 255).astype(np.uint8)
+
+    effect_files = sorted((project_root / "effects").rglob("*.xml"))
+    for effect_file in effect_files:
+        spec = EffectSpec.from_file(effect_file)
+        rendered = sum(len(batch) for batch in renderer.render_batches(spec, itertools.repeat(frame), 10))
+        assert rendered == 10, effect_file
+
+    print(f"✅ Rendered {len(effect_files)} generated effects")
+
+
+if __name__ == "__main__":
+    test_keyframe_interpolation()
+    test_identity_and_translation()
+    test_color_operations()
+    test_directional_blur_preserves_flat_frames()
+    test_generated_effects_render()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+测试预览视频的Range请求：拖动进度条只传输请求的字节
+"""
+
+import sys
+import socket
+import tempfile
+import threading
+from pathlib import Path
+
+# 添加src目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from werkzeug.serving import make_server
+
+from src.web_server import EffectPreviewServer
+
+
+PREVIEW_SIZE = 50 * 1024 * 1024
+PREVIEW = "previews/zoom/big_preview.mp4"
+
+
+def _make_project(root: Path) -> Path:
+    """50 MB的稀疏预览文件，在偏移处写入可识别的字节"""
+    preview = root / PREVIEW
+    preview.parent.mkdir(parents=True)
+    with open(preview, "wb") as f:
+        f.truncate(PREVIEW_SIZE)
+        for offset in (0, 10 * 1024 * 1024, PREVIEW_SIZE - 16):
+            f.seek(offset)
+            f.write(b"MARK%012d" % offset)
+    return preview
+
+
+def _raw_get(port: int, path: str, headers: dict) -> bytes:
+    """直接在socket上发请求，返回收到的全部字节（状态行+头+正文）"""
+    lines = [f"GET /{path} HTTP/1.1", f"Host: 127.0.0.1:{port}", "Connection: close"]
+    lines += [f"{k}: {v}" for k, v in headers.items()]
+    with socket.create_connection(("127.0.0.1", port), timeout=10) as sock:
+        sock.sendall(("\r\n".join(lines) + "\r\n\r\n").encode("ascii"))
+        received = b""
+        while True:
+            data = sock.recv(65536)
+            if not data:
+                return received
+            received += data
+
+
+def test_seek_transfers_only_requested_bytes():
+    """在真实socket上请求50 MB预览中间的64 KB，收到的总字节数不超过区间加响应头"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _make_project(root)
+        preview_server = EffectPreviewServer(str(root))
+        server = make_server("127.0.0.1", 0, preview_server.app, threaded=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            start, length = 10 * 1024 * 1024, 64 * 1024
+            received = _raw_get(server.port, PREVIEW, {"Range": f"bytes={start}-{start + length - 1}"})
+            head, body = received.split(b"\r\n\r\n", 1)
+
+            assert head.startswith(b"HTTP/1.1 206"), head
+            assert f"Content-Range: bytes {start}-{start + length - 1}/{PREVIEW_SIZE}".encode() in head
+            assert len(body) == length
+            assert body.startswith(b"MARK%012d" % start)
+            assert len(received) < length + 1024
+        finally:
+            server.shutdown()
+            preview_server.access_log.flush()
+
+    print(f"✅ Seek transferred {len(received)} bytes of a {PREVIEW_SIZE // (1024 * 1024)} MB preview")
+
+
+def test_multi_range_and_if_range():
+    """多区间返回multipart/byteranges；If-Range不匹配时返回完整文件；超出范围返回416"""
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _make_project(root)
+        preview_server = EffectPreviewServer(str(root))
+        client = preview_server.app.test_client()
+
+        full = client.head(f"/{PREVIEW}")
+        assert full.status_code == 200
+        assert full.headers["Accept-Ranges"] == "bytes"
+        etag = full.headers["ETag"]
+
+        tail = client.get(f"/{PREVIEW}", headers={"Range": "bytes=-16"})
+        assert tail.status_code == 206
+        assert tail.data == b"MARK%012d" % (PREVIEW_SIZE - 16)
+
+        multi = client.get(f"/{PREVIEW}", headers={"Range": "bytes=0-15,10485760-10485775"})
+        assert multi.status_code == 206
+        assert multi.mimetype == "multipart/byteranges"
+        assert int(multi.headers["Content-Length"]) == len(multi.data) < 1024
+        assert b"MARK%012d" % 0 in multi.data and b"MARK%012d" % (10 * 1024 * 1024) in multi.data
+        assert f"Content-Range: bytes 0-15/{PREVIEW_SIZE}".encode() in multi.data
+
+        matched = client.get(f"/{PREVIEW}", headers={"Range": "bytes=0-15", "If-Range": etag})
+        assert matched.status_code == 206 and len(matched.data) == 16
+
+        stale = client.head(f"/{PREVIEW}", headers={"Range": "bytes=0-15", "If-Range": '"stale"'})
+        assert stale.status_code == 200
+        assert int(stale.headers["Content-Length"]) == PREVIEW_SIZE
+
+        outside = client.get(f"/{PREVIEW}", headers={"Range": f"bytes={PREVIEW_SIZE}-"})
+        assert outside.status_code == 416
+        assert outside.headers["Content-Range"] == f"bytes */{PREVIEW_SIZE}"
+        assert outside.headers["Accept-Ranges"] == "bytes"
+
+        not_modified = client.get(f"/{PREVIEW}", headers={"Range": "bytes=0-15", "If-None-Match": etag})
+        assert not_modified.status_code == 304
+        preview_server.access_log.flush()
+
+    print("✅ Multi-range, If-Range and 416")
+
+
+if __name__ == "__main__":
+    test_seek_transfers_only_requested_bytes()
+    test_multi_range_and_if_range()
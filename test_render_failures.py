@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+测试渲染失败的分类与负缓存：按类别的TTL、过期后重新渲染、预检失败计入指标且第二次直接跳过
+"""
+
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+# 添加src目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from src.render_failures import (DEFAULT_TTLS, FAILURE_BAD_XML, FAILURE_ENCODER, FAILURE_MISSING_ASSET,
+                                 FAILURE_TIMEOUT, FAILURE_UNKNOWN, NegativeCache, classify_failure)
+
+
+def _sample(text: str, name: str) -> float:
+    for line in text.splitlines():
+        if line.startswith(name + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_classify_failure():
+    assert classify_failure("x", timed_out=True) == FAILURE_TIMEOUT
+    assert classify_failure("", stalled=True) == FAILURE_TIMEOUT
+    assert classify_failure("assets/a.mp4: No such file or directory") == FAILURE_MISSING_ASSET
+    assert classify_failure("not well-formed (invalid token): line 3") == FAILURE_BAD_XML
+    assert classify_failure("Error initializing output stream") == FAILURE_ENCODER
+    assert classify_failure("segfault") == FAILURE_UNKNOWN
+    print("✅ stderr特征和超时状态映射到失败类别")
+
+
+def test_ttl_per_class():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = NegativeCache(str(Path(tmp) / "failures.db"), ttls={FAILURE_TIMEOUT: 0})
+
+        now = time.time()
+        bad = cache.record("k-xml", FAILURE_BAD_XML, "parse error", "a.xml")
+        encoder = cache.record("k-enc", FAILURE_ENCODER, "encoder", "b.xml")
+        assert abs(bad["expires_at"] - now - DEFAULT_TTLS[FAILURE_BAD_XML]) < 5
+        assert abs(encoder["expires_at"] - now - DEFAULT_TTLS[FAILURE_ENCODER]) < 5
+        assert cache.record("k-x", "no_such_class", "?", "c.xml")["failure_class"] == FAILURE_UNKNOWN
+
+        # TTL为0的超时记录立即过期，不会跳过下一次渲染
+        cache.record("k-timeout", FAILURE_TIMEOUT, "timed out", "d.xml")
+        assert cache.lookup("k-timeout") is None
+
+        hit = cache.lookup("k-xml")
+        assert hit["failure_class"] == FAILURE_BAD_XML and hit["count"] == 1
+        cache.record("k-xml", FAILURE_BAD_XML, "parse error again", "a.xml")
+        assert cache.lookup("k-xml")["count"] == 2
+
+        counters = cache.counters()
+        assert counters["failed"][FAILURE_BAD_XML] == 2
+        assert counters["skipped"][FAILURE_BAD_XML] == 2
+        assert counters["active"][FAILURE_TIMEOUT] == 0
+
+        assert cache.clear("k-enc") and cache.lookup("k-enc") is None
+        assert cache.purge_expired() == 1
+    print("✅ 按类别设置TTL，过期记录不再跳过，成功后清除")
+
+
+def test_preflight_failure_metrics():
+    from src.preview_generator import PreviewGenerator, record_render
+
+    metrics = sys.modules[record_render.__module__]
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        effect_file = root / "effects" / "zoom" / "zoom_broken.xml"
+        effect_file.parent.mkdir(parents=True)
+        effect_file.write_text("<effect id='zoom_broken'><n>broken</effect>", encoding="utf-8")
+        output_file = root / "previews" / "zoom" / "zoom_broken_preview.mp4"
+        output_file.parent.mkdir(parents=True)
+
+        generator = PreviewGenerator(str(root))
+        failed = 'effect_renders_failed_total{path="preflight"}'
+        skipped = "effect_renders_skipped_total"
+        before = metrics.REGISTRY.render()
+
+        result = generator.render_preview(effect_file, output_file, save_demo=False)
+        assert not result and result.failure["failure_class"] == FAILURE_BAD_XML
+        assert result.render_info()["attempts"] == [["preflight", False]]
+        text = metrics.REGISTRY.render()
+        assert _sample(text, failed) == _sample(before, failed) + 1
+        assert _sample(text, 'effect_renders_started_total{path="preflight"}') == \
+            _sample(before, 'effect_renders_started_total{path="preflight"}') + 1
+
+        # 负缓存命中：不再预检，计入跳过
+        again = generator.render_preview(effect_file, output_file, save_demo=False)
+        assert again.skipped and again.failure["skipped"]
+        text = metrics.REGISTRY.render()
+        assert _sample(text, failed) == _sample(before, failed) + 1
+        assert _sample(text, skipped) == _sample(before, skipped) + 1
+        assert not output_file.exists()
+    print("✅ 预检失败计入渲染失败指标，再次遇到时直接跳过")
+
+
+if __name__ == "__main__":
+    test_classify_failure()
+    test_ttl_per_class()
+    test_preflight_failure_metrics()
+    print("🎉 渲染失败测试通过")
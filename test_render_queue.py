@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+测试渲染队列：去重复用的任务计入每个批次、按优先级认领、失败后指数退避、心跳超时的任务重新排队
+"""
+
+import sys
+import time
+import sqlite3
+import tempfile
+from pathlib import Path
+
+# 添加src目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from src.render_queue import (PRIORITY_BATCH, PRIORITY_INTERACTIVE, STATE_CANCELLED, STATE_FAILED,
+                              STATE_PENDING, STATE_RUNNING, STATE_SUCCEEDED, RenderQueue)
+
+
+def test_dedup_joins_every_batch():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = RenderQueue(str(Path(tmp) / "queue.db"))
+        first = queue.enqueue("zoom", "zoom_001", PRIORITY_BATCH, "batch-a")
+        queue.enqueue("zoom", "zoom_002", PRIORITY_BATCH, "batch-a")
+        shared = queue.enqueue("zoom", "zoom_001", PRIORITY_BATCH, "batch-b")
+
+        # 相同的待处理任务复用同一个ID，并同时属于两个批次
+        assert shared["id"] == first["id"]
+        assert shared["batch_ids"] == ["batch-a", "batch-b"]
+        assert [job["effect_id"] for job in queue.list_batch("batch-b")] == ["zoom_001"]
+
+        batch_b = queue.describe("batch-b")
+        assert batch_b["total"] == 1 and batch_b["status"] == STATE_PENDING
+
+        job = queue.claim("w")
+        assert job["id"] == first["id"]
+        assert queue.describe("batch-b")["status"] == STATE_RUNNING
+        queue.complete(job["id"], "previews/zoom/zoom_001_preview.mp4")
+        assert queue.describe("batch-b")["status"] == STATE_SUCCEEDED
+        batch_a = queue.describe("batch-a")
+        assert batch_a["status"] == STATE_RUNNING and batch_a["done"] == 1  # zoom_002 还在等待
+    print("✅ 去重复用的任务计入新批次，批次状态随之更新")
+
+
+def test_cancel_batch_keeps_shared_jobs():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = RenderQueue(str(Path(tmp) / "queue.db"))
+        shared = queue.enqueue("blur", "blur_001", PRIORITY_BATCH, "batch-a")
+        own = queue.enqueue("blur", "blur_002", PRIORITY_BATCH, "batch-b")
+        queue.enqueue("blur", "blur_001", PRIORITY_BATCH, "batch-b")
+
+        assert queue.cancel_batch("batch-b") == 1
+        assert queue.get(own["id"])["state"] == STATE_CANCELLED
+        assert queue.get(shared["id"])["state"] == STATE_PENDING
+        assert queue.describe("batch-a")["status"] == STATE_PENDING
+    print("✅ 取消批次不影响其他批次仍在等待的任务")
+
+
+def test_legacy_batch_column():
+    """升级前的数据库只有 jobs.batch_id，批次查询仍能找到这些任务"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Path(tmp) / "queue.db"
+        queue = RenderQueue(str(db))
+        job = queue.enqueue("zoom", "zoom_001", PRIORITY_BATCH, "old-batch")
+        conn = sqlite3.connect(str(db))
+        conn.execute("DELETE FROM batch_jobs")
+        conn.commit()
+        conn.close()
+        assert [j["id"] for j in queue.list_batch("old-batch")] == [job["id"]]
+        assert queue.get(job["id"])["batch_ids"] == ["old-batch"]
+    print("✅ 兼容只记录在 jobs.batch_id 上的旧批次")
+
+
+def test_claim_priority_and_backoff():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = RenderQueue(str(Path(tmp) / "queue.db"), max_attempts=2, backoff_base=60.0)
+        queue.enqueue("zoom", "batch_effect", PRIORITY_BATCH)
+        interactive = queue.enqueue("zoom", "clicked_effect", PRIORITY_INTERACTIVE)
+
+        job = queue.claim("w")
+        assert job["id"] == interactive["id"] and job["attempts"] == 1
+
+        # 第一次失败：退避后重新排队，退避期间不会被认领
+        assert queue.fail(job["id"], "boom") == STATE_PENDING
+        retried = queue.get(job["id"])
+        assert retried["next_run_at"] >= time.time() + 50
+        assert queue.claim("w")["effect_id"] == "batch_effect"
+        assert queue.claim("w") is None
+
+        # 到期后再次认领；达到最大次数后不再重试
+        conn = sqlite3.connect(str(queue.db_path))
+        conn.execute("UPDATE jobs SET next_run_at = 0 WHERE id = ?", (job["id"],))
+        conn.commit()
+        conn.close()
+        again = queue.claim("w")
+        assert again["id"] == job["id"] and again["attempts"] == 2
+        assert queue.fail(job["id"], "boom") == STATE_FAILED
+
+        # 不可重试的失败直接结束
+        other = queue.enqueue("zoom", "bad_xml_effect")
+        assert queue.claim("w")["id"] == other["id"]
+        assert queue.fail(other["id"], "render failed (bad_xml)", retry=False) == STATE_FAILED
+    print("✅ 交互式任务优先认领，失败后指数退避，达到次数上限后结束")
+
+
+def test_recover_stale():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = RenderQueue(str(Path(tmp) / "queue.db"), backoff_base=0.0)
+        lost = queue.enqueue("zoom", "zoom_lost")
+        alive = queue.enqueue("zoom", "zoom_alive")
+        queue.claim("crashed")
+        queue.claim("alive")
+
+        conn = sqlite3.connect(str(queue.db_path))
+        conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE id = ?", (time.time() - 3600, lost["id"]))
+        conn.commit()
+        conn.close()
+
+        assert queue.recover_stale(timeout=600) == 1
+        assert queue.get(lost["id"])["state"] == STATE_PENDING
+        assert queue.get(alive["id"])["state"] == STATE_RUNNING
+        assert queue.claim("w")["id"] == lost["id"]
+    print("✅ 心跳超时的运行中任务重新排队")
+
+
+if __name__ == "__main__":
+    test_dedup_joins_every_batch()
+    test_cancel_batch_keeps_shared_jobs()
+    test_legacy_batch_column()
+    test_claim_priority_and_backoff()
+    test_recover_stale()
+    print("🎉 渲染队列测试通过")
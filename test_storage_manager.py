@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+测试存储预算的LRU淘汰：硬链接的预览和demo按一份数据计算，按最近一次访问（任一路径）排序
+"""
+
+import os
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+# 添加src目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from src.storage_manager import StorageManager
+
+KB = 1024
+
+
+def _make_project(root: Path):
+    """a与demos中的副本硬链接，b、c没有demo；a带封面图。修改时间 a < b < c"""
+    previews = root / "previews" / "zoom"
+    previews.mkdir(parents=True)
+    (root / "demos").mkdir()
+    now = time.time()
+    for age, name in ((3, "a"), (2, "b"), (1, "c")):
+        path = previews / f"{name}_preview.mp4"
+        path.write_bytes(b"\x00" * 100 * KB)
+        os.utime(path, (now - age * 86400, now - age * 86400))
+    os.link(previews / "a_preview.mp4", root / "demos" / "zoom_a_demo.mp4")
+    (previews / "a_poster.jpg").write_bytes(b"\x00" * 10 * KB)
+
+
+def test_hardlinks_counted_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _make_project(root)
+        manager = StorageManager(str(root))
+
+        report = manager.plan(budget_bytes=0)
+        assert report["files"] == 3
+        assert report["total_bytes"] == 310 * KB
+        assert not report["evict"]
+
+        # a最旧：淘汰时预览和demo两个路径一起删除，封面图一起计入
+        report = manager.plan(budget_bytes=250 * KB)
+        assert [obj["paths"] for obj in report["evict"]] == \
+            [["previews/zoom/a_preview.mp4", "demos/zoom_a_demo.mp4"]]
+        assert report["reclaim_bytes"] == 110 * KB
+        manager.access_log.flush()
+    print("✅ 硬链接的预览和demo按一份数据计算")
+
+
+def test_lru_uses_latest_access_of_any_path():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        _make_project(root)
+        manager = StorageManager(str(root))
+        # 只访问了demo：a整体变为最近使用
+        manager.access_log.touch("demos/zoom_a_demo.mp4")
+
+        report = manager.enforce(budget_bytes=150 * KB)
+        assert [obj["paths"] for obj in report["evict"]] == \
+            [["previews/zoom/b_preview.mp4"], ["previews/zoom/c_preview.mp4"]]
+        assert report["after_bytes"] == 110 * KB
+        assert sorted(p.name for p in (root / "previews" / "zoom").iterdir()) == ["a_poster.jpg", "a_preview.mp4"]
+        assert sorted(key for key, _ in manager.indexes["previews"].items()) == ["zoom/a_preview.mp4"]
+
+        # 固定的文件不会被淘汰，即使超出预算
+        manager.access_log.pin("demos/*")
+        report = manager.enforce(budget_bytes=50 * KB)
+        assert not report["evict"] and report["over_budget"]
+        assert (root / "demos" / "zoom_a_demo.mp4").exists()
+
+        manager.access_log.unpin("demos/*")
+        report = manager.enforce(budget_bytes=50 * KB)
+        assert report["after_bytes"] == 0
+        assert not (root / "demos" / "zoom_a_demo.mp4").exists()
+        assert not (root / "previews" / "zoom" / "a_poster.jpg").exists()
+        manager.access_log.flush()
+    print("✅ 按任一路径的最近访问排序淘汰，固定的文件保留")
+
+
+if __name__ == "__main__":
+    test_hardlinks_counted_once()
+    test_lru_uses_latest_access_of_any_path()
+    print("🎉 存储淘汰测试通过")
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+测试ZIP导出：流式生成的压缩包能被 zipfile.ZipFile 完整读回
+"""
+
+import io
+import os
+import sys
+import json
+import zipfile
+import tempfile
+from pathlib import Path
+
+# 添加src目录到Python路径
+project_root = Path(__file__).parent
+sys.path.insert(0, str(project_root))
+
+from src.zip_export import _zip_info, export_files, stream_zip
+from src.web_server import EffectPreviewServer
+from src.effect_generator import EffectGenerator
+
+
+def _read_zip(data: bytes) -> zipfile.ZipFile:
+    archive = zipfile.ZipFile(io.BytesIO(data))
+    assert archive.testzip() is None
+    return archive
+
+
+def test_round_trip():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        xml = root / "a.xml"
+        xml.write_text("<effect id='a'>" + "<parameter/>" * 2000 + "</effect>", encoding="utf-8")
+        video = root / "a_preview.mp4"
+        video.write_bytes(os.urandom(300 * 1024))
+        missing = root / "gone.xml"
+
+        chunks = list(stream_zip([("zoom/a.xml", xml), ("zoom/gone.xml", missing),
+                                  ("zoom/previews/a_preview.mp4", video)], chunk_size=64 * 1024))
+        # 边读边发送：不是一次性生成整个压缩包
+        assert len(chunks) > 2
+        archive = _read_zip(b"".join(chunks))
+
+        assert archive.namelist() == ["zoom/a.xml", "zoom/previews/a_preview.mp4", "manifest.json"]
+        assert archive.read("zoom/a.xml") == xml.read_bytes()
+        assert archive.read("zoom/previews/a_preview.mp4") == video.read_bytes()
+        assert archive.getinfo("zoom/a.xml").compress_type == zipfile.ZIP_DEFLATED
+        assert archive.getinfo("zoom/previews/a_preview.mp4").compress_type == zipfile.ZIP_STORED
+
+        manifest = json.loads(archive.read("manifest.json"))
+        assert [f["path"] for f in manifest["files"]] == ["zoom/a.xml", "zoom/previews/a_preview.mp4"]
+        assert manifest["files"][1]["size"] == 300 * 1024
+    print("✅ 流式ZIP可被zipfile完整读回，缺失的文件跳过")
+
+
+def test_zip_info_from_fstat():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "old.xml"
+        path.write_text("<effect/>", encoding="utf-8")
+        expected = zipfile.ZipInfo.from_file(path, "old.xml")
+        with open(path, "rb") as source:
+            info = _zip_info("old.xml", os.fstat(source.fileno()))
+        assert (info.date_time, info.external_attr, info.file_size) == \
+            (expected.date_time, expected.external_attr, expected.file_size)
+
+        # 早于1980年的修改时间按ZIP能表示的最早时间写入
+        os.utime(path, (0, 0))
+        with open(path, "rb") as source:
+            assert _zip_info("old.xml", os.fstat(source.fileno())).date_time == (1980, 1, 1, 0, 0, 0)
+    print("✅ ZipInfo取自已打开文件的fstat")
+
+
+def test_export_endpoint():
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        (root / "effects").mkdir()
+        EffectGenerator(str(root)).generate_effects("zoom", 3)
+        ids = sorted(p.stem for p in (root / "effects" / "zoom").glob("*.xml"))
+        preview = root / "previews" / "zoom" / f"{ids[0]}_preview.mp4"
+        preview.parent.mkdir(parents=True)
+        preview.write_bytes(b"\x00" * 4096)
+
+        server = EffectPreviewServer(str(root))
+        client = server.app.test_client()
+        response = client.get("/api/export?style=zoom&previews=1")
+        assert response.status_code == 200
+        assert response.headers["Content-Disposition"] == 'attachment; filename="effects-zoom.zip"'
+        archive = _read_zip(response.get_data())
+
+        expected = [name for name, _ in export_files(root, [("zoom", i) for i in ids], True)]
+        assert archive.namelist() == expected + ["manifest.json"]
+        assert f"zoom/previews/{preview.name}" in expected
+        assert archive.read(f"zoom/{ids[1]}.xml") == (root / "effects" / "zoom" / f"{ids[1]}.xml").read_bytes()
+        server.access_log.flush()
+    print("✅ /api/export 返回可读回的ZIP")
+
+
+if __name__ == "__main__":
+    test_round_trip()
+    test_zip_info_from_fstat()
+    test_export_endpoint()
+    print("🎉 ZIP导出测试通过")
@@ -5,6 +5,8 @@ let effectModal = null;
 let progressModal = null;
 let demosModal = null;
 let allDemos = [];
+let effectsById = {};
+let eventsConnected = false;
 
 // 初始化
 document.addEventListener('DOMContentLoaded', function() {
@@ -23,6 +25,9 @@ document.addEventListener('DOMContentLoaded', function() {
     // 加载数据
     loadStyles();
     
+    // 订阅服务端事件：预览完成、新特效和渲染进度由服务器推送，不再轮询
+    subscribeEvents();
+    
     // 绑定事件
     document.getElementById('generateForm').addEventListener('submit', handleGenerateSubmit);
 });
@@ -41,6 +46,7 @@ async function loadStyles() {
             const item = document.createElement('a');
             item.className = 'list-group-item list-group-item-action d-flex justify-content-between align-items-center';
             item.href = '#';
+            item.dataset.style = style.name;
             item.onclick = () => selectStyle(style.name);
             
             item.innerHTML = `
@@ -49,8 +55,8 @@ async function loadStyles() {
                     <span>${getStyleDisplayName(style.name)}</span>
                 </div>
                 <div>
-                    <span class="badge bg-primary stat-badge me-1">${style.effect_count}</span>
-                    <span class="badge bg-success stat-badge">${style.preview_count}</span>
+                    <span class="badge bg-primary stat-badge me-1 effect-count">${style.effect_count}</span>
+                    <span class="badge bg-success stat-badge preview-count">${style.preview_count}</span>
                 </div>
             `;
             
@@ -80,27 +86,62 @@ async function selectStyle(styleName) {
     await loadEffects(styleName);
 }
 
-// 加载特效列表
-async function loadEffects(styleName) {
+// 加载特效列表（服务端分页：首屏一页，"加载更多"按游标继续）
+const EFFECTS_PAGE_SIZE = 60;
+let effectsCursor = null;
+
+function effectsQuery(cursor) {
+    const params = new URLSearchParams({ limit: EFFECTS_PAGE_SIZE });
+    const sort = document.getElementById('effectsSort');
+    const previewFilter = document.getElementById('effectsPreviewFilter');
+    if (sort && sort.value) {
+        const [field, order] = sort.value.split(':');
+        params.set('sort', field);
+        params.set('order', order);
+    }
+    if (previewFilter && previewFilter.value) {
+        params.set('has_preview', previewFilter.value);
+    }
+    if (cursor) {
+        params.set('cursor', cursor);
+    }
+    return params.toString();
+}
+
+async function loadEffects(styleName, append = false) {
     try {
         console.log('loadEffects: Starting to load effects for style:', styleName);
         showLoading('正在加载特效列表...');
         
         console.log(`Loading effects for style: ${styleName}`);
-        const response = await fetch(`/api/effects/${styleName}`);
+        const response = await fetch(`/api/effects/${styleName}?${effectsQuery(append ? effectsCursor : null)}`);
         console.log(`API response status: ${response.status}`);
         
         if (!response.ok) {
             throw new Error(`HTTP ${response.status}: ${response.statusText}`);
         }
         
-        const effects = await response.json();
-        console.log(`Loaded ${effects.length} effects:`, effects);
+        const page = await response.json();
+        const effects = page.items;
+        effectsCursor = page.next_cursor;
+        console.log(`Loaded ${effects.length} of ${page.total} effects:`, effects);
+        
+        // 缓存列表数据，详情页据此判断是否已有预览，无需再发HEAD请求
+        if (!append) {
+            effectsById = {};
+        }
+        effects.forEach(effect => { effectsById[effect.id] = effect; });
         
         const effectsGrid = document.getElementById('effectsGrid');
-        effectsGrid.innerHTML = '';
+        const oldMore = document.getElementById('effectsLoadMore');
+        if (oldMore) {
+            oldMore.remove();
+        }
+        if (!append) {
+            effectsGrid.innerHTML = '';
+        }
         
-        if (effects.length === 0) {
+        if (!append && effects.length === 0) {
             effectsGrid.innerHTML = `
                 <div class="col-12 text-center text-muted py-5">
                     <i class="fas fa-exclamation-circle fa-3x mb-3"></i>
@@ -116,57 +157,24 @@ async function loadEffects(styleName) {
         }
         
         effects.forEach(effect => {
-            const col = document.createElement('div');
-            col.className = 'col-lg-4 col-md-6 col-sm-12 mb-4';
-            
-            const previewContent = effect.has_preview ? 
-                `<video class="effect-preview" preload="metadata" muted>
-                    <source src="/${effect.preview_file}" type="video/mp4">
-                </video>` :
-                `<div class="effect-preview-placeholder">
-                    <i class="fas fa-video-slash"></i>
-                </div>`;
-            
-            col.innerHTML = `
-                <div class="card effect-card" onclick="showEffectDetails('${styleName}', '${effect.id}')">
-                    <div class="position-relative">
-                        ${previewContent}
-                        <span class="badge bg-secondary badge-style">${getStyleDisplayName(styleName)}</span>
-                    </div>
-                    <div class="effect-info">
-                        <div class="effect-title">${effect.name || effect.id}</div>
-                        <div class="effect-description">${effect.description || '无描述'}</div>
-                        <div class="effect-actions">
-                            <button class="btn btn-sm btn-outline-primary" onclick="event.stopPropagation(); showEffectDetails('${styleName}', '${effect.id}')">
-                                <i class="fas fa-eye"></i> 详情
-                            </button>
-                            ${effect.has_preview ? 
-                                `<button class="btn btn-sm btn-outline-warning" onclick="event.stopPropagation(); regeneratePreview('${styleName}', '${effect.id}')" title="重新生成预览">
-                                    <i class="fas fa-redo"></i> 重生成
-                                </button>` :
-                                `<button class="btn btn-sm btn-outline-success" onclick="event.stopPropagation(); generateSinglePreview('${styleName}', '${effect.id}')">
-                                    <i class="fas fa-video"></i> 预览
-                                </button>`}
-                        </div>
-                    </div>
-                </div>
-            `;
-            
-            effectsGrid.appendChild(col);
+            effectsGrid.appendChild(renderEffectCard(styleName, effect));
         });
         
-        // 为视频添加播放事件
-        document.querySelectorAll('.effect-preview').forEach(video => {
-            video.addEventListener('mouseenter', () => {
-                video.currentTime = 0;
-                video.play().catch(() => {});
-            });
-            
-            video.addEventListener('mouseleave', () => {
-                video.pause();
-                video.currentTime = 0;
-            });
-        });
+        // 还有下一页时显示"加载更多"
+        if (effectsCursor) {
+            const more = document.createElement('div');
+            more.id = 'effectsLoadMore';
+            more.className = 'col-12 text-center mb-4';
+            more.innerHTML = `
+                <button class="btn btn-outline-secondary" onclick="loadEffects('${styleName}', true)">
+                    <i class="fas fa-chevron-down"></i> 加载更多（已显示 ${Object.keys(effectsById).length} / ${page.total}）
+                </button>
+            `;
+            effectsGrid.appendChild(more);
+        }
+        
+        // 为雪碧图和视频添加悬停播放事件
+        bindPreviewHover(effectsGrid);
         
     } catch (error) {
         console.error('Failed to load effects:', error);
@@ -177,6 +185,68 @@ async function loadEffects(styleName) {
     }
 }
 
+// 特效卡片
+function renderEffectCard(styleName, effect) {
+    const col = document.createElement('div');
+    col.className = 'col-lg-4 col-md-6 col-sm-12 mb-4';
+    col.dataset.effectId = effect.id;
+    
+    const previewContent = renderPreviewThumbnail(effect);
+    
+    col.innerHTML = `
+        <div class="card effect-card" onclick="showEffectDetails('${styleName}', '${effect.id}')">
+            <div class="position-relative">
+                ${previewContent}
+                <span class="badge bg-secondary badge-style">${getStyleDisplayName(styleName)}</span>
+            </div>
+            <div class="effect-info">
+                <div class="effect-title">${effect.name || effect.id}</div>
+                <div class="effect-description">${effect.description || '无描述'}</div>
+                <div class="effect-actions">
+                    <button class="btn btn-sm btn-outline-primary" onclick="event.stopPropagation(); showEffectDetails('${styleName}', '${effect.id}')">
+                        <i class="fas fa-eye"></i> 详情
+                    </button>
+                    ${effect.has_preview ? 
+                        `<button class="btn btn-sm btn-outline-warning" onclick="event.stopPropagation(); regeneratePreview('${styleName}', '${effect.id}')" title="重新生成预览">
+                            <i class="fas fa-redo"></i> 重生成
+                        </button>` :
+                        `<button class="btn btn-sm btn-outline-success" onclick="event.stopPropagation(); generateSinglePreview('${styleName}', '${effect.id}')">
+                            <i class="fas fa-video"></i> 预览
+                        </button>`}
+                </div>
+            </div>
+        </div>
+    `;
+    
+    return col;
+}
+
+// 插入或替换一张特效卡片（服务端推送的新特效/新预览）
+function upsertEffectCard(styleName, effect) {
+    const effectsGrid = document.getElementById('effectsGrid');
+    const col = renderEffectCard(styleName, effect);
+    const existing = effectsGrid.querySelector(`[data-effect-id="${CSS.escape(effect.id)}"]`);
+    if (existing) {
+        existing.replaceWith(col);
+    } else {
+        if (Object.keys(effectsById).length === 0) {
+            // 替换"暂无特效"提示
+            effectsGrid.innerHTML = '';
+        }
+        const more = document.getElementById('effectsLoadMore');
+        effectsGrid.insertBefore(col, more);
+    }
+    effectsById[effect.id] = effect;
+    bindPreviewHover(col);
+}
+
+// 排序/过滤条件变化时从第一页重新加载
+function reloadEffects() {
+    if (currentStyle) {
+        loadEffects(currentStyle);
+    }
+}
+
 // 显示特效详情
 async function showEffectDetails(styleName, effectId) {
     try {
@@ -208,32 +278,30 @@ async function showEffectDetails(styleName, effectId) {
                 const video = document.getElementById('previewVideo');
                 const container = document.getElementById('previewContainer');
                 
-                // 检查预览文件是否存在
-                fetch(`/${previewFile}`, { method: 'HEAD' })
-                    .then(response => {
-                        if (response.ok && video) {
-                            video.src = `/${previewFile}`;
-                            video.style.display = 'block';
-                        } else {
-                            if (video) {
-                                video.style.display = 'none';
-                            }
-                            if (container) {
-                                container.innerHTML = `
-                                    <div class="text-center p-4 bg-light">
-                                        <i class="fas fa-video-slash fa-3x text-muted mb-3"></i>
-                                        <p class="text-muted">暂无预览视频</p>
-                                        <button class="btn btn-success" onclick="generateSinglePreview()">
-                                            <i class="fas fa-video"></i> 生成预览
-                                        </button>
-                                    </div>
-                                `;
-                            }
-                        }
-                    })
-                    .catch(error => {
-                        console.error('Error checking preview file:', error);
-                    });
+                // 根据列表数据判断预览是否存在
+                const listed = effectsById[effectId];
+                if (listed && listed.has_preview && video) {
+                    if (listed.poster_file) {
+                        video.poster = `/${listed.poster_file}`;
+                    }
+                    video.src = `/${listed.preview_url || previewFile}`;
+                    video.style.display = 'block';
+                } else {
+                    if (video) {
+                        video.style.display = 'none';
+                    }
+                    if (container) {
+                        container.innerHTML = `
+                            <div class="text-center p-4 bg-light">
+                                <i class="fas fa-video-slash fa-3x text-muted mb-3"></i>
+                                <p class="text-muted">暂无预览视频</p>
+                                <button class="btn btn-success" onclick="generateSinglePreview()">
+                                    <i class="fas fa-video"></i> 生成预览
+                                </button>
+                            </div>
+                        `;
+                    }
+                }
             }, 100);
             
         } else {
@@ -280,10 +348,12 @@ async function generateEffects(style, count = 5) {
         if (response.ok && result.success) {
             showAlert(`成功生成 ${result.generated_count} 个特效`, 'success');
             
-            // 刷新数据
-            await loadStyles();
-            if (currentStyle === style) {
-                await loadEffects(style);
+            // 刷新数据（已订阅事件时由 effect-created 更新）
+            if (!eventsConnected) {
+                await loadStyles();
+                if (currentStyle === style) {
+                    await loadEffects(style);
+                }
             }
         } else {
             showAlert(`生成特效失败: ${result.error}`, 'danger');
@@ -297,6 +367,109 @@ async function generateEffects(style, count = 5) {
     }
 }
 
+// 服务端推送事件（/api/events）；EventSource断线后自动重连并带上 Last-Event-ID
+const jobWaiters = new Map();
+
+function subscribeEvents() {
+    if (!window.EventSource) {
+        return;
+    }
+    const source = new EventSource('/api/events');
+    source.onopen = () => { eventsConnected = true; };
+    source.onerror = () => { eventsConnected = source.readyState === EventSource.OPEN; };
+    
+    source.addEventListener('effect-created', e => {
+        const data = JSON.parse(e.data);
+        if (!updateStyleBadge(data.style, '.effect-count', 1)) {
+            // 新风格：重新加载一次风格列表
+            clearTimeout(stylesReloadTimer);
+            stylesReloadTimer = setTimeout(() => loadStyles(), 500);
+        }
+        if (currentStyle === data.style && !effectsById[data.effect.id]) {
+            upsertEffectCard(data.style, data.effect);
+        }
+    });
+    
+    source.addEventListener('preview-ready', e => {
+        const data = JSON.parse(e.data);
+        if (!data.replaced) {
+            updateStyleBadge(data.style, '.preview-count', 1);
+        }
+        if (currentStyle === data.style && effectsById[data.effect.id]) {
+            upsertEffectCard(data.style, data.effect);
+        }
+    });
+    
+    ['render-progress', 'job-updated'].forEach(type => {
+        source.addEventListener(type, e => {
+            const data = JSON.parse(e.data);
+            // 去重复用的任务可能同时属于多个批次
+            new Set([data.job_id, data.batch_id, ...(data.batch_ids || [])]).forEach(id => {
+                const waiter = id && jobWaiters.get(id);
+                if (waiter) {
+                    waiter(type, data);
+                }
+            });
+        });
+    });
+    
+    // 错过的事件无法补发（服务器重启等）：重新加载当前列表
+    source.addEventListener('reset', () => {
+        loadStyles();
+        if (currentStyle) {
+            loadEffects(currentStyle);
+        }
+    });
+}
+
+let stylesReloadTimer = null;
+
+function updateStyleBadge(styleName, selector, delta) {
+    const item = document.querySelector(`#stylesList [data-style="${CSS.escape(styleName)}"]`);
+    const badge = item && item.querySelector(selector);
+    if (badge) {
+        badge.textContent = parseInt(badge.textContent || '0') + delta;
+    }
+    return Boolean(badge);
+}
+
+// 等待渲染任务（202响应）结束：任务状态变化时由事件触发查询，没有事件时（独立worker进程渲染）低频查询
+const JOB_FALLBACK_POLL_INTERVAL = 15000;
+
+async function waitForJob(statusUrl, onProgress, onRenderProgress) {
+    const jobId = statusUrl.split('/').pop();
+    try {
+        while (true) {
+            const response = await fetch(statusUrl);
+            const job = await response.json();
+            if (!response.ok) {
+                throw new Error(job.error || `HTTP ${response.status}`);
+            }
+            if (onProgress) {
+                onProgress(job);
+            }
+            if (job.status !== 'pending' && job.status !== 'running') {
+                return job;
+            }
+            await new Promise(resolve => {
+                const timer = setTimeout(resolve, eventsConnected ? JOB_FALLBACK_POLL_INTERVAL : 1000);
+                jobWaiters.set(jobId, (type, data) => {
+                    if (type === 'render-progress') {
+                        if (onRenderProgress) {
+                            onRenderProgress(data.progress);
+                        }
+                        return;
+                    }
+                    clearTimeout(timer);
+                    resolve();
+                });
+            });
+        }
+    } finally {
+        jobWaiters.delete(jobId);
+    }
+}
+
 // 生成单个预览
 async function generateSinglePreview(styleName, effectId) {
     if (!styleName && currentEffect) {
@@ -323,7 +496,23 @@ async function generateSinglePreview(styleName, effectId) {
             })
         });
         
-        const result = await response.json();
+        let result = await response.json();
+        
+        if (response.status === 202) {
+            // 已入队：等待后台渲染完成
+            const job = await waitForJob(result.status_url, job => {
+                showLoading(job.status === 'pending' ? '预览已加入渲染队列...' : '正在生成预览视频...');
+            }, progress => {
+                showLoading(`正在生成预览视频... ${progress.percent}%`);
+            });
+            const item = job.results[0] || {};
+            result = {
+                success: job.status === 'succeeded',
+                preview_file: item.preview_file,
+                demo_file: item.preview_file ? `demos/${styleName}_${effectId}_demo.mp4` : null,
+                error: item.error || job.status
+            };
+        }
         
         if (response.ok && result.success) {
             let message = '预览视频生成成功';
@@ -338,21 +527,21 @@ async function generateSinglePreview(styleName, effectId) {
                 const previewContainer = document.getElementById('previewContainer');
                 
                 if (previewVideo) {
-                    previewVideo.src = `/${result.preview_file}`;
+                    previewVideo.src = `/${result.preview_url || result.preview_file}`;
                     previewVideo.style.display = 'block';
                 }
                 
                 if (previewContainer) {
                     previewContainer.innerHTML = `
                         <video id="previewVideo" class="w-100" controls style="max-height: 400px;">
-                            <source src="/${result.preview_file}" type="video/mp4">
+                            <source src="/${result.preview_url || result.preview_file}" type="video/mp4">
                         </video>
                     `;
                 }
             }
             
-            // 刷新特效列表
-            if (currentStyle === styleName) {
+            // 刷新特效列表（已订阅事件时卡片由 preview-ready 更新）
+            if (currentStyle === styleName && !eventsConnected) {
                 await loadEffects(styleName);
             }
             
@@ -458,13 +647,28 @@ async function generatePreviews() {
                 body: JSON.stringify({ style: currentStyle })
             });
             
-            const result = await response.json();
+            let result = await response.json();
+            
+            if (response.status === 202) {
+                const job = await waitForJob(result.status_url, job => {
+                    showLoading(`正在批量生成预览... ${job.done}/${job.total}`);
+                });
+                result = {
+                    success: job.status !== 'failed' || job.counts.succeeded > 0,
+                    generated_count: job.counts.succeeded,
+                    total_effects: job.total,
+                    demos_saved_to: 'demos/',
+                    error: job.status
+                };
+            }
             
             if (response.ok && result.success) {
                 showAlert(`批量预览完成！为 ${result.generated_count}/${result.total_effects} 个特效生成了预览\nDemo视频已保存到: ${result.demos_saved_to}`, 'success');
                 
-                // 刷新当前风格的特效列表
-                await loadEffects(currentStyle);
+                // 刷新当前风格的特效列表（已订阅事件时卡片由 preview-ready 更新）
+                if (!eventsConnected) {
+                    await loadEffects(currentStyle);
+                }
             } else {
                 showAlert(`批量预览失败: ${result.error}`, 'danger');
             }
@@ -538,14 +742,39 @@ async function refreshData() {
 //     }
 // }
 
-// 加载Demos列表
-async function loadDemos() {
+// 加载Demos列表（服务端分页和搜索）
+const DEMOS_PAGE_SIZE = 60;
+let demosCursor = null;
+
+async function loadDemos(append = false) {
     try {
-        const response = await fetch('/api/demos');
-        allDemos = await response.json();
+        const params = new URLSearchParams({ limit: DEMOS_PAGE_SIZE, sort: 'created', order: 'desc' });
+        const searchTerm = document.getElementById('demoSearch').value.trim();
+        if (searchTerm) {
+            params.set('q', searchTerm);
+        }
+        if (append && demosCursor) {
+            params.set('cursor', demosCursor);
+        }
+        
+        const response = await fetch(`/api/demos?${params}`);
+        const page = await response.json();
+        demosCursor = page.next_cursor;
+        allDemos = append ? allDemos.concat(page.items) : page.items;
         
         displayDemos(allDemos);
         
+        if (demosCursor) {
+            const more = document.createElement('div');
+            more.className = 'col-12 text-center mb-4';
+            more.innerHTML = `
+                <button class="btn btn-outline-secondary" onclick="loadDemos(true)">
+                    <i class="fas fa-chevron-down"></i> 加载更多（已显示 ${allDemos.length} / ${page.total}）
+                </button>
+            `;
+            document.getElementById('demosGrid').appendChild(more);
+        }
+        
     } catch (error) {
         console.error('Failed to load demos:', error);
         showAlert('加载Demo视频失败', 'danger');
@@ -619,15 +848,11 @@ function displayDemos(demos) {
     });
 }
 
-// 过滤Demos
+// 过滤Demos（输入停止300ms后由服务端搜索）
+let demoSearchTimer = null;
 function filterDemos() {
-    const searchTerm = document.getElementById('demoSearch').value.toLowerCase();
-    const filteredDemos = allDemos.filter(demo => 
-        demo.filename.toLowerCase().includes(searchTerm) ||
-        demo.style.toLowerCase().includes(searchTerm) ||
-        demo.effect_id.toLowerCase().includes(searchTerm)
-    );
-    displayDemos(filteredDemos);
+    clearTimeout(demoSearchTimer);
+    demoSearchTimer = setTimeout(() => loadDemos(), 300);
 }
 
 // 刷新Demos
@@ -670,6 +895,70 @@ function downloadAllDemos() {
     showAlert('打包下载功能开发中...', 'info');
 }
 
+// 特效卡片的预览缩略图：优先使用封面图+雪碧图，只有旧预览才退回到视频
+function renderPreviewThumbnail(effect) {
+    if (!effect.has_preview) {
+        return `<div class="effect-preview-placeholder">
+                    <i class="fas fa-video-slash"></i>
+                </div>`;
+    }
+    
+    if (effect.poster_file) {
+        const webpSource = effect.poster_webp_file ?
+            `<source srcset="/${effect.poster_webp_file}" type="image/webp">` : '';
+        const spriteAttrs = effect.sprite_file ?
+            `data-sprite="/${effect.sprite_file}" data-frames="${effect.sprite_frames}"` : '';
+        
+        return `<div class="effect-preview effect-sprite" ${spriteAttrs}>
+                    <picture>
+                        ${webpSource}
+                        <img class="effect-poster" src="/${effect.poster_file}" loading="lazy" alt="${effect.id}">
+                    </picture>
+                </div>`;
+    }
+    
+    return `<video class="effect-preview" preload="none" muted>
+                <source src="/${effect.preview_url || effect.preview_file}" type="video/mp4">
+            </video>`;
+}
+
+// 悬停时播放雪碧图动画（或旧预览的视频）
+function bindPreviewHover(container) {
+    container.querySelectorAll('.effect-sprite[data-sprite]').forEach(el => {
+        let timer = null;
+        
+        el.addEventListener('mouseenter', () => {
+            const frames = parseInt(el.dataset.frames) || 1;
+            let frame = 0;
+            el.style.backgroundImage = `url('${el.dataset.sprite}')`;
+            el.style.backgroundSize = `${frames * 100}% 100%`;
+            el.classList.add('playing');
+            timer = setInterval(() => {
+                frame = (frame + 1) % frames;
+                el.style.backgroundPositionX = frames > 1 ? `${frame / (frames - 1) * 100}%` : '0%';
+            }, 200);
+        });
+        
+        el.addEventListener('mouseleave', () => {
+            clearInterval(timer);
+            el.classList.remove('playing');
+            el.style.backgroundPositionX = '0%';
+        });
+    });
+    
+    container.querySelectorAll('video.effect-preview').forEach(video => {
+        video.addEventListener('mouseenter', () => {
+            video.currentTime = 0;
+            video.play().catch(() => {});
+        });
+        
+        video.addEventListener('mouseleave', () => {
+            video.pause();
+            video.currentTime = 0;
+        });
+    });
+}
+
 // 工具函数
 function getStyleIcon(styleName) {
     const icons = {